@@ -5,6 +5,8 @@
 #
 from __future__ import annotations
 from typing import Optional, List, Callable, Any, Union, Collection, Iterator, Tuple
+import weakref
+import zlib
 
 import numpy as np
 
@@ -604,6 +606,14 @@ class ElementFilter(Filter):
         a list of nodal tags names to use to extract elements
     nTagsTreatment : str, optional
         ["allnodes" | "leastonenode"], by default "allnodes"
+
+    The ids computed by GetIdsToTreat are cached (per element type). The cache
+    is invalidated when the filter parameters change, when the mutation
+    counter of the mesh changes (see UnstructuredMesh.GetMutationCounter) or
+    when the content of the mask or of the ids of the tags used changes
+    (even if modified in place). The cached ids are read only arrays.
+    If a zone or the connectivity is modified in place (without calling
+    Modified) the user must call ClearCache.
     """
     def __init__(self, mesh:UnstructuredMesh=None,
                  dimensionality:Optional[int]=None,
@@ -631,6 +641,7 @@ class ElementFilter(Filter):
             self.SetNTags(nTags)
 
         self.withError = False
+        self.cache = {}
 
     def IsEquivalent(self, other:Any) -> bool:
         """To check if 2 element filter are equivalent ()
@@ -888,8 +899,108 @@ class ElementFilter(Filter):
             raise Exception("nTagsTreatment unknown")
         return np.where(res)[0]
 
+    def ClearCache(self):
+        """Clear the cached ids, this is needed only if a zone is modified in place
+        """
+        self.cache = {}
+
+    def __getstate__(self):
+        # the cache (with weak references) is not transferred
+        state = self.__dict__.copy()
+        state["cache"] = {}
+        return state
+
+    def _GetCacheState_(self, elements:ElementsContainer) -> Union[Tuple,None]:
+        """Internal function to compute the state used to validate the cached ids
+
+        Parameters
+        ----------
+        elements : ElementsContainer
+            the incoming ElementsContainer
+
+        Returns
+        -------
+        Union[Tuple,None]
+            a tuple (counters and parameters, objects to compare by identity)
+            None if the mesh or the elements cannot track their modifications
+        """
+        if self.mesh is None:
+            return None
+        meshCounter = getattr(self.mesh, "GetMutationCounter", lambda : None)()
+        if meshCounter is None:
+            return None
+        elementsCounter = getattr(elements, "GetMutationCounter", lambda : None)()
+        if elementsCounter is None:
+            return None
+
+        # the number of elements and the connectivity (by identity) are also
+        # checked: some code sets them directly without calling Modified
+        # the ids of the tags and the mask are checked by identity and by
+        # content: they are small and can be modified in place
+        tagsIds = [elements.tags[tag].GetIds() for tag in self.tags if tag in elements.tags]
+        tagsIds += [self.mesh.nodesTags[tag].GetIds() for tag in self.nTags if tag in self.mesh.nodesTags]
+        contents = tuple(self._GetContentFingerprint_(ids) for ids in tagsIds)
+        if self.mask is not None:
+            contents += (self._GetContentFingerprint_(np.asarray(self.mask)), )
+
+        parameters = (meshCounter, elementsCounter, elements.cpt, elements.connectivity.shape, self.dimensionality, self.zoneTreatment,
+                      self.nTagsTreatment, tuple(self.tags), tuple(self.elementTypes), tuple(self.nTags), contents)
+        objects = (self.mesh, self.mesh.nodes, elements, elements.connectivity, self.mask) + tuple(self.zones) + tuple(tagsIds)
+        return parameters, objects
+
+    @staticmethod
+    def _GetContentFingerprint_(data:np.ndarray) -> Tuple:
+        """Internal function to compute a fingerprint of the content of an array
+
+        Parameters
+        ----------
+        data : np.ndarray
+            the array
+
+        Returns
+        -------
+        Tuple
+            (shape, dtype, checksum of the data)
+        """
+        return (data.shape, data.dtype.str, zlib.crc32(np.ascontiguousarray(data)))
+
     def GetIdsToTreat(self,elements:ElementsContainer) -> Union[np.ndarray,Collection]:
-        """Get the entities selected by this filter
+        """Get the entities selected by this filter. The result is cached and
+        reused until the mesh or the filter is modified.
+
+        Parameters
+        ----------
+        elements : ElementsContainer
+            Elements to treat
+
+        Returns
+        -------
+        Union[np.ndarray,Collection]
+            The filtered entities
+        """
+        state = self._GetCacheState_(elements)
+        if state is not None:
+            parameters, objects = state
+            cached = self.cache.get(elements.elementType, None)
+            if cached is not None and cached[0] == parameters and len(cached[1]) == len(objects) and all(ref() is obj for ref, obj in zip(cached[1],objects)):
+                self.zonesField = cached[3]
+                return cached[2]
+
+        res = self._ComputeIdsToTreat_(elements)
+
+        if state is not None:
+            try:
+                refs = tuple(weakref.ref(obj) if obj is not None else (lambda : None) for obj in objects)
+            except TypeError:
+                # objects not supporting weak references (mask as a list for example)
+                return res
+            if isinstance(res, np.ndarray):
+                res.flags.writeable = False
+            self.cache[elements.elementType] = (parameters, refs, res, getattr(self, "zonesField", None))
+        return res
+
+    def _ComputeIdsToTreat_(self,elements:ElementsContainer) -> Union[np.ndarray,Collection]:
+        """Internal function to compute the entities selected by this filter (no cache)
 
         Parameters
         ----------
@@ -1237,6 +1348,112 @@ def ElementFilterToImplicitField(elementFilter:ElementFilter, pseudoDistance:int
             break
     return phi
 
+def CheckIntegrityCache(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    mesh = CreateCube(dimensions=[5,6,7], origin=[0,0,0.], spacing=[1.,1.,1.], ofTetras=True )
+
+    class CountingZone():
+        def __init__(self):
+            self.cpt = 0
+        def __call__(self, pos):
+            self.cpt += 1
+            return pos[:,0]-1.5
+
+    zone = CountingZone()
+    ff = ElementFilter(mesh, zone=zone, dimensionality=3)
+    for i in range(3):
+        res = ff.ApplyOnElements(ElementCounter())
+    if zone.cpt != 1: # pragma: no cover
+        raise Exception("Cache not used")
+    numberOfElements = res.cpt
+
+    # the cached ids must be read only
+    for name, data, ids in ff:
+        if isinstance(ids, np.ndarray) and ids.flags.writeable: # pragma: no cover
+            raise Exception("Cached ids must be read only")
+
+    # change in the filter
+    ff.SetZoneTreatment("allnodes")
+    res = ff.ApplyOnElements(ElementCounter())
+    if zone.cpt != 2 or res.cpt >= numberOfElements: # pragma: no cover
+        raise Exception("Cache not invalidated by a change in the filter")
+    ff.SetZoneTreatment("center")
+
+    # change of the nodes using the API
+    mesh.SetNodes(mesh.nodes-1.)
+    res = ff.ApplyOnElements(ElementCounter())
+    if zone.cpt != 3 or res.cpt <= numberOfElements: # pragma: no cover
+        raise Exception("Cache not invalidated by SetNodes")
+
+    # in place modification of the nodes
+    mesh.nodes[:,0] += 1.
+    mesh.Modified()
+    res = ff.ApplyOnElements(ElementCounter())
+    if zone.cpt != 4 or res.cpt != numberOfElements: # pragma: no cover
+        raise Exception("Cache not invalidated by Modified")
+
+    # change in the tags
+    ff = ElementFilter(mesh, tag="Tag", zone=zone)
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 0: # pragma: no cover
+        raise Exception("Error in the number of elements")
+    mesh.GetElementsOfType(EN.Tetrahedron_4).GetTag("Tag").SetIds([0, 1, 2])
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 3 or zone.cpt != 5: # pragma: no cover
+        raise Exception("Cache not invalidated by a change in the tags")
+
+    # in place modification of the ids of the tag (without calling Modified)
+    mesh.GetElementsOfType(EN.Tetrahedron_4).GetTag("Tag").GetIds()[2] = 1
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 2 or zone.cpt != 6: # pragma: no cover
+        raise Exception("Cache not invalidated by an in place change in the tags")
+
+    # in place modification of the mask
+    mask = np.zeros(mesh.GetNumberOfElements(), dtype=bool)
+    ff = ElementFilter(mesh, mask=mask, dimensionality=3)
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 0: # pragma: no cover
+        raise Exception("Error in the number of elements")
+    mask[:4] = True
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 4: # pragma: no cover
+        raise Exception("Cache not invalidated by an in place change in the mask")
+
+    # in place modification of the nodal tags
+    mesh.nodesTags.CreateTag("NTag").SetIds(np.arange(mesh.GetNumberOfNodes()))
+    ff = ElementFilter(mesh, nTags=["NTag"], dimensionality=3)
+    res = ff.ApplyOnElements(ElementCounter())
+    nbElements3D = res.cpt
+    if nbElements3D != mesh.GetElementsOfType(EN.Tetrahedron_4).GetNumberOfElements(): # pragma: no cover
+        raise Exception("Error in the number of elements")
+    mesh.nodesTags["NTag"].GetIds()[0] = 1
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt >= nbElements3D: # pragma: no cover
+        raise Exception("Cache not invalidated by an in place change in the nodal tags")
+
+    # new element container
+    ff = ElementFilter(mesh, dimensionality=1)
+    res = ff.ApplyOnElements(ElementCounter())
+    mesh.GetElementsOfType(EN.Bar_2).AddNewElement([0,1],0)
+    res2 = ff.ApplyOnElements(ElementCounter())
+    if res2.cpt != res.cpt + 1: # pragma: no cover
+        raise Exception("Cache not invalidated by a new element")
+
+    # direct modification of the connectivity and of the number of elements
+    # (without calling Modified)
+    bars = mesh.GetElementsOfType(EN.Bar_2)
+    bars.connectivity = np.array([[0,1],[1,2],[2,3]], dtype=bars.connectivity.dtype)
+    bars.cpt = 3
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 3: # pragma: no cover
+        raise Exception("Cache not invalidated by a new connectivity")
+    bars.cpt = 2
+    res = ff.ApplyOnElements(ElementCounter())
+    if res.cpt != 2: # pragma: no cover
+        raise Exception("Cache not invalidated by a change in the number of elements")
+
+    return "ok"
+
 def CheckIntegrity( GUI=False):
     """
     .. literalinclude:: ../../src/BasicTools/Containers/Filters.py
@@ -1412,7 +1629,7 @@ def CheckIntegrity( GUI=False):
 
     WriteMeshToXdmf(tempdir+"test.xdmf",mesh, PointFields=[phi],PointFieldsNames=["Phi"] )
 
-    return "ok"
+    return CheckIntegrityCache(GUI)
 
 if __name__ == '__main__':
     print(CheckIntegrity(GUI=False)) # pragma: no cover
@@ -9,7 +9,7 @@ import numpy as np
 
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject
 from BasicTools.NumpyDefs import PBasicIndexType
-from BasicTools.Containers.Tags import Tag, Tags
+from BasicTools.Containers.Tags import Tag, Tags, NextMutationCounter
 
 class MeshBase(BaseOutputObject):
     def __init__(self):
@@ -22,6 +22,7 @@ class MeshBase(BaseOutputObject):
         object using/setting the information
         """
         self.props = {}
+        self.mutationCounter = NextMutationCounter()
 
     def __copy__(self):
         res = MeshBase()
@@ -66,6 +67,34 @@ class MeshBase(BaseOutputObject):
 
         return True
 
+    def Modified(self):
+        """Mark the mesh as modified (update the mutation counter).
+        Modifications done using the API of the mesh, the elements containers
+        and the tags are tracked automatically. The user must call this
+        function after an in-place modification of the nodes or the
+        connectivity arrays (PrepareForOutput calls this function).
+        """
+        self.mutationCounter = NextMutationCounter()
+
+    def GetMutationCounter(self):
+        """Return the mutation counter of the mesh, this number increases
+        every time the mesh, the nodal tags, the element containers or the
+        element tags are modified
+
+        Returns
+        -------
+        int or None
+            the mutation counter, None if the elements of this mesh cannot
+            track their modifications
+        """
+        res = max(self.mutationCounter, self.nodesTags.GetMutationCounter(), getattr(self.elements,"mutationCounter",0))
+        for data in self.elements.values():
+            op = getattr(data,"GetMutationCounter",None)
+            if op is None:
+                return None
+            res = max(res, op())
+        return res
+
     def GetElementsOfType(self,typename):
         """
         return the element container for the typename element
@@ -9,6 +9,11 @@
 # Code © Spencer Krum June 2011
 # Released underl GPLv3 See LICENSE file in this repository
 
+import numpy as np
+
+from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
+from BasicTools.Helpers.BaseOutputObject import BaseOutputObject, froze_it
+
 class node():
     """
     Class to be a node in my octree
@@ -386,6 +391,356 @@ class Octree():
             return [ item for sublist in list_list[-1] for item in  sublist.value]
 
 
+def _SpreadBits(x):
+    """Insert two zero bits between each of the 21 lower bits of x (uint64)"""
+    x = np.asarray(x, dtype=np.uint64) & np.uint64(0x1fffff)
+    x = (x | (x << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    x = (x | (x << np.uint64(8)))  & np.uint64(0x100f00f00f00f00f)
+    x = (x | (x << np.uint64(4)))  & np.uint64(0x10c30c30c30c30c3)
+    x = (x | (x << np.uint64(2)))  & np.uint64(0x1249249249249249)
+    return x
+
+def MortonEncode(ijk):
+    """Compute the Morton (Z-order) code of integer coordinates
+
+    Parameters
+    ----------
+    ijk : np.ndarray
+        (n,3) array of non negative integers (only the 21 lower bits are used)
+
+    Returns
+    -------
+    np.ndarray
+        (n,) array of np.uint64 Morton codes
+    """
+    ijk = np.asarray(ijk, dtype=np.uint64)
+    return _SpreadBits(ijk[:,0]) | (_SpreadBits(ijk[:,1]) << np.uint64(1)) | (_SpreadBits(ijk[:,2]) << np.uint64(2))
+
+@froze_it
+class LinearOctree(BaseOutputObject):
+    """Array based (linear) octree to index large point clouds
+
+    The points are quantized on a regular grid of 2**maxLevel cells per
+    direction and sorted by the Morton code of their cell. Every octree node
+    at a coarser level is then a contiguous range of the sorted codes, so the
+    queries only need searchsorted calls on a single array. All the queries
+    are batched (one call for many query points) and return numpy arrays of
+    point indices (the index of the point in the insertion order).
+
+    Parameters
+    ----------
+    points : ArrayLike, optional
+        (n,3) or (n,2) array of points, by default None
+    boundingMin : ArrayLike, optional
+        lower corner of the indexed domain, by default the bounding box of points
+    boundingMax : ArrayLike, optional
+        upper corner of the indexed domain, by default the bounding box of points
+    maxLevel : int, optional
+        depth of the octree (maximal 21), by default 16
+
+    Points added outside the domain are correctly handled (they are stored in
+    the boundary cells) but the efficiency of the queries degrades.
+    """
+    def __init__(self, points=None, boundingMin=None, boundingMax=None, maxLevel=16):
+        super(LinearOctree,self).__init__()
+        if maxLevel < 1 or maxLevel > 21:
+            raise ValueError("maxLevel must be between 1 and 21")
+        self.maxLevel = maxLevel
+        self.origin = None
+        self.cellSize = None
+        self.points = np.empty((0,3), dtype=PBasicFloatType)
+        self.sortedCodes = np.empty(0, dtype=np.uint64)
+        self.sortedIds = np.empty(0, dtype=PBasicIndexType)
+        self.sortedPoints = np.empty((0,3), dtype=PBasicFloatType)
+        if boundingMin is not None and boundingMax is not None:
+            self.SetBoundingBox(boundingMin, boundingMax)
+        if points is not None:
+            self.SetPoints(points)
+
+    def SetBoundingBox(self, boundingMin, boundingMax):
+        """Set the domain covered by the octree (the octree must be empty)
+
+        Parameters
+        ----------
+        boundingMin : ArrayLike
+            lower corner of the domain
+        boundingMax : ArrayLike
+            upper corner of the domain
+        """
+        if self.GetNumberOfPoints():
+            raise RuntimeError("Cannot change the bounding box of a non empty octree")
+        boundingMin = self._To3D(np.asarray(boundingMin, dtype=PBasicFloatType)[None,:])[0]
+        boundingMax = self._To3D(np.asarray(boundingMax, dtype=PBasicFloatType)[None,:])[0]
+        size = np.max(boundingMax-boundingMin)
+        if not size > 0:
+            size = 1.
+        self.origin = boundingMin
+        self.cellSize = size/2**self.maxLevel
+
+    def GetNumberOfPoints(self):
+        """Return the number of points in the octree"""
+        return self.points.shape[0]
+
+    def SetPoints(self, points):
+        """Bulk build of the octree (previous points are discarded)
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array of points
+        """
+        points = self._To3D(points)
+        if self.origin is None:
+            self.SetBoundingBox(np.min(points,axis=0), np.max(points,axis=0))
+        self.points = np.array(points)
+        codes = self._ComputeCodes(self.points)
+        self.sortedIds = np.argsort(codes, kind="stable").astype(PBasicIndexType)
+        self.sortedCodes = codes[self.sortedIds]
+        self.sortedPoints = self.points[self.sortedIds,:]
+
+    def AddPoints(self, points):
+        """Incremental insertion of points
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array of points
+
+        Returns
+        -------
+        np.ndarray
+            the indices of the new points
+        """
+        points = self._To3D(points)
+        if self.GetNumberOfPoints() == 0:
+            if self.origin is None:
+                self.SetBoundingBox(np.min(points,axis=0), np.max(points,axis=0))
+            self.SetPoints(points)
+            return np.arange(points.shape[0], dtype=PBasicIndexType)
+
+        newIds = np.arange(self.points.shape[0], self.points.shape[0]+points.shape[0], dtype=PBasicIndexType)
+        codes = self._ComputeCodes(points)
+        order = np.argsort(codes, kind="stable")
+        codes = codes[order]
+        positions = np.searchsorted(self.sortedCodes, codes, side="right")
+        self.points = np.vstack((self.points, points))
+        self.sortedCodes = np.insert(self.sortedCodes, positions, codes)
+        self.sortedIds = np.insert(self.sortedIds, positions, newIds[order])
+        self.sortedPoints = np.insert(self.sortedPoints, positions, points[order,:], axis=0)
+        return newIds
+
+    def FindWithinRange(self, centers, size, shape="cube"):
+        """Find the points inside a box or a sphere around each center
+
+        Parameters
+        ----------
+        centers : ArrayLike
+            (m,3) or (m,2) array of the query points (or a single point)
+        size : float or ArrayLike
+            half size of the box (scalar, per direction (3,) or per query (m,)),
+            or radius of the sphere (scalar or per query (m,))
+        shape : str, optional
+            "cube" or "sphere", by default "cube"
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            indptr, indices : CSR storage of the result, the points found for
+            the query i are indices[indptr[i]:indptr[i+1]]
+        """
+        centers = self._To3D(centers)
+        nbQueries = centers.shape[0]
+        size = np.asarray(size, dtype=PBasicFloatType)
+        if shape == "cube":
+            if size.ndim == 1 and size.shape[0] == 3 and nbQueries != 3:
+                halfSize = np.tile(size,(nbQueries,1))
+            else:
+                halfSize = np.tile(np.broadcast_to(size,(nbQueries,))[:,None],(1,3))
+        elif shape == "sphere":
+            halfSize = np.tile(np.broadcast_to(size,(nbQueries,))[:,None],(1,3))
+        else:
+            raise ValueError(f"shape {shape} not supported (cube or sphere)")
+
+        if self.GetNumberOfPoints() == 0 or nbQueries == 0:
+            return np.zeros(nbQueries+1, dtype=PBasicIndexType), np.empty(0, dtype=PBasicIndexType)
+
+        # queries in Morton order for a better memory locality
+        queryOrder = np.argsort(self._ComputeCodes(centers), kind="stable")
+        queryIds, candidates = self._FindInBoxes(centers[queryOrder,:], halfSize[queryOrder,:], shape == "sphere")
+
+        # back to the original order of the queries
+        sortedCounts = np.bincount(queryIds, minlength=nbQueries)
+        sortedOffsets = np.cumsum(sortedCounts) - sortedCounts
+        counts = np.empty(nbQueries, dtype=PBasicIndexType)
+        counts[queryOrder] = sortedCounts
+        indptr = np.zeros(nbQueries+1, dtype=PBasicIndexType)
+        np.cumsum(counts, out=indptr[1:])
+        positions = indptr[queryOrder[queryIds]] + np.arange(len(queryIds)) - sortedOffsets[queryIds]
+        indices = np.empty(len(queryIds), dtype=PBasicIndexType)
+        indices[positions] = self.sortedIds[candidates]
+        return indptr, indices
+
+    def FindNearest(self, points):
+        """Find the closest point in the octree for each query point
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (m,3) or (m,2) array of the query points
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            ids, distances : index and distance of the closest point
+        """
+        if self.GetNumberOfPoints() == 0:
+            raise RuntimeError("Cannot search in an empty octree")
+
+        points = self._To3D(points)
+        nbQueries = points.shape[0]
+        ids = np.empty(nbQueries, dtype=PBasicIndexType)
+        distances = np.empty(nbQueries, dtype=PBasicFloatType)
+
+        queryOrder = np.argsort(self._ComputeCodes(points), kind="stable")
+        points = points[queryOrder,:]
+        size = self.cellSize*2**self.maxLevel
+        radius = np.full(nbQueries, max(self.cellSize, size*self.GetNumberOfPoints()**(-1./3)), dtype=PBasicFloatType)
+        todo = np.arange(nbQueries)
+        while len(todo):
+            # a point at a distance r <= radius is always inside the cube
+            queryIds, candidates = self._FindInBoxes(points[todo,:], np.tile(radius[todo,None],(1,3)), False)
+            dist2 = np.sum((self.sortedPoints[candidates,:] - points[todo[queryIds],:])**2, axis=1)
+            counts = np.bincount(queryIds, minlength=len(todo))
+            owners = np.flatnonzero(counts)
+            best = np.minimum.reduceat(dist2, (np.cumsum(counts)-counts)[owners]) if len(owners) else dist2
+            positions = np.flatnonzero(dist2 == np.repeat(best, counts[owners]))
+            best = np.sqrt(best)
+            found = np.zeros(len(todo), dtype=bool)
+            found[owners] = best <= radius[todo[owners]]
+            positions = positions[found[queryIds[positions]]]
+            ids[todo[queryIds[positions]]] = self.sortedIds[candidates[positions]]
+            distances[todo[owners[found[owners]]]] = best[found[owners]]
+            todo = todo[~found]
+            radius[todo] *= 2
+
+        res = (np.empty_like(ids), np.empty_like(distances))
+        res[0][queryOrder] = ids
+        res[1][queryOrder] = distances
+        return res
+
+    def _To3D(self, points):
+        points = np.asarray(points, dtype=PBasicFloatType)
+        if points.ndim == 1:
+            points = points[None,:]
+        if points.shape[1] == 3:
+            return points
+        res = np.zeros((points.shape[0],3), dtype=PBasicFloatType)
+        res[:,0:points.shape[1]] = points
+        return res
+
+    def _ComputeCells(self, points):
+        cells = np.floor((points-self.origin)/self.cellSize)
+        return np.clip(cells, 0, 2**self.maxLevel-1).astype(np.int64)
+
+    def _ComputeCodes(self, points):
+        return MortonEncode(self._ComputeCells(points))
+
+    def _FindInBoxes(self, centers, halfSize, sphere):
+        """Return (queryIds, positions in the sorted arrays) of the points
+        inside the boxes (or the spheres of radius halfSize[:,0]).
+        queryIds is sorted"""
+        queryIds, candidates = self._GetCandidates(centers-halfSize, centers+halfSize)
+        delta = self.sortedPoints[candidates,:] - centers[queryIds,:]
+        if sphere:
+            mask = np.sum(delta**2, axis=1) <= halfSize[queryIds,0]**2
+        else:
+            mask = np.all(np.abs(delta) <= halfSize[queryIds,:], axis=1)
+        return queryIds[mask], candidates[mask]
+
+    def _GetCandidates(self, lowerCorners, upperCorners):
+        """Return (queryIds, positions in the sorted arrays) of the points in the
+        octree nodes overlapping the boxes. For every box, the level is
+        chosen to have at most 3 nodes per direction (so 27 nodes)"""
+        nbQueries = lowerCorners.shape[0]
+        lowerCells = self._ComputeCells(lowerCorners)
+        upperCells = self._ComputeCells(upperCorners)
+        width = np.max(upperCells-lowerCells, axis=1)
+        shift = np.maximum(np.ceil(np.log2(width+1)).astype(np.int64)-1, 0)
+        lowerCells >>= shift[:,None]
+        upperCells >>= shift[:,None]
+        codeShift = (3*shift).astype(np.uint64)
+
+        starts = np.empty((nbQueries,27), dtype=np.int64)
+        stops = np.empty((nbQueries,27), dtype=np.int64)
+        cpt = 0
+        for i in range(3):
+            for j in range(3):
+                for k in range(3):
+                    nodes = lowerCells + np.array([i,j,k])
+                    valid = np.all(nodes <= upperCells, axis=1)
+                    codes = MortonEncode(nodes[valid,:])
+                    starts[:,cpt] = 0
+                    stops[:,cpt] = 0
+                    starts[valid,cpt] = np.searchsorted(self.sortedCodes, codes << codeShift[valid], side="left")
+                    stops[valid,cpt] = np.searchsorted(self.sortedCodes, (codes + np.uint64(1)) << codeShift[valid], side="left")
+                    cpt += 1
+
+        lengths = (stops-starts).ravel()
+        total = np.sum(lengths)
+        queryIds = np.repeat(np.repeat(np.arange(nbQueries),27), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        candidates = np.arange(total) - np.repeat(offsets - starts.ravel(), lengths)
+        return queryIds, candidates
+
+
+def CheckIntegrity_LinearOctree(GUI=False):
+    from scipy.spatial import cKDTree
+
+    rng = np.random.default_rng(0)
+    points = rng.random((2000,3))
+    tree = LinearOctree(points, maxLevel=10)
+
+    # incremental insert
+    extraPoints = rng.random((500,3))*1.2-0.1
+    newIds = tree.AddPoints(extraPoints)
+    if newIds[0] != 2000 or tree.GetNumberOfPoints() != 2500: # pragma: no cover
+        raise Exception("Error in AddPoints")
+    allPoints = np.vstack((points,extraPoints))
+
+    queries = rng.random((300,3))*1.4-0.2
+    indptr, indices = tree.FindWithinRange(queries, 0.1, "cube")
+    for i in range(queries.shape[0]):
+        ref = np.where(np.all(np.abs(allPoints-queries[i,:]) <= 0.1,axis=1))[0]
+        if not np.array_equal(np.sort(indices[indptr[i]:indptr[i+1]]), ref): # pragma: no cover
+            raise Exception("Error in FindWithinRange cube")
+
+    radius = rng.random(queries.shape[0])*0.2
+    indptr, indices = tree.FindWithinRange(queries, radius, "sphere")
+    for i in range(queries.shape[0]):
+        ref = np.where(np.linalg.norm(allPoints-queries[i,:],axis=1) <= radius[i])[0]
+        if not np.array_equal(np.sort(indices[indptr[i]:indptr[i+1]]), ref): # pragma: no cover
+            raise Exception("Error in FindWithinRange sphere")
+
+    ids, distances = tree.FindNearest(queries)
+    refDistances, _ = cKDTree(allPoints).query(queries)
+    if np.max(np.abs(refDistances-distances)) > 1e-14: # pragma: no cover
+        raise Exception("Error in FindNearest (distances)")
+    if np.max(np.abs(np.linalg.norm(allPoints[ids,:]-queries,axis=1)-distances)) > 1e-14: # pragma: no cover
+        raise Exception("Error in FindNearest (ids)")
+
+    # 2D points and incremental build from an empty tree
+    tree = LinearOctree(boundingMin=[0,0], boundingMax=[1,1])
+    tree.AddPoints([[0.5,0.5],[0.25,0.75]])
+    tree.AddPoints([[0.,0.]])
+    indptr, indices = tree.FindWithinRange([0.3,0.7], 0.1)
+    if list(indices) != [1]: # pragma: no cover
+        raise Exception("Error in 2D FindWithinRange")
+    ids, _ = tree.FindNearest([[0.1,0.1],[0.6,0.6]])
+    if list(ids) != [2,0]: # pragma: no cover
+        raise Exception("Error in 2D FindNearest")
+    return "ok"
+
 def CheckIntegrity():
 
     print( "Creating octree")
@@ -434,7 +789,8 @@ def CheckIntegrity():
 
     if len(entries) != 3:# pragma: no cover
         raise(Exception("Error") )
-    return "ok"
+
+    return CheckIntegrity_LinearOctree()
 
 if __name__ == '__main__':
     print((CheckIntegrity()))# pragma: no cover
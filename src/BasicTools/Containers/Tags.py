@@ -7,12 +7,27 @@
 from __future__ import annotations # python 3 compatibility
 
 from typing import Iterable, Optional,  List, Tuple, Iterator, Collection
+import itertools
 
 import numpy as np
 
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject, froze_it
 from BasicTools.NumpyDefs import PBasicIndexType
 
+_mutationClock = itertools.count(1)
+
+def NextMutationCounter() -> int:
+    """Return a new value of the global mutation clock.
+    The values are strictly increasing, so an object created or modified
+    after another one has always a bigger mutation counter.
+
+    Returns
+    -------
+    int
+        a new value of the global mutation clock
+    """
+    return next(_mutationClock)
+
 @froze_it
 class Tag(BaseOutputObject):
     """A Tag is an object to store a name and ids.
@@ -25,6 +40,23 @@ class Tag(BaseOutputObject):
         self.name = tagname
         self._id = np.empty(0,dtype=PBasicIndexType)
         self.cpt = 0
+        self.mutationCounter = NextMutationCounter()
+
+    def Modified(self):
+        """Mark the tag as modified (update the mutation counter).
+        Must be called by the user after a direct modification of the ids
+        """
+        self.mutationCounter = NextMutationCounter()
+
+    def GetMutationCounter(self) -> int:
+        """Return the mutation counter of this tag
+
+        Returns
+        -------
+        int
+            the value of the global mutation clock at the last modification
+        """
+        return self.mutationCounter
 
     def __eq__(self, other:object) -> bool:
         """Equal operator, return True only if names and ids are equal
@@ -75,6 +107,7 @@ class Tag(BaseOutputObject):
 
             self._id[self.cpt] = tid
             self.cpt += 1
+        self.mutationCounter = NextMutationCounter()
 
     def __len__(self) -> int :
         return self.cpt
@@ -101,6 +134,7 @@ class Tag(BaseOutputObject):
         """
         self._id = np.unique(np.asarray(ids,dtype=PBasicIndexType))
         self.cpt = len(self._id)
+        self.mutationCounter = NextMutationCounter()
 
     def SetId(self, pos:int, idd:int):
         """set the value of the id in the position  pos
@@ -113,6 +147,7 @@ class Tag(BaseOutputObject):
             the value
         """
         self._id[pos] = idd
+        self.mutationCounter = NextMutationCounter()
 
     def Allocate(self, allocationSize:int):
         """Allocate the memory for n objects
@@ -125,6 +160,7 @@ class Tag(BaseOutputObject):
         """
         self.cpt = allocationSize
         self.Tighten()
+        self.mutationCounter = NextMutationCounter()
 
     def GetIds(self) -> np.ndarray:
         """Return the Ids in the tag
@@ -217,6 +253,25 @@ class Tags(BaseOutputObject):
     def __init__(self):
         super(Tags,self).__init__()
         self.storage = []
+        self.mutationCounter = NextMutationCounter()
+
+    def Modified(self):
+        """Mark the container as modified (update the mutation counter)"""
+        self.mutationCounter = NextMutationCounter()
+
+    def GetMutationCounter(self) -> int:
+        """Return the mutation counter of the container and the tags inside
+
+        Returns
+        -------
+        int
+            the value of the global mutation clock at the last modification
+            of the container or of any tag in the container
+        """
+        res = self.mutationCounter
+        for tag in self.storage:
+            res = max(res, tag.GetMutationCounter())
+        return res
 
     def Tighten(self):
         """Call Tag.Tighten on every tag """
@@ -252,6 +307,7 @@ class Tags(BaseOutputObject):
             raise Exception("Cant add the tag two times!!")# pragma: no cover
 
         self.storage.append(item)
+        self.mutationCounter = NextMutationCounter()
         return item
 
     def DeleteTags(self, tagNames:List[str]):
@@ -264,6 +320,7 @@ class Tags(BaseOutputObject):
         """
 
         self.storage = [ tag for tag in self.storage if tag.name not in tagNames ]
+        self.mutationCounter = NextMutationCounter()
 
     def CreateTag(self, name: str, errorIfAlreadyCreated:Optional[bool]=True) -> Tag:
         """Create a new tag with the name "name" and return it
@@ -312,6 +369,7 @@ class Tags(BaseOutputObject):
         """
         if name in self:
             self[name].name = newName
+            self.mutationCounter = NextMutationCounter()
         else:
             if noError:
                 return
@@ -324,6 +382,7 @@ class Tags(BaseOutputObject):
             tag = self[tagname]
             if tag.cpt == 0:
                 self.storage.remove(tag)
+                self.mutationCounter = NextMutationCounter()
 
 ## function to act like a dict
 
@@ -496,6 +555,16 @@ def CheckIntegrity():
     # Dict interface
     print(tags.items())
 
+    # mutation counter
+    counter = tags.GetMutationCounter()
+    tags["tag2"].AddToTag(5)
+    if tags.GetMutationCounter() <= counter: # pragma: no cover
+        raise Exception("Mutation counter not updated by a modification of a tag")
+    counter = tags.GetMutationCounter()
+    tags.DeleteTags(["tag3"])
+    if tags.GetMutationCounter() <= counter: # pragma: no cover
+        raise Exception("Mutation counter not updated by the deletion of a tag")
+
 
     return "OK"
 
@@ -10,6 +10,7 @@ from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
 import BasicTools.Containers.ElementNames as ElementNames
 from BasicTools.Containers.MeshBase import MeshBase
 from BasicTools.Containers.MeshBase import Tags
+from BasicTools.Containers.Tags import NextMutationCounter
 
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject, froze_it
 
@@ -43,6 +44,19 @@ class ElementsContainer(BaseOutputObject):
         self.originalIds = np.empty((0,),dtype=PBasicIndexType)
         self.originalOffset = 0
         self.mutable = True
+        self.mutationCounter = NextMutationCounter()
+
+    def Modified(self):
+        """Mark the container as modified (update the mutation counter).
+        Must be called by the user after an in-place modification of the
+        connectivity
+        """
+        self.mutationCounter = NextMutationCounter()
+
+    def GetMutationCounter(self):
+        """Return the mutation counter of the container and of its tags
+        """
+        return max(self.mutationCounter, self.tags.GetMutationCounter())
 
     def __eq__(self, other):
 
@@ -98,6 +112,7 @@ class ElementsContainer(BaseOutputObject):
             self.GetTag(tag.name).AddToTag(tag.GetIds() + self.cpt)
 
         self.cpt += other.cpt
+        self.mutationCounter = NextMutationCounter()
 
     def AddNewElements(self,conn,originalids=None):
         """
@@ -118,6 +133,7 @@ class ElementsContainer(BaseOutputObject):
             self.originalIds[onoe:onoe+conn.shape[0]] = -1
         else:
             self.originalIds[onoe:onoe+conn.shape[0]] = originalids
+        self.mutationCounter = NextMutationCounter()
 
         return self.cpt
 
@@ -137,6 +153,7 @@ class ElementsContainer(BaseOutputObject):
         self.connectivity[self.cpt,:] = conn
         self.originalIds[self.cpt] = originalid
         self.cpt +=1
+        self.mutationCounter = NextMutationCounter()
 
         return self.cpt
 
@@ -186,6 +203,7 @@ class ElementsContainer(BaseOutputObject):
         """
         self.Reserve(nbElements)
         self.cpt = nbElements
+        self.mutationCounter = NextMutationCounter()
 
     def tighten(self):
         """
@@ -227,6 +245,7 @@ class AllElements(object):
     def __init__(self):
         super(AllElements,self).__init__()
         self.storage = {}
+        self.mutationCounter = NextMutationCounter()
 
     def __eq__(self, other):
         if len(self.storage) != len(other.storage):
@@ -255,6 +274,7 @@ class AllElements(object):
     #send basis functions calls to the storage dictionary
     def __setitem__(self, key, value):
         self.storage[key] = value
+        self.mutationCounter = NextMutationCounter()
 
     def __len__(self):
         return len(self.storage)
@@ -267,6 +287,7 @@ class AllElements(object):
 
     def __delitem__(self,key):
         del self.storage[key]
+        self.mutationCounter = NextMutationCounter()
 
     def GetElementsOfType(self,typename):
         if not typename in self:
@@ -356,6 +377,7 @@ class UnstructuredMesh(MeshBase):
             self.originalIDNodes = np.require(originalIDNodes,dtype=PBasicIndexType,requirements=['C','A'])
         elif generateOriginalIDs:
             self.originalIDNodes = np.arange(self.GetNumberOfNodes())
+        self.Modified()
 
     def GetPointsDimensionality(self) -> int:
         """Return the number of coordinates of the points
@@ -557,6 +579,7 @@ class UnstructuredMesh(MeshBase):
             data.tighten()
         self.ComputeGlobalOffset()
         self.VerifyIntegrity()
+        self.Modified()
 
     def __str__(self):
         res  = "UnstructuredMesh \n"
@@ -162,10 +162,6 @@ def GetFieldTransferOp(inputField: FEField, targetPoints:ArrayLike, method:Union
             for elementType2, num in tt:
                 LagrangeSpaceGeo[elementType2].Create()
 
-    # we build de Dual Coonectivity
-    from BasicTools.Containers.UnstructuredMeshInspectionTools import GetDualGraphNodeToElement
-    dualGraph,nused = GetDualGraphNodeToElement(imesh)
-
     from BasicTools.Containers.MeshTools import  GetElementsCenters
 
     centers = GetElementsCenters(imesh)
@@ -197,18 +193,34 @@ def GetFieldTransferOp(inputField: FEField, targetPoints:ArrayLike, method:Union
     distTP, idsTP = kdt.query(targetPoints)
     distTPcenters, idsTPcenters = kdtcenters.query(targetPoints)
 
+    status = np.zeros(nbtp)
+
+    # batched treatment of the points inside the mesh (closest elements first)
+    if insideMethod == 1:
+        treated = _ComputeInsidePointsTransferBatch(imesh, originalmesh, numbering, space, targetPoints, kdtcenters, cood)
+        status[treated] = 1
+        pointsToTreat = np.where(~treated)[0]
+    else:
+        pointsToTreat = np.arange(nbtp)
+
+    nbPointsToTreat = len(pointsToTreat)
+
+    # we build de Dual Coonectivity (only needed for the points not treated by the batch)
+    if nbPointsToTreat:
+        from BasicTools.Containers.UnstructuredMeshInspectionTools import GetDualGraphNodeToElementCSR
+        dualGraphIndptr, dualGraphIndices = GetDualGraphNodeToElementCSR(imesh)
+
     if verbose:
         from BasicTools.Helpers.ProgressBar import printProgressBar
-        printProgressBar(0, nbtp, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
+        printProgressBar(0, nbPointsToTreat, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
         verbosecpt = 0
 
-    status = np.zeros(nbtp)
     ones = np.ones(50)
-    for p in range(nbtp):
+    for pcpt, p in enumerate(pointsToTreat):
         if verbose:
-            nvc = int(p/nbtp*1000)
+            nvc = int(pcpt/nbPointsToTreat*1000)
             if verbosecpt != nvc:
-                printProgressBar(p+1, nbtp, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
+                printProgressBar(pcpt+1, nbPointsToTreat, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
                 verbosecpt = nvc
 
         TP = targetPoints[p,:]  # target point posicion
@@ -219,10 +231,10 @@ def GetFieldTransferOp(inputField: FEField, targetPoints:ArrayLike, method:Union
         ## construct the potentialElements list (all element touching the closest element)
         potentialElements = []
         #Element connected to the closest point
-        potentialElements.extend(dualGraph[idsTP[p],0:nused[idsTP[p]]])
+        potentialElements.extend(dualGraphIndices[dualGraphIndptr[idsTP[p]]:dualGraphIndptr[idsTP[p]+1]])
         #Elements connected to the closest element (bases on the element center)
         for elempoint in  imesh_data.connectivity[imesh_elnb,:]:
-            potentialElements.extend(dualGraph[elempoint,0:nused[elempoint]])
+            potentialElements.extend(dualGraphIndices[dualGraphIndptr[elempoint]:dualGraphIndptr[elempoint+1]])
         potentialElements = np.unique(potentialElements)
         # compute distance to elements
         # for the moment we use the distance to the center, this gives a good estimate
@@ -303,10 +315,172 @@ def GetFieldTransferOp(inputField: FEField, targetPoints:ArrayLike, method:Union
         AddToOutput(l,col,row,dat,cood)
 
     if verbose:
-        printProgressBar(nbtp, nbtp, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
+        printProgressBar(nbPointsToTreat, nbPointsToTreat, prefix = 'Building Transfer '+method+':', suffix = 'Complete', length = 50)
 
     return coo_matrix((cood[2][0:cood[3]], (cood[1][0:cood[3]], cood[0][0:cood[3]])), shape=(nbtp , inputField.numbering["size"])), status
 
+# number of candidate elements (closest centers) tested for every point in the
+# batched treatment, the points not found are treated one by one
+numberOfCandidatesForBatch = 8
+
+def _ComputeInsidePointsTransferBatch(imesh, originalmesh, numbering, space, targetPoints, kdtcenters, cood):
+    """Batched computation of the transfer coefficients for the target points
+    inside the mesh. The candidate elements (closest element centers) are tested
+    by rounds, in every round the points are grouped by element type and the
+    inverse of the isoparametric mapping is computed for all the points at once.
+
+    The coefficients are added to cood (cols, rows, datas, fillcpt)
+
+    Returns
+    -------
+    ndarray
+        bool vector, True for the target points treated
+    """
+    from BasicTools.FE.Spaces.FESpaces import LagrangeSpaceGeo
+
+    nbtp = targetPoints.shape[0]
+    treated = np.zeros(nbtp, dtype=bool)
+
+    names = []
+    offsets = [0]
+    for name, data in imesh.elements.items():
+        names.append(name)
+        offsets.append(offsets[-1]+data.GetNumberOfElements())
+    offsets = np.array(offsets)
+
+    nbCandidates = min(numberOfCandidatesForBatch, offsets[-1])
+    if nbCandidates == 0:
+        return treated
+    _, candidates = kdtcenters.query(targetPoints, k=nbCandidates)
+    candidates = candidates.reshape((nbtp,nbCandidates))
+
+    for cpt in range(nbCandidates):
+        pointsToTreat = np.where(~treated)[0]
+        if len(pointsToTreat) == 0:
+            break
+        elements = candidates[pointsToTreat,cpt]
+        typeIndex = np.searchsorted(offsets, elements, side="right")-1
+        for tcpt, name in enumerate(names):
+            if ElementNames.dimension[name] == 0 or ElementNames.geoSupport[name] == ElementNames.GeoPyr:
+                continue
+            mask = typeIndex == tcpt
+            if not np.any(mask):
+                continue
+            points = pointsToTreat[mask]
+            lenb = imesh.elements[name].originalIds[elements[mask]-offsets[tcpt]]
+            coordAtDofs = originalmesh.nodes[originalmesh.elements[name].connectivity[lenb,:],:]
+
+            converged, bary = ComputeBarycentricCoordinateOnElementsBatch(coordAtDofs,LagrangeSpaceGeo[name],targetPoints[points,:],name)
+            inside = np.logical_and(converged, IsInsideReferenceElement(bary,name))
+            if not np.any(inside):
+                continue
+            points = points[inside]
+            shapeFunc = space[name].GetShapeFuncVectorized(bary[inside,:])
+            col = numbering[name][lenb[inside],:]
+            l = col.size
+            fillcpt = cood[3]
+            cood[0][fillcpt:fillcpt+l] = col.ravel()
+            cood[1][fillcpt:fillcpt+l] = np.repeat(points,col.shape[1])
+            cood[2][fillcpt:fillcpt+l] = shapeFunc.ravel()
+            cood[3] += l
+            treated[points] = True
+
+    return treated
+
+def IsInsideReferenceElement(xietaphi,elementType,tol=1e-6):
+    """Test if the points in parametric coordinates are inside the reference
+    element (with a tolerance)
+
+    Parameters
+    ----------
+    xietaphi : ndarray
+        (nbPoints,dim) parametric coordinates
+    elementType : str
+        the element type
+    tol : float, optional
+        tolerance, by default 1e-6
+
+    Returns
+    -------
+    ndarray
+        bool vector True if the point is inside (always False for the unsupported element types)
+    """
+    geoSupport = ElementNames.geoSupport[elementType]
+    lower = np.all(xietaphi >= -tol, axis=1)
+    if geoSupport in [ElementNames.GeoBar, ElementNames.GeoQuad, ElementNames.GeoHex]:
+        return np.logical_and(lower, np.all(xietaphi <= 1+tol, axis=1))
+    elif geoSupport in [ElementNames.GeoTri, ElementNames.GeoTet]:
+        return np.logical_and(lower, np.sum(xietaphi,axis=1) <= 1+tol)
+    elif geoSupport == ElementNames.GeoWed:
+        return lower & (xietaphi[:,0]+xietaphi[:,1] <= 1+tol) & (xietaphi[:,2] <= 1+tol)
+    return np.zeros(xietaphi.shape[0], dtype=bool)
+
+def ComputeBarycentricCoordinateOnElementsBatch(coordAtDofs,localspace,targetPoints,elementType):
+    """Vectorized version of ComputeBarycentricCoordinateOnElement for several
+    points, each one with his own element (all of the same type).
+
+    Same algorithm as the scalar version: a Gauss-Newton minimization of the
+    distance, the Hessian is approximated by the product of the first
+    derivatives of the mapping (the second derivatives term is not used, see
+    ddf), and the same stopping criterion.
+
+    Parameters
+    ----------
+    coordAtDofs : ndarray
+        (nbPoints, nbNodesPerElement, spaceDim) coordinates of the nodes of the elements
+    localspace : SpaceBase
+        the geometrical space of the elements
+    targetPoints : ndarray
+        (nbPoints, spaceDim) the target points
+    elementType : str
+        the element type
+
+    Returns
+    -------
+    converged : ndarray
+        bool vector, False if the Newton algorithm did not converge
+    xietaphi : ndarray
+        (nbPoints, dim) parametric coordinates
+    """
+    linear = ElementNames.linear[elementType]
+    spacedim = localspace.GetDimensionality()
+    nbPoints = targetPoints.shape[0]
+
+    xietaphi = np.full((nbPoints,spacedim),0.5)
+    converged = np.zeros(nbPoints, dtype=bool)
+    active = np.arange(nbPoints)
+
+    N = localspace.GetShapeFuncVectorized(xietaphi)
+    f = targetPoints - np.einsum("ns,nsd->nd",N,coordAtDofs)
+    for x in range(10):
+        X = coordAtDofs[active]
+        dN = localspace.GetShapeFuncDerVectorized(xietaphi[active])
+        dNX = np.einsum("nas,nsd->nad",dN,X)
+        df_num = -np.einsum("nd,nad->na",f,dNX)
+        H = np.einsum("nad,nbd->nab",dNX,dNX)
+        det = np.linalg.det(H)
+        regular = np.abs(det) > 1e-30
+        dxietaphi = np.zeros_like(df_num)
+        dxietaphi[regular] = np.linalg.solve(H[regular],df_num[regular,:,None])[:,:,0]
+        xietaphi[active] -= dxietaphi
+
+        # if the cell is linear only one iteration is needed
+        if linear :
+            converged[active[regular]] = True
+            break
+
+        N = localspace.GetShapeFuncVectorized(xietaphi[active])
+        f = targetPoints[active] - np.einsum("ns,nsd->nd",N,X)
+
+        done = (np.sum(dxietaphi**2,axis=1) < 1e-3) & (np.sum(f**2,axis=1) < 1e-3) & regular
+        converged[active[done]] = True
+        active = active[~done & regular]
+        f = f[~done & regular]
+        if len(active) == 0:
+            break
+
+    return converged, xietaphi
+
 def ComputeInterpolationExtrapolationsBarycentricCoordinates(TP,elementType,coordAtDofs,posspace):
     if ElementNames.dimension[elementType]==0:
         distv = coordAtDofs[0,:] - TP
@@ -842,6 +1016,72 @@ def CheckIntegrity_GetValueAtPosLinearSymplecticMesh(GUI=False):
 
     return "OK"
 
+def CheckIntegrityBatchTransfer(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    import BasicTools.Containers.UnstructuredMeshFieldOperations as UMFO
+
+    inputmesh = CreateCube(dimensions=[5,6,7],origin=[0,0,0],spacing=[0.25,0.2,0.2],ofTetras=True)
+    inputmesh.nodes[:,0] += 0.05*np.sin(3*inputmesh.nodes[:,1])
+
+    from BasicTools.FE.FETools import PrepareFEComputation
+    space, numberings, _offset, _NGauss = PrepareFEComputation(inputmesh)
+
+    from BasicTools.FE.Fields.FEField import FEField
+    inputFEField = FEField(name="3DTo3D",mesh=inputmesh,space=space,numbering=numberings[0])
+    x = inputmesh.nodes[:,0]
+    y = inputmesh.nodes[:,1]
+    data = (x -0.5)**2-y*0.5+x*y*0.25
+
+    targetPoints = np.random.RandomState(0).rand(200,3)*1.4-0.2
+    oldValue = UMFO.numberOfCandidatesForBatch
+    try:
+        for method in ["Interp/Nearest","Interp/Clamp","Interp/Extrap","Interp/ZeroFill"]:
+            UMFO.numberOfCandidatesForBatch = 0
+            op,status = GetFieldTransferOp(inputFEField,targetPoints,method = method)
+            UMFO.numberOfCandidatesForBatch = oldValue
+            opBatch,statusBatch = GetFieldTransferOp(inputFEField,targetPoints,method = method)
+            if np.any(status != statusBatch) :
+                return "Status not equal for the batched transfer, method " + method
+            error = np.max(abs(op.dot(data) - opBatch.dot(data)))
+            if error > 1e-12:
+                return "Error in the batched transfer, method " + method + " : " + str(error)
+    finally:
+        UMFO.numberOfCandidatesForBatch = oldValue
+    return "ok"
+
+def CheckIntegrityBatchBarycentricCoordinates(GUI=False):
+    from BasicTools.FE.Spaces.FESpaces import LagrangeSpaceGeo
+
+    rs = np.random.RandomState(0)
+    nbPoints = 50
+    for elementType in [ElementNames.Hexaedron_8, ElementNames.Tetrahedron_10]:
+        localspace = LagrangeSpaceGeo[elementType]
+        localspace.Create()
+        # distorted (and curved for the quadratic elements) elements
+        refCoords = np.asarray(localspace.posN, dtype=float)
+        coordAtDofs = refCoords[None,:,:] + 0.15*rs.rand(nbPoints,refCoords.shape[0],3)-0.075
+        if elementType == ElementNames.Tetrahedron_10:
+            coordAtDofs[:,4:,:] += 0.08*rs.rand(nbPoints,6,3)-0.04
+
+        xi = rs.rand(nbPoints,3)
+        if elementType == ElementNames.Tetrahedron_10:
+            xi /= np.maximum(1,np.sum(xi,axis=1))[:,None]*1.1
+        N = localspace.GetShapeFuncVectorized(xi)
+        targetPoints = np.einsum("ns,nsd->nd",N,coordAtDofs)
+        # some points outside of the elements
+        targetPoints[::5] += 0.2
+
+        converged, xietaphi = ComputeBarycentricCoordinateOnElementsBatch(coordAtDofs,localspace,targetPoints,elementType)
+        for i in range(nbPoints):
+            inside, xietaphiScalar, _ = ComputeBarycentricCoordinateOnElement(coordAtDofs[i],localspace,targetPoints[i],elementType)
+            if converged[i] != (inside is not None):
+                return "Convergence not equal for the batched barycentric coordinates, element " + elementType
+            if converged[i] and np.max(abs(xietaphi[i]-xietaphiScalar)) > 1e-12:
+                return "Error in the batched barycentric coordinates, element " + elementType
+        if not np.all(converged[1::5]) or np.max(abs(xietaphi[1::5]-xi[1::5])) > 1e-3:
+            return "Error in the batched barycentric coordinates, element " + elementType
+    return "ok"
+
 def CheckIntegrity_PointToCellData(GUI = False):
     myMesh = UnstructuredMesh()
     myMesh.nodes = np.array([[0,0,0],[1,0,0],[2,0,0]] ,dtype=PBasicFloatType)
@@ -875,6 +1115,8 @@ def CheckIntegrity(GUI=False):
     CheckIntegrity1D,
     CheckIntegrity2D,
     CheckIntegrity2DTo3D,
+    CheckIntegrityBatchTransfer,
+    CheckIntegrityBatchBarycentricCoordinates,
     CheckIntegrityApplyRotationMatrixTensorField
     ]
     for f in totest:
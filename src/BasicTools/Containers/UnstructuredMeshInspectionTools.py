@@ -4,6 +4,8 @@
 # file 'LICENSE.txt', which is part of this source code package.
 #
 from typing import Dict, List, Optional, Tuple
+import warnings
+
 import numpy as np
 from BasicTools.Containers.Filters import ElementFilter
 from BasicTools.FE.Fields.FEField import FEField
@@ -251,64 +253,162 @@ def GetVolume(inmesh:UnstructuredMesh) -> PBasicFloatType:
     _,f  = IntegrateGeneral( mesh=inmesh, wform=wform, constants={}, fields=[F], unkownFields=unkownFields)
     return f[0]
 
-def GetDualGraphNodeToElement(inmesh, maxNumConnections=200):
-    # generation of the dual graph
-    dualGraph = np.zeros((inmesh.GetNumberOfNodes(),maxNumConnections), dtype=PBasicIndexType )-1
-    usedPoints = np.zeros(inmesh.GetNumberOfNodes(), dtype=PBasicIndexType )
+def GetDualGraphNodeToElementCSR(inmesh: UnstructuredMesh) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the node to element adjacency in the CSR format.
+    The elements are numbered using the global numbering of the mesh
+    (order of the elements in inmesh.elements)
 
-    cpt =0
+    Parameters
+    ----------
+    inmesh : UnstructuredMesh
+        the input mesh
 
-    for name,elems in inmesh.elements.items():
-        for i in range(elems.GetNumberOfElements()):
-            coon = elems.connectivity[i,:]
-            for j in coon:
-                dualGraph[j,usedPoints[j]] =  cpt
-                usedPoints[j] += 1
-            cpt += 1
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        indptr, indices : the elements touching the node i are
+        indices[indptr[i]:indptr[i+1]] (in increasing order)
+    """
+    nbNodes = inmesh.GetNumberOfNodes()
+    nodes = []
+    elementIds = []
+    cpt = 0
+    for _name, elems in inmesh.elements.items():
+        nbElements = elems.GetNumberOfElements()
+        if nbElements == 0:
+            continue
+        nbNodesPerElement = elems.GetNumberOfNodesPerElement()
+        nodes.append(elems.connectivity[0:nbElements,:].ravel())
+        elementIds.append(np.repeat(np.arange(cpt,cpt+nbElements, dtype=PBasicIndexType), nbNodesPerElement))
+        cpt += nbElements
+
+    if len(nodes) == 0:
+        return np.zeros(nbNodes+1, dtype=PBasicIndexType), np.zeros(0, dtype=PBasicIndexType)
+
+    nodes = np.concatenate(nodes)
+    elementIds = np.concatenate(elementIds)
+    order = np.argsort(nodes, kind="stable")
+    indptr = np.zeros(nbNodes+1, dtype=PBasicIndexType)
+    np.cumsum(np.bincount(nodes, minlength=nbNodes), out=indptr[1:])
+    return indptr, elementIds[order]
+
+def GetDualGraphCSR(inmesh: UnstructuredMesh, chunkSize: int = 100000) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the node to node adjacency (nodes sharing at least one element)
+    in the CSR format
 
-    #we crop the output data
-    maxsize = np.max(np.sum(dualGraph>=0,axis=1))
-    dualGraph = dualGraph[:,0:maxsize]
-    return dualGraph,usedPoints
+    Parameters
+    ----------
+    inmesh : UnstructuredMesh
+        the input mesh
+    chunkSize : int, optional
+        number of elements treated at the same time (to limit the memory usage), by default 100000
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        indptr, indices : the neighbors of the node i are
+        indices[indptr[i]:indptr[i+1]] (unique and in increasing order)
+    """
+    nbNodes = inmesh.GetNumberOfNodes()
+    keys = []
+    for _name, elems in inmesh.elements.items():
+        nbElements = elems.GetNumberOfElements()
+        nbNodesPerElement = elems.GetNumberOfNodesPerElement()
+        if nbElements == 0 or nbNodesPerElement < 2:
+            continue
+        offDiagonal = ~np.eye(nbNodesPerElement, dtype=bool)
+        for start in range(0, nbElements, chunkSize):
+            conn = elems.connectivity[start:min(start+chunkSize,nbElements),:].astype(np.int64)
+            pairKeys = conn[:,:,None]*nbNodes + conn[:,None,:]
+            keys.append(np.unique(pairKeys[:,offDiagonal]))
+
+    if len(keys) == 0:
+        return np.zeros(nbNodes+1, dtype=PBasicIndexType), np.zeros(0, dtype=PBasicIndexType)
+
+    keys = np.unique(np.concatenate(keys))
+    indptr = np.zeros(nbNodes+1, dtype=PBasicIndexType)
+    np.cumsum(np.bincount(keys // nbNodes, minlength=nbNodes), out=indptr[1:])
+    return indptr, (keys % nbNodes).astype(PBasicIndexType)
+
+def CSRToDenseDualGraph(indptr: np.ndarray, indices: np.ndarray, maxNumConnections: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert a CSR adjacency into the dense format (array padded with -1) used by
+    GetDualGraph and GetDualGraphNodeToElement
 
-def GetDualGraph(inmesh, maxNumConnections=200):
+    Parameters
+    ----------
+    indptr : np.ndarray
+        CSR index pointer
+    indices : np.ndarray
+        CSR indices
+    maxNumConnections : Optional[int], optional
+        maximal number of connections kept for every node (the first ones in
+        the CSR order), by default None (no limit)
 
-    # generation of the dual graph
-    dualGraph = np.zeros((inmesh.GetNumberOfNodes(),maxNumConnections), dtype=PBasicIndexType )-1
-    usedPoints = np.zeros(inmesh.GetNumberOfNodes(), dtype=PBasicIndexType )
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        dualGraph : (nbNodes, maxNumberOfConnections) array padded with -1
+        usedPoints : the number of connections for every node
+    """
+    usedPoints = np.diff(indptr).astype(PBasicIndexType)
+    nbNodes = len(usedPoints)
+    keep = np.ones(len(indices), dtype=bool)
+    if maxNumConnections is not None:
+        cols = np.arange(len(indices)) - np.repeat(indptr[:-1], usedPoints)
+        keep = cols < maxNumConnections
+        usedPoints = np.minimum(usedPoints, maxNumConnections)
+    maxsize = np.max(usedPoints) if nbNodes else 0
+    dualGraph = np.full((nbNodes,maxsize), -1, dtype=PBasicIndexType)
+    rows = np.repeat(np.arange(nbNodes), usedPoints)
+    cols = np.arange(len(rows)) - np.repeat(np.cumsum(usedPoints)-usedPoints, usedPoints)
+    dualGraph[rows,cols] = np.asarray(indices)[keep]
+    return dualGraph, usedPoints
+
+def _WarnMaxNumConnections(maxNumConnections, functionName):
+    if maxNumConnections is not None:
+        warnings.warn(f"the maxNumConnections argument of {functionName} is deprecated (the dense graph is sized from the mesh), it is only used to truncate the output. Please use {functionName}CSR.", DeprecationWarning, stacklevel=3)
+
+def GetDualGraphNodeToElement(inmesh, maxNumConnections=None):
+    """Compute the node to element adjacency in a dense format.
+    Please use GetDualGraphNodeToElementCSR for large meshes.
 
-    for name,elems in inmesh.elements.items():
-        size = elems.GetNumberOfNodesPerElement()
-        for i in range(elems.GetNumberOfElements()):
-            coon = elems.connectivity[i,:]
-            for j in range(size):
-                myIndex = coon[j]
-                for k in range(size):
-                    if k == j:
-                        continue
-                    dualGraph[myIndex,usedPoints[myIndex]] =  coon[k]
-                    usedPoints[myIndex] += 1
-                    # we reached the maximun number of connection
-                    # normally we have some data duplicated
-                    # we try to shrink the vector
-                    if usedPoints[myIndex] == maxNumConnections :# pragma: no cover
-                        # normaly we shouldn't pas here
-                        c = np.unique(dualGraph[myIndex,:])
-                        dualGraph[myIndex,0:len(c)] = c
-                        usedPoints[myIndex] = len(c)
-
-    maxsize = 0
-    # we finish now we try to compact the structure
-    for i in range(inmesh.GetNumberOfNodes()):
-        c = np.unique(dualGraph[i,0:usedPoints[i]])
-        dualGraph[i,0:len(c)] = c
-        dualGraph[i,len(c):] = -1
-        usedPoints[i] = len(c)
-        maxsize = max(len(c),maxsize)
-
-    #we crop the output data
-    dualGraph = dualGraph[:,0:maxsize]
-    return dualGraph,usedPoints
+    Parameters
+    ----------
+    inmesh : UnstructuredMesh
+        the mesh
+    maxNumConnections : int, optional
+        deprecated (a DeprecationWarning is emitted), the output is sized
+        from the mesh. If given, only the first maxNumConnections elements
+        of every node are kept (by default None, no limit)
+
+    Returns
+    -------
+    dualGraph : (nbNodes, maxNumberOfConnections) array padded with -1
+    usedPoints : the number of elements connected to every node
+    """
+    _WarnMaxNumConnections(maxNumConnections, "GetDualGraphNodeToElement")
+    return CSRToDenseDualGraph(*GetDualGraphNodeToElementCSR(inmesh), maxNumConnections=maxNumConnections)
+
+def GetDualGraph(inmesh, maxNumConnections=None):
+    """Compute the node to node adjacency in a dense format.
+    Please use GetDualGraphCSR for large meshes.
+
+    Parameters
+    ----------
+    inmesh : UnstructuredMesh
+        the mesh
+    maxNumConnections : int, optional
+        deprecated (a DeprecationWarning is emitted), the output is sized
+        from the mesh. If given, only the first maxNumConnections neighbors
+        (lower ids) of every node are kept (by default None, no limit)
+
+    Returns
+    -------
+    dualGraph : (nbNodes, maxNumberOfConnections) array padded with -1
+    usedPoints : the number of neighbors of every node
+    """
+    _WarnMaxNumConnections(maxNumConnections, "GetDualGraph")
+    return CSRToDenseDualGraph(*GetDualGraphCSR(inmesh), maxNumConnections=maxNumConnections)
 
 def ExtractElementsByElementFilter(inmesh: UnstructuredMesh, elementFilter:ElementFilter, copy:bool=True) -> UnstructuredMesh:
     """Create a new mesh with the selected element by elementFilter
@@ -770,6 +870,29 @@ def CheckIntegrity_GetDualGraph(GUI=False):
     res = CreateMeshOfTriangles([[0,0,0],[1,0,0],[0,1,0],[0,0,1] ], [[0,1,2],[0,2,3]])
     dg, nused = GetDualGraph(res)
 
+    if not np.array_equal(nused,[3,2,3,2]) or not np.array_equal(dg[0,:],[1,2,3]) or not np.array_equal(dg[1,:],[0,2,-1]):
+        raise# pragma: no cover
+
+    indptr, indices = GetDualGraphNodeToElementCSR(res)
+    if not np.array_equal(indptr,[0,2,3,5,6]) or not np.array_equal(indices,[0,1,0,0,1,1]):
+        raise# pragma: no cover
+
+    dg, nused = GetDualGraphNodeToElement(res)
+    if not np.array_equal(nused,[2,1,2,1]) or not np.array_equal(dg[3,:],[1,-1]):
+        raise# pragma: no cover
+
+    # the deprecated maxNumConnections truncates the output
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        dg, nused = GetDualGraph(res, maxNumConnections=2)
+        dgNE, nusedNE = GetDualGraphNodeToElement(res, maxNumConnections=1)
+    if len(w) != 2 or any(not issubclass(x.category, DeprecationWarning) for x in w):
+        raise# pragma: no cover
+    if not np.array_equal(nused,[2,2,2,2]) or not np.array_equal(dg,[[1,2],[0,2],[0,1],[0,2]]):
+        raise# pragma: no cover
+    if not np.array_equal(nusedNE,[1,1,1,1]) or not np.array_equal(dgNE[:,0],[0,0,0,1]):
+        raise# pragma: no cover
+
     return "ok"
 
 def CheckIntegrity_ComputeMeshMinMaxLengthScale(GUI=False):
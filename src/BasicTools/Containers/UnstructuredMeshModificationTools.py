@@ -13,89 +13,98 @@ from BasicTools.Containers.MeshBase import Tags
 from BasicTools.Containers.UnstructuredMesh import UnstructuredMesh
 from BasicTools.NumpyDefs import PBasicIndexType
 
-def CleanDoubleNodes(res, tol = None, nodesToTestMask= None):
+def CleanDoubleNodes(res, tol = None, nodesToTestMask= None, transitive=False):
+    """Merge the nodes closer than tol (inplace).
+
+    The nodes are treated in the original order: every node is merged into
+    the first (lower index) kept node within tol, or kept if there is none.
+    So the distance between a merged node and the node it is merged into is
+    never bigger than tol (for example, for 3 aligned nodes spaced by
+    0.6*tol, the middle node is merged into the first one and the last node
+    is kept).
+
+    Parameters
+    ----------
+    res : UnstructuredMesh
+        the mesh to treat
+    tol : float, optional
+        the tolerance, by default the diagonal of the bounding box times 1e-7
+    nodesToTestMask : ndarray, optional
+        bool vector, only the nodes with True are merged (only for distances
+        strictly smaller than tol)
+    transitive : bool, optional
+        if True, the nodes connected by a chain of distances smaller than tol
+        are merged into one node (the first node of the group is kept), even
+        if the distance between the ends of the chain is bigger than tol.
+        By default False
+    """
 
     res.ComputeBoundingBox()
     if tol is None:
         tol = np.linalg.norm(res.boundingMax - res.boundingMin)*1e-7
 
     nbnodes = res.GetNumberOfNodes()
-    toKeep = np.zeros(nbnodes, dtype=bool )
-    newindex = np.zeros(nbnodes, dtype=PBasicIndexType)
-    tol2 = tol**2
-    def dist2(array,value):
-        d = array-value
-        return np.inner(d,d)
-
-    if nodesToTestMask is None and tol == 0:
-        # optimized version for tol = 0.0
-        database = {}
-        cpt  = 0
-        for i in range(nbnodes):
-            point = tuple(res.nodes[i,:])
-            ni = database.get(point)
-            if ni is None:
-                database[point] = cpt
-                newindex[i] = cpt
-                cpt +=1
-                toKeep[i] = True
-            else:
-                newindex[i] = ni
-
-    elif nodesToTestMask is None :
-
-        from BasicTools.Containers.Octree import Octree
-        cpt  = 0
-
-        Ma = res.boundingMax
-        Mi = res.boundingMin
-        diag2 = np.linalg.norm(res.boundingMax-res.boundingMin)**2
-        tree = Octree(Ma[0],Ma[1],Ma[2], Mi[0], Mi[1], Mi[2])
-
-        for i in range(nbnodes):
-            point = tuple(res.nodes[i,:])
-            entries = tree.find_within_range_cube(point, tol)
-
-            odist = diag2
-            if len(entries):
-                for entry in entries:
-                    dist = (point[0] - entry[0][0])**2   +(point[1] - entry[0][1])**2+(point[2] - entry[0][2])**2
-                    if dist < odist:
-                        odist = dist
-                        index = entry[1]
-
-            if odist <= tol2:
-                newindex[i] = index
-            else:
-                tree.add_item(cpt, point )
-                newindex[i] = cpt
-                cpt += 1
-                toKeep[i] = True
 
+    # representative (lower index of the group) of every node
+    representative = np.arange(nbnodes, dtype=PBasicIndexType)
 
+    if nodesToTestMask is None and tol == 0:
+        # optimized version for tol = 0.0 : lexicographic sort of the coordinates
+        if nbnodes:
+            order = np.lexsort(res.nodes.T[::-1])
+            sortedNodes = res.nodes[order,:]
+            newGroup = np.empty(nbnodes, dtype=bool)
+            newGroup[0] = True
+            newGroup[1:] = np.any(sortedNodes[1:,:] != sortedNodes[:-1,:], axis=1)
+            groupStarts = np.where(newGroup)[0]
+            groupRepresentative = np.minimum.reduceat(order, groupStarts)
+            representative[order] = groupRepresentative[np.cumsum(newGroup)-1]
     else:
-        cpt =0
-        for i in range(nbnodes):
-            if not nodesToTestMask[i]:
-                newindex[i] = cpt
-                cpt += 1
-                toKeep[i] = True
-                continue
+        from scipy.spatial import cKDTree
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
 
-            posi = res.nodes[i,:]
-
-            for j in range(i):
-                if not nodesToTestMask[j]:
-                    continue
-                if toKeep[j]:
-                    dist = dist2(posi,res.nodes[j,:] )
-                    if dist < tol2 :
-                        newindex[i] = newindex[j]
-                        break
+        if nodesToTestMask is None:
+            nodesToTest = np.arange(nbnodes)
+        else:
+            nodesToTest = np.where(nodesToTestMask)[0]
+
+        if len(nodesToTest):
+            points = res.nodes[nodesToTest,:]
+            pairs = cKDTree(points).query_pairs(tol, output_type="ndarray")
+            if nodesToTestMask is not None:
+                # only distances strictly smaller than tol for the masked version
+                d = points[pairs[:,0],:]-points[pairs[:,1],:]
+                pairs = pairs[np.sum(d*d,axis=1) < tol**2,:]
+
+            nbToTest = len(nodesToTest)
+            if transitive:
+                graph = coo_matrix((np.ones(pairs.shape[0],dtype=np.int8),(pairs[:,0],pairs[:,1])), shape=(nbToTest,nbToTest))
+                _, labels = connected_components(graph, directed=False)
+                # nodesToTest is sorted, so the minimum local index is the minimum global index
+                labelRepresentative = np.full(labels.max()+1, nbToTest, dtype=PBasicIndexType)
+                np.minimum.at(labelRepresentative, labels, np.arange(nbToTest))
+                localRepresentative = labelRepresentative[labels]
             else:
-                newindex[i] = cpt
-                cpt += 1
-                toKeep[i] = True
+                # for every node the lower index neighbors (sorted), only the
+                # nodes with at least one lower neighbor must be treated (in
+                # order, the choice depends on the previous ones)
+                pairs = np.sort(pairs, axis=1)
+                graph = coo_matrix((np.ones(pairs.shape[0],dtype=np.int8),(pairs[:,1],pairs[:,0])), shape=(nbToTest,nbToTest)).tocsr()
+                graph.sort_indices()
+                indptr, indices = graph.indptr, graph.indices
+                localRepresentative = np.arange(nbToTest, dtype=PBasicIndexType)
+                kept = np.ones(nbToTest, dtype=bool)
+                for i in np.flatnonzero(np.diff(indptr)):
+                    candidates = indices[indptr[i]:indptr[i+1]]
+                    keptCandidates = candidates[kept[candidates]]
+                    if len(keptCandidates):
+                        localRepresentative[i] = keptCandidates[0]
+                        kept[i] = False
+            representative[nodesToTest] = nodesToTest[localRepresentative]
+
+    toKeep = representative == np.arange(nbnodes)
+    newindex = (np.cumsum(toKeep)-1).astype(PBasicIndexType)[representative]
 
     res.nodes = res.nodes[toKeep,:]
     res.originalIDNodes = np.where(toKeep)[0]
@@ -571,8 +580,8 @@ def NodesPermutation(mesh,per):
 # to generate one tag per body
 # a body is defines by all the nodes connected by the elements
 def AddTagPerBody(inmesh):
-    from BasicTools.Containers.UnstructuredMeshInspectionTools import GetDualGraph
-    dualGraph,usedPoints = GetDualGraph(inmesh)
+    from BasicTools.Containers.UnstructuredMeshInspectionTools import GetDualGraphCSR
+    dualGraphIndptr, dualGraphIndices = GetDualGraphCSR(inmesh)
 
     # Connectivity walk
     nbOfNodes = inmesh.GetNumberOfNodes()
@@ -613,7 +622,7 @@ def AddTagPerBody(inmesh):
 
         while cpt < nextpointcpt:
             workingIndex = nextpoint[cpt]
-            indexes = dualGraph[workingIndex,0:usedPoints[workingIndex]]
+            indexes = dualGraphIndices[dualGraphIndptr[workingIndex]:dualGraphIndptr[workingIndex+1]]
 
             for index in indexes:
                 if not treated[index] :
@@ -849,6 +858,54 @@ def CheckIntegrity_CleanDoubleNodes(GUI=False):
     if mesh.GetNumberOfNodes() != 4:
         raise# pragma: no cover
 
+    points = [[0,0,0],[1,0,0],[1,1e-9,0],[0,1,0],[0,0,1],[0,0,1e-9],[1,0,0] ]
+    tets = [[0,1,3,4],[5,6,2,4]]
+    mesh = CreateMeshOf(points,tets,ElementNames.Tetrahedron_4)
+    mesh.nodesTags.CreateTag("Points").SetIds([2,3,5])
+
+    CleanDoubleNodes(mesh)
+    if mesh.GetNumberOfNodes() != 4:
+        raise# pragma: no cover
+    if not np.array_equal(mesh.originalIDNodes,[0,1,3,4]):
+        raise# pragma: no cover
+    if not np.array_equal(mesh.GetElementsOfType(ElementNames.Tetrahedron_4).connectivity,[[0,1,2,3],[0,1,1,3]]):
+        raise# pragma: no cover
+    if not np.array_equal(mesh.nodesTags["Points"].GetIds(),[0,1,2]):
+        raise# pragma: no cover
+
+    # chain of nodes : the middle node is merged into the first one, the last
+    # node is too far from the first one (1.2 > tol) and is kept
+    points = [[0,0,0],[0.6,0,0],[1.2,0,0],[5,5,5] ]
+    bars = [[0,1],[1,2],[2,3]]
+    mesh = CreateMeshOf(points,bars,ElementNames.Bar_2)
+    CleanDoubleNodes(mesh, tol=1.)
+    if not np.array_equal(mesh.originalIDNodes,[0,2,3]):
+        raise# pragma: no cover
+    if not np.array_equal(mesh.GetElementsOfType(ElementNames.Bar_2).connectivity,[[0,0],[0,1],[1,2]]):
+        raise# pragma: no cover
+
+    # same chain, node 2 is merged into the kept node 0 and not into the
+    # merged node 1
+    points = [[0,0,0],[0.6,0,0],[0.9,0,0],[5,5,5] ]
+    mesh = CreateMeshOf(points,bars,ElementNames.Bar_2)
+    CleanDoubleNodes(mesh, tol=1.)
+    if not np.array_equal(mesh.originalIDNodes,[0,3]):
+        raise# pragma: no cover
+
+    # the transitive merge : the first and last nodes of the chain are
+    # merged even if their distance is bigger than tol
+    points = [[0,0,0],[0.6,0,0],[1.2,0,0],[5,5,5] ]
+    mesh = CreateMeshOf(points,bars,ElementNames.Bar_2)
+    CleanDoubleNodes(mesh, tol=1., transitive=True)
+    if mesh.GetNumberOfNodes() != 2:
+        raise# pragma: no cover
+
+    # the same with a mask
+    mesh = CreateMeshOf(points,bars,ElementNames.Bar_2)
+    CleanDoubleNodes(mesh, tol=1., nodesToTestMask=np.array([True,True,True,False]))
+    if not np.array_equal(mesh.originalIDNodes,[0,2,3]):
+        raise# pragma: no cover
+
     return "ok"
 
 def CheckIntegrity_CleanLonelyNodes(GUI=False):
@@ -147,11 +147,164 @@ class ElementaryMatrix():
         KGeneric = KGeneric[:,permutation]
         return KGeneric
 
+class MatrixFreeOperator(linalg.LinearOperator):
+    """Matrix-free version of the matrix assembled by Fea.AssemblyMatrix. All
+    the elements share the same elementary matrix Op (weighted by Eeff), so
+    the product K.u is computed by blocks of elements: gather of the
+    elementary dofs, product by Op and scatter of the elementary
+    contributions. The dofs of the elements are generated block by block from
+    the multi index of the elements (first dof of the element plus the local
+    stencil of offsets), so only the elementary matrix and the stencil are
+    stored (no edofMat).
+
+    As in Fea.Solve, the dofs without contribution (zero diagonal) get a unit
+    diagonal term. If free is given, the operator is restricted to the free
+    dofs (the behavior of deleterowcol).
+
+    Parameters
+    ----------
+    Op : np.ndarray
+        elementary matrix
+    dimensions : ArrayLike
+        number of nodes in each direction of the grid
+    dofpernode : int
+        number of dofs per node (the dofs of a node are contiguous)
+    Eeff : np.ndarray, optional
+        element weights (densities), elements with Eeff < minthreshold are
+        ignored. By default None (all the elements with a weight of 1)
+    minthreshold : float, optional
+        minimal density, by default 0.
+    free : np.ndarray, optional
+        boolean mask of the dofs to keep, by default None (all the dofs)
+    blockSize : int, optional
+        number of elements treated at once, by default None (small blocks but
+        with more entries than the range of dofs of one element)
+    """
+    def __init__(self, Op, dimensions, dofpernode, Eeff=None, minthreshold=0., free=None, blockSize=None):
+        self.Op = np.asarray(Op, dtype=PBasicFloatType)
+        dimensions = np.asarray(dimensions, dtype=PBasicIndexType)
+        self.dofpernode = dofpernode
+        self.ndof = int(np.prod(dimensions))*dofpernode
+        # strides of the nodes and of the elements (last index is the fastest)
+        self.nodeStrides = np.cumprod(np.concatenate(([1],dimensions[:0:-1])))[::-1].astype(PBasicIndexType)
+        self.elementDimensions = dimensions-1
+        self.nbElements = int(np.prod(self.elementDimensions))
+
+        # local stencil: dofs of the element 0 (same nodes ordering as
+        # ConstantRectilinearElementContainer.GetConnectivityForElements)
+        if len(dimensions) == 3:
+            corners = np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0,0,1],[1,0,1],[1,1,1],[0,1,1]], dtype=PBasicIndexType)
+        else:
+            corners = np.array([[0,0],[1,0],[1,1],[0,1]], dtype=PBasicIndexType)
+        self.localOffsets = (corners.dot(self.nodeStrides)[:,np.newaxis]*dofpernode + np.arange(dofpernode, dtype=PBasicIndexType)).ravel()
+
+        if blockSize is None:
+            blockSize = max(2**14, int(np.max(self.localOffsets))//len(self.localOffsets)+1)
+        self.blockSize = blockSize
+
+        if Eeff is None:
+            self.elements = None
+            self.weights = None
+        else:
+            Eeff = np.asarray(Eeff).ravel()
+            self.elements = np.flatnonzero(Eeff >= minthreshold)
+            self.weights = Eeff[self.elements].astype(PBasicFloatType)
+
+        self.fullDiagonal = self._Accumulate(lambda edofs, weights : np.broadcast_to(np.diag(self.Op)*weights, edofs.shape) )
+        self.emptyDofs = self.fullDiagonal == 0
+        self.fullDiagonal[self.emptyDofs] = 1.
+
+        if free is None:
+            self.free = None
+            n = self.ndof
+        else:
+            self.free = np.asarray(free, dtype=bool)
+            n = np.count_nonzero(self.free)
+
+        super(MatrixFreeOperator,self).__init__(dtype=PBasicFloatType, shape=(n,n))
+
+    def GetElementsDofs(self, elements):
+        """Compute the dofs of the elements (the rows of the edofMat)
+
+        Parameters
+        ----------
+        elements : np.ndarray
+            ids of the elements
+
+        Returns
+        -------
+        np.ndarray
+            (len(elements), len(localOffsets)) dofs of each element
+        """
+        firstNode = np.zeros(len(elements), dtype=PBasicIndexType)
+        rest = np.asarray(elements, dtype=PBasicIndexType)
+        for d in range(len(self.elementDimensions)-1, -1, -1):
+            rest, index = np.divmod(rest, self.elementDimensions[d])
+            firstNode += index*self.nodeStrides[d]
+        return (firstNode*self.dofpernode)[:,np.newaxis] + self.localOffsets
+
+    def GetNumberOfEmptyDofs(self):
+        """Return the number of dofs without contribution of the elements"""
+        return np.count_nonzero(self.emptyDofs)
+
+    def _Accumulate(self, op):
+        """Scatter the elementary contributions op(edofs, weights) of all the
+        elements (block by block)"""
+        res = np.zeros(self.ndof, dtype=PBasicFloatType)
+        nbElements = self.nbElements if self.elements is None else len(self.elements)
+        for start in range(0, nbElements, self.blockSize):
+            stop = min(start+self.blockSize, nbElements)
+            if self.elements is None:
+                edofs = self.GetElementsDofs(np.arange(start, stop, dtype=PBasicIndexType))
+                weights = np.ones((stop-start,1), dtype=PBasicFloatType)
+            else:
+                edofs = self.GetElementsDofs(self.elements[start:stop])
+                weights = self.weights[start:stop,np.newaxis]
+            # on structured grids the dofs of a block of elements are in a
+            # small range, the scatter is done only on this range
+            lo = np.min(edofs)
+            hi = np.max(edofs)+1
+            res[lo:hi] += np.bincount((edofs-lo).ravel(), op(edofs, weights).ravel(), minlength=hi-lo)
+        return res
+
+    def FullDot(self, u):
+        """Product of the full (not restricted to the free dofs) operator by u
+
+        Parameters
+        ----------
+        u : np.ndarray
+            vector of size ndof
+
+        Returns
+        -------
+        np.ndarray
+            K.u
+        """
+        u = np.asarray(u, dtype=PBasicFloatType).ravel()
+        res = self._Accumulate(lambda edofs, weights : np.dot(u[edofs], self.Op.T)*weights )
+        res[self.emptyDofs] += u[self.emptyDofs]
+        return res
+
+    def diagonal(self):
+        """Return the diagonal of the operator (used by the Jacobi preconditioner)"""
+        if self.free is None:
+            return self.fullDiagonal.copy()
+        return self.fullDiagonal[self.free]
+
+    def _matvec(self, x):
+        if self.free is None:
+            return self.FullDot(x)
+        u = np.zeros(self.ndof, dtype=PBasicFloatType)
+        u[self.free] = np.ravel(x)
+        return self.FullDot(u)[self.free]
+
 class Fea(FeaBase.FeaBase):
 
     def __init__(self):
         super(Fea,self).__init__()
         self.linearSolver = "EigenCG"
+        # linear problem used in the last solve (to inspect the solver)
+        self.linearProblem = None
         self.writer = None
         self.minthreshold = 0.9e-3
         self.tol = 1.e-6
@@ -212,11 +365,10 @@ class Fea(FeaBase.FeaBase):
 
         # FE: Build the index vectors for the for coo matrix format
         self.PrintDebug("Building Connectivity matrix")
-        self.edofMat = np.zeros((self.support.GetNumberOfElements(), self.nodesPerElement*self.dofpernode), dtype=PBasicIndexType)
+        coon = self.support.GenerateFullConnectivity()
         self.PrintDebug("Building Connectivity matrix 2")
-        for i in  range(self.support.GetNumberOfElements()):
-            coon = self.support.GetConnectivityForElement(i)
-            self.edofMat[i, :] = np.array([(coon*self.dofpernode+y) for y in range(self.dofpernode)]).ravel('F')
+        # dofs of the first node, dofs of the second node ...
+        self.edofMat = (coon[:,:,np.newaxis]*self.dofpernode + np.arange(self.dofpernode, dtype=PBasicIndexType)).reshape((coon.shape[0], self.nodesPerElement*self.dofpernode))
 
         self.PrintDebug("Building Connectivity matrix Done")
 
@@ -289,6 +441,23 @@ class Fea(FeaBase.FeaBase):
             M = coo_matrix((sM, (local_iK, local_jK)), shape=(self.ndof, self.ndof),dtype=PBasicFloatType).tocsr()
         return M.tocsr()
 
+    def BuildTangentOperator(self, Eeff = None, free = None):
+        """Matrix-free version of BuildTangentMatrix
+
+        Parameters
+        ----------
+        Eeff : np.ndarray, optional
+            element densities, by default None
+        free : np.ndarray, optional
+            mask of the dofs to keep, by default None (all the dofs)
+
+        Returns
+        -------
+        MatrixFreeOperator
+            the tangent operator
+        """
+        return MatrixFreeOperator(self.KE, self.support.GetDimensions(), self.dofpernode, Eeff=Eeff, minthreshold=self.minthreshold, free=free)
+
     def BuildTangentMatrix(self, Eeff = None):
         self.PrintDebug("BuildTangentMatrix")
         res = self.AssemblyMatrix(self.KE, Eeff)
@@ -319,6 +488,39 @@ class Fea(FeaBase.FeaBase):
                 self.f[:,0] += f
             self.mecaPhysics = None
 
+        if self.linearSolver == "MatrixFreeCG":
+            self.SolveMatrixFree(Eeff)
+        else:
+            self.SolveAssembled(Eeff)
+        self.PostProcess()
+
+    def SolveMatrixFree(self, Eeff=None):
+        """Solve the problem without the assembly of the tangent matrix, the
+        operator is applied element by element (all the elements share the
+        same elementary matrix) and the system is solved with a Jacobi
+        preconditioned conjugate gradient
+        """
+        self.PrintDebug("Construction of the matrix-free tangent operator")
+        K = self.BuildTangentOperator(Eeff, free=self.free)
+
+        self.PrintVerbose("Number of active nodes : " + str(self.ndof-K.GetNumberOfEmptyDofs() ) + "  of " + str(self.ndof) + "   "+ str(float(K.GetNumberOfEmptyDofs()*100.)/self.ndof)+ "% of empty dofs"  )
+
+        rhsfixed = K.FullDot(self.fixedValues[:,0])
+        rhs = self.f[self.free, 0]-rhsfixed[self.free]
+
+        self.u = np.zeros((self.ndof, 1), dtype=PBasicFloatType)
+
+        if K.shape[0] > 0 :
+            self.PrintDebug(" Start solver (" + str(self.linearSolver) + ")")
+            from BasicTools.Linalg.LinearSolver import LinearProblem
+            linSol = LinearProblem()
+            linSol.SetAlgo("CG")
+            linSol.SetTolerance(self.tol)
+            linSol.SetOp(K)
+            self.u[self.free, 0] = linSol.Solve(rhs)
+            self.linearProblem = linSol
+
+    def SolveAssembled(self, Eeff=None):
         self.PrintDebug("Construction of the tangent matrix")
 
         K = self.BuildTangentMatrix(Eeff)
@@ -342,16 +544,25 @@ class Fea(FeaBase.FeaBase):
             from BasicTools.Linalg.LinearSolver import LinearProblem
             linSol = LinearProblem()
             linSol.tol = self.tol
-            linSol.SetAlgo(self.linearSolver)
+            if self.linearSolver == "GMG":
+                # the multigrid needs the description of the grid
+                linSol.SetAlgo(self.linearSolver, ops={"dimensions":self.support.GetDimensions(),
+                                                       "dofPerNode":self.dofpernode,
+                                                       "freeDofs":self.free})
+                linSol.SetTolerance(self.tol)
+            else:
+                linSol.SetAlgo(self.linearSolver)
             linSol.SetOp(K)
             linSol.u = self.u[self.free, 0]
             self.u[self.free, 0] = linSol.Solve(rhs)
+            self.linearProblem = linSol
           #else :
 
             #print("'"+self.linearSolver + "' is not a valid linear solver")#pragma: no cover
             #print('Please set a type of linear solver')#pragma: no cover
             #raise Exception()#pragma: no cover
 
+    def PostProcess(self):
         self.PrintDebug('Post Process')
         self.u = self.u + self.fixedValues
 
@@ -762,8 +973,85 @@ def CheckIntegrityDep2D():
 
     return 'ok'
 
+def CheckIntegrityMatrixFree():
+    import BasicTools.Containers.ConstantRectilinearMesh as CRM
+
+    print('----------------------- Matrix free -------------------------------------------------')
+    # big enough to have at least 2 levels in the GMG solver
+    nx = 13; ny = 11; nz = 9;
+    myMesh = CRM.ConstantRectilinearMesh()
+    myMesh.SetDimensions([nx,ny,nz]);
+    myMesh.SetSpacing([0.1, 0.2, 0.3]);
+    myMesh.SetOrigin([0, 0, 0]);
+
+    dirichlet_bcs = BundaryCondition()
+    for y in range(ny):
+        for z in range(nz):
+            for coor in range(3):
+                dirichlet_bcs.append([0,y,z], coor, 0 )
+            dirichlet_bcs.append([nx-1,y,z], 0, 0.1 )
+
+    neumann_nodal = BundaryCondition()
+    neumann_nodal.append([nx-1,ny-1,nz-1],2,1)
+
+    np.random.seed(0)
+    densities = np.random.rand(myMesh.GetNumberOfElements())
+    densities[densities < 0.2] = 0
+
+    results = []
+    for solver in ["Direct", "MatrixFreeCG", "GMG"]:
+        myProblem = Fea()
+        myProblem.tol = 1e-10
+        myProblem.BuildProblem(myMesh, dofpernode = 3,
+            dirichlet_bcs = dirichlet_bcs,
+            neumann_nodal = neumann_nodal)
+        myProblem.linearSolver = solver
+        myProblem.Solve(densities)
+        results.append(myProblem.u[:,0])
+        if solver == "GMG":
+            gmg = myProblem.linearProblem.realsolver
+            print("GMG levels : " + str(len(gmg._levels)) + ", iterations : " + str(gmg.numberOfIterations))
+            if len(gmg._levels) < 2 or gmg.numberOfIterations > 60:
+                raise Exception("Error in the GMG solve (levels or iterations)")
+
+    # the operator must be the assembled matrix (with the unit diagonal on the empty dofs)
+    for Eeff in [None, densities]:
+        K = myProblem.BuildTangentMatrix(Eeff)
+        diag = K.diagonal()
+        K = K + sps.diags((diag == 0).astype(float))
+        op = myProblem.BuildTangentOperator(Eeff, free=myProblem.free)
+        op.blockSize = 13
+        if not np.array_equal(op.GetElementsDofs(np.arange(myMesh.GetNumberOfElements())), myProblem.edofMat):
+            raise Exception("Error in MatrixFreeOperator.GetElementsDofs")
+        u = np.random.rand(myProblem.ndof)
+        if np.max(np.abs(op.FullDot(u) - K.dot(u))) > 1e-10*np.max(np.abs(K.dot(u))):
+            raise Exception("Error in MatrixFreeOperator.FullDot")
+        free = myProblem.free
+        if np.max(np.abs(op.dot(u[free]) - K[free,:][:,free].dot(u[free]))) > 1e-10*np.max(np.abs(K.dot(u))):
+            raise Exception("Error in MatrixFreeOperator.dot")
+        if np.max(np.abs(op.diagonal() - K.diagonal()[free])) > 1e-14*np.max(diag):
+            raise Exception("Error in MatrixFreeOperator.diagonal")
+
+    # the dofs of the elements generated on the fly in 2D
+    myMesh2D = CRM.ConstantRectilinearMesh(2)
+    myMesh2D.SetDimensions([5,4])
+    myProblem2D = Fea()
+    myProblem2D.BuildProblem(myMesh2D, dofpernode=2, dirichlet_bcs=BundaryCondition(dim=2))
+    op = myProblem2D.BuildTangentOperator()
+    if not np.array_equal(op.GetElementsDofs(np.arange(myMesh2D.GetNumberOfElements())), myProblem2D.edofMat):
+        raise Exception("Error in MatrixFreeOperator.GetElementsDofs (2D)")
+
+    for result, solver in zip(results[1:], ["MatrixFreeCG", "GMG"]):
+        error = np.linalg.norm(results[0]-result)/np.linalg.norm(results[0])
+        print(solver + " relative error : " + str(error))
+        if error > 1e-9:
+            raise Exception("Error in the " + solver + " solve")
+
+    return 'ok'
+
 def CheckIntegrity():
 
+    print(CheckIntegrityMatrixFree())
     print(CheckIntegrityThermal3D())
     print(CheckIntegrityDep3D())
     print(CheckIntegrityThermal2D())
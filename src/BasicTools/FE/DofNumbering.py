@@ -4,52 +4,194 @@
 # file 'LICENSE.txt', which is part of this source code package.
 #
 
+import hashlib
+import os
+import pickle
+
+import numpy as np
+
+from BasicTools.NumpyDefs import PBasicIndexType
 from BasicTools.Containers import Filters
 
-__cache__ = {}
-__cacheSize__ = 1
 numberingAlgorithm = "CppBase"
 #numberingAlgorithm = "NumpyBase"
 #numberingAlgorithm = "DictBase"
 
+# directory for the on disk cache of the numberings (None: no cache)
+numberingCacheDirectory = None
+
+def SetNumberingCacheDirectory(directory=None):
+    """Set the directory used to store the numberings (persistent cache). The
+    numberings are stored using a fingerprint of the mesh (number of nodes and
+    connectivities), of the space (dof attachments), of the element filter
+    (ids of the selected elements) and of the numbering algorithm, so a
+    restarted job can skip the computation of the numbering.
+
+    Parameters
+    ----------
+    directory : str, optional
+        the directory (created if needed), None to deactivate the cache, by default None
+    """
+    global numberingCacheDirectory
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    numberingCacheDirectory = directory
+
+def GetNumberingAlgorithm():
+    """Return the numbering algorithm actually used by ComputeDofNumbering
+    (fallback from "CppBase" to "NumpyBase" if the native module is not
+    available)
+
+    Returns
+    -------
+    str
+        the name of the algorithm
+    """
+    global numberingAlgorithm
+    if numberingAlgorithm == "CppBase":
+        try:
+            from BasicTools.FE.Numberings.NativeDofNumbering import NativeDofNumbering
+        except:
+            numberingAlgorithm = "NumpyBase"
+            print("Warning CppBase Numbering non available (missing compilation) Using NumpyBase")
+    return numberingAlgorithm
+
+def GetPicklableNumbering(numbering, mesh):
+    """Convert a numbering to a picklable object. The python numberings are
+    returned as is, the other numberings (NativeDofNumbering) are copied in a
+    DofNumberingNumpy (numbering of every element type, size, dof to point
+    and dof to cell extractors)
+
+    Parameters
+    ----------
+    numbering : DofNumbering
+        the numbering to convert
+    mesh : UnstructuredMesh
+        the mesh used to compute the numbering
+
+    Returns
+    -------
+    DofNumberingNumpy or DofNumberingDict
+        a picklable numbering
+    """
+    from BasicTools.FE.Numberings.DofNumberingNumpy import DofNumberingNumpy
+    from BasicTools.FE.Numberings.DofNumberingDict import DofNumberingDict
+    if isinstance(numbering, (DofNumberingNumpy, DofNumberingDict)):
+        return numbering
+
+    res = DofNumberingNumpy()
+    res.size = int(numbering.size)
+    res.fromConnectivity = bool(numbering.fromConnectivity)
+    for name in mesh.elements:
+        data = numbering.get(name, None)
+        if data is not None:
+            res.numbering[name] = np.array(data)
+    res.totalNumberOfPoints = mesh.GetNumberOfNodes()
+    res._doftopointLeft = np.array(numbering.doftopointLeft, dtype=PBasicIndexType)
+    res._doftopointRight = np.array(numbering.doftopointRight, dtype=PBasicIndexType)
+    res.pointDofs = np.full(res.totalNumberOfPoints, -1, dtype=PBasicIndexType)
+    res.pointDofs[res._doftopointLeft] = res._doftopointRight
+    res._doftocellLeft = np.array(numbering.doftocellLeft, dtype=PBasicIndexType)
+    res._doftocellRight = np.array(numbering.doftocellRight, dtype=PBasicIndexType)
+    return res
+
+def GetNumberingCacheKey(mesh,space,elementFilter=None,discontinuous=False):
+    """Compute the key (a hex string) used to store a numbering in the cache
+
+    Parameters
+    ----------
+    mesh : UnstructuredMesh
+        the mesh
+    space : FESpaceType
+        the space
+    elementFilter : ElementFilter, optional
+        the filter used to compute the numbering, by default None
+    discontinuous : bool, optional
+        discontinuous numbering, by default False
+
+    Returns
+    -------
+    str
+        the key
+    """
+    if elementFilter is None:
+        elementFilter = Filters.ElementFilter(mesh)
+
+    fingerprint = hashlib.blake2b(digest_size=20)
+    def AddToFingerprint(data):
+        if isinstance(data,np.ndarray):
+            data = np.ascontiguousarray(data)
+            fingerprint.update(repr((data.shape,data.dtype.str)).encode())
+            fingerprint.update(data.data.cast("B"))
+        else:
+            fingerprint.update(repr(data).encode())
+
+    AddToFingerprint((GetNumberingAlgorithm(), discontinuous, mesh.GetNumberOfNodes()))
+    for name, data in sorted(mesh.elements.items()):
+        if data.GetNumberOfElements() == 0:
+            continue
+        AddToFingerprint(name)
+        AddToFingerprint(data.connectivity)
+        sp = space.get(name, None)
+        if sp is not None:
+            AddToFingerprint((sp.GetNumberOfShapeFunctions(), [tuple(str(x) for x in at) for at in sp.dofAttachments]))
+        AddToFingerprint(np.asarray(elementFilter.GetIdsToTreat(data)))
+    return fingerprint.hexdigest()
+
 def GetNumberingFromCache(mesh,space,elementFilter=None,discontinuous=False,fromConnectivity=False):
-    return None
-    key = (id(mesh),id(space),id(elementFilter),discontinuous,fromConnectivity)
-    return __cache__.get(key,None)
+    """Load a numbering from the on disk cache (see SetNumberingCacheDirectory)
+
+    Returns
+    -------
+    DofNumbering or None
+        the numbering, None if not present in the cache
+    """
+    if numberingCacheDirectory is None or fromConnectivity:
+        return None
+    key = GetNumberingCacheKey(mesh, space, elementFilter=elementFilter, discontinuous=discontinuous)
+    fileName = os.path.join(numberingCacheDirectory, key + ".pickle")
+    if not os.path.exists(fileName):
+        return None
+    try:
+        with open(fileName, "rb") as f:
+            return pickle.load(f)
+    except Exception:# pragma: no cover
+        # corrupted file, the numbering is computed again
+        return None
 
 def SetNumberingToCache(obj, mesh,space,elementFilter=None,discontinuous=False,fromConnectivity=False):
-    if len(__cache__) >=  __cacheSize__:
-        for k in __cache__:
-            del __cache__[k]
-            break
-    key = (id(mesh),id(space),id(elementFilter),discontinuous,fromConnectivity)
-    __cache__[key] = obj
+    """Store a numbering in the on disk cache (see SetNumberingCacheDirectory)
+    """
+    if numberingCacheDirectory is None or fromConnectivity:
+        return
+    key = GetNumberingCacheKey(mesh, space, elementFilter=elementFilter, discontinuous=discontinuous)
+    fileName = os.path.join(numberingCacheDirectory, key + ".pickle")
+    # write in a temporary file and rename, to never leave a partial file
+    tempFileName = fileName + "." + str(os.getpid()) + ".tmp"
+    with open(tempFileName, "wb") as f:
+        pickle.dump(GetPicklableNumbering(obj, mesh), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tempFileName, fileName)
 
 def ComputeDofNumbering(mesh,Space,dofs=None,fromConnectivity=False,elementFilter=None,discontinuous=False):
 
+    cachedData = None
     if dofs is None:
         cachedData = GetNumberingFromCache(mesh=mesh, space=Space, fromConnectivity=fromConnectivity, elementFilter=elementFilter, discontinuous=discontinuous )
     if cachedData is not None:
         return cachedData
 	
-    global numberingAlgorithm 
-    res = None
-    if numberingAlgorithm == "CppBase":
-        try:
-            from BasicTools.FE.Numberings.NativeDofNumbering import NativeDofNumbering
-            res = NativeDofNumbering()
-        except:
-           numberingAlgorithm = "NumpyBase" 
-           print("Warning CppBase Numbering non available (missing compilation) Using NumpyBase")
-        
-    if numberingAlgorithm == "NumpyBase":
+    algorithm = GetNumberingAlgorithm()
+    if algorithm == "CppBase":
+        from BasicTools.FE.Numberings.NativeDofNumbering import NativeDofNumbering
+        res = NativeDofNumbering()
+    elif algorithm == "NumpyBase":
         from BasicTools.FE.Numberings.DofNumberingNumpy import DofNumberingNumpy
         res = DofNumberingNumpy()
-    elif numberingAlgorithm == "DictBase":
+    elif algorithm == "DictBase":
         from BasicTools.FE.Numberings.DofNumberingDict import DofNumberingDict
         res = DofNumberingDict()
-    elif res == None:
-        raise(Exception(f"Numbering algorithm of type {numberingAlgorithm} not available "))
+    else:
+        raise(Exception(f"Numbering algorithm of type {algorithm} not available "))
 
 
     if fromConnectivity:
@@ -63,7 +205,8 @@ def ComputeDofNumbering(mesh,Space,dofs=None,fromConnectivity=False,elementFilte
             res = dofs
 
         res.ComputeNumberingGeneral(mesh=mesh, space=Space, elementFilter=elementFilter, discontinuous=discontinuous )
-        SetNumberingToCache(res,mesh=mesh, space=Space, fromConnectivity=fromConnectivity, elementFilter=elementFilter, discontinuous=discontinuous )
+        if dofs is None:
+            SetNumberingToCache(res,mesh=mesh, space=Space, fromConnectivity=fromConnectivity, elementFilter=elementFilter, discontinuous=discontinuous )
 
         return res
 
@@ -128,6 +271,85 @@ def CheckIntegrity(GUI=False):
         print(numbering.size)
         print("----------------------{} 3D filter-----------------------------".format(spacename))
         print(time.time()-st)
+
+    return DN.CheckIntegrityCache(GUI)
+
+def CheckIntegrityCache(GUI=False):
+    import BasicTools.FE.DofNumbering  as DN
+    from BasicTools.Helpers.Tests import TestTempDir
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    from BasicTools.FE.Spaces.FESpaces import LagrangeSpaceP2
+
+    mesh = CreateCube([3,4,5],[-1.0,-1.0,-1.0],[0.5, 0.5,0.5])
+    tempdir = TestTempDir.GetTempPath() + "NumberingCache"
+
+    tmpAlgo = DN.numberingAlgorithm
+    tmpDirectory = DN.numberingCacheDirectory
+    DN.numberingAlgorithm = "NumpyBase"
+    try:
+        DN.SetNumberingCacheDirectory(tempdir)
+        for f in os.listdir(tempdir):
+            os.remove(os.path.join(tempdir,f))
+
+        elementFilter = Filters.ElementFilter(mesh=mesh,dimensionality=3)
+        numbering = DN.ComputeDofNumbering(mesh,LagrangeSpaceP2,elementFilter=elementFilter)
+        if len(os.listdir(tempdir)) != 1: raise Exception("The numbering must be stored on disk")
+        cached = DN.ComputeDofNumbering(mesh,LagrangeSpaceP2,elementFilter=Filters.ElementFilter(mesh=mesh,dimensionality=3))
+        if cached is numbering or cached.size != numbering.size: raise Exception("The numbering must be loaded from disk")
+        for name in numbering.numbering:
+            if not np.array_equal(cached[name],numbering[name]): raise Exception("Error in the cached numbering")
+
+        # other filter and modified mesh: new entries
+        DN.ComputeDofNumbering(mesh,LagrangeSpaceP2)
+        if len(os.listdir(tempdir)) != 2: raise Exception("Error in the key of the cache (filter)")
+        connectivity = mesh.elements["hex8"].connectivity.copy()
+        connectivity[0,:] = connectivity[0,[1,2,3,0,5,6,7,4]]
+        mesh.elements["hex8"].connectivity = connectivity
+        DN.ComputeDofNumbering(mesh,LagrangeSpaceP2)
+        if len(os.listdir(tempdir)) != 3: raise Exception("Error in the key of the cache (mesh)")
+
+        # restarted process: the default algorithm ("CppBase") falls back to
+        # "NumpyBase" if the native module is missing, the key must be the same
+        DN.numberingAlgorithm = "CppBase"
+        for f in os.listdir(tempdir):
+            os.remove(os.path.join(tempdir,f))
+        numbering = DN.ComputeDofNumbering(mesh,LagrangeSpaceP2)
+        if len(os.listdir(tempdir)) != 1: raise Exception("The numbering must be stored on disk")
+        DN.numberingAlgorithm = "CppBase"
+        cached = DN.GetNumberingFromCache(mesh,LagrangeSpaceP2)
+        if cached is None or cached.size != numbering.size: raise Exception("The numbering must be loaded from disk after a restart")
+        cached = DN.ComputeDofNumbering(mesh,LagrangeSpaceP2)
+        if len(os.listdir(tempdir)) != 1: raise Exception("Error in the key of the cache (algorithm)")
+        for name in mesh.elements:
+            if not np.array_equal(cached.get(name,None),numbering.get(name,None)): raise Exception("Error in the cached numbering")
+
+        # conversion of a numbering to a picklable DofNumberingNumpy
+        from BasicTools.FE.Numberings.DofNumberingDict import DofNumberingDict
+        ref = DofNumberingDict().ComputeNumberingGeneral(mesh,LagrangeSpaceP2)
+        class OpaqueNumbering():
+            # only the public API (like NativeDofNumbering)
+            def __init__(self,numbering):
+                self.__numbering = numbering
+            def get(self,key,default=None):
+                return self.__numbering.get(key,default)
+            def __getattr__(self,name):
+                if name.startswith("_"): raise AttributeError(name)
+                return getattr(self.__numbering,name)
+            def __reduce__(self):
+                raise TypeError("can not be pickled")
+        converted = DN.GetPicklableNumbering(OpaqueNumbering(ref),mesh)
+        converted = pickle.loads(pickle.dumps(converted))
+        if converted.size != ref.size or converted.fromConnectivity != ref.fromConnectivity: raise Exception("Error in GetPicklableNumbering")
+        for name in mesh.elements:
+            if not np.array_equal(converted[name],ref[name]): raise Exception("Error in GetPicklableNumbering")
+        if not np.array_equal(converted.doftopointLeft,ref.doftopointLeft) or not np.array_equal(converted.doftopointRight,ref.doftopointRight): raise Exception("Error in GetPicklableNumbering")
+        if converted.GetDofOfPoint(ref.doftopointLeft[1]) != ref.doftopointRight[1]: raise Exception("Error in GetPicklableNumbering")
+
+        DN.SetNumberingCacheDirectory(None)
+        if DN.GetNumberingFromCache(mesh,LagrangeSpaceP2) is not None: raise Exception("The cache must be deactivated")
+    finally:
+        DN.numberingAlgorithm = tmpAlgo
+        DN.numberingCacheDirectory = tmpDirectory
     return "ok"
 
 def CheckIntegrityUsingAlgo(algo,GUI=False):
@@ -5,6 +5,8 @@
 #
 
 
+import weakref
+
 import numpy as np
 
 from BasicTools.FE.Spaces.FESpaces import LagrangeSpaceP1
@@ -249,7 +251,143 @@ def ComputeInterpolationMatrix_FE_GaussPoint(mesh, feSpace, integrationRule,feNu
     interpMatrixMatrix,_ = IntegrateGeneral(mesh=mesh,constants={},fields=[],wform=symForm, unkownFields= [leftField],testFields=[rightField],onlyEvaluation=True,integrationRule=integrationRule,elementFilter=elementFilter)
     return interpMatrixMatrix
 
-def ComputeJdetAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
+_atIntegPointCache = {}
+
+def ClearAtIntegPointCache():
+    """Clear the results cached by the functions Compute*AtIntegPoint (called
+    with useCache=True)
+    """
+    _atIntegPointCache.clear()
+
+def _GetCachedAtIntegPoint(mesh, key, function):
+    """Internal function to cache the result of function() for the mesh
+
+    The cached result is reused while the mutation counter of the mesh and the
+    nodes array are unchanged. A copy of the result is returned.
+    """
+    counter = getattr(mesh, "GetMutationCounter", lambda : None)()
+    if counter is None:
+        return function()
+
+    entry = _atIntegPointCache.get(id(mesh), None)
+    if entry is None or entry[0]() is not mesh or entry[1] != counter or entry[2]() is not mesh.nodes:
+        # the entry is removed when the mesh is destroyed
+        meshId = id(mesh)
+        entry = (weakref.ref(mesh, lambda ref: _atIntegPointCache.pop(meshId, None)), counter, weakref.ref(mesh.nodes), {})
+        _atIntegPointCache[id(mesh)] = entry
+
+    results = entry[3]
+    if key not in results:
+        results[key] = function()
+    return _CopyResult(results[key])
+
+def _CopyResult(res):
+    if isinstance(res, tuple):
+        return tuple(_CopyResult(x) for x in res)
+    if isinstance(res, list):
+        return [_CopyResult(x) for x in res]
+    return res.copy()
+
+def _GetElementSetsKey(elementSets):
+    if not elementSets:
+        return None
+    return tuple(elementSets)
+
+def ComputeGeometryAtIntegPoint(nodes, connectivity, space, points, computeGradients=False, computeNormals=False, blockSize=8192):
+    """Batched computation of the geometric quantities at the integration
+    points of elements of the same type. The elements are treated by blocks
+    of blockSize elements: the coordinates are gathered once per block and the
+    jacobians, determinants, inverses and gradients are computed for all
+    the elements and all the integration points at once.
+
+    Parameters
+    ----------
+    nodes : np.ndarray
+        (nbNodes, spaceDim) coordinates of the nodes
+    connectivity : np.ndarray
+        (nbElements, nbNodesPerElement) connectivity of the elements to treat
+    space : Space
+        geometric space of the elements (LagrangeSpaceGeo[elementType])
+    points : np.ndarray
+        (nbIp, dim) parametric coordinates of the integration points
+    computeGradients : bool, optional
+        compute the gradients of the shape functions, by default False
+    computeNormals : bool, optional
+        compute the normals, by default False
+    blockSize : int, optional
+        number of elements treated at once, by default 8192
+
+    Returns
+    -------
+    Jdet : np.ndarray
+        (nbElements, nbIp) determinants of the jacobians (measure for
+        elements of lower dimensionality)
+    gradPhi : np.ndarray or None
+        (nbElements, nbIp, spaceDim, nbShapeFunctions) gradients of the
+        shape functions
+    normals : np.ndarray or None
+        (nbElements, nbIp, nbComponents) normals
+    """
+    nbElements = connectivity.shape[0]
+    spaceDim = nodes.shape[1]
+    dim = space.GetDimensionality()
+    nbIp = len(points)
+    nbShapeFunctions = connectivity.shape[1]
+    space.Create()
+
+    Jdet = np.empty((nbElements, nbIp))
+    gradPhi = np.empty((nbElements, nbIp, spaceDim, nbShapeFunctions)) if computeGradients else None
+    normals = None
+
+    if dim == 0:
+        Jdet.fill(1.)
+        if computeGradients:
+            gradPhi.fill(0.)
+        return Jdet, gradPhi, normals
+
+    dphidxi = space.GetShapeFuncDerVectorized(points)
+
+    for start in range(0, nbElements, blockSize):
+        block = slice(start, min(start+blockSize, nbElements))
+        xcoor = nodes[connectivity[block],:]
+        Jack = np.einsum("pdn,ens->epds", dphidxi, xcoor)
+
+        if dim == spaceDim:
+            Jdet[block] = np.linalg.det(Jack)
+        elif dim == 1:
+            Jdet[block] = np.linalg.norm(Jack[:,:,0,:], axis=2)
+        else:
+            Jdet[block] = np.linalg.norm(np.cross(Jack[:,:,0,:], Jack[:,:,1,:]), axis=2)
+
+        if computeGradients:
+            gradPhi[block] = np.einsum("epsd,pdn->epsn", _InverseJacobians(Jack), dphidxi)
+
+        if computeNormals:
+            n = space.GetNormalVectorized(Jack.reshape((-1,dim,spaceDim)))
+            if normals is None:
+                normals = np.empty((nbElements, nbIp, n.shape[1]))
+            normals[block] = n.reshape((-1, nbIp, n.shape[1]))
+
+    if computeNormals and normals is None:
+        normals = np.empty((0, nbIp, spaceDim))
+
+    return Jdet, gradPhi, normals
+
+def _InverseJacobians(Jack):
+    """Inverses (pseudo-inverses for elements of lower dimensionality, the
+    minimal norm solution of Jack.x = vec) of a stack of jacobians
+    (..., dim, spaceDim) -> (..., spaceDim, dim)
+    """
+    try:
+        if Jack.shape[-2] == Jack.shape[-1]:
+            return np.linalg.inv(Jack)
+        JackT = np.swapaxes(Jack, -1, -2)
+        return np.matmul(JackT, np.linalg.inv(np.matmul(Jack, JackT)))
+    except np.linalg.LinAlgError:
+        # degenerated elements
+        return np.linalg.pinv(Jack)
+
+def ComputeJdetAtIntegPoint(mesh, elementSets = None, relativeDimension = 0, useCache = False):
     """
     Computes determinant of the Jacobian of the transformation of the
     transformation between the reference element and the mesh element, at
@@ -264,12 +402,18 @@ def ComputeJdetAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     relativeDimension : int (0, -1 or -2)
         difference between the dimension of the elements on which the function
         is computed and the dimensionality of the mesh
+    useCache : bool
+        reuse the result of a previous call on the same (unmodified) mesh
 
     Returns
     -------
     np.ndarray
         of size (NGauss,)
     """
+    if useCache:
+        key = ("Jdet", _GetElementSetsKey(elementSets), relativeDimension)
+        return _GetCachedAtIntegPoint(mesh, key, lambda : ComputeJdetAtIntegPoint(mesh, elementSets, relativeDimension))
+
     ff = ElementFilter(mesh)
 
     dimension = mesh.GetDimensionality() + relativeDimension
@@ -289,21 +433,14 @@ def ComputeJdetAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     for name,data,ids in ff:
 
         p,w =  LagrangeIsoParam[name]
-        NGaussperEl = len(w)
-
-        for el in ids:
-            xcoor = mesh.nodes[data.connectivity[el],:]
-            space_ipvalues = spaces[name].SetIntegrationRule(p,w)
-            for ip in range(NGaussperEl):
-                Jack, Jdet, Jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
 
-                jDet[countTotal] = Jdet
-
-                countTotal += 1
+        Jdet, _, _ = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], spaces[name], p)
+        jDet[countTotal:countTotal+Jdet.size] = Jdet.ravel()
+        countTotal += Jdet.size
 
     return jDet
 
-def ComputePhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
+def ComputePhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0, useCache = False):
     """
     Computes the value of the finite element shape functions at the integration
     points. (Lagrange isoparametric finite elements)
@@ -317,6 +454,8 @@ def ComputePhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     relativeDimension : int (0, -1 or -2)
         difference between the dimension of the elements on which the function
         is computed and the dimensionality of the mesh
+    useCache : bool
+        reuse the result of a previous call on the same (unmodified) mesh
 
     Returns
     -------
@@ -325,6 +464,10 @@ def ComputePhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     coo_matrix
         of size (NGauss, nbNodes)
     """
+    if useCache:
+        key = ("Phi", _GetElementSetsKey(elementSets), relativeDimension)
+        return _GetCachedAtIntegPoint(mesh, key, lambda : ComputePhiAtIntegPoint(mesh, elementSets, relativeDimension))
+
     ff = ElementFilter(mesh)
 
     dimension = mesh.GetDimensionality() + relativeDimension
@@ -338,40 +481,35 @@ def ComputePhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
 
     spaces, numberings, offset, NGauss = PrepareFEComputation(mesh, ff)
 
-    nbNodes = mesh.GetNumberOfNodes()
-
-    phiAtIntegPointIndices = []
-    phiAtIntegPointValues = []
-    row = []
+    return _ComputePhiAtIntegPoint(mesh, ff, spaces, numberings[0])
 
-    integrationWeights = np.zeros(NGauss)
+def _ComputePhiAtIntegPoint(mesh, elFilter, spaces, numbering):
+    """Internal function for ComputePhiAtIntegPoint and
+    ComputePhiAtIntegPointFromElFilter
+    """
+    phiAtIntegPointIndices = [np.zeros(0,dtype=PBasicIndexType)]
+    phiAtIntegPointValues = [np.zeros(0)]
+    row = [np.zeros(0,dtype=PBasicIndexType)]
+    integrationWeights = [np.zeros(0)]
 
     countTotal = 0
-    for name,data,ids in ff:
+    for name,data,ids in elFilter:
 
         p,w =  LagrangeIsoParam[name]
-        NGaussperEl = len(w)
-        lenNumbering = len(numberings[0][name][0,:])
-
-        ones = np.ones(lenNumbering,dtype=int)
-
-        for el in ids:
-            xcoor = mesh.nodes[data.connectivity[el],:]
-            space_ipvalues = spaces[name].SetIntegrationRule(p,w)
-            for ip in range(NGaussperEl):
-                Jack, Jdet, Jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
 
-                integrationWeights[countTotal] = w[ip]*Jdet
+        Jdet, _, _ = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], spaces[name], p)
+        valN = spaces[name].GetShapeFuncVectorized(p)
+        integrationWeights.append((w*Jdet).ravel())
 
-                leftNumbering = numberings[0][name][el,:]
-                left = space_ipvalues.valN[ip]
+        leftNumbering = numbering[name][ids,:]
+        lenNumbering = leftNumbering.shape[1]
+        phiAtIntegPointIndices.append(np.broadcast_to(leftNumbering[:,None,:], Jdet.shape+(lenNumbering,)).ravel())
+        phiAtIntegPointValues.append(np.broadcast_to(valN, Jdet.shape+(lenNumbering,)).ravel())
+        row.append(np.repeat(np.arange(countTotal, countTotal+Jdet.size, dtype=PBasicIndexType), lenNumbering))
+        countTotal += Jdet.size
 
-                phiAtIntegPointIndices.extend(leftNumbering)
-                phiAtIntegPointValues.extend(left)
-                row.extend(countTotal*ones)
-                countTotal += 1
-
-    phiAtIntegPointMatrix = coo_matrix((phiAtIntegPointValues, (row, phiAtIntegPointIndices)), shape=(NGauss, nbNodes))
+    integrationWeights = np.concatenate(integrationWeights)
+    phiAtIntegPointMatrix = coo_matrix((np.concatenate(phiAtIntegPointValues), (np.concatenate(row), np.concatenate(phiAtIntegPointIndices))), shape=(countTotal, mesh.GetNumberOfNodes()))
 
     return integrationWeights, phiAtIntegPointMatrix
 
@@ -396,46 +534,9 @@ def ComputePhiAtIntegPointFromElFilter(mesh, elFilter):
 
     numbering = ComputeDofNumbering(mesh,LagrangeSpaceGeo,fromConnectivity=True)
 
-    nbNodes = mesh.GetNumberOfNodes()
-
-    phiAtIntegPointIndices = []
-    phiAtIntegPointValues = []
-    row = []
-    integrationWeights = []
+    return _ComputePhiAtIntegPoint(mesh, elFilter, LagrangeSpaceGeo, numbering)
 
-    countTotal = 0
-    for name,data,ids in elFilter:
-
-        p,w =  LagrangeIsoParam[name]
-        NGaussperEl = len(w)
-        lenNumbering = len(numbering[name][0,:])
-
-        ones = np.ones(lenNumbering,dtype=int)
-
-        for el in ids:
-            xcoor = mesh.nodes[data.connectivity[el],:]
-            space_ipvalues = LagrangeSpaceGeo[name].SetIntegrationRule(p,w)
-            for ip in range(NGaussperEl):
-                Jack, Jdet, Jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
-
-                integrationWeights.append(w[ip]*Jdet)
-
-                leftNumbering = numbering[name][el,:]
-                left = space_ipvalues.valN[ip]
-
-                phiAtIntegPointIndices.extend(leftNumbering)
-                phiAtIntegPointValues.extend(left)
-                row.extend(countTotal*ones)
-                countTotal += 1
-
-    NGauss = len(integrationWeights)
-    integrationWeights = np.array(integrationWeights)
-
-    phiAtIntegPointMatrix = coo_matrix((phiAtIntegPointValues, (row, phiAtIntegPointIndices)), shape=(NGauss, nbNodes))
-
-    return integrationWeights, phiAtIntegPointMatrix
-
-def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
+def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0, useCache = False):
     """
     Computes the components of the gradient of the shape functions on the
     integration points and the integration weights associated with the
@@ -449,6 +550,8 @@ def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
         element sets, support for the shape functions
     relativeDimension : int
         0, -1, or -2: the dimension of the element set relative to the dimension of the mesh
+    useCache : bool
+        reuse the result of a previous call on the same (unmodified) mesh
 
     Returns
     -------
@@ -458,6 +561,9 @@ def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     list (length dimensionality of the mesh) coo_matrix of size (NGauss, nbNodes)
         gradPhiAtIntegPoint
     """
+    if useCache:
+        key = ("GradPhi", _GetElementSetsKey(elementSets), relativeDimension)
+        return _GetCachedAtIntegPoint(mesh, key, lambda : ComputeGradPhiAtIntegPoint(mesh, elementSets, relativeDimension))
 
     ff = ElementFilter(mesh)
 
@@ -477,9 +583,9 @@ def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     nbNodes = mesh.GetNumberOfNodes()
     meshDimension = mesh.GetDimensionality()
 
-    GradPhiAtIntegPointIndices = []
-    GradPhiAtIntegPointValues = [[] for i in range(meshDimension)]
-    row = []
+    GradPhiAtIntegPointIndices = [np.zeros(0,dtype=PBasicIndexType)]
+    GradPhiAtIntegPointValues = [[np.zeros(0)] for i in range(meshDimension)]
+    row = [np.zeros(0,dtype=PBasicIndexType)]
 
     integrationWeights = np.zeros(NGauss)
 
@@ -487,34 +593,27 @@ def ComputeGradPhiAtIntegPoint(mesh, elementSets = None, relativeDimension = 0):
     for name,data,ids in ff:
 
         p,w =  LagrangeIsoParam[name]
-        NGaussperEl = len(w)
-        lenNumbering = len(numberings[0][name][0,:])
-
-        ones = np.ones(lenNumbering,dtype=int)
-
-        for el in ids:
-            xcoor = mesh.nodes[data.connectivity[el],:]
-            space_ipvalues = spaces[name].SetIntegrationRule(p,w)
-            for ip in range(NGaussperEl):
-                Jack, Jdet, Jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
-                BxByBzI = Jinv(space_ipvalues.valdphidxi[ip])
 
-                integrationWeights[countTotal] = w[ip]*Jdet
+        Jdet, gradPhi, _ = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], spaces[name], p, computeGradients=True)
+        integrationWeights[countTotal:countTotal+Jdet.size] = (w*Jdet).ravel()
 
-                leftNumbering = numberings[0][name][el,:]
+        leftNumbering = numberings[0][name][ids,:]
+        lenNumbering = leftNumbering.shape[1]
 
-                GradPhiAtIntegPointIndices.extend(leftNumbering)
-                for k in range(meshDimension):
-                    GradPhiAtIntegPointValues[k].extend(BxByBzI[k])
+        GradPhiAtIntegPointIndices.append(np.broadcast_to(leftNumbering[:,None,:], Jdet.shape+(lenNumbering,)).ravel())
+        for k in range(meshDimension):
+            GradPhiAtIntegPointValues[k].append(gradPhi[:,:,k,:].ravel())
 
-                row.extend(countTotal*ones)
-                countTotal += 1
+        row.append(np.repeat(np.arange(countTotal, countTotal+Jdet.size, dtype=PBasicIndexType), lenNumbering))
+        countTotal += Jdet.size
 
-    GradPhiAtIntegPointMatrix = [coo_matrix((GradPhiAtIntegPointValues[k], (row, GradPhiAtIntegPointIndices)), shape=(NGauss, nbNodes)) for k in range(meshDimension)]
+    row = np.concatenate(row)
+    GradPhiAtIntegPointIndices = np.concatenate(GradPhiAtIntegPointIndices)
+    GradPhiAtIntegPointMatrix = [coo_matrix((np.concatenate(GradPhiAtIntegPointValues[k]), (row, GradPhiAtIntegPointIndices)), shape=(NGauss, nbNodes)) for k in range(meshDimension)]
 
     return integrationWeights, GradPhiAtIntegPointMatrix
 
-def ComputeNormalsAtIntegPoint(mesh, elementSets):
+def ComputeNormalsAtIntegPoint(mesh, elementSets, useCache = False):
 
     """
     Computes the normals at the elements from the sets elementSets in the
@@ -527,12 +626,18 @@ def ComputeNormalsAtIntegPoint(mesh, elementSets):
         mesh on which the function is applied
     elementSets : list of strings
         sets of elements on which the function is computed
+    useCache : bool
+        reuse the result of a previous call on the same (unmodified) mesh
 
     Returns
     -------
     np.ndarray
         of size (dimensionality, NGauss)
     """
+    if useCache:
+        key = ("Normals", _GetElementSetsKey(elementSets))
+        return _GetCachedAtIntegPoint(mesh, key, lambda : ComputeNormalsAtIntegPoint(mesh, elementSets))
+
     ff = ElementFilter(mesh)
 
     dimension = mesh.GetDimensionality() - 1
@@ -553,16 +658,10 @@ def ComputeNormalsAtIntegPoint(mesh, elementSets):
     for name,data,ids in ff:
 
         p,w =  LagrangeIsoParam[name]
-        NGaussperEl = len(w)
 
-        for el in ids:
-            xcoor = mesh.nodes[data.connectivity[el],:]
-            space_ipvalues = spaces[name].SetIntegrationRule(p,w)
-            for ip in range(NGaussperEl):
-                Jack, Jdet, Jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
-                normal = space_ipvalues.GetNormal(Jack)
-                normalsAtIntegPoint[:,countTotal] = normal
-                countTotal += 1
+        Jdet, _, normals = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], spaces[name], p, computeNormals=True)
+        normalsAtIntegPoint[:,countTotal:countTotal+Jdet.size] = normals.reshape((Jdet.size,-1)).T
+        countTotal += Jdet.size
 
     return normalsAtIntegPoint
 
@@ -718,7 +817,59 @@ def IntegrationPointsToCellData(mesh, scalarFields):
     return np.array(cellData)
 
 
+def CheckIntegrityGeometryAtIntegPoint(GUI=False):
+    import BasicTools.TestData as BasicToolsTestData
+    from BasicTools.IO import GeofReader as GR
+    mesh = GR.ReadGeof(BasicToolsTestData.GetTestDataPath()+"cube2.geof")
+    mesh.nodes += 0.05*np.sin(7*mesh.nodes[:,[1,2,0]])
+
+    # comparison with the element by element computation
+    for name, data, ids in ElementFilter(mesh, dimensionality=3):
+        p,w = LagrangeIsoParam[name]
+        Jdet, gradPhi, _ = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], LagrangeSpaceGeo[name], p, computeGradients=True, blockSize=7)
+        space_ipvalues = LagrangeSpaceGeo[name].SetIntegrationRule(p,w)
+        for cpt, el in enumerate(ids):
+            xcoor = mesh.nodes[data.connectivity[el],:]
+            for ip in range(len(w)):
+                _, jdet, jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
+                if abs(jdet-Jdet[cpt,ip]) > 1e-12 or np.max(np.abs(jinv(space_ipvalues.valdphidxi[ip])-gradPhi[cpt,ip])) > 1e-10:
+                    raise Exception("Error in ComputeGeometryAtIntegPoint")
+
+    for name, data, ids in ElementFilter(mesh, dimensionality=2, tag="x0"):
+        p,w = LagrangeIsoParam[name]
+        Jdet, gradPhi, normals = ComputeGeometryAtIntegPoint(mesh.nodes, data.connectivity[ids,:], LagrangeSpaceGeo[name], p, computeGradients=True, computeNormals=True)
+        space_ipvalues = LagrangeSpaceGeo[name].SetIntegrationRule(p,w)
+        for cpt, el in enumerate(ids):
+            xcoor = mesh.nodes[data.connectivity[el],:]
+            for ip in range(len(w)):
+                jack, jdet, jinv = space_ipvalues.GetJackAndDetI(ip,xcoor)
+                if abs(jdet-Jdet[cpt,ip]) > 1e-12 or np.max(np.abs(jinv(space_ipvalues.valdphidxi[ip])-gradPhi[cpt,ip])) > 1e-10:
+                    raise Exception("Error in ComputeGeometryAtIntegPoint (surface)")
+                if np.linalg.norm(space_ipvalues.GetNormal(jack)-normals[cpt,ip]) > 1e-12:
+                    raise Exception("Error in ComputeGeometryAtIntegPoint (normals)")
+
+    # cache
+    ClearAtIntegPointCache()
+    jdet = ComputeJdetAtIntegPoint(mesh, useCache=True)
+    jdet[:] = 0
+    if not np.array_equal(ComputeJdetAtIntegPoint(mesh, useCache=True), ComputeJdetAtIntegPoint(mesh)):
+        raise Exception("Error in the cache of ComputeJdetAtIntegPoint")
+    w, grad = ComputeGradPhiAtIntegPoint(mesh, useCache=True)
+    mesh.nodes *= 2
+    mesh.Modified()
+    w2, grad2 = ComputeGradPhiAtIntegPoint(mesh, useCache=True)
+    if not np.allclose(w2, 8*w) or not np.allclose(grad2[0].toarray(), grad[0].toarray()/2):
+        raise Exception("Error in the invalidation of the cache")
+    ComputeNormalsAtIntegPoint(mesh, ["x0"], useCache=True)
+    ComputePhiAtIntegPoint(mesh, useCache=True)
+    ClearAtIntegPointCache()
+    return "ok"
+
 def CheckIntegrity(GUI=False):
+    res = CheckIntegrityGeometryAtIntegPoint(GUI)
+    if res.lower() != "ok":
+        return res
+
     from BasicTools.FE.SymPhysics import MecaPhysics
 
     mecaPhysics = MecaPhysics()
@@ -4,10 +4,11 @@
 # file 'LICENSE.txt', which is part of this source code package.
 #
 import concurrent.futures
+import pickle
 import time
 
 import numpy as np
-from scipy.sparse import coo_matrix
+from scipy.sparse import coo_matrix, csr_matrix
 
 from BasicTools.NumpyDefs import PBasicIndexType, PBasicFloatType
 from BasicTools.Helpers.CPU import GetNumberOfAvailableCpus
@@ -23,7 +24,7 @@ from BasicTools.FE.Fields.IPField import IPField
 from BasicTools.FE.DofNumbering import ComputeDofNumbering
 from BasicTools.FE.FETools import PrepareFEComputation
 
-from BasicTools.FE.SymWeakForm import GetField, GetTestField, GetNormal
+from BasicTools.FE.SymWeakForm import GetField, GetTestField, GetNormal, GetConstant
 import BasicTools.FE.WeakForms.NumericalWeakForm as WeakForm
 from BasicTools.FE.IntegrationsRules import LagrangeIsoParam
 from BasicTools.FE.IntegrationsRules import IntegrationRulesAlmanac
@@ -31,6 +32,7 @@ from BasicTools.FE.IntegrationsRules import IntegrationRulesAlmanac
 
 UseCpp = True
 UseMultiThread =  True
+UseMultiProcess = False
 MultiThreadThreshold = 100
 
 def IntegrateGeneralMonoThread( mesh, wform, constants, fields, unkownFields=None, testFields=None, integrationRuleName=None,onlyEvaluation=False, elementFilter=None,userIntegrator=None, integrationRule=None):
@@ -95,6 +97,96 @@ def IntegrateGeneral( mesh, wform, constants, fields, unkownFields=None, testFie
     intClass.Compute()
     return intClass.GetK(),intClass.GetRhs()
 
+class PartialElementFilter(ElementFilter):
+    """ Utility class to create a partition of a ElementFilter"""
+
+    def __init__(self,elementFilter,partitions,partitionNumber):
+        super(PartialElementFilter,self).__init__()
+        self.partitions = partitions
+        self.parentfilter = elementFilter
+        self.partitionNumber = partitionNumber
+        self.mesh = elementFilter.mesh
+
+    def GetIdsToTreat(self,elements):
+        res = self.parentfilter.GetIdsToTreat(elements)
+        return np.array_split(res,self.partitions)[self.partitionNumber]
+
+    def Complementary(self):
+        for name,data,ids  in self.parentfilter.Complementary():
+            ids = np.array_split(ids,self.partitions)[self.partitionNumber]
+            if len(ids) == 0:
+                continue
+            yield name, data, ids
+
+def _InitSpaces(fields):
+    for f in fields:
+        if isinstance(f,IPField):
+            continue
+        for space in f.space.values():
+            space.Create()
+
+# state of a worker process of IntegrationClass.ComputeMultiProcess
+# (filled once per worker by _MultiProcessInitializer)
+_multiProcessState = {}
+
+def _MultiProcessInitializer(payloadName, payloadSize, buffersNames, buffersShapes):
+    """Function executed once in every worker process. The integration data
+    (mesh, filter, fields, weak form ...) is read from the shared memory block
+    and the output buffers (vK, iK, jK, rhs) are attached.
+    """
+    from multiprocessing import shared_memory
+
+    payload = shared_memory.SharedMemory(name=payloadName)
+    data = pickle.loads(payload.buf[0:payloadSize])
+    payload.close()
+
+    # only the spaces of the treated elements are created (sympy lambdify is expensive)
+    elementNames = [name for name, _data, ids in data["elementFilter"] if len(ids) ]
+    fields = [f for f in data["extraFields"] if not isinstance(f,IPField)]
+    for fs in (data["unkownFields"], data["testFields"]):
+        if fs is not None:
+            fields.extend(fs)
+    for name in elementNames:
+        LagrangeSpaceGeo[name].Create()
+        for f in fields:
+            f.space[name].Create()
+
+    buffers = {}
+    arrays = {}
+    for (name, shmName), (shape, dtype) in zip(buffersNames.items(), buffersShapes):
+        buffers[name] = shared_memory.SharedMemory(name=shmName)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=buffers[name].buf)
+
+    _multiProcessState.clear()
+    _multiProcessState.update(data)
+    _multiProcessState["buffers"] = buffers
+    _multiProcessState["arrays"] = arrays
+
+def _MultiProcessWorker(task):
+    """Integration of one partition of the element filter inside a worker process.
+    The results are written directly in the shared output buffers.
+    """
+    partitionNumber, partitions, rhsRow, start, stop = task
+    state = _multiProcessState
+    arrays = state["arrays"]
+
+    res = IntegrationClass()
+    res.nbCPUs = 1
+    res.SetIntegrator(state["integratorType"]())
+    res.SetMesh(state["mesh"])
+    res.SetOnlyEvaluation(state["onlyEvaluation"])
+    res.SetConstants(state["constants"])
+    res.SetUnkownFields(state["unkownFields"])
+    res.SetTestFields(state["testFields"])
+    res.SetExtraFields(state["extraFields"])
+    res.SetIntegrationRule(integrationRule=state["integrationRule"])
+    res.SetElementFilter(PartialElementFilter(state["elementFilter"],partitions,partitionNumber))
+    res.SetWeakForm(state["numericalWeakForm"])
+    res.PreStartCheck()
+    res.SetOutputObjects(arrays["vK"][start:stop],arrays["iK"][start:stop],arrays["jK"][start:stop],arrays["rhs"][rhsRow,:])
+    res.ComputeMonoThread()
+    return res.numberOfUsedvij
+
 @froze_it
 class IntegrationClass(BaseOutputObject):
     """ Class to define and execute an integration of a weak form
@@ -113,6 +205,7 @@ class IntegrationClass(BaseOutputObject):
         self.unkownFields = None
         self.testFields = None
         self.nbCPUs = GetNumberOfAvailableCpus()
+        self.useMultiProcess = UseMultiProcess
         self.onlyEvaluation = False
         self.constants = {}
         #----
@@ -121,6 +214,7 @@ class IntegrationClass(BaseOutputObject):
         self.jK = None
         self.numberOfUsedvij = 0
         self.rhs = None
+        self.partitions = None
         #----
 
         self.SetIntegrator()
@@ -165,6 +259,7 @@ class IntegrationClass(BaseOutputObject):
             unkownFields = []
         self.unkownFields = unkownFields
         self.integrator.SetUnkownFields(unkownFields)
+        self.partitions = None
 
     def SetTestFields(self, testFields):
         """Set the fields used for the test space
@@ -176,6 +271,7 @@ class IntegrationClass(BaseOutputObject):
         """
         self.testFields = testFields
         self.integrator.SetTestFields(testFields)
+        self.partitions = None
 
     def SetExtraFields(self, fields ):
         """Set the extra fields used in the weak formulation
@@ -232,6 +328,21 @@ class IntegrationClass(BaseOutputObject):
         else:
             self.integrator = userIntegrator
 
+    def SetUseMultiProcess(self, useMultiProcess):
+        """Set the useMultiProcess option. If true the integration is done
+        using a pool of processes (one process per cpu). The data is sent once
+        to every worker through shared memory and every worker writes its
+        results directly in shared vK, iK, jK and rhs buffers.
+        This is useful for integrators not able to work in multithread
+        (python integrator).
+
+        Parameters
+        ----------
+        useMultiProcess : bool
+            True to activate this option
+        """
+        self.useMultiProcess = useMultiProcess
+
     def SetMesh(self,mesh):
         """Set the mesh defining the integration domain
         Parameters
@@ -240,10 +351,12 @@ class IntegrationClass(BaseOutputObject):
             mesh containing the geometry
         """
         self.mesh = mesh
+        self.partitions = None
 
     def SetElementFilter(self, elementFilter=None):
         """Set the element filter to select the elements of the integration
         """
+        self.partitions = None
         if elementFilter is None:
             if self.mesh is None:
                 raise Exception("Need a mesh")
@@ -340,6 +453,11 @@ class IntegrationClass(BaseOutputObject):
             true to force the use of only one thread
 
         """
+        if self.useMultiProcess and not forceMonoThread and self.nbCPUs > 1 :
+            if self.elementFilter.ApplyOnElements(ElementCounter()).cpt >= MultiThreadThreshold:
+                self.PrintDebug(f"Integration multiprocess, nbCPUs={self.nbCPUs}")
+                return self.ComputeMultiProcess()
+
         if not self.integrator.IsMultiThread():
             self.PrintDebug("Integration with only one thread")
             return self.ComputeMonoThread()
@@ -351,52 +469,20 @@ class IntegrationClass(BaseOutputObject):
         if self.elementFilter.ApplyOnElements(ElementCounter()).cpt < MultiThreadThreshold:
             return self.ComputeMonoThread()
 
-        def InitSpaces(fields):
-            for f in fields:
-                if isinstance(f,IPField):
-                    continue
-                for space in f.space.values():
-                    space.Create()
-
         for space in LagrangeSpaceGeo.values():
             space.Create()
 
         if self.unkownFields is not None:
-            InitSpaces(self.unkownFields)
-        InitSpaces(self.extraFields)
+            _InitSpaces(self.unkownFields)
+        _InitSpaces(self.extraFields)
         if self.testFields is not None:
-            InitSpaces(self.testFields)
-
-        class PartialElementFilter(ElementFilter):
-            """ Utility class to create a partition of a ElementFilter"""
-
-            def __init__(self,elementFilter,partitions,partitionNumber):
-                super(PartialElementFilter,self).__init__()
-                self.partitions = partitions
-                self.parentfilter = elementFilter
-                self.partitionNumber = partitionNumber
-                self.mesh = elementFilter.mesh
-
-            def GetIdsToTreat(self,elements):
-                res = self.parentfilter.GetIdsToTreat(elements)
-                return np.array_split(res,self.partitions)[self.partitionNumber]
-
-            def Complementary(self):
-                for name,data,ids  in self.parentfilter.Complementary():
-                    ids = np.array_split(ids,self.partitions)[self.partitionNumber]
-                    if len(ids) == 0:
-                        continue
-                    yield name, data, ids
-
-        allworkload = [ PartialElementFilter(self.elementFilter,self.nbCPUs,i) for i in range(self.nbCPUs)  ]
-        workload = []
+            _InitSpaces(self.testFields)
 
+        workload = []
         cpt = 0
-        for f in allworkload:
-            if f.ApplyOnElements(ElementCounter()).cpt > 0:
-                numberOfVIJ = self.integrator.ComputeNumberOfVIJ(self.mesh,f)
-                workload.append((f,self.vK[cpt:numberOfVIJ+cpt],self.iK[cpt:numberOfVIJ+cpt],self.jK[cpt:numberOfVIJ+cpt]) )
-                cpt += numberOfVIJ
+        for f, start, stop in self._GetPartitions():
+            workload.append((f,self.vK[start:stop],self.iK[start:stop],self.jK[start:stop]) )
+            cpt = stop
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.nbCPUs) as executor:
             results =  executor.map(self._InternalComputeMonoThreadSafe,workload)
@@ -404,6 +490,99 @@ class IntegrationClass(BaseOutputObject):
                 self.rhs += rhs
         self.numberOfUsedvij = cpt
 
+    def _GetPartitions(self):
+        """Split the element filter in self.nbCPUs partitions.
+        The partitions are kept until the mesh, the element filter or the
+        fields are changed.
+
+        Returns
+        -------
+        list of (PartialElementFilter, int, int)
+            the non empty partitions and the range (start, stop) in the vK, iK, jK
+            vectors to be used by each partition
+        """
+        if self.partitions is not None and self.partitions[0] == self.nbCPUs:
+            return self.partitions[1]
+
+        res = []
+        cpt = 0
+        for i in range(self.nbCPUs):
+            f = PartialElementFilter(self.elementFilter,self.nbCPUs,i)
+            if f.ApplyOnElements(ElementCounter()).cpt > 0:
+                numberOfVIJ = self.integrator.ComputeNumberOfVIJ(self.mesh,f)
+                res.append((f,cpt,cpt+numberOfVIJ))
+                cpt += numberOfVIJ
+        self.partitions = (self.nbCPUs, res)
+        return res
+
+    def ComputeMultiProcess(self):
+        """Execute the integration using a pool of processes (self.nbCPUs processes).
+
+        The data needed for the integration (mesh, element filter, fields,
+        weak form, ...) is pickled only once in a shared memory block read by
+        every worker at startup. Every worker integrates partitions of the
+        element filter and writes the results directly in shared vK, iK, jK
+        and rhs buffers.
+        """
+        from multiprocessing import shared_memory
+
+        partitions = self._GetPartitions()
+        cpt = partitions[-1][2] if len(partitions) else 0
+
+        data = {"mesh": self.mesh,
+                "elementFilter": self.elementFilter,
+                "numericalWeakForm": self.numericalWeakForm,
+                "constants": self.constants,
+                "unkownFields": self.unkownFields,
+                "testFields": self.testFields,
+                "extraFields": self.extraFields,
+                "integrationRule": self.integrationRule,
+                "onlyEvaluation": self.onlyEvaluation,
+                "integratorType": type(self.integrator) }
+
+        payloadBytes = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        sharedBlocks = []
+        arrays = {}
+        try:
+            payload = shared_memory.SharedMemory(create=True, size=max(len(payloadBytes),1))
+            sharedBlocks.append(payload)
+            payload.buf[0:len(payloadBytes)] = payloadBytes
+            del payloadBytes
+
+            buffersNames = {}
+            buffersShapes = []
+            for name, shape, dtype in [("vK", self.vK.shape, self.vK.dtype),
+                                       ("iK", self.iK.shape, self.iK.dtype),
+                                       ("jK", self.jK.shape, self.jK.dtype),
+                                       ("rhs", (max(len(partitions),1), self.rhs.shape[0]), self.rhs.dtype) ]:
+                block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape))*np.dtype(dtype).itemsize,1))
+                sharedBlocks.append(block)
+                buffersNames[name] = block.name
+                buffersShapes.append((shape,dtype))
+                arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+                arrays[name].fill(0)
+
+            tasks = [ (f.partitionNumber, self.nbCPUs, i, start, stop) for i, (f, start, stop) in enumerate(partitions)]
+
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(self.nbCPUs,max(len(tasks),1)),
+                                                        initializer=_MultiProcessInitializer,
+                                                        initargs=(payload.name, payload.size, buffersNames, buffersShapes)) as executor:
+                for _numberOfUsedvij in executor.map(_MultiProcessWorker,tasks):
+                    pass
+
+            self.vK[0:cpt] = arrays["vK"][0:cpt]
+            self.iK[0:cpt] = arrays["iK"][0:cpt]
+            self.jK[0:cpt] = arrays["jK"][0:cpt]
+            self.rhs += np.sum(arrays["rhs"],axis=0)
+        finally:
+            # the numpy views must be released before closing the blocks
+            arrays.clear()
+            for block in sharedBlocks:
+                block.close()
+                block.unlink()
+
+        self.numberOfUsedvij = cpt
+
     def _InternalComputeMonoThreadSafe(self,elementFilter_vK_iK_jK):
         elementFilter,vK,iK,jK =elementFilter_vK_iK_jK
         res = IntegrationClass()
@@ -492,6 +671,125 @@ class IntegrationClass(BaseOutputObject):
         return self.rhs
 
 
+@froze_it
+class AssemblyPlan(BaseOutputObject):
+    """Class to execute repeated integrations of the same weak form on the
+    same mesh and element filter (Newton loops, optimization iterations ...),
+    only the values of the constants and of the extra fields can change
+    between calls.
+
+    The first call to Compute() does a normal integration and keeps the
+    IntegrationClass (partitioning and preallocated vK, iK, jK, rhs buffers)
+    and the permutation from the COO triplets to the CSR storage. The next
+    calls only refill the values of the same CSR matrix.
+
+    For more information about the arguments please refer to IntegrationClass
+    """
+    def __init__(self, mesh, wform, constants, fields, unkownFields=None, testFields=None,
+                       integrationRuleName=None, onlyEvaluation=False, elementFilter=None,
+                       userIntegrator=None, integrationRule=None):
+        super(AssemblyPlan,self).__init__()
+        self.intClass = IntegrationClass()
+        self.intClass.SetIntegrator(userIntegrator)
+        self.intClass.SetMesh(mesh)
+        self.intClass.SetOnlyEvaluation(onlyEvaluation)
+        self.intClass.SetElementFilter(elementFilter)
+        self.intClass.SetConstants(constants)
+        self.intClass.SetUnkownFields(unkownFields)
+        self.intClass.SetTestFields(testFields)
+        self.intClass.SetExtraFields(fields)
+        self.intClass.SetIntegrationRule(integrationRuleName=integrationRuleName,integrationRule=integrationRule)
+        self.intClass.SetWeakForm(wform)
+        self.intClass.PreStartCheck()
+        self.intClass.Allocate()
+        #----
+        self.K = None
+        self.keys = None
+        self.permutation = None
+        self.iK = None
+        self.jK = None
+
+    def Compute(self, constants=None, fields=None):
+        """Execute the integration
+
+        Parameters
+        ----------
+        constants : dict, optional
+            new values of the constants, if None the previous constants are used
+        fields : list(FEField or IPField), optional
+            new extra fields, if None the previous fields are used
+
+        Returns
+        -------
+        K : csr_matrix
+            the asembled matrix. The same object is returned by every call,
+            its values are overwritten by the next call. If new entries
+            appear, the sparsity pattern of this object is extended in place
+            (the entries of the previous pattern are kept, with zero values)
+        rhs : ndarray
+            Array with the values of the right hand side term (overwritten by
+            the next call)
+        """
+        intClass = self.intClass
+        if constants is not None:
+            intClass.SetConstants(constants)
+        if fields is not None:
+            intClass.SetExtraFields(fields)
+            intClass.PreStartCheck()
+
+        intClass.Reset()
+        intClass.vK.fill(0)
+        intClass.rhs.fill(0)
+        intClass.Compute()
+
+        if self.K is None:
+            self._BuildStructure()
+        else:
+            self._FillValues()
+
+        return self.K, intClass.GetRhs()
+
+    def _BuildStructure(self):
+        vK, (iK, jK) = self.intClass.GetKvij()
+        nbRows, nbCols = self.intClass.GetLinearSystemSize()
+        keys = iK.astype(np.int64)*nbCols + jK
+        if self.keys is None:
+            self.keys, self.permutation = np.unique(keys, return_inverse=True)
+        else:
+            # the previous pattern is kept (union), so the structure is stable
+            self.keys = np.union1d(self.keys, keys)
+            self.permutation = np.searchsorted(self.keys, keys)
+        self.iK = np.array(iK)
+        self.jK = np.array(jK)
+
+        indices = (self.keys % nbCols).astype(PBasicIndexType)
+        indptr = np.zeros(nbRows+1,dtype=PBasicIndexType)
+        np.cumsum(np.bincount(self.keys // nbCols, minlength=nbRows), out=indptr[1:])
+        data = np.bincount(self.permutation, weights=vK, minlength=len(self.keys))
+        if self.K is None:
+            self.K = csr_matrix((data, indices, indptr), shape=(nbRows, nbCols))
+        else:
+            # update of the structure in place (the same object is returned)
+            self.K.data = data
+            self.K.indices = indices
+            self.K.indptr = indptr
+
+    def _FillValues(self):
+        vK, (iK, jK) = self.intClass.GetKvij()
+        if len(iK) == len(self.iK) and np.array_equal(iK, self.iK) and np.array_equal(jK, self.jK):
+            permutation = self.permutation
+        else:
+            # the integrators do not store the zero entries, so the triplets
+            # can change from one call to the other
+            keys = iK.astype(np.int64)*self.K.shape[1] + jK
+            permutation = np.searchsorted(self.keys, keys)
+            if np.any(permutation == len(self.keys)) or np.any(self.keys[np.minimum(permutation,len(self.keys)-1)] != keys):
+                self.PrintVerbose("New entries in the operator, rebuilding the sparsity pattern")
+                return self._BuildStructure()
+
+        self.K.data[:] = np.bincount(permutation, weights=vK, minlength=len(self.keys))
+
+
 def CheckIntegrityNormalFlux(GUI=False):
     from BasicTools.Containers.UnstructuredMeshCreationTools import CreateMeshOf
 
@@ -858,7 +1156,108 @@ def CheckIntegrityIntegrationWithIntegrationPointField(GUI=False):
 
     return "ok"
 
+def CheckIntegrityMultiProcess(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    import BasicTools.FE.Integrators.PythonIntegration as PI
+
+    mesh = CreateCube([6.,7.,8.],[-1.0,-1.0,-1.0],[2./10, 2./10,2./10])
+    space, numberings, _offset, _NGauss = PrepareFEComputation(mesh,numberOfComponents=1)
+
+    tField = GetField("T",1)
+    tFieldTest = GetTestField("T",1)
+    weakForm = tField.T*tFieldTest + 1*tFieldTest
+
+    unkownFields = [FEField("T",mesh=mesh,space=space,numbering=numberings[0]) ]
+    elemFilt = ElementFilter(mesh,dimensionality=3)
 
+    K,F = IntegrateGeneralMonoThread(mesh=mesh, wform=weakForm, constants={}, fields=[],
+                    unkownFields=unkownFields, elementFilter=elemFilt,userIntegrator=PI.MonoElementsIntegral())
+
+    intClass = IntegrationClass()
+    intClass.SetIntegrator(PI.MonoElementsIntegral())
+    intClass.SetUseMultiProcess(True)
+    intClass.nbCPUs = 2
+    intClass.SetMesh(mesh)
+    intClass.SetElementFilter(elemFilt)
+    intClass.SetConstants({})
+    intClass.SetUnkownFields(unkownFields)
+    intClass.SetTestFields(None)
+    intClass.SetExtraFields([])
+    intClass.SetIntegrationRule()
+    intClass.SetWeakForm(weakForm)
+    intClass.PreStartCheck()
+    intClass.Allocate()
+    intClass.Compute()
+
+    error = abs(intClass.GetK().tocsr()-K.tocsr()).max()
+    if error > 1e-14:
+        print("Error in the operator with multiprocess integration : ", error)
+        return "KO"
+
+    error = np.max(abs(intClass.GetRhs()-F))
+    if error > 1e-14:
+        print("Error in the rhs with multiprocess integration : ", error)
+        return "KO"
+
+    return "ok"
+
+def CheckIntegrityAssemblyPlan(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+
+    mesh = CreateCube([3.,4.,5.],[-1.0,-1.0,-1.0],[2./10, 2./10,2./10])
+    space, numberings, _offset, _NGauss = PrepareFEComputation(mesh,numberOfComponents=1)
+
+    tField = GetField("T",1)
+    F = GetField("F",1)
+    alpha = GetConstant("alpha")
+    tFieldTest = GetTestField("T",1)
+    weakForm = alpha*tField.T*tFieldTest + F.T*tFieldTest
+
+    unkownFields = [FEField("T",mesh=mesh,space=space,numbering=numberings[0]) ]
+    fField = FEField("F",mesh,space,numberings[0])
+    fField.Allocate(1)
+    elemFilt = ElementFilter(mesh,dimensionality=3)
+
+    plan = AssemblyPlan(mesh=mesh, wform=weakForm, constants={"alpha":1.}, fields=[fField],
+                    unkownFields=unkownFields, elementFilter=elemFilt)
+
+    indptr = None
+    for alphaValue, fValue in [(1.,1.), (2.,3.), (0.,1.), (5.,-1.)]:
+        fField.data.fill(fValue)
+        K,rhs = plan.Compute(constants={"alpha":alphaValue})
+        if indptr is None:
+            indptr = K.indptr.copy()
+            indices = K.indices.copy()
+        elif not (np.array_equal(indptr,K.indptr) and np.array_equal(indices,K.indices)):
+            print("The structure of the operator changed")
+            return "KO"
+
+        KRef,rhsRef = IntegrateGeneral(mesh=mesh, wform=weakForm, constants={"alpha":alphaValue}, fields=[fField],
+                    unkownFields=unkownFields, elementFilter=elemFilt)
+
+        error = abs(K-KRef.tocsr()).max()
+        if error > 1e-14:
+            print("Error in the operator with the assembly plan : ", error)
+            return "KO"
+
+        error = np.max(abs(rhs-rhsRef))
+        if error > 1e-14:
+            print("Error in the rhs with the assembly plan : ", error)
+            return "KO"
+
+    # new entries in the operator : the structure is extended in place
+    plan = AssemblyPlan(mesh=mesh, wform=weakForm, constants={"alpha":0.}, fields=[fField],
+                    unkownFields=unkownFields, elementFilter=elemFilt)
+    K0, _ = plan.Compute()
+    nnz0 = K0.nnz
+    K,rhs = plan.Compute(constants={"alpha":2.})
+    KRef,rhsRef = IntegrateGeneral(mesh=mesh, wform=weakForm, constants={"alpha":2.}, fields=[fField],
+                unkownFields=unkownFields, elementFilter=elemFilt)
+    if K is not K0 or K.nnz <= nnz0 or abs(K-KRef.tocsr()).max() > 1e-14:
+        print("Error in the assembly plan with new entries in the operator")
+        return "KO"
+
+    return "ok"
 
 def CheckIntegrity(GUI=False):
     import BasicTools.FE.Integration as BTFEI
@@ -880,6 +1279,12 @@ def CheckIntegrity(GUI=False):
 
     print("Integration with IPField OK")
 
+    if CheckIntegrityMultiProcess(GUI).lower() != "ok":
+        return "Not ok in the multiprocess integration"
+
+    if CheckIntegrityAssemblyPlan(GUI).lower() != "ok":
+        return "Not ok in the integration with an assembly plan"
+
     problems = [ (1,1,"A bars 1D"),
                  (1,2,"A bars 2D"),
                  (1,3,"A bars 3D"),
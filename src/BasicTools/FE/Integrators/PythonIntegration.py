@@ -45,6 +45,8 @@ class MonoElementsIntegral(BOO):
     * hasnormal        : (computed Automatically)
     * __usedSpaces__
     * geoSpaceNumber
+    * batchSize        : number of elements treated at the same time (vectorized
+                         integration), if 0 the elements are treated one by one
     """
     def __init__(self):
         super(MonoElementsIntegral,self).__init__()
@@ -81,6 +83,7 @@ class MonoElementsIntegral(BOO):
         self.__usedValues__ = None
         self.__usedValuesAtIP__ = None
         self.geoSpaceNumber = 0
+        self.batchSize = 1024
 
         # internal variables dependent on the current element type been treated
         # (internal use only )
@@ -226,6 +229,9 @@ class MonoElementsIntegral(BOO):
             constantNames.append(x)
 
         ## spaces treatement
+        # the geoSpace is set by ActivateElementType, reset it in case of
+        # a second integration with the same integrator
+        self.geoSpace = None
         spacesId = {}
         spacesNames = {}
         spacesId[id(self.geoSpace)] = self.geoSpace
@@ -389,6 +395,116 @@ class MonoElementsIntegral(BOO):
         wform: (PyWeakForm) Python Or C++ version of the weak form to be integrated
         idstotreat:  list like (int) ids of the element to treat
         """
+        if self.batchSize > 0:
+            self.IntegrateBatched(wform,idstotreat)
+        else:
+            self.IntegrateElementByElement(wform,idstotreat)
+
+    def IntegrateBatched(self,wform,idstotreat):
+        """
+        Vectorized integration, the elements are treated by blocks of
+        batchSize elements (the jacobians and the contributions of every
+        monomial are computed for all the elements of the block at once)
+        wform: (PyWeakForm) Python Or C++ version of the weak form to be integrated
+        idstotreat:  list like (int) ids of the element to treat
+        """
+        constantsNumerical = np.array([self.__cfs__[x] for x in self.__cfs__],dtype=PBasicFloatType)
+        idstotreat = np.asarray(idstotreat,dtype=PBasicIndexType)
+        numberOfIntegrationPoints = len(self.w)
+        numberOfFields = len(self.__usedSpaces__)
+
+        for start in range(0,len(idstotreat),self.batchSize):
+            ids = idstotreat[start:start+self.batchSize]
+            nbElements = len(ids)
+            xcoor = self.nodes[self.connectivity[ids],:]
+            localNumbering = [None if numbering is None else numbering[ids,:] for numbering in self.localNumbering]
+
+            ev = []
+            ei = []
+            ej = []
+
+            for ip in range(numberOfIntegrationPoints):
+                #we recover the jacobian matrices of all the elements of the block
+                Jack, Jdet, Jinv = self.geoSpace.GetJackAndDetIVectorized(ip,xcoor)
+
+                NxNyNzI = [None] *numberOfFields
+                BxByBzI = [None] *numberOfFields
+                for i in range(numberOfFields):
+                    if self.localSpaces[i] is not None:
+                        NxNyNzI[i] = self.localSpaces[i].valN[ip]
+                        BxByBzI[i] = np.einsum("esd,dn->esn", Jinv, self.localSpaces[i].valdphidxi[ip])
+
+                if self.hasnormal:
+                    normal = self.geoSpace.GetNormalVectorized(Jack)
+
+                for monom in wform:
+                    factor = np.full(nbElements,monom.prefactor,dtype=PBasicFloatType)
+                    if not self.onlyEvaluation :
+                        # for the integration we multiply by the deteminant of the jac
+                        factor *= Jdet
+                        factor *= self.w[ip]
+
+                    hasright = False
+
+                    for term in monom:
+
+                        if term.internalType == term.EnumNormal :
+                            factor *= normal[:,term.derDegree]
+                        elif  term.internalType == term.EnumConstant :
+                            factor *= constantsNumerical[term.valuesIndex_]
+                        elif  term.internalType == term.EnumUnknownField :
+                            if term.derDegree == 1:
+                                right = BxByBzI[term.spaceIndex_][:,term.derCoordIndex_,:]
+                            else:
+                                right = NxNyNzI[term.spaceIndex_][None,:]
+                            rightNumbering = localNumbering[term.numberingIndex_] + self.unkownDofsOffset[term.valuesIndex_]
+                            hasright = True
+                        elif  term.internalType == term.EnumTestField :
+                            if term.derDegree == 1:
+                                left = BxByBzI[term.spaceIndex_][:,term.derCoordIndex_,:]
+                            else:
+                                left = NxNyNzI[term.spaceIndex_][None,:]
+                            leftNumbering = localNumbering[term.numberingIndex_] + self.testDofsOffset[term.valuesIndex_]
+                        elif term.internalType == term.EnumExtraField :
+                            if term.derDegree == 1:
+                                func = BxByBzI[term.spaceIndex_][:,term.derCoordIndex_,:]
+                            else:
+                                func = NxNyNzI[term.spaceIndex_][None,:]
+                            vals = self.__usedValues__[term.valuesIndex_][localNumbering[term.numberingIndex_]]
+                            factor *= np.sum(func*vals,axis=1)
+                        elif term.internalType == term.EnumExtraIPField :
+                            if term.derDegree == 1:
+                                raise Exception("Integration point field cant be derivated")
+                            factor *= self.__usedValuesAtIP__[term.valuesIndex_][ids,ip]
+                        else :
+                            raise(Exception("Cant treat term " + str(term.fieldName)))
+
+                    if hasright:
+                        values = (left*factor[:,None])[:,:,None]*right[:,None,:]
+                        ev.append(values.ravel())
+                        ei.append(np.broadcast_to(leftNumbering[:,:,None],values.shape).ravel())
+                        ej.append(np.broadcast_to(rightNumbering[:,None,:],values.shape).ravel())
+                    else:
+                        np.add.at(self.F, leftNumbering, np.broadcast_to(left*factor[:,None],leftNumbering.shape))
+
+            if len(ev):
+                data = coo_matrix((np.concatenate(ev), (np.concatenate(ei),np.concatenate(ej))), shape=( self.totalTestDofs,self.totalUnkownDofs))
+                data.sum_duplicates()
+                data.eliminate_zeros()
+                start = self.totalvijcpt
+                stop = start+len(data.data)
+
+                self.vK[start:stop] = data.data
+                self.iK[start:stop] = data.row
+                self.jK[start:stop] = data.col
+                self.totalvijcpt += len(data.data)
+
+    def IntegrateElementByElement(self,wform,idstotreat):
+        """
+        Integration treating the elements one by one
+        wform: (PyWeakForm) Python Or C++ version of the weak form to be integrated
+        idstotreat:  list like (int) ids of the element to treat
+        """
         constantsNumerical = np.empty(len(self.__cfs__))
         cpt =0
         for x in self.__cfs__:
@@ -500,9 +616,9 @@ class MonoElementsIntegral(BOO):
                                 l2cpt += 1
 
                         l2cpt = fillcpt
-                        for j in range(l2) :
-                            for i in range(l1):
-                                ei[l2cpt] = leftNumbering[j]
+                        for i in range(l1):
+                            for j in range(l2) :
+                                ei[l2cpt] = leftNumbering[i]
                                 l2cpt += 1
                         fillcpt += l
                     else:
@@ -546,7 +662,88 @@ class MonoElementsIntegral(BOO):
 
 
 
+def CheckIntegrityBatched(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube, CreateMeshOf
+    from BasicTools.Containers.UnstructuredMeshModificationTools import ComputeSkin
+    from BasicTools.Containers.Filters import ElementFilter
+    import BasicTools.Containers.ElementNames as EN
+    from BasicTools.FE.Integration import IntegrateGeneralMonoThread
+    from BasicTools.FE.FETools import PrepareFEComputation
+    from BasicTools.FE.Fields.IPField import IPField
+    from BasicTools.FE.IntegrationsRules import LagrangeIsoParam
+    from BasicTools.FE.MaterialHelp import HookeIso
+    from BasicTools.FE.SymWeakForm import GetField, GetTestField, GetNormal, Strain, ToVoigtEpsilon, GetConstant, space as symSpace
+
+    def Compare(mesh, wform, dofs, elementFilter, constants={}, fields=[], numberOfComponents=1):
+        space, numberings, _offset, _NGauss = PrepareFEComputation(mesh,numberOfComponents=numberOfComponents)
+        unkownFields = [FEField(name,mesh=mesh,space=space,numbering=numberings[i]) for i, name in enumerate(dofs)]
+        results = []
+        for batchSize in [0, 7, 1024]:
+            integrator = MonoElementsIntegral()
+            integrator.batchSize = batchSize
+            K, F = IntegrateGeneralMonoThread(mesh=mesh, wform=wform, constants=constants, fields=fields,
+                unkownFields=unkownFields, elementFilter=elementFilter, userIntegrator=integrator)
+            results.append((K.tocsr(),F))
+        scale = max(abs(results[0][0]).max(), np.max(abs(results[0][1])))
+        for K, F in results[1:]:
+            error = max(abs(K-results[0][0]).max() if K.nnz else 0., np.max(abs(F-results[0][1])))
+            if error > 1e-12*scale:
+                raise Exception("Error in the batched integration : " + str(error))
+
+    # elasticity on tetrahedrons, with an extra field, an ip field and a constant
+    mesh = CreateCube([3,4,5],[-1.0,-1.0,-1.0],[0.5, 0.4, 0.3], ofTetras=True)
+    mesh.nodes += np.random.rand(*mesh.nodes.shape)*0.05
+    mesh.ConvertDataForNativeTreatment()
+    space, numberings, _offset, _NGauss = PrepareFEComputation(mesh,numberOfComponents=1)
+    tField = FEField("T",mesh=mesh,space=space,numbering=numberings[0])
+    tField.Allocate(0)
+    tField.data[:] = np.random.rand(len(tField.data))
+    rhoField = IPField("rho",mesh=mesh,rule=LagrangeIsoParam)
+    rhoField.Allocate(0)
+    for data in rhoField.data.values():
+        data[:] = np.random.rand(*data.shape)
+
+    x, y, z = symSpace
+    u = GetField("u",3)
+    ut = GetTestField("u",3)
+    T = GetField("T",1)[0]
+    rho = GetField("rho",1)[0]
+    alpha = GetConstant("alpha")
+    weak = (ToVoigtEpsilon(Strain(u,3)).T@HookeIso(1.,0.3,dim=3)@ToVoigtEpsilon(Strain(ut,3)))[0,0]*alpha
+    weak += T.diff(x)*rho*ut[0] + T*ut[1] + rho*u[2]*ut[2] + u[0].diff(y)*ut[1]
+    Compare(mesh, weak, ["u_0","u_1","u_2"], ElementFilter(mesh,dimensionality=3), constants={"alpha":2.}, fields=[tField, rhoField], numberOfComponents=3)
+
+    # surfaces in 3D with normals (non square jacobians)
+    skin = ComputeSkin(mesh,md=3)
+    skin.ConvertDataForNativeTreatment()
+    p = GetField("p",1)[0]
+    pt = GetTestField("p",1)[0]
+    weak = p*pt + p.diff(x)*pt.diff(x) + p.diff(z)*pt.diff(y) + GetNormal(3)[2]*pt
+    Compare(skin, weak, ["p"], ElementFilter(skin,dimensionality=2))
+
+    # bars in 2D
+    mesh = CreateMeshOf([[0,0],[1,0],[2,1],[3,3]],[[0,1],[1,2],[2,3]],EN.Bar_2)
+    mesh.ConvertDataForNativeTreatment()
+    weak = p.diff(x)*pt.diff(x) + GetNormal(2)[0]*pt
+    Compare(mesh, weak, ["p"], ElementFilter(mesh,dimensionality=1))
+
+    return "ok"
+
+def CheckIntegritySetIntegrationRule(GUI=False):
+    from BasicTools.FE.IntegrationsRules import LagrangeP1, IntegrationRulesAlmanac
+    integrator = MonoElementsIntegral()
+    integrator.SetIntegrationRule(None)
+    if integrator.integrationRule is not LagrangeP1:
+        raise Exception("Error in the default integration rule")
+    integrator.SetIntegrationRule("LagrangeIsoParam")
+    if integrator.integrationRule is not IntegrationRulesAlmanac["LagrangeIsoParam"]:
+        raise Exception("Error setting the integration rule by name")
+    return "ok"
+
 def CheckIntegrity():
+    CheckIntegritySetIntegrationRule()
+    CheckIntegrityBatched()
+
     import BasicTools.FE.Integration as Integration
     backup  = Integration.UseCpp
 
@@ -8,9 +8,86 @@ import numpy as np
 
 from BasicTools.Containers.Filters import ElementFilter
 from BasicTools.FE.KR.KRBase import KRBaseVector
-from BasicTools.Containers.Octree import Octree
-
-
+from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
+
+
+
+def GetTransformedNodes(mesh, tags, base):
+    """Return the ids (sorted) of the nodes used by the elements in tags and
+    their coordinates in the base
+
+    Parameters
+    ----------
+    mesh : UnstructuredMesh
+        the mesh
+    tags : List[str]
+        element tags of the zone
+    base : Transform
+        the transformation applied to the nodes
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        usedNodes, nodes
+    """
+    usedNodes = [np.empty(0, dtype=PBasicIndexType)]
+    ef = ElementFilter(mesh,tags=tags)
+    for name,data, ids in ef:
+        usedNodes.append(data.connectivity[ids,:].ravel())
+    usedNodes = np.unique(np.concatenate(usedNodes)).astype(PBasicIndexType)
+    nodes = base.ApplyTransform(mesh.nodes[usedNodes,:])
+    return usedNodes, nodes
+
+def MatchNodes(nodesI, nodesII, tol):
+    """Pair every point of nodesI with its closest point in nodesII if the
+    distance is smaller than tol (one kd-tree query for all the points)
+
+    Parameters
+    ----------
+    nodesI : np.ndarray
+        (n,dim) array of points
+    nodesII : np.ndarray
+        (m,dim) array of points
+    tol : float
+        maximal distance between two matching points
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        idsI, idsII : nodesI[idsI[k]] matches nodesII[idsII[k]], idsI is sorted
+    """
+    if len(nodesI) == 0 or len(nodesII) == 0:
+        return np.empty(0, dtype=PBasicIndexType), np.empty(0, dtype=PBasicIndexType)
+
+    from scipy.spatial import cKDTree
+    # the bound of the query is exclusive and compared to the squared
+    # distances, so it is slightly enlarged (np.nextafter(0.,1.)**2 is 0) to
+    # accept the distances equal to tol (and the coincident nodes for
+    # tol = 0). The exact test is done on the returned distances
+    distances, ids = cKDTree(nodesII).query(nodesI, k=1, distance_upper_bound=tol*(1+1e-10)+1e-150)
+    idsI = np.flatnonzero(distances <= tol).astype(PBasicIndexType)
+    return idsI, ids[idsI].astype(PBasicIndexType)
+
+def GetPointsDofs(numbering, pointIds, nbPoints):
+    """Return the dofs of the points pointIds (-1 for points without dof)
+
+    Parameters
+    ----------
+    numbering : DofNumbering
+        the numbering of the field
+    pointIds : np.ndarray
+        ids of the points
+    nbPoints : int
+        number of points of the mesh
+
+    Returns
+    -------
+    np.ndarray
+        the dofs of the points
+    """
+    pointDofs = np.full(nbPoints, -1, dtype=PBasicIndexType)
+    pointDofs[np.asarray(numbering.doftopointLeft, dtype=PBasicIndexType)] = numbering.doftopointRight
+    return pointDofs[pointIds]
 
 class KRConformalTieVector(KRBaseVector):
     def __init__(self):
@@ -66,44 +143,14 @@ class KRConformalTieVector(KRBaseVector):
         else:
             argsII = self.argsII
 
-        #submesh1 = ExtractElementByTags(meshI,self.on,cleanLonelyNodes=False)
-        #submesh2 = ExtractElementByTags(meshII,self.onII,cleanLonelyNodes=False)
-
-        meshI.ComputeBoundingBox()
-        meshII.ComputeBoundingBox()
-
-        bmin1 = meshI.boundingMin
-        bmax1 = meshI.boundingMax
-        bmin2 = meshII.boundingMin
-        bmax2 = meshII.boundingMax
-
         fieldDicI = {f.name:f for f in fields }
-        fieldDicII = {f.name:f for f in fields }
+        fieldDicII = {f.name:f for f in fieldsII }
 
         offsets  , fieldOffsetsI, totalNumberOfDofsI  = self._ComputeOffsets(fields)
         offsetsII, fieldOffsetsII, totalNumberOfDofsII = self._ComputeOffsets(fieldsII)
 
-        oc1 = Octree(bmax1[0],bmax1[1],bmax1[2],bmin1[0],bmin1[1],bmin1[2])
-        oc2 = Octree(bmax2[0],bmax2[1],bmax2[2],bmin2[0],bmin2[1],bmin2[2])
-
-
-        def FillOctree(mesh,oc, tags, base ):
-            usedNodes = set()
-
-            ef = ElementFilter(mesh,tags=tags)
-            for name,data, ids in ef:
-                nids = data.GetNodesIdFor(ids)
-                usedNodes.update(nids)
-
-            usedNodes = list(usedNodes)
-            nodes = base.ApplyTransform(mesh.nodes[usedNodes,:])
-            for cpt,nid in enumerate(usedNodes):
-                oc.add_item(nid,nodes[cpt])
-
-            return (usedNodes, nodes)
-
-        usedNodesMeshI, nodesI  = FillOctree(meshI,oc1, self.on, self.originSystem.GetOrthoNormalBase())
-        usedNodesMeshII, nodesII = FillOctree(meshII,oc2,self.onII, self.targetSystem.GetOrthoNormalBase())
+        usedNodesMeshI, nodesI = GetTransformedNodes(meshI, self.on, self.originSystem.GetOrthoNormalBase())
+        usedNodesMeshII, nodesII = GetTransformedNodes(meshII, self.onII, self.targetSystem.GetOrthoNormalBase())
 
         ffI = []
         usedOffsetsI = []
@@ -113,43 +160,41 @@ class KRConformalTieVector(KRBaseVector):
         for arg, argII in zip(self.args,argsII):
 
             if arg in fieldDicI.keys():
-                dim = 1
                 ffI.append(fieldDicI[arg])
                 usedOffsetsI.append(fieldOffsetsI[arg])
                 ffII.append(fieldDicII[argII])
                 usedOffsetsII.append(fieldOffsetsII[argII])
             else:
-                dim =0
-                #field = fieldDic[arg+"_0"]
                 for i in range(3):
                     if arg+"_"+str(i) in fieldDicI:
-                        dim += 1
                         ffI.append(fieldDicI[arg+"_"+str(i)])
                         usedOffsetsI.append(fieldOffsetsI[arg+"_"+str(i)])
                         ffII.append(fieldDicII[argII+"_"+str(i)])
-                        usedOffsetsII.append(fieldOffsetsI[argII+"_"+str(i)])
+                        usedOffsetsII.append(fieldOffsetsII[argII+"_"+str(i)])
                     else:
                         break
 
+        idsI, idsII = MatchNodes(nodesI, nodesII, self.tol)
+        nidsI = usedNodesMeshI[idsI]
+        nidsII = usedNodesMeshII[idsII]
+
+        # one equation per pair and per field : dof(I) - dof(II) = 0
+        firstNumbering = np.empty((len(nidsI),len(ffI)), dtype=PBasicIndexType)
+        secondNumbering = np.empty((len(nidsI),len(ffI)), dtype=PBasicIndexType)
+        for i in range(len(ffI)):
+            firstNumbering[:,i] = GetPointsDofs(ffI[i].numbering, nidsI, meshI.GetNumberOfNodes())
+            secondNumbering[:,i] = GetPointsDofs(ffII[i].numbering, nidsII, meshII.GetNumberOfNodes())
 
-        for cpt,nidI in enumerate(usedNodesMeshI):
-            posI = nodesI[cpt,:]
-            entries = oc2.find_within_range_cube(nodesI[cpt,:], self.tol)
-            for entry in entries:
-                posII, nidII = entry
-                dist = np.linalg.norm(posII - posI)
-                if dist > self.tol:
-                    continue
-
-                for i in range(len(ffI)):
-                    firstOff = usedOffsetsI[i]
-                    firstNumbering = ffI[i].numbering.GetDofOfPoint(nidI)+firstOff
-                    secondOff = usedOffsetsII[i]
-                    secondNumbering = ffII[i].numbering.GetDofOfPoint(nidII) + secondOff
-                    CH.AddFactor(firstNumbering,1)
-                    CH.AddFactor(secondNumbering,-1)
-                    CH.NextEquation()
-                break
+        # pairs with points without dofs are ignored
+        mask = np.all(firstNumbering >= 0, axis=1) & np.all(secondNumbering >= 0, axis=1)
+        firstNumbering = firstNumbering[mask,:] + np.asarray(usedOffsetsI, dtype=PBasicIndexType)
+        secondNumbering = secondNumbering[mask,:] + np.asarray(usedOffsetsII, dtype=PBasicIndexType)
+
+        nbEquations = firstNumbering.size
+        ei = np.repeat(np.arange(nbEquations, dtype=PBasicIndexType), 2)
+        ej = np.column_stack((firstNumbering.ravel(), secondNumbering.ravel())).ravel()
+        ev = np.tile(np.array([1,-1], dtype=PBasicFloatType), nbEquations)
+        CH.AddEquationsFromIJV(ei, ej, ev)
 
         return CH
 
@@ -220,8 +265,76 @@ def CheckIntegrityKRConformalTieVector(GUI=False):
     return 'ok'
 
 
+def CheckIntegrityMatchNodes(GUI=False):
+    np.random.seed(0)
+    nodesII = np.random.rand(1000,3)
+    perm = np.random.permutation(1000)[0:600]
+    nodesI = np.vstack((nodesII[perm,:] + 1e-8, np.random.rand(50,3)+2))
+    idsI, idsII = MatchNodes(nodesI, nodesII, 1e-6)
+
+    if not np.array_equal(idsI, np.arange(600)) or not np.array_equal(idsII, perm):
+        raise Exception("Error in MatchNodes")
+
+    idsI, idsII = MatchNodes(nodesI, nodesII[0:0,:], 1e-6)
+    if len(idsI) or len(idsII):
+        raise Exception("Error in MatchNodes (empty)")
+
+    # coincident nodes with tol = 0
+    idsI, idsII = MatchNodes(nodesII[perm,:], nodesII, 0.)
+    if not np.array_equal(idsI, np.arange(600)) or not np.array_equal(idsII, perm):
+        raise Exception("Error in MatchNodes (tol = 0)")
+
+    # distance equal to tol (accepted) and just above tol (rejected)
+    nodesII = np.array([[0.,0.,0.],[10.,0.,0.]])
+    idsI, idsII = MatchNodes(np.array([[0.5,0.,0.],[10.,0.,np.nextafter(0.5, 1.)]]), nodesII, 0.5)
+    if not np.array_equal(idsI, [0]) or not np.array_equal(idsII, [0]):
+        raise Exception("Error in MatchNodes (distance equal to tol)")
+    return "ok"
+
+def CheckIntegrityKRConformalTiePeriodic(GUI=False):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    from BasicTools.FE.FETools import PrepareFEComputation
+    from BasicTools.FE.Fields.FEField import FEField
+
+    mesh = CreateCube(dimensions=[6,5,4], spacing=[0.2,0.25,1./3])
+    space, numberings, offset, _ = PrepareFEComputation(mesh, numberOfComponents=3)
+
+    obj = KRConformalTieVector()
+    obj.From([-1,0,0])
+    obj.To([0,0,0])
+    obj.AddArg("u")
+    obj.SideI("X0")
+    obj.SideII("X1")
+
+    fields = [FEField("u_"+str(x),mesh=mesh,space=space, numbering=numberings[x]) for x in range(3)]
+    CH = obj.GenerateEquations(mesh,fields)
+    nbDofs = numberings[0]["size"]
+    CH.SetNumberOfDofs(nbDofs*3)
+    mat, dofs = CH.ToSparse()
+    mat = mat.tocsr()
+
+    if CH.numberOfEquations != 5*4*3:
+        raise Exception("Error in the number of equations")
+
+    # every equation ties a node of X0 to the node of X1 with the same y and z
+    pointDofs = GetPointsDofs(numberings[0], np.arange(mesh.GetNumberOfNodes()), mesh.GetNumberOfNodes())
+    dofToPoint = np.empty(nbDofs, dtype=PBasicIndexType)
+    dofToPoint[pointDofs] = np.arange(mesh.GetNumberOfNodes())
+    for row in range(mat.shape[0]):
+        cols = dofs[mat.indices[mat.indptr[row]:mat.indptr[row+1]]]
+        vals = mat.data[mat.indptr[row]:mat.indptr[row+1]]
+        if len(cols) != 2 or sorted(vals) != [-1,1] or cols[0]//nbDofs != cols[1]//nbDofs:
+            raise Exception("Error in the equation " + str(row))
+        posI = mesh.nodes[dofToPoint[cols[vals>0][0]%nbDofs],:]
+        posII = mesh.nodes[dofToPoint[cols[vals<0][0]%nbDofs],:]
+        if np.linalg.norm(posII-posI-[1,0,0]) > 1e-10:
+            raise Exception("Error in the pair of the equation " + str(row))
+    return "ok"
+
 def CheckIntegrity(GUI=False):
-    totest = [CheckIntegrityKRConformalTieScalar,
+    totest = [CheckIntegrityMatchNodes,
+              CheckIntegrityKRConformalTiePeriodic,
+              CheckIntegrityKRConformalTieScalar,
               CheckIntegrityKRConformalTieVector]
 
     for f in totest:
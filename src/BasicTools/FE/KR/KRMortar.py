@@ -7,6 +7,8 @@ import numpy as np
 
 from scipy.sparse import coo_matrix, diags
 
+from BasicTools.NumpyDefs import PBasicIndexType
+
 import BasicTools.Containers.ElementNames as ElementNames
 from BasicTools.Containers.Filters import ElementFilter
 from BasicTools.Containers.UnstructuredMeshCreationTools import CreateMeshOf
@@ -89,14 +91,12 @@ class KRMortar(KRBaseVector):
             if tag is not None:
                 data.GetTag(tag).AddToTag(cpt-1)
 
-        bar_p, bar_w =  LagrangeIsoParam[ElementNames.Bar_2]
-        bar_space_ipvalues = LagrangeSpaceGeo[ElementNames.Bar_2].SetIntegrationRule(bar_p,bar_w)
-
-        tri_p,tri_w =  LagrangeIsoParam[ElementNames.Triangle_3]
-        tri_space_ipvalues = LagrangeSpaceGeo[ElementNames.Triangle_3].SetIntegrationRule(tri_p,tri_w)
-
-        tet_p,tet_w =  LagrangeIsoParam[ElementNames.Tetrahedron_4]
-        tet_space_ipvalues = LagrangeSpaceGeo[ElementNames.Tetrahedron_4].SetIntegrationRule(tet_p,tet_w)
+        # integration rules (points, weights and values on the space) of the
+        # integration simplices
+        integrationRules = {}
+        for name in [ElementNames.Bar_2, ElementNames.Triangle_3, ElementNames.Tetrahedron_4]:
+            ip, iw = LagrangeIsoParam[name]
+            integrationRules[ElementNames.dimension[name]] = (name, iw, LagrangeSpaceGeo[name].SetIntegrationRule(ip,iw))
 
         meshI_IPoints = []
         meshII_IPoints = []
@@ -108,279 +108,123 @@ class KRMortar(KRBaseVector):
         OS = self.originSystem.GetOrthoNormalBase()
         TS = self.targetSystem.GetOrthoNormalBase()
 
-        # working memory
-        # for bars
-        integrationBar = np.zeros((2,3))
-        iwBar = np.zeros_like(bar_w)
-        ipBar = np.zeros((len(bar_w),3))
-        # for triangles
-        integrationTri = np.zeros((3,3))
-        iwTri = np.zeros_like(tri_w)
-        ipTri = np.zeros((len(tri_w),3))
-        # for tetra
-        integrationTet = np.zeros((4,3))
-        iwTet = np.zeros_like(tet_w)
-        ipTet = np.zeros((len(tet_w),3))
-
-        # loop over every element in the two meshes
         from BasicTools.Helpers.ProgressBar import printProgressBar
         #computation of the integration points
         for name1,data1,ids1 in ElementFilter(meshI,tags=self.on):
-            cpt = 0
-            for elid1 in ids1:
-                printProgressBar(cpt,len(ids1))
-                cpt += 1
-                #pos of node in the real spaces
-                _nodes1 = meshI.nodes[data1.connectivity[elid1],:]
-                #normal in the real space
-
-                if ElementNames.dimension[name1] < 3:
-                    _normal1,_baricentre1, incellvector1  = self.__ConputeNormal(meshI,name1,data1,elid1)
-                    #baricenter in the projection space
-                    #baricentre1 = OS.ApplyTransform(_baricentre1)
-                    #normal in the projection space
-                    normal1 = OS.ApplyTransformDirection(_normal1)
-                #nodes in the projection space
-                nodes1 = OS.ApplyTransform(_nodes1)
-                #bounding box
-                min1 = np.min(nodes1,axis=0)
-                max1 = np.max(nodes1,axis=0)
-
-                for name2,data2,ids2 in ElementFilter(meshII,tags=self.onII,dimensionality=ElementNames.dimension[name1]):
-                    for elid2 in ids2:
-
-                        _nodes2 = meshII.nodes[data2.connectivity[elid2],:]
-                        nodes2 = TS.ApplyTransform(_nodes2)
-
-                        # check if bounding box intersect
-                        min2 = np.min(nodes2,axis=0)
-                        max2 = np.max(nodes2,axis=0)
-
-                        intersection = True
-                        tol = 0.1*max( np.max(max1-min1),np.max(max2-min2))
-                        for i in range(len(min1)):
-                             intersection = intersection and ((min2[i] <= max1[i]+tol and min2[i] >= min1[i]-tol) or (
-                                max2[i] <= max1[i]+tol and max2[i] >= min1[i]-tol) or (
-                                min1[i] <= max2[i]+tol and min1[i] >= min2[i]-tol) or (
-                                max1[i] <= max2[i]+tol and max1[i] >= min2[i]-tol))
-
-                        if not intersection :
-                            continue
-
-                        if ElementNames.dimension[name2] < 3:
-                            _normal2,_baricentre2, incellvector2 = self.__ConputeNormal(meshII,name2,data2,elid2)
-                            normal2 = TS.ApplyTransformDirection(_normal2)
-                            # only for 1d and 2d elements
-                            # check normal are aligned using the self.ang
-                            # the orientation is not important
-                            angle = np.arccos(normal1.dot(normal2))
-                            if abs(angle) > self.ang and abs(angle-np.pi) > self.ang:
-                                continue
-
-                        # we have intersection of 2 elements
-                        if ElementNames.dimension[name2] == 1:
-                            # element of dimension 1 (bars)
-                            if self.useSurface == "mean_surface":
-                                lineNormal = (normal1-normal2)/2
-                                lineNormal /= np.linalg.norm(lineNormal)
-                                base = np.array([-lineNormal[1], lineNormal[0], lineNormal[2]])
-                                offset = (min1+min2+max1+max2)/4
-                            # projection of the point in this line
-                            elif self.useSurface == "first_surface":
-                                base = np.array([-normal1[1],normal1[0],normal1[2]])
-                                offset = (min1+max1)/2
-                            elif self.useSurface == "second_surface":
-                                base = np.array([-normal2[1],normal2[0],normal2[2]])
-                                offset = (min2+max2)/2
-                            else:
-                                raise(Exception(f"Method {self.useSurface} not available!!!"))
-                            second = base*1
-                            for i,v in enumerate(second):
-                                if v == 0:
-                                    second[i] += 1
-                                    break
-                            else:
-                                second[0] += 1
-
-                            T = Transform(offset=offset,first=base, second=second )
-                            proj1_ = T.ApplyTransform(nodes1)
-                            proj2_ = T.ApplyTransform(nodes2)
-
-                            proj1 = proj1_[:,0]
-                            proj2 = proj2_[:,0]
-
-                            #compute intersection
-                            projmin = max(min(proj1),min(proj2))
-                            projmax = min(max(proj1),max(proj2))
-                            if projmax < projmin:
-                                continue
-
-                            integrationBar[0,0 ] = projmin
-                            integrationBar[1,0 ] = projmax
-
-                            # compute the coordinate of the integration points
-                            for ip_nb in range(len(bar_w)):
-                                Jack, Jdet, Jinv = bar_space_ipvalues.GetJackAndDetI(ip_nb,integrationBar)
-                                iwBar[ip_nb] = Jdet*bar_w[ip_nb]
-                                ipBar[ip_nb,:] = np.dot(bar_space_ipvalues.valN[ip_nb],integrationBar)
-
-                            # if the integration bar is degenerated we skip it
-                            if Jdet < 1e-8:
-                                continue
-
-                            # transfert the coordinate to the original meshes (1 and 2)
-                            integration_coords_II = T.ApplyInvTransform(ipBar)
-
-                            ## compute integration point in the meshI, meshII
-                            original_int_points = OS.ApplyInvTransform(integration_coords_II)
-                            target_int_points = TS.ApplyInvTransform(integration_coords_II)
-
-                            if self._debug_IntegrationMesh is not None: # pragma: no cover
-                                AddElementToViz(self._debug_IntegrationMesh,original_int_points,ElementNames.Bar_2,"eint_I")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-                                AddElementToViz(self._debug_IntegrationMesh,target_int_points,ElementNames.Bar_2,"eint_II")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-
-                            # Append points and weights
-                            weights_IPoints.extend(iwBar)
-                            mesh_IElement.extend(np.ones(len(bar_w))*elid1)
-                            mesh_IIElement.extend(np.ones(len(bar_w))*elid2)
-                            for ip_nb in range(len(bar_w)):
-                                meshI_IPoints.append(original_int_points[ip_nb,:])
-                                meshII_IPoints.append(target_int_points[ip_nb,:])
-
-                                if self._debug_IntegrationMesh is not None:# pragma: no cover
-                                    AddElementToViz(self._debug_IntegrationMesh,original_int_points[ip_nb:ip_nb+1,:],ElementNames.Point_1,"int_I")
-                                    AddElementToViz(self._debug_IntegrationMesh,target_int_points[ip_nb:ip_nb+1,:],ElementNames.Point_1,"int_II")
-
-                        elif ElementNames.dimension[name2] == 2:
-                            # element of dimension 2 (tris)
-                            if self.useSurface == "flat":
-                                lineNormal = [0,0,1]
-                            elif self.useSurface == "mean_surface":
-                                lineNormal = (normal1-normal2)/2
-                                lineNormal /= np.linalg.norm(lineNormal)
-                            # projection of the point in this line
-                            elif self.useSurface == "first_surface":
-                                lineNormal  = normal1
-                            elif self.useSurface == "second_surface":
-                                lineNormal  = normal2
-                            #T = Transform(first=[-lineNormal[1], lineNormal[0], lineNormal[2]],second=[-lineNormal[2], lineNormal[1], lineNormal[0]])
-                            T = Transform()
-                            T.SetOpUsingThird(lineNormal)
-
-                            proj1 = T.ApplyTransform(nodes1)
-                            proj2 = T.ApplyTransform(nodes2)
-
-                            inter = Intersection(proj1*[1,1,0],range(data1.GetNumberOfNodesPerElement()),
-                                                 proj2*[1,1,0],range(data2.GetNumberOfNodesPerElement()),tol/100000.)
-
-                            if len(inter) < 4 :
-                                # insufficent point to build as 2D domain
-                                continue
-                            if len(inter) == 4 :
-
-                                # we have a triangle (first point is repetead at the end)
-                                center = inter[0,:]
-                                inter = inter[1:3,:]
-                            else:
-                                center = np.sum(inter[0:-1,:],axis=0)/(inter.shape[0]-1)
-
-                            # we use the center as the first point for all the triangles
-                            integrationTri[0,:] = center
-
-                            for i in range(inter.shape[0]):
-                                # copy the coord to generate a triangle
-                                integrationTri[1:3,:] = inter[i:i+2,:]
-                                # compute the coordinate of the integration points
-                                for ip_nb in range(len(tri_w)):
-                                    Jack, Jdet, Jinv = tri_space_ipvalues.GetJackAndDetI(ip_nb,integrationTri)
-                                    iwTri[ip_nb] = Jdet*tri_w[ip_nb]
-                                    ipTri[ip_nb,:] = np.dot(tri_space_ipvalues.valN[ip_nb],integrationTri)
-
-                                # if the integration triangle is degenerated we skip it
-                                if Jdet < 1e-8:
-                                    continue
-
-                                # transfert the coordinate to the original meshes (1 and 2)
-                                integration_coords_II = T.ApplyInvTransform(ipTri)
-                                if self._debug_IntegrationMesh is not None:# pragma: no cover
-                                    AddElementToViz(self._debug_IntegrationMesh,OS.ApplyInvTransform(T.ApplyInvTransform(integrationTri)),ElementNames.Triangle_3,"eint_I")
-                                    AddElementToViz(self._debug_IntegrationMesh,TS.ApplyInvTransform(T.ApplyInvTransform(integrationTri)),ElementNames.Triangle_3,"eint_II")
-
-                                ## compute integration point in the meshI, meshII
-
-                                original_int_points = OS.ApplyInvTransform(integration_coords_II)
-                                target_int_points = TS.ApplyInvTransform(integration_coords_II)
-                                if self._debug_IntegrationMesh is not None:# pragma: no cover
-                                    AddElementToViz(self._debug_IntegrationMesh,original_int_points,ElementNames.Triangle_3,"eint_I")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-                                    AddElementToViz(self._debug_IntegrationMesh,target_int_points,ElementNames.Triangle_3,"eint_II")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-
-                                # Append points and weights
-                                weights_IPoints.extend(iwTri)
-                                mesh_IElement.extend(np.ones(len(tri_w))*elid1)
-                                mesh_IIElement.extend(np.ones(len(tri_w))*elid2)
-                                for ip_nb in range(len(tri_w)):
-                                    meshI_IPoints.append(original_int_points[ip_nb,:])
-                                    meshII_IPoints.append(target_int_points[ip_nb,:])
-                                    AddElementToViz(self._debug_IntegrationMesh,original_int_points[ip_nb:ip_nb+1,:],ElementNames.Point_1,"int_I")
-                                    AddElementToViz(self._debug_IntegrationMesh,target_int_points[ip_nb:ip_nb+1,:],ElementNames.Point_1,"int_II")
-
-                        elif ElementNames.dimension[name2] == 3:
-                            status, points, tets = IntersectionOf2CovexHulls(nodes1,nodes2)
-                            if status == False:
-                                continue
-
-                            for i in range(tets.shape[0]):
-                                # copy the coord to generate a tet
-                                integrationTet[:,:] = points[tets[i,:],:]
-                                for ip_nb in range(len(tet_w)):
-                                    Jack, Jdet, Jinv = tet_space_ipvalues.GetJackAndDetI(ip_nb,integrationTet)
-                                    iwTet[ip_nb] = abs(Jdet)*tet_w[ip_nb]
-                                    ipTet[ip_nb,:] = np.dot(tet_space_ipvalues.valN[ip_nb],integrationTet)
-
-                                # if the integration triangle is degenerated we skip it
-
-                                if abs(Jdet) < 1e-8:
-                                    continue
-
-                                # transfert the coordinate to the original meshes (1 and 2)
-                                if self._debug_IntegrationMesh is not None: # pragma: no cover
-                                    AddElementToViz(self._debug_IntegrationMesh,OS.ApplyInvTransform(integrationTet),ElementNames.Tetrahedron_4,"eint_I_"+str(elid1)+"_"+str(elid2))
-                                    #AddElementToViz(self._debug_IntegrationMesh,TS.ApplyInvTransform(integrationTet),ElementNames.Tetrahedron_4,"eint_II"+str(elid1)+"_"+str(elid2))
-                                original_int_points = OS.ApplyInvTransform(ipTet)
-
-                                target_int_points = TS.ApplyInvTransform(ipTet)
-                                if self._debug_IntegrationMesh is not None: # pragma: no cover
-                                    AddElementToViz(self._debug_IntegrationMesh,original_int_points,ElementNames.Point_1,"Left")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-                                    AddElementToViz(self._debug_IntegrationMesh,target_int_points,ElementNames.Point_1,"Right")#,"I_E"+str(elid1)+"_E"+str(elid2) )
-                                # Append points and weights
-                                weights_IPoints.extend(iwTet)
-
-                                mesh_IElement.extend(np.ones(len(tet_w))*elid1)
-                                mesh_IIElement.extend(np.ones(len(tet_w))*elid2)
-                                for ip_nb in range(len(tet_w)):
-                                    meshI_IPoints.append(original_int_points[ip_nb,:])
-                                    meshII_IPoints.append(target_int_points[ip_nb,:])
-
+            dim1 = ElementNames.dimension[name1]
+            # nodes, bounding boxes and normals in the projection space
+            allNodes1, allMin1, allMax1, allNormals1 = self.__ComputeElementsGeometry(meshI,name1,data1,ids1,OS)
+
+            # broad phase: candidate pairs (bounding boxes and normals)
+            candidates = []
+            elementsII = []
+            for name2,data2,ids2 in ElementFilter(meshII,tags=self.onII,dimensionality=dim1):
+                allNodes2, allMin2, allMax2, allNormals2 = self.__ComputeElementsGeometry(meshII,name2,data2,ids2,TS)
+                cand1, cand2 = GetBoundingBoxCandidates(allMin1, allMax1, allMin2, allMax2, 0.1)
+                if ElementNames.dimension[name2] < 3:
+                    # check normal are aligned using the self.ang
+                    # the orientation is not important
+                    with np.errstate(invalid="ignore"):
+                        angle = np.arccos(np.sum(allNormals1[cand1,:]*allNormals2[cand2,:],axis=1))
+                    mask = ~((np.abs(angle) > self.ang) & (np.abs(angle-np.pi) > self.ang))
+                    cand1 = cand1[mask]
+                    cand2 = cand2[mask]
+                candidates.append((cand1, np.full(len(cand1), len(elementsII)), cand2))
+                elementsII.append((ids2, allNodes2, allMin2, allMax2, allNormals2))
+
+            if len(candidates) == 0:
                 continue
-
-            printProgressBar(len(ids1),len(ids1))
+            cand1, candType2, cand2 = (np.concatenate(c) for c in zip(*candidates))
+            # same order as the brute force loop over the elements
+            order = np.lexsort((cand2, candType2, cand1))
+            cand1, candType2, cand2 = cand1[order], candType2[order], cand2[order]
+
+            # narrow phase only on the candidate pairs : integration simplices
+            # (in the projection space) of the intersection of every pair
+            pairs = []
+            simplices = []
+            elid2 = np.empty(len(cand1), dtype=PBasicIndexType)
+            for t2, (ids2, allNodes2, allMin2, allMax2, allNormals2) in enumerate(elementsII):
+                typePairs = np.flatnonzero(candType2 == t2)
+                elid2[typePairs] = ids2[cand2[typePairs]]
+                if dim1 == 3 or len(typePairs) == 0:
+                    continue
+                # the bars and the triangles are treated by batches of pairs
+                # (one batch for every element type of the second side)
+                i1 = cand1[typePairs]
+                i2 = cand2[typePairs]
+                geo1 = (allNodes1[i1], allMin1[i1], allMax1[i1], allNormals1[i1])
+                geo2 = (allNodes2[i2], allMin2[i2], allMax2[i2], allNormals2[i2])
+                if dim1 == 1:
+                    typePairsIds, typeSimplices = ComputeBarsIntersections(self.useSurface, *geo1, *geo2)
+                else:
+                    typePairsIds, typeSimplices = ComputeTrianglesIntersections(self.useSurface, *geo1, *geo2)
+                pairs.append(typePairs[typePairsIds])
+                simplices.append(typeSimplices)
+
+            if dim1 == 3:
+                # intersection of convex hulls, pair by pair
+                for cpt, i1, t2, i2 in zip(range(len(cand1)), cand1, candType2, cand2):
+                    printProgressBar(cpt,len(cand1))
+                    status, points, tets = IntersectionOf2CovexHulls(allNodes1[i1],elementsII[t2][1][i2])
+                    if status == False:
+                        continue
+                    pairs.append(np.full(tets.shape[0], cpt))
+                    simplices.append(points[tets,:])
+                printProgressBar(len(cand1),len(cand1))
+
+            if len(pairs) == 0:
+                continue
+            pairs = np.concatenate(pairs)
+            simplices = np.concatenate(simplices)
+            # same order as the pair by pair treatment
+            pairsOrder = np.argsort(pairs, kind="stable")
+            pairs = pairs[pairsOrder]
+            simplices = simplices[pairsOrder]
+
+            # integration points of all the integration simplices
+            simplexName, iw, spaceIPValues = integrationRules[dim1]
+            ipoints, iweights, nonDegenerated = ComputeIntegrationPoints(simplices, spaceIPValues, iw)
+            pairs = pairs[nonDegenerated]
+            simplices = simplices[nonDegenerated]
+            ipoints = ipoints[nonDegenerated].reshape(-1,3)
+            iweights = iweights[nonDegenerated]
+
+            ## compute integration point in the meshI, meshII
+            original_int_points = OS.ApplyInvTransform(ipoints)
+            target_int_points = TS.ApplyInvTransform(ipoints)
+
+            if self._debug_IntegrationMesh is not None: # pragma: no cover
+                for i in range(simplices.shape[0]):
+                    AddElementToViz(self._debug_IntegrationMesh,OS.ApplyInvTransform(simplices[i]),simplexName,"eint_I")
+                    AddElementToViz(self._debug_IntegrationMesh,TS.ApplyInvTransform(simplices[i]),simplexName,"eint_II")
+                for ip in range(original_int_points.shape[0]):
+                    AddElementToViz(self._debug_IntegrationMesh,original_int_points[ip:ip+1,:],ElementNames.Point_1,"int_I")
+                    AddElementToViz(self._debug_IntegrationMesh,target_int_points[ip:ip+1,:],ElementNames.Point_1,"int_II")
+
+            # Append points and weights
+            weights_IPoints.append(iweights.ravel())
+            mesh_IElement.append(np.repeat(ids1[cand1[pairs]], len(iw)))
+            mesh_IIElement.append(np.repeat(elid2[pairs], len(iw)))
+            meshI_IPoints.append(original_int_points)
+            meshII_IPoints.append(target_int_points)
 
         if self._debug_IntegrationMesh is not None :
             self._debug_IntegrationMesh.PrepareForOutput()
             self._debug_IntegrationMesh.GenerateManufacturedOriginalIDs()
 
-        weights_IPoints = np.array(weights_IPoints)
-        meshI_IPoints = np.array(meshI_IPoints)
-        meshII_IPoints= np.array(meshII_IPoints)
-        mesh_IElement = np.array(mesh_IElement)
-        mesh_IIElement = np.array(mesh_IIElement)
-
-        totalNumberOfIP = weights_IPoints.shape[0]
-
         if len(meshI_IPoints) == 0:
             print("Warning! -> Zero elements in contact")
             return
 
+        weights_IPoints = np.concatenate(weights_IPoints)
+        meshI_IPoints = np.concatenate(meshI_IPoints)
+        meshII_IPoints= np.concatenate(meshII_IPoints)
+        mesh_IElement = np.concatenate(mesh_IElement)
+        mesh_IIElement = np.concatenate(mesh_IIElement)
+
+        totalNumberOfIP = weights_IPoints.shape[0]
+
         # need to code the transfert of the field to the integration points meshI
         from BasicTools.Containers.UnstructuredMeshFieldOperations import GetFieldTransferOp
         meshIOps = {}
@@ -430,31 +274,227 @@ class KRMortar(KRBaseVector):
         self.meshIIOps = meshIIOps
         return CH
 
-    def __computeNormalSurface(self,nodes,conn):
-        baricentre = np.sum(nodes[conn ,:],axis=0)/len(conn)
-        edgeVector = nodes[conn[0],:] - nodes[conn[1],:]
-        planeVector = baricentre - nodes[conn[1],:]
-        normal = np.cross(edgeVector, planeVector)
-        normal /= np.linalg.norm(normal)
-        return normal, baricentre, planeVector/np.linalg.norm(planeVector)
-
-    def __computeNormalEdge(self,nodes,conn):
-        baricentre = np.sum(nodes[conn ,:],axis=0)/len(conn)
-        planeVector = baricentre - nodes[conn[0],:]
-        normal = np.array([planeVector[1], -planeVector[0],0])
-        normal /= np.linalg.norm(normal)
-        return normal, baricentre, planeVector/np.linalg.norm(planeVector)
-
-    def __ConputeNormal(self,submesh,name,data,elid):
-        if ElementNames.dimension[name] == 1:
-            return self.__computeNormalEdge(submesh.nodes,data.connectivity[elid,:])
-        elif ElementNames.dimension[name] == 2:
-            return self.__computeNormalSurface(submesh.nodes,data.connectivity[elid,:])
-        else: # pragma: no cover
-            raise Exception(" Error ")
+    def __ComputeElementsGeometry(self,submesh,name,data,ids,system):
+        """
+        Compute for the elements ids: the nodes (nbElements,nbNodes,3), the
+        bounding boxes (nbElements,3) and the normals (nbElements,3) in the
+        projection space (system). The normals are None for 3D elements
+        """
+        conn = data.connectivity[ids,:]
+        _nodes = submesh.nodes[conn,:]
+        nodes = system.ApplyTransform(_nodes.reshape(-1,3)).reshape(_nodes.shape)
+        normals = None
+        if ElementNames.dimension[name] < 3:
+            baricentre = np.sum(_nodes,axis=1)/conn.shape[1]
+            if ElementNames.dimension[name] == 1:
+                planeVector = baricentre - _nodes[:,0,:]
+                _normals = np.zeros_like(planeVector)
+                _normals[:,0] = planeVector[:,1]
+                _normals[:,1] = -planeVector[:,0]
+            else:
+                edgeVector = _nodes[:,0,:] - _nodes[:,1,:]
+                planeVector = baricentre - _nodes[:,1,:]
+                _normals = np.cross(edgeVector, planeVector)
+            _normals /= np.linalg.norm(_normals,axis=1)[:,None]
+            normals = system.ApplyTransformDirection(_normals)
+        return nodes, np.min(nodes,axis=1), np.max(nodes,axis=1), normals
+
+def GetBoundingBoxCandidates(min1, max1, min2, max2, relativeTolerance=0.1):
+    """
+    Find the pairs of boxes (one of each set) intersecting (in every
+    direction) after the extension of the boxes by a tolerance equal to
+    relativeTolerance times the size (max extent) of the biggest box of the pair.
+    A LinearOctree over the centers of the second set is used as broad phase.
+
+    Parameters
+    ----------
+    min1 : np.ndarray
+        (n1,3) lower corners of the first set of boxes
+    max1 : np.ndarray
+        (n1,3) upper corners of the first set of boxes
+    min2 : np.ndarray
+        (n2,3) lower corners of the second set of boxes
+    max2 : np.ndarray
+        (n2,3) upper corners of the second set of boxes
+    relativeTolerance : float, optional
+        by default 0.1
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        the indices of the boxes of the candidate pairs, in the first and in
+        the second set
+    """
+    from BasicTools.Containers.Octree import LinearOctree
+    if len(min1) == 0 or len(min2) == 0:
+        return np.empty(0, dtype=PBasicIndexType), np.empty(0, dtype=PBasicIndexType)
+
+    size1 = np.max(max1-min1,axis=1)
+    size2 = np.max(max2-min2,axis=1)
+    # the tolerance of a pair is smaller than the sum of the tolerances of the two boxes
+    reach2 = np.max(np.max(max2-min2,axis=1)/2 + relativeTolerance*size2)
+    halfSize1 = np.max(max1-min1,axis=1)/2 + relativeTolerance*size1 + reach2
+
+    tree = LinearOctree((min2+max2)/2)
+    indptr, cand2 = tree.FindWithinRange((min1+max1)/2, halfSize1, "cube")
+    cand1 = np.repeat(np.arange(len(min1), dtype=PBasicIndexType), np.diff(indptr))
+
+    tol = relativeTolerance*np.maximum(size1[cand1], size2[cand2])[:,None]
+    mask = np.all( (min2[cand2,:] <= max1[cand1,:]+tol) & (max2[cand2,:] >= min1[cand1,:]-tol) ,axis=1)
+    return cand1[mask], cand2[mask]
+
+def ComputeBarsIntersections(useSurface, nodes1, min1, max1, normals1, nodes2, min2, max2, normals2):
+    """
+    Batched intersection of pairs of bars (projected on a line). The
+    arguments are the nodes (nbPairs,2,3), bounding boxes (nbPairs,3) and
+    normals (nbPairs,3) of the two bars of every pair in the projection space.
+
+    Returns
+    -------
+    pairs : ndarray
+        ids of the pairs with an intersection
+    bars : ndarray
+        (len(pairs),2,3) the intersection bars in the projection space
+    """
+    if useSurface == "mean_surface":
+        lineNormal = (normals1-normals2)/2
+        lineNormal /= np.linalg.norm(lineNormal,axis=1)[:,None]
+        base = np.stack((-lineNormal[:,1], lineNormal[:,0], lineNormal[:,2]),axis=1)
+        offset = (min1+min2+max1+max2)/4
+    # projection of the point in this line
+    elif useSurface == "first_surface":
+        base = np.stack((-normals1[:,1], normals1[:,0], normals1[:,2]),axis=1)
+        offset = (min1+max1)/2
+    elif useSurface == "second_surface":
+        base = np.stack((-normals2[:,1], normals2[:,0], normals2[:,2]),axis=1)
+        offset = (min2+max2)/2
+    else:
+        raise(Exception(f"Method {useSurface} not available!!!"))
+    direction = base/np.linalg.norm(base,axis=1)[:,None]
+
+    proj1 = np.einsum("pnx,px->pn", nodes1-offset[:,None,:], direction)
+    proj2 = np.einsum("pnx,px->pn", nodes2-offset[:,None,:], direction)
+
+    #compute intersection
+    projmin = np.maximum(np.min(proj1,axis=1), np.min(proj2,axis=1))
+    projmax = np.minimum(np.max(proj1,axis=1), np.max(proj2,axis=1))
+    pairs = np.flatnonzero(~(projmax < projmin))
+
+    ends = np.stack((projmin[pairs], projmax[pairs]),axis=1)
+    bars = offset[pairs,None,:] + ends[:,:,None]*direction[pairs,None,:]
+    return pairs, bars
+
+def ComputeTrianglesIntersections(useSurface, nodes1, min1, max1, normals1, nodes2, min2, max2, normals2):
+    """
+    Batched intersection of pairs of triangles (projected on a plane). The
+    arguments are the nodes (nbPairs,3,3), bounding boxes (nbPairs,3) and
+    normals (nbPairs,3) of the two triangles of every pair in the projection
+    space. The intersection polygons are split in triangles (fan from the
+    center of the polygon).
+
+    Returns
+    -------
+    pairs : ndarray
+        id of the pair of every integration triangle
+    triangles : ndarray
+        (len(pairs),3,3) the integration triangles in the projection space
+    """
+    nbPairs = nodes1.shape[0]
+    if useSurface == "flat":
+        lineNormals = np.tile([0.,0.,1.], (nbPairs,1))
+    elif useSurface == "mean_surface":
+        lineNormals = (normals1-normals2)/2
+        lineNormals /= np.linalg.norm(lineNormals,axis=1)[:,None]
+    # projection of the point in this plane
+    elif useSurface == "first_surface":
+        lineNormals = normals1
+    elif useSurface == "second_surface":
+        lineNormals = normals2
+    else:
+        raise(Exception(f"Method {useSurface} not available!!!"))
+
+    # one transform by normal (constant for flat surfaces)
+    uniqueNormals, inverse = np.unique(lineNormals, axis=0, return_inverse=True)
+    RMatrices = np.empty((uniqueNormals.shape[0],3,3))
+    for i, lineNormal in enumerate(uniqueNormals):
+        T = Transform()
+        T.SetOpUsingThird(lineNormal)
+        RMatrices[i] = T.RMatrix
+    RMatrices = RMatrices[inverse.ravel()]
+
+    proj1 = np.einsum("pij,pnj->pni", RMatrices, nodes1)
+    proj2 = np.einsum("pij,pnj->pni", RMatrices, nodes2)
+    proj1[:,:,2] = 0
+    proj2[:,:,2] = 0
+    tol = 0.1*np.maximum(np.max(max1-min1,axis=1), np.max(max2-min2,axis=1))
+    inter, counts = IntersectionBatch(proj1, proj2, tol/100000.)
+
+    # insufficent point to build as 2D domain
+    valid = counts >= 4
+    # we have a triangle (first point is repetead at the end)
+    triangle = counts == 4
+    nbTriangles = np.where(valid, np.where(triangle, 1, counts-1), 0)
+    pairs = np.repeat(np.arange(nbPairs), nbTriangles)
+    local = np.arange(len(pairs)) - np.repeat(np.cumsum(nbTriangles)-nbTriangles, nbTriangles)
+
+    used = np.arange(inter.shape[1])[None,:] < (counts-1)[:,None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        center = np.sum(inter*used[:,:,None],axis=1)/(counts-1)[:,None]
+    center[triangle] = inter[triangle,0,:]
+    shift = triangle[pairs].astype(PBasicIndexType)
+
+    # we use the center as the first point for all the triangles
+    triangles = np.empty((len(pairs),3,3))
+    triangles[:,0,:] = center[pairs]
+    triangles[:,1,:] = inter[pairs,local+shift,:]
+    triangles[:,2,:] = inter[pairs,local+shift+1,:]
+
+    # transfert the coordinate to the projection space
+    return pairs, np.einsum("pji,pnj->pni", RMatrices[pairs], triangles)
+
+def ComputeIntegrationPoints(simplices, spaceIPValues, weights):
+    """
+    Compute the integration points and weights of a set of simplices
+
+    Parameters
+    ----------
+    simplices : ndarray
+        (nbSimplices,nbNodes,3) the nodes of the simplices (bars, triangles or tetrahedrons)
+    spaceIPValues : SpaceAtIP
+        the geometric space of the simplices at the integration points
+    weights : ndarray
+        the weights of the integration rule
+
+    Returns
+    -------
+    points : ndarray
+        (nbSimplices,nbIP,3) integration points
+    weights : ndarray
+        (nbSimplices,nbIP) integration weights
+    nonDegenerated : ndarray
+        bool vector, False for the degenerated simplices (skipped)
+    """
+    dim = simplices.shape[1]-1
+    points = np.empty((simplices.shape[0],len(weights),3))
+    iweights = np.empty((simplices.shape[0],len(weights)))
+    for ip_nb in range(len(weights)):
+        Jack = np.einsum("dn,tnx->tdx",spaceIPValues.valdphidxi[ip_nb],simplices)
+        if dim == 1:
+            Jdet = np.linalg.norm(Jack[:,0,:],axis=1)
+        elif dim == 2:
+            Jdet = np.linalg.norm(np.cross(Jack[:,0,:],Jack[:,1,:]),axis=1)
+        else:
+            Jdet = np.abs(np.linalg.det(Jack))
+        iweights[:,ip_nb] = Jdet*weights[ip_nb]
+        points[:,ip_nb,:] = np.einsum("n,tnx->tx",spaceIPValues.valN[ip_nb],simplices)
+
+    # if the integration simplex is degenerated we skip it
+    nonDegenerated = ~(Jdet < 1e-8)
+    return points, iweights, nonDegenerated
 
 def AreCCW(p1,p2,p3):
-    return bool((np.sign(np.cross(p2-p1,p3-p2)[2])+1)/2)
+    # sign of the z component of (p2-p1)x(p3-p2), (zero and nan are counted as ccw)
+    return not ((p2[0]-p1[0])*(p3[1]-p2[1]) - (p2[1]-p1[1])*(p3[0]-p2[0]) < 0)
 
 def Append(l,point,tol):
     p = np.array(point)
@@ -507,11 +547,13 @@ def Intersection(points1, _poly1,points2,_poly2, tol):
         for s in range(len(poly1)-1):
             sp0 = poly1[s]
             sp1 = poly1[s+1]
-            if AreCCW(cp0,cp1,sp0):
+            sp0In = AreCCW(cp0,cp1,sp0)
+            sp1In = AreCCW(cp0,cp1,sp1)
+            if sp0In:
                 # point inside keep the point
                 Append(res,sp0,tol)
 
-            if AreCCW(cp0,cp1,sp0) != AreCCW(cp0,cp1,sp1):
+            if sp0In != sp1In:
                 # segment must be cutted by cutter
                 # keep the intersection
                 x1 = cp0[0]
@@ -534,7 +576,7 @@ def Intersection(points1, _poly1,points2,_poly2, tol):
                 py = np.clip(py, min(y3,y4),max(y3,y4))
 
                 Append(res,[px,py,0],tol)
-            if AreCCW(cp0,cp1,sp1):
+            if sp1In:
                 # the last point is treated by the next interation
                 Append(res,sp1,tol)
         poly1 = res
@@ -545,6 +587,116 @@ def Intersection(points1, _poly1,points2,_poly2, tol):
     return np.array(res)
 
 
+def _AreCCWBatch(p1,p2,p3):
+    # vectorized version of AreCCW
+    return ~((p2[:,0]-p1[:,0])*(p3[:,1]-p2[:,1]) - (p2[:,1]-p1[:,1])*(p3[:,0]-p2[:,0]) < 0)
+
+def _AppendBatch(l,counts,points,mask,tol):
+    # vectorized version of Append, only for the rows in mask
+    rows = np.flatnonzero(mask)
+    last = l[rows,np.maximum(counts[rows]-1,0),:]
+    add = (counts[rows] == 0) | (np.linalg.norm(last-points[rows],axis=1) > tol[rows])
+    rows = rows[add]
+    l[rows,counts[rows],:] = points[rows]
+    counts[rows] += 1
+
+def _CheckTriWindingBatch(points):
+    # vectorized version of CheckTriWinding (allowReversed = True)
+    trisq = np.ones((points.shape[0],3,3))
+    trisq[:,:,0:2] = points[:,0:3,0:2]
+    reverse = np.linalg.det(trisq) < 0.0
+    res = points.copy()
+    res[reverse,1,:] = points[reverse,2,:]
+    res[reverse,2,:] = points[reverse,1,:]
+    return res
+
+def IntersectionBatch(points1, points2, tol):
+    """
+    Vectorized version of Intersection for pairs of triangles (same
+    algorithm: cut of the first triangle by the edges of the second one).
+
+    Parameters
+    ----------
+    points1 : ndarray
+        (nbPairs,3,3) the first triangle of every pair (z must be 0)
+    points2 : ndarray
+        (nbPairs,3,3) the second triangle of every pair (z must be 0)
+    tol : float or ndarray
+        tolerance to merge the points (for every pair)
+
+    Returns
+    -------
+    inter : ndarray
+        (nbPairs,n,3) points of the intersection of every pair (with the first
+        point repeated at the end), the unused entries are zeros
+    counts : ndarray
+        number of points of every intersection
+    """
+    nbPairs = points1.shape[0]
+    tol = np.broadcast_to(np.asarray(tol,dtype=float), (nbPairs,))
+    cutter = _CheckTriWindingBatch(points2)
+    poly = np.zeros((nbPairs,points1.shape[1]+1,3))
+    poly[:,:-1,:] = _CheckTriWindingBatch(points1)
+    counts = np.full(nbPairs, points1.shape[1], dtype=PBasicIndexType)
+    # the cut of a pair stops when less than 3 points remain
+    active = np.ones(nbPairs, dtype=bool)
+    zeros = np.zeros(nbPairs)
+
+    for cut in range(cutter.shape[1]):
+        cp0 = cutter[:,cut,:]
+        cp1 = cutter[:,(cut+1)%cutter.shape[1],:]
+        x1 = cp0[:,0]
+        y1 = cp0[:,1]
+        x2 = cp1[:,0]
+        y2 = cp1[:,1]
+
+        _AppendBatch(poly,counts,poly[:,0,:],active,tol)
+        # at most 3 points for every segment
+        res = np.zeros((nbPairs,3*poly.shape[1]+1,3))
+        resCounts = np.zeros(nbPairs, dtype=PBasicIndexType)
+        for s in range(poly.shape[1]-1):
+            segment = active & (s < counts-1)
+            if not np.any(segment):
+                break
+            sp0 = poly[:,s,:]
+            sp1 = poly[:,s+1,:]
+            sp0In = _AreCCWBatch(cp0,cp1,sp0)
+            sp1In = _AreCCWBatch(cp0,cp1,sp1)
+            # point inside keep the point
+            _AppendBatch(res,resCounts,sp0,segment & sp0In,tol)
+
+            # segment must be cutted by cutter, keep the intersection
+            cutted = segment & (sp0In != sp1In)
+            if np.any(cutted):
+                x3 = sp0[:,0]
+                y3 = sp0[:,1]
+                x4 = sp1[:,0]
+                y4 = sp1[:,1]
+                den = (( x1-x2 )*(y3-y4)-(y1-y2)*(x3-x4) )
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    px = ((x1*y2-y1*x2)*(x3-x4)-(x1-x2)*(x3*y4-y3*x4)) /den
+                    py = ((x1*y2-y1*x2)*(y3-y4)-(y1-y2)*(x3*y4-y3*x4)) /den
+                px = np.where(den == 0, x4, px)
+                py = np.where(den == 0, y4, py)
+                px = np.clip(px, np.minimum(x3,x4), np.maximum(x3,x4))
+                py = np.clip(py, np.minimum(y3,y4), np.maximum(y3,y4))
+                _AppendBatch(res,resCounts,np.stack((px,py,zeros),axis=1),cutted,tol)
+
+            # the last point is treated by the next interation
+            _AppendBatch(res,resCounts,sp1,segment & sp1In,tol)
+
+        counts = np.where(active, resCounts, counts)
+        # keep one free entry to close the polygons
+        width = np.max(counts, initial=0)+1
+        newPoly = np.zeros((nbPairs,width,3))
+        newPoly[active,:,:] = res[active,:width,:]
+        newPoly[~active,:min(width,poly.shape[1]),:] = poly[~active,:width,:]
+        poly = newPoly
+        active &= counts >= 3
+
+    _AppendBatch(poly,counts,poly[:,0,:],counts > 0,tol)
+    return poly, counts
+
 def IntersectionOf2CovexHulls(pointsI,pointsII):
     from scipy.spatial import ConvexHull, HalfspaceIntersection
     from scipy.optimize import linprog
@@ -735,6 +887,30 @@ def CheckIntegrityIntersection(GUI=False):
     result = (center,data)
     return "ok"
 
+def CheckIntegrityIntersectionBatch(GUI=False):
+    rng = np.random.default_rng(0)
+    nbPairs = 500
+    points1 = np.zeros((nbPairs,3,3))
+    points2 = np.zeros((nbPairs,3,3))
+    points1[:,:,0:2] = rng.random((nbPairs,3,2))
+    points2[:,:,0:2] = rng.random((nbPairs,3,2))
+    # shared vertices and coincident triangles
+    points2[0:50,0,:] = points1[0:50,0,:]
+    points2[50:60] = points1[50:60]
+    tol = 1e-3*rng.random(nbPairs)
+
+    inter, counts = IntersectionBatch(points1, points2, tol)
+    P = np.zeros((6,3))
+    for i in range(nbPairs):
+        P[0:3] = points1[i]
+        P[3:6] = points2[i]
+        ref = Intersection(P,[0,1,2],P,[3,4,5],tol[i])
+        if counts[i] != len(ref) or np.max(np.abs(inter[i,:counts[i],:]-ref.reshape(-1,3)),initial=0) > 1e-12: # pragma: no cover
+            raise Exception("Error in IntersectionBatch")
+    if np.count_nonzero(counts >= 4) < 100: # pragma: no cover
+        raise Exception("Error in IntersectionBatch (not enough intersections)")
+    return "ok"
+
 def CheckIntegrity1DInterface2Meshes(GUI=False):
     """CheckIntegrity for 2 1D meshes
     Mesh 1
@@ -964,8 +1140,30 @@ def CheckIntegrity3DVector(GUI=False):
 
     return "ok"
 
+def CheckIntegrityBoundingBoxCandidates(GUI=False):
+    rng = np.random.default_rng(0)
+    min1 = rng.random((200,3))*10
+    max1 = min1 + rng.random((200,3))*np.array([1.,1.,0.01])
+    min2 = rng.random((300,3))*10
+    max2 = min2 + rng.random((300,3))*np.array([0.5,2.,0.01])
+
+    cand1, cand2 = GetBoundingBoxCandidates(min1, max1, min2, max2, 0.1)
+    res = set(zip(cand1, cand2))
+
+    # brute force (same criteria as the pair by pair test)
+    ref = set()
+    for i in range(min1.shape[0]):
+        for j in range(min2.shape[0]):
+            tol = 0.1*max( np.max(max1[i]-min1[i]),np.max(max2[j]-min2[j]))
+            if np.all( (min2[j] <= max1[i]+tol) & (max2[j] >= min1[i]-tol) ):
+                ref.add((i,j))
+
+    if len(ref) == 0 or res != ref: # pragma: no cover
+        raise Exception("Error in GetBoundingBoxCandidates")
+    return "ok"
+
 def CheckIntegrity(GUI=False):
-    func = [CheckIntegrity1DInterface, CheckIntegrity1DInterface2Meshes, CheckIntegrity2DScalar, CheckIntegrity3DVector, CheckIntegrityIntersection, CheckIntegrity3D, CheckIntegrityIntersectionConvexHull3D]
+    func = [CheckIntegrityBoundingBoxCandidates, CheckIntegrity1DInterface, CheckIntegrity1DInterface2Meshes, CheckIntegrity2DScalar, CheckIntegrity3DVector, CheckIntegrityIntersection, CheckIntegrityIntersectionBatch, CheckIntegrity3D, CheckIntegrityIntersectionConvexHull3D]
     for f in func:
         print("working on : ", f)
         res = f(GUI)
@@ -11,6 +11,55 @@ from BasicTools.Helpers.BaseOutputObject import BaseOutputObject
 import BasicTools.Containers.ElementNames as EN
 from BasicTools.Containers import Filters
 
+def UniqueSortedRows(rows):
+    """Unique rows of an integer array after sorting every row.
+    Same output as np.unique(np.sort(rows,axis=1),return_index=True,return_inverse=True,axis=0)
+    but faster: the sorted rows are packed in int64 keys (one key if possible)
+    and only one (arg/lex)sort is needed
+
+    Parameters
+    ----------
+    rows : np.ndarray
+        (n,m) array of integers
+
+    Returns
+    -------
+    Tuple[np.ndarray,np.ndarray,np.ndarray]
+        unique (sorted rows), indices (first occurrence of every unique row)
+        and inverse (position of every row in the unique array)
+    """
+    rows = np.sort(rows,axis=1)
+    nbRows, nbCols = rows.shape
+    if nbRows == 0:
+        return rows, np.empty(0,dtype=PBasicIndexType), np.empty(0,dtype=PBasicIndexType)
+
+    # pack the (shifted) values of several columns in every int64 key
+    minValue = int(rows.min())
+    bits = max(int(rows.max()) - minValue, 1).bit_length()
+    colsPerKey = max(62//bits,1)
+    keys = []
+    for start in range(0,nbCols,colsPerKey):
+        key = np.zeros(nbRows,dtype=np.int64)
+        for col in range(start,min(start+colsPerKey,nbCols)):
+            key <<= bits
+            key |= rows[:,col].astype(np.int64) - minValue
+        keys.append(key)
+
+    if len(keys) == 1:
+        order = np.argsort(keys[0],kind="stable")
+    else:
+        order = np.lexsort(keys[::-1])
+    flags = np.zeros(nbRows-1,dtype=bool)
+    for key in keys:
+        sortedKey = key[order]
+        flags |= sortedKey[1:] != sortedKey[:-1]
+
+    flags = np.concatenate(([True],flags))
+    indices = order[flags]
+    inverse = np.empty(nbRows,dtype=PBasicIndexType)
+    inverse[order] = np.cumsum(flags)-1
+    return rows[indices], indices, inverse
+
 class DofNumberingNumpy(BaseOutputObject ):
     def __init__(self):
         super(DofNumberingNumpy,self).__init__()
@@ -173,7 +222,7 @@ class DofNumberingNumpy(BaseOutputObject ):
         self.PrintDebug("Numbering generation of uniques")
         # recover the unique dofs and generate the numbering
         for k,v in storage.items():
-            unique, indices, inverse = np.unique(np.sort(v,axis=1),return_index=True,return_inverse=True,axis=0)
+            unique, indices, inverse = UniqueSortedRows(v)
             newdofs = np.arange(len(indices)) + cpt
             tempAlmanac[k] = (unique,newdofs,inverse)
             cpt += len(indices)
@@ -253,7 +302,7 @@ class DofNumberingNumpy(BaseOutputObject ):
                 (unique,newdofs,inverse) = tempAlmanac[key]
                 name, idxI, idxII = self.GetHashFor(data,sp,ids,sf,False,elidsConnectivity=elidsConnectivity)
                 v = np.vstack((unique,idxI))
-                uniqueII, indices, inverse = np.unique(np.sort(v,axis=1),return_index=True,return_inverse=True,axis=0)
+                uniqueII, indices, inverse = UniqueSortedRows(v)
                 newnewdofs = np.hstack((newdofs,np.zeros(len(idxI),dtype=PBasicIndexType)-1 ))[inverse][len(unique):]
                 self.numbering[elemName][ids,sf] = newnewdofs
         self.PrintVerbose("Numbering Done")
@@ -375,6 +424,15 @@ class DofNumberingNumpy(BaseOutputObject ):
         return res
 
 def CheckIntegrity(GUI=False):
+    for shape, low, high in [((1000,4),0,100), ((1000,1),0,50), ((500,27),0,10**6), ((100,3),-3,3), ((0,3),0,1)]:
+        rows = np.random.randint(low,high+1,size=shape)
+        rows = np.vstack((rows,rows[::-1,::-1]))
+        res = UniqueSortedRows(rows)
+        ref = np.unique(np.sort(rows,axis=1),return_index=True,return_inverse=True,axis=0)
+        for a, b in zip(res, ref):
+            if not np.array_equal(a.ravel(), b.ravel()):
+                raise Exception("Error in UniqueSortedRows")
+
     import BasicTools.FE.DofNumbering  as DN
     return DN.CheckIntegrityUsingAlgo("NumpyBase",GUI)
 
@@ -43,6 +43,36 @@ class SpaceBase(BaseOutputObject):
                 res[cpt] = 0
         return res
 
+    def GetShapeFuncVectorized(self,qcoors):
+        """Evaluation of the shape functions at several points
+
+        Parameters
+        ----------
+        qcoors : ndarray
+            (nbPoints, dim) parametric coordinates of the points
+
+        Returns
+        -------
+        ndarray
+            (nbPoints, nbShapeFunctions) values of the shape functions
+        """
+        return np.array([self.GetShapeFunc(q) for q in qcoors], dtype=PBasicFloatType)
+
+    def GetShapeFuncDerVectorized(self,qcoors):
+        """Evaluation of the derivatives of the shape functions at several points
+
+        Parameters
+        ----------
+        qcoors : ndarray
+            (nbPoints, dim) parametric coordinates of the points
+
+        Returns
+        -------
+        ndarray
+            (nbPoints, dim, nbShapeFunctions) values of the derivatives of the shape functions
+        """
+        return np.array([self.GetShapeFuncDer(q) for q in qcoors], dtype=PBasicFloatType)
+
     def GetNormal(self,Jack):
         # Edge in 2D
         if Jack.shape[0] == 1 and Jack.shape[1] == 2 :
@@ -100,6 +130,68 @@ class SpaceBase(BaseOutputObject):
 
        return Jack, Jdet, jinv
 
+    def GetJackAndDetVectorized(self, Nfder, xcoor):
+        """Vectorized version of GetJackAndDet for a block of elements
+
+        Parameters
+        ----------
+        Nfder : ndarray
+            (dim, nbShapeFunctions) derivatives of the shape functions at one point
+        xcoor : ndarray
+            (nbElements, nbShapeFunctions, spaceDim) coordinates of the nodes
+
+        Returns
+        -------
+        Jack : ndarray
+            (nbElements, dim, spaceDim) jacobian matrices
+        Jdet : ndarray
+            (nbElements,) determinants (measure for dim < spaceDim)
+        Jinv : ndarray
+            (nbElements, spaceDim, dim) inverses (pseudo-inverses for dim < spaceDim)
+        """
+        dim = self.GetDimensionality()
+        nbElements, _, s = xcoor.shape
+
+        if dim == 0:
+            return np.ones((nbElements,1,1)), np.ones(nbElements), np.zeros((nbElements,s,0))
+
+        Jack = np.einsum("dn,ens->eds", Nfder, xcoor)
+
+        if dim == s:
+            return Jack, np.linalg.det(Jack), np.linalg.inv(Jack)
+
+        if dim == 1:
+            Jdet = np.linalg.norm(Jack[:,0,:],axis=1)
+        elif dim == 2:
+            Jdet = np.linalg.norm(np.cross(Jack[:,0,:],Jack[:,1,:]),axis=1)
+
+        # minimal norm solution of Jack.x = vec (same as the QR in GetJackAndDet)
+        Jinv = np.einsum("eds,edf->esf", Jack, np.linalg.inv(np.einsum("eds,efs->edf", Jack, Jack)))
+        return Jack, Jdet, Jinv
+
+    def GetNormalVectorized(self,Jack):
+        """Vectorized version of GetNormal
+
+        Parameters
+        ----------
+        Jack : ndarray
+            (nbElements, dim, spaceDim) jacobian matrices
+
+        Returns
+        -------
+        ndarray
+            (nbElements, nbComponents) the normals
+        """
+        if Jack.shape[1] == 1 and (Jack.shape[2] == 2 or Jack.shape[2] == 3):
+            res = np.stack((Jack[:,0,1],-Jack[:,0,0]),axis=1)
+        elif Jack.shape[1] == 2 and Jack.shape[2] == 3 :
+            res = np.cross(Jack[:,0,:],Jack[:,1,:])
+        else:
+            raise Exception("Shape of Jacobian not coherent. Possible error: an elset has the same name of the considered faset")
+
+        res /= np.linalg.norm(res,axis=1)[:,None]
+        return res
+
 class SpaceAtIntegrationPoints():
     def __init__(self,space = None, points = None, weights = None):
 
@@ -133,5 +225,11 @@ class SpaceAtIntegrationPoints():
     def GetJackAndDet(self, Nfder, xcoor):
         return self.space.GetJackAndDet(Nfder, xcoor)
 
+    def GetJackAndDetIVectorized(self, pp, xcoor):
+       return self.space.GetJackAndDetVectorized(self.valdphidxi[pp], xcoor)
+
     def GetNormal(self,Jack):
         return self.space.GetNormal(Jack)
+
+    def GetNormalVectorized(self,Jack):
+        return self.space.GetNormalVectorized(Jack)
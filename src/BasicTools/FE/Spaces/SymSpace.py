@@ -22,11 +22,10 @@ class SymSpaceBase(SpaceBase):
         self.symdNdxi = None
         self.__created__ = False
 
-    def __getstate__(self):
-        return None
-
-    def __setstat__(self,state):
-        self.__init__()
+    def __reduce__(self):
+        # the lambdified functions can not be pickled, so a fresh instance is
+        # created (the user must call Create() after unpickling)
+        return (self.__class__, ())
 
 
     def GetNumberOfShapeFunctions(self):
@@ -66,8 +65,11 @@ class SymSpaceBase(SpaceBase):
         self.symdNdxi = Matrix(self.symdNdxi)
         if self.symdNdxi.shape == (0,0):
            self.fct_dNdxi_Matrix = lambda xi,chi,phi: np.empty((0,0))
+           self.fct_dNdxi_List = lambda xi,chi,phi: []
         else:
            self.fct_dNdxi_Matrix =  lambdify(allcoords,self.symdNdxi.subs(subsList) , lambdifyList )
+           # nested list version (for the evaluation at several points)
+           self.fct_dNdxi_List =  lambdify(allcoords,self.symdNdxi.subs(subsList).tolist() , lambdifyList )
         ############ shape functions second derivative ################
 
         self.symdNdxidxi = [ None ]*nbSF
@@ -106,6 +108,38 @@ class SymSpaceBase(SpaceBase):
     def GetShapeFuncDer(self,qcoor):
         return np.asarray(self.GetShapeFuncDer_default(*qcoor), dtype=float)
 
+    def _GetVectorizedArguments(self,qcoors):
+        qcoors = np.asarray(qcoors, dtype=float)
+        zeros = np.zeros(qcoors.shape[0])
+        return [ qcoors[:,i] if i < qcoors.shape[1] else zeros for i in range(3) ]
+
+    def GetShapeFuncVectorized(self,qcoors):
+        qcoors = np.asarray(qcoors, dtype=float)
+        nbPoints = qcoors.shape[0]
+        try:
+            vals = self.fct_N_Matrix(*self._GetVectorizedArguments(qcoors))
+        except (TypeError, ValueError):
+            # some functions (DiracDelta) are not vectorized
+            return super(SymSpaceBase,self).GetShapeFuncVectorized(qcoors)
+        res = np.empty((nbPoints,len(vals)), dtype=float)
+        for i, v in enumerate(vals):
+            res[:,i] = v
+        return res
+
+    def GetShapeFuncDerVectorized(self,qcoors):
+        qcoors = np.asarray(qcoors, dtype=float)
+        nbPoints = qcoors.shape[0]
+        try:
+            vals = self.fct_dNdxi_List(*self._GetVectorizedArguments(qcoors))
+        except (TypeError, ValueError):
+            # some functions (DiracDelta) are not vectorized
+            return super(SymSpaceBase,self).GetShapeFuncDerVectorized(qcoors)
+        res = np.empty((nbPoints,len(vals),self.GetNumberOfShapeFunctions()), dtype=float)
+        for i, row in enumerate(vals):
+            for j, v in enumerate(row):
+                res[:,i,j] = v
+        return res
+
     def GetShapeFuncDerDer_default(self,xi=0,chi=0,phi=0):
         return [ np.asarray(x(xi,chi,phi),dtype=float) for x in self.fct_dNdxidxi_Matrix ]
 
@@ -11,7 +11,7 @@ import numpy as np
 
 import BasicTools.Containers.ElementNames as EN
 import BasicTools.Containers.UnstructuredMesh as UM
-from BasicTools.IO.ReaderBase import ReaderBase
+from BasicTools.IO.ReaderBase import ReaderBase, NewMetaData
 from BasicTools.Helpers.ParserHelper import LocalVariables
 from BasicTools.NumpyDefs import PBasicIndexType
 from BasicTools.IO.AnsysTools import PermutationAnsysToBasicTools
@@ -23,6 +23,12 @@ def ReadAnsys(fileName=None, string=None, out=None, **kwargs):
     reader.Read(fileName=fileName, string=string, out=out, **kwargs)
     return reader.output
 
+def ReadMetaData(fileName=None, string=None):
+    reader = AnsysReader()
+    reader.SetFileName(fileName)
+    reader.SetStringToRead(string)
+    return reader.ReadMetaData()
+
 
 class AnsysReader(ReaderBase):
     def __init__(self):
@@ -45,6 +51,19 @@ class AnsysReader(ReaderBase):
         self.output = result
         return result
 
+    def ReadMetaData(self):
+        """Read the sizes, the element types and the tags names of the file
+        without storing the nodes and the connectivity
+
+        Returns
+        -------
+        dict
+            the metadata (see BasicTools.IO.ReaderBase.NewMetaData)
+        """
+        with self.GetIterator() as iterator:
+            session = MetaDataSession(iterator)
+        return session.GetMetaData()
+
     def GetIterator(self):
         return InputContextManager(self)
 
@@ -322,6 +341,101 @@ class Session:
 
         self.ReadEblock(NonSolidDataParser, max_element_count)
 
+class MetaDataSession(Session):
+    """Session to extract the metadata of the file: the node coordinates are
+    skipped and only the element types (not the connectivity) are computed
+    """
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.metadata = NewMetaData()
+        self.nodesTags = {}
+        self.elementsTags = {}
+        self.block_count = 0
+        self.element_type_ids = dict()
+        self.current_element_type = None
+        self.substitutions = LocalVariables(prePostChars=('',''))
+
+        commands = {
+                '*set': self.ParseAssignment,
+                'nblock': self.ParseNodeBlock,
+                'eblock': self.ParseElementBlock,
+                'en': self.ParseUnblockedElement,
+                'et': self.ParseElementTypeDefinition,
+                'type': self.ParseElementTypeSelection,
+                'CMBLOCK': self.ParseTagDefinition,
+                'cm': self.ParseCMDefinition
+                }
+
+        def Pass(args): pass
+
+        for line in self.iterator:
+            tokens = line.split(',')
+            keyword = tokens[0]
+            arguments = tokens[1:]
+            commands.get(keyword, Pass)(arguments)
+
+    def AddElements(self, internal_element_type, tags):
+        elementTypes = self.metadata["elementTypes"]
+        elementTypes[internal_element_type] = elementTypes.get(internal_element_type,0) + 1
+        self.metadata["nbElements"] += 1
+        for t in tags:
+            self.elementsTags[t] = None
+
+    def ParseNodeBlock(self, args):
+        # Skip format line
+        line = next(self.iterator)
+        while True:
+            line = next(self.iterator)
+            if line.startswith('-1'):
+                break
+            self.metadata["nbNodes"] += 1
+
+    def ParseUnblockedElement(self, args):
+        element_id = int(args[0])
+        self.AddElements(EN.Point_1, ['et_{}'.format(self.current_element_type)])
+        self.nodesTags['elem_{}'.format(element_id)] = None
+
+    def ParseCMDefinition(self, args):
+        if args[1].lower() != "elem":
+            return
+        self.elementsTags[args[0]] = None
+
+    def ParseTagDefinition(self, args):
+        tag_name = args[0].strip()
+        kind = args[1]
+        item_count = int(args[2])
+        line_count = (item_count + 7) // 8
+
+        # Skip format line and items
+        for i in range(line_count+1):
+            line = next(self.iterator)
+
+        if kind == 'NODE':
+            self.nodesTags[tag_name] = None
+        else:
+            self.elementsTags[tag_name] = None
+
+    def ReadEblock(self, data_parser, max_element_count):
+        while True:
+            line = next(self.iterator)
+            if line.startswith('-1'):
+                break
+            values = [int(t) for t in line.split()]
+            element_id, et, real_constant, _, nodes = \
+                    data_parser(values, self.iterator)
+            element_type_id = self.element_type_ids[et]
+            internal_element_type, _ = \
+                    internal_element_type_from_ansys[element_type_id](nodes)
+            self.AddElements(internal_element_type, (
+                    'et_{}'.format(et),
+                    'rc_{}'.format(real_constant),
+                    'EB_{}'.format(self.block_count)) )
+
+    def GetMetaData(self):
+        self.metadata["nodesTags"] = list(self.nodesTags)
+        self.metadata["elementsTags"] = list(self.elementsTags)
+        return self.metadata
+
 def discriminate_tri_or_quad(nodes):
     # SURF154/TARGE170/CONTA174: EN.Quadrangle_4 or EN.Quadrangle_9
     # May degenerate to EN.Triangle_3 or EN.Triangle_6
@@ -542,6 +656,14 @@ eblock,19,solid,,4
     for t in ('et_1', 'et_2', 'et_3', 'et_4', 'rc_4', 'rc_5', 'EB_0', 'EB_1', 'EB_2', 'EB_3'):
         print('element set {}: {}'.format(t, res.GetElementsInTag(t)))
 
+    metadata = ReadMetaData(string=__teststring)
+    print(metadata)
+    assert(metadata["nbNodes"] == res.GetNumberOfNodes())
+    assert(metadata["nbElements"] == res.GetNumberOfElements())
+    assert(metadata["elementTypes"] == {name:data.GetNumberOfElements() for name,data in res.elements.items()})
+    assert(metadata["nodesTags"] == ['FewNodes'])
+    assert(set(metadata["elementsTags"]) == set(res.GetNamesOfElemTags()))
+
     return 'ok'
 
 if __name__ == '__main__':
@@ -11,7 +11,7 @@ import numpy as np
 
 import BasicTools.Containers.ElementNames as EN
 
-from BasicTools.IO.ReaderBase import ReaderBase
+from BasicTools.IO.ReaderBase import ReaderBase, LinesToArray, LinesToFlatArray, LinesToFlatArrayWithSizes, OriginalIdsToInternalIds, NewMetaData
 
 from BasicTools.IO.ZsetTools import GeofNumber, PermutationZSetToBasicTools, nbIntegrationsPoints
 
@@ -38,9 +38,21 @@ class GeofReader(ReaderBase):
         self.readFormat = 'r'
 
   def ReadMetaData(self):
-    res = {}
+    """Read the sizes, the element types, the names of the sets and the
+    number of integration points per element, without reading the nodes.
+    "nbElements" and "elementTypes" only take into account the elements of
+    the **element block, the elements of the fasets/lisets are reported as
+    element tags.
+
+    Returns
+    -------
+    dict
+        the metadata (see BasicTools.IO.ReaderBase.NewMetaData) plus the
+        "dimensionality", "nbIntegrationPoints" and "IPPerElement" entries
+    """
+    res = NewMetaData()
     self.StartReading()
-    nbIP  = 0
+    IPPerElement = np.empty(0, dtype=PBasicIndexType)
     l = self.ReadCleanLine()
 
     while(True):
@@ -53,18 +65,29 @@ class GeofReader(ReaderBase):
         s       = l.split()
         res["nbNodes"] = int(s[0])
         res["dimensionality"] = int(s[1])
+        _, _, l = self.SkimCleanBlock("**")
+        continue
       elif l.find("**element")>-1:
         l  = self.ReadCleanLine()
         res['nbElements'] = int(l.split()[0])
-        IPPerElement = np.empty(res['nbElements'],dtype= PBasicIndexType)
-        cpt = 0
-        while(True):
-          l  = self.ReadCleanLine()
-          if l.find("**") > -1:
-               break
-          s = l.split()
-          IPPerElement[cpt] = nbIntegrationsPoints[s[1]]
-          cpt +=1
+        lines, l = self.ReadCleanBlock("**")
+        geofTypes = [line.split(None,2)[1] for line in lines]
+        IPPerElement = np.fromiter((nbIntegrationsPoints[geofType] for geofType in geofTypes), dtype=PBasicIndexType, count=len(lines))
+        for geofType in geofTypes:
+          nametype = GeofNumber[geofType]
+          res["elementTypes"][nametype] = res["elementTypes"].get(nametype,0) + 1
+        continue
+      elif l.find("**nset")>-1:
+        res["nodesTags"].append(l.split()[1])
+        _, _, l = self.SkimCleanBlock("**")
+        continue
+      elif l.find("**elset")>-1:
+        res["elementsTags"].append(l.split()[1])
+        _, _, l = self.SkimCleanBlock("**")
+        continue
+      elif l.find("**faset")>-1 or l.find("**liset")>-1:
+        res["elementsTags"].append(l[8:])
+        _, _, l = self.SkimCleanBlock("**")
         continue
       l = self.ReadCleanLine()
 
@@ -74,7 +97,6 @@ class GeofReader(ReaderBase):
 
     return res
 
-
   def Read(self, fileName=None,string=None,out=None,readElset=True,readFaset=True,printNotRead=True):
     import BasicTools.Containers.UnstructuredMesh as UM
     if fileName is not None:
@@ -90,11 +112,16 @@ class GeofReader(ReaderBase):
     else:
         res = out
 
-    filetointernalid = {}
+    filetointernalid = OriginalIdsToInternalIds([])
     FENames = {}
 
-    oidToElementContainer = {}
-    oidToLocalElementNumber = {}
+    # for every element block : the original ids, the container number,
+    # the id of the elements in the container
+    elementsOids = []
+    elementsNames = []
+    elementsLocalIds = []
+    elementsContainers = []
+    oidToElement = OriginalIdsToInternalIds([])
     l = self.ReadCleanLine()
     while(True):
 
@@ -110,19 +137,14 @@ class GeofReader(ReaderBase):
         nbNodes = int(s[0])
         dim     = int(s[1])
         self.PrintDebug("Reading "+str(nbNodes)+ " Nodes in dimension "+str(dim))
+        lines, l = self.ReadCleanBlock("**")
+        data = LinesToArray(lines)
         res.nodes = np.empty((nbNodes,dim))
         res.originalIDNodes= np.empty((nbNodes,),dtype=PBasicIndexType)
-        cpt = 0
-        while(True):
-            l  = self.ReadCleanLine()
-            if l.find("**") > -1:
-                break
-            s = l.split()
-            oid = int(s[0])
-            filetointernalid[oid] = cpt
-            res.originalIDNodes[cpt] = int(s[0])
-            res.nodes[cpt,:] = list(map(float,s[1:]))
-            cpt += 1
+        if len(lines):
+          res.nodes[0:len(lines),:] = data[:,1:]
+          res.originalIDNodes[0:len(lines)] = data[:,0]
+        filetointernalid = OriginalIdsToInternalIds(res.originalIDNodes[0:len(lines)])
         continue
 
 
@@ -130,23 +152,19 @@ class GeofReader(ReaderBase):
         l  = self.ReadCleanLine()
         nbElements = int(l.split()[0])
         self.PrintVerbose( "nbElements {}".format(nbElements) )
-        while(True):
-          l  = self.ReadCleanLine()
-          if l.find("**") > -1:
-               break
-          s = l.split()
-          nametype = GeofNumber[s[1]]
-          conn = [filetointernalid[x] for x in  map(int,s[2:]) ]
+        lines, l = self.ReadCleanBlock("**")
+        for nametype, geofTypes, data in _GroupLinesByElementType(lines, 1):
+          conn = filetointernalid[data[:,1:]]
+          _PermuteConnectivity(conn, geofTypes)
           elements = res.GetElementsOfType(nametype)
-          oid = int(s[0])
-          if s[1] in PermutationZSetToBasicTools:
-              conn =  [conn[x] for x in PermutationZSetToBasicTools[s[1]] ]
-          cpt = elements.AddNewElement(conn,oid)
-          oidToElementContainer[oid] = elements
-          oidToLocalElementNumber[oid] = cpt-1
-          if nametype not in FENames:
-            FENames[nametype] = []
-          FENames[nametype].append(s[1])
+          firstElement = elements.GetNumberOfElements()
+          elements.AddNewElements(conn,data[:,0])
+          elementsOids.append(data[:,0])
+          elementsNames.append(np.full(len(geofTypes),len(elementsContainers),dtype=PBasicIndexType))
+          elementsContainers.append(elements)
+          elementsLocalIds.append(np.arange(firstElement,elements.GetNumberOfElements(),dtype=PBasicIndexType))
+          FENames.setdefault(nametype,[]).extend(geofTypes)
+        oidToElement = OriginalIdsToInternalIds(np.concatenate(elementsOids))
         continue
 
       if l.find("**nset")>-1:
@@ -154,49 +172,39 @@ class GeofReader(ReaderBase):
         self.PrintDebug( "nset {}".format(nsetname) )
 
         tag = res.GetNodalTag(nsetname)
-
-        while(True):
-          l  = self.ReadCleanLine()
-          if l.find("**") > -1:
-               break
-          s = l.split()
-          for oid in s:
-              tag.AddToTag(filetointernalid[int(oid)])
+        lines, l = self.ReadCleanBlock("**")
+        tag.AddToTag(filetointernalid[LinesToFlatArray(lines)])
         continue
 
       if l.find("**elset")>-1:
         elsetname = l.split()[1]
         self.PrintDebug( "elset {}".format(elsetname) )
 
-        while(True):
-          l  = self.ReadCleanLine()
-          if l.find("**") > -1 or readElset == False:
-               break
-          s = l.split()
+        lines, l = self.ReadCleanBlock("**")
+        if readElset == False:
+          continue
 
-          for soid in s:
-              oid = int(soid)
-              #res.AddElementToTagUsingOriginalId(int(oid),elsetname)
-              oidToElementContainer[oid].tags.CreateTag(elsetname,False).AddToTag(oidToLocalElementNumber[oid])
+        ids = oidToElement[LinesToFlatArray(lines)]
+        containers = np.concatenate(elementsNames)[ids]
+        localIds = np.concatenate(elementsLocalIds)[ids]
+        for containerNumber in np.unique(containers):
+            mask = containers == containerNumber
+            elementsContainers[containerNumber].tags.CreateTag(elsetname,False).AddToTag(localIds[mask])
         continue
 
       if l.find("**faset")>-1 or l.find("**liset")>-1:
         fasetName = l[8:]
         self.PrintDebug("Reading Group " + fasetName)
-        while(True):
-          l  = self.ReadCleanLine()
-          if l.find("**") > -1 or readFaset == False:
-               break
-          s = l.split()
-          nametype = GeofNumber[s[0]]
-          conn = [filetointernalid[x] for x in  map(int,s[1:])]
-
-          if s[0] in PermutationZSetToBasicTools:
-              conn =  [conn[x] for x in PermutationZSetToBasicTools[s[0]] ]
-
+        lines, l = self.ReadCleanBlock("**")
+        if readFaset == False:
+          continue
+        for nametype, geofTypes, data in _GroupLinesByElementType(lines, 0):
+          conn = filetointernalid[data]
+          _PermuteConnectivity(conn, geofTypes)
           elements = res.GetElementsOfType(nametype)
-          localId = elements.AddNewElement(conn,-1)
-          elements.GetTag(fasetName).AddToTag(localId-1)
+          firstElement = elements.GetNumberOfElements()
+          elements.AddNewElements(conn,-1)
+          elements.GetTag(fasetName).AddToTag(np.arange(firstElement,elements.GetNumberOfElements()))
         continue
 
       if l.find("***return")>-1:
@@ -228,6 +236,59 @@ class GeofReader(ReaderBase):
     return res
 
 
+def _GroupLinesByElementType(lines, typeColumn):
+    """Internal function to group the lines of an element block by element
+    type (in the order of the file). The block is converted with only one
+    tokenization call.
+
+    Parameters
+    ----------
+    lines : list of str
+        lines with the geof type of the element in the column typeColumn and
+        only integers in the other columns
+    typeColumn : int
+        the column of the geof type (0 or 1)
+
+    Returns
+    -------
+    list of (str, list of str, np.ndarray)
+        for every element type : the element type, the geof types of the
+        elements, the integers of the lines (without the type column)
+    """
+    if len(lines) == 0:
+        return []
+    flat, sizes, words = LinesToFlatArrayWithSizes(lines, dtype=PBasicIndexType, stringColumn=typeColumn)
+    offsets = np.cumsum(sizes) - sizes
+    uniqueWords, firstIndices, inverse = np.unique(words, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    uniqueGeofTypes = uniqueWords.astype(str)
+    geofTypes = uniqueGeofTypes[inverse]
+
+    # the element types in the order of the file
+    typesOrder = np.argsort(firstIndices)
+    uniqueNametypes = list(dict.fromkeys(GeofNumber[uniqueGeofTypes[i]] for i in typesOrder))
+    nametypeIds = np.array([uniqueNametypes.index(GeofNumber[geofType]) for geofType in uniqueGeofTypes])[inverse]
+
+    res = []
+    for cpt, nametype in enumerate(uniqueNametypes):
+        rows = np.flatnonzero(nametypeIds == cpt)
+        nbValues = sizes[rows[0]]
+        if np.any(sizes[rows] != nbValues):
+            raise(Exception("Error converting the elements of type " + str(nametype) + ": lines with different number of values"))
+        data = flat[offsets[rows,None] + np.arange(nbValues)]
+        res.append((nametype, geofTypes[rows].tolist(), data))
+    return res
+
+def _PermuteConnectivity(conn, geofTypes):
+    """Internal function to apply (inplace) the permutation from the geof
+    numbering to the BasicTools numbering"""
+    geofTypes = np.asarray(geofTypes)
+    for geofType in np.unique(geofTypes):
+        if geofType not in PermutationZSetToBasicTools:
+            continue
+        mask = geofTypes == geofType
+        conn[mask,:] = conn[mask,:][:,PermutationZSetToBasicTools[geofType]]
+
 from BasicTools.IO.IOFactory import RegisterReaderClass
 RegisterReaderClass(".geof",GeofReader)
 
@@ -269,7 +330,11 @@ def CheckIntegrity():
 
     import BasicTools.Containers.UnstructuredMesh as UM
     ReadGeof(fileName=newFileName,out = UM.UnstructuredMesh())
-    print(ReadMetaData(fileName=newFileName))
+    metadata = ReadMetaData(fileName=newFileName)
+    print(metadata)
+    if metadata["nbNodes"] != 5 or metadata["dimensionality"] != 3 or metadata["nbElements"] != 1: raise
+    if metadata["elementTypes"] != {EN.Tetrahedron_4:1} or metadata["nbIntegrationPoints"] != 4: raise
+    if metadata["nodesTags"] != ["g1"] or metadata["elementsTags"] != ["g2", "tri", "quads"]: raise
     return 'ok'
 
 if __name__ == '__main__':
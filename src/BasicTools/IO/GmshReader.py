@@ -11,7 +11,7 @@ import numpy as np
 
 import BasicTools.Containers.ElementNames as EN
 import BasicTools.Containers.UnstructuredMesh  as UM
-from BasicTools.IO.ReaderBase import ReaderBase
+from BasicTools.IO.ReaderBase import ReaderBase, LinesToArray, LinesToFlatArrayWithSizes, OriginalIdsToInternalIds, NewMetaData
 from BasicTools.NumpyDefs import PBasicIndexType
 from BasicTools.IO.GmshTools import gmshNumber,PermutationGmshToBasicTools
 
@@ -22,6 +22,11 @@ def ReadGmsh(fileName=None,string=None,out=None,**kwargs):
     reader.Read(fileName=fileName, string=string,out=out,**kwargs)
     return reader.output
 
+def ReadMetaData(fileName=None,string=None):
+    reader = GmshReader()
+    reader.SetFileName(fileName)
+    reader.SetStringToRead(string)
+    return reader.ReadMetaData()
 
 class GmshReader(ReaderBase):
     def __init__(self):
@@ -29,6 +34,47 @@ class GmshReader(ReaderBase):
         self.commentChar= "%"
         self.readFormat = 'r'
 
+    def ReadMetaData(self):
+        """Read the sizes, the element types and the physical names of the
+        file without reading the nodes and elements blocks
+
+        Returns
+        -------
+        dict
+            the metadata (see BasicTools.IO.ReaderBase.NewMetaData)
+        """
+        res = NewMetaData()
+        self.StartReading()
+        while(True):
+            l = self.ReadCleanLine()
+            if not l: break
+
+            if l.find("$Nodes")>-1 :
+                res["nbNodes"] = int(self.ReadCleanLine().split()[0])
+                self.SkimCleanBlock("$EndNodes")
+                continue
+
+            if l.find("$Elements")>-1 :
+                self.ReadCleanLine()
+                nbElements, counts, _ = self.SkimCleanBlock("$EndElements", column=1)
+                res["nbElements"] += nbElements
+                for gmshElemType, nb in counts.items():
+                    nametype = gmshNumber[gmshElemType]
+                    res["elementTypes"][nametype] = res["elementTypes"].get(nametype,0) + nb
+                continue
+
+            if l.find("$PhysicalNames")>-1 :
+                lines, _ = self.ReadCleanBlock("$EndPhysicalNames")
+                res["elementsTags"].extend(line.split()[2].strip('"').strip("'") for line in lines[1:])
+                continue
+
+            if l[0] == "$":
+                self.SkimCleanBlock("$End")
+                continue
+
+        self.EndReading()
+        return res
+
     def Read(self,fileName=None,string=None, out=None):
 
         if fileName is not None:
@@ -45,8 +91,7 @@ class GmshReader(ReaderBase):
             res = out
 
 
-        filetointernalid = {}
-        #filetointernalidElem =  {}
+        filetointernalid = OriginalIdsToInternalIds([])
         tagsNames = []
         while(True):
             l = self.ReadCleanLine()
@@ -66,23 +111,16 @@ class GmshReader(ReaderBase):
 
                 nbNodes = int(l.split()[0])
                 #print("Reading "+str(nbNodes)+ " Nodes")
-                res.nodes = np.empty((nbNodes,3))
-                res.originalIDNodes= np.empty((nbNodes,),dtype=PBasicIndexType)
-                cpt =0;
-                while(True):
-                    line = self.ReadCleanLine()
-                    l = line.strip('\n').lstrip().rstrip()
-                    if len(l) == 0: continue
-                    if l.find("$EndNodes") > -1:
-                        break
-                    s = l.split()
-                    if cpt == nbNodes :
-                        raise(Exception("More points than the number of point in the header (fix your file!!!)")) # pragma: no cover
-                    filetointernalid[s[0]] = cpt
-                    res.originalIDNodes[cpt] = int(s[0])
-                    res.nodes[cpt,:] = list(map(float,s[1:]))
-                    cpt +=1
-
+                lines, l = self.ReadCleanBlock("$EndNodes")
+                if len(lines) > nbNodes :
+                    raise(Exception("More points than the number of point in the header (fix your file!!!)")) # pragma: no cover
+                data = LinesToArray(lines)
+                res.nodes = np.zeros((nbNodes,3))
+                res.originalIDNodes= np.zeros((nbNodes,),dtype=PBasicIndexType)
+                if len(lines):
+                    res.nodes[0:len(lines),:] = data[:,1:]
+                    res.originalIDNodes[0:len(lines)] = data[:,0]
+                filetointernalid = OriginalIdsToInternalIds(res.originalIDNodes[0:len(lines)])
                 continue
             if l.find("$PhysicalNames")>-1 :
                 l = self.ReadCleanLine()
@@ -115,45 +153,53 @@ class GmshReader(ReaderBase):
 
                 nbElements = int(l.split()[0])
                 #print("Reading "+str(nbElements)+ " Elements")
-                #res.nodes = np.empty((nbNodes,dim))
-                #res.originalIDNodes= np.empty((nbNodes,))
-                allTags = {}
-                cpt =0;
-                while(True):
-                    l = self.ReadCleanLine()
-                    if l.find("$EndElements") > -1:
-                        if nbElements != cpt:# pragma: no cover
-                            print("File problem!! number of elements read not equal to the total number of elements")
-                            print(nbElements)
-                            print(cpt)
-                        break
-                    s = l.split()
-
-                    oid = int(s[0])
-                    gmshElemType = s[1]
-                    nametype = gmshNumber[gmshElemType]
+                lines, l = self.ReadCleanBlock("$EndElements")
+                if nbElements != len(lines):# pragma: no cover
+                    print("File problem!! number of elements read not equal to the total number of elements")
+                    print(nbElements)
+                    print(len(lines))
+                if len(lines) == 0:
+                    continue
 
-                    ntags = int(s[2])
+                # every line : oid type ntags tags... connectivity
+                # the lines have different sizes, so all the values are read
+                # in a flat array, then the lines are recovered using offsets
+                flat, lineSizes = LinesToFlatArrayWithSizes(lines, dtype=PBasicIndexType)
+                if len(flat) != np.sum(lineSizes):
+                    raise(Exception("Error reading the elements")) # pragma: no cover
+                offsets = np.zeros(len(lines), dtype=PBasicIndexType)
+                offsets[1:] = np.cumsum(lineSizes)[:-1]
+                gmshTypes = flat[offsets+1]
+                ntags = flat[offsets+2]
+
+                # the element types are treated in the order of the file
+                uniqueTypes, firstIndices = np.unique(gmshTypes, return_index=True)
+                for gmshElemType in uniqueTypes[np.argsort(firstIndices)]:
+                    nametype = gmshNumber[str(gmshElemType)]
+                    mask = gmshTypes == gmshElemType
+                    typeOffsets = offsets[mask]
+                    typeNtags = ntags[mask]
+                    elements = res.elements.GetElementsOfType(nametype)
+                    nbNodesPerElement = elements.GetNumberOfNodesPerElement()
 
-                    conn = [filetointernalid[x] for x in  s[ntags+3:] ]
+                    connStarts = typeOffsets + 3 + typeNtags
+                    conn = filetointernalid[flat[connStarts[:,None]+np.arange(nbNodesPerElement)[None,:]]]
                     if nametype in PermutationGmshToBasicTools:
-                        conn = [conn[x] for x in PermutationGmshToBasicTools[nametype]]
-                    elements = res.elements.GetElementsOfType(nametype)
-                    elnumber = elements.AddNewElement(conn,oid)-1
-                    tags = allTags.setdefault(nametype,{})
-                    if ntags >=0 :
-                        tags.setdefault("PhyTag"+s[3],[]).append(elnumber)
-                    if ntags >=1 :
-                        tags.setdefault("GeoTag"+s[4],[]).append(elnumber)
-                    for n in range(2, ntags):
-                        tags.setdefault("ExtraTag"+str(n-2),[]).append(elnumber)
-
-                    cpt +=1
-                for nametype,tags in allTags.items():
-                    elements = res.elements.GetElementsOfType(nametype)
-                    for name,ids in tags.items():
-                        elements.tags.CreateTag(name).SetIds(ids)
-                del allTags
+                        conn = conn[:,PermutationGmshToBasicTools[nametype]]
+                    firstElement = elements.GetNumberOfElements()
+                    elements.AddNewElements(conn,flat[typeOffsets])
+                    elnumbers = np.arange(firstElement, elements.GetNumberOfElements())
+
+                    for n, tagName in [(1,"PhyTag"), (2,"GeoTag")]:
+                        tagMask = typeNtags >= n
+                        if not np.any(tagMask):
+                            continue
+                        tagValues = flat[typeOffsets[tagMask]+2+n]
+                        tagElements = elnumbers[tagMask]
+                        for value in np.unique(tagValues):
+                            elements.tags.CreateTag(tagName+str(value)).AddToTag(tagElements[tagValues == value])
+                    for n in range(2, np.max(typeNtags)):
+                        elements.tags.CreateTag("ExtraTag"+str(n-2)).AddToTag(elnumbers[typeNtags > n])
                 continue
             print("ignoring line : " + l )
 
@@ -232,6 +278,14 @@ this is a comment
 
     res = ReadGmsh(string=__teststring)
 
+    metadata = ReadMetaData(string=__teststring)
+    print(metadata)
+    if metadata["nbNodes"] != 23 or metadata["nbElements"] != 3: raise
+    if metadata["elementTypes"] != {EN.Point_1:2, EN.Hexaedron_20:1}: raise
+    if metadata["elementsTags"] != ["1D", "2D", "3D"]: raise
+    for name, data in res.elements.items():
+        if data.GetNumberOfElements() != metadata["elementTypes"][name]: raise
+
     print("----")
     print(res.nodes)
     print(res.originalIDNodes)
@@ -23,6 +23,28 @@ class ReaderFactory(Factory):
 def GetAvailableReaders():
     return list(ReaderFactory._Catalog.keys())
 
+def ReadMetaData(fileName):
+    """Read the metadata of a file (sizes, element types, tags, fields and
+    times) without reading the heavy data, using the reader registered for
+    the extension of the file (the readers must be registered, see
+    InitAllReaders)
+
+    Parameters
+    ----------
+    fileName : str
+        name of the file
+
+    Returns
+    -------
+    dict
+        the metadata (see BasicTools.IO.ReaderBase.NewMetaData)
+    """
+    reader = CreateReader("."+fileName.split(".")[-1].lower())
+    if not hasattr(reader,"ReadMetaData"):
+        raise Exception("The reader "+ type(reader).__name__ +" cant read only the metadata of a file")
+    reader.SetFileName(fileName)
+    return reader.ReadMetaData()
+
 def InitAllReaders():
 
     import BasicTools.IO.InpReader as InpReader
@@ -89,6 +111,37 @@ def CheckIntegrity():
     print("Available Readers for '.test': ", ReaderFactory.GetAvailablesFor(".test"))
 
     print(CreateReader(".test"))
+    try:
+        ReadMetaData("file.test")
+        raise # pragma: no cover
+    except Exception:
+        pass
+
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    from BasicTools.Helpers.Tests import TestTempDir
+    from BasicTools.IO.GmshWriter import WriteMeshToGmsh
+    from BasicTools.IO.MeshWriter import WriteMesh
+    from BasicTools.IO.XdmfWriter import WriteMeshToXdmf
+    from BasicTools.IO.GeofWriter import WriteMeshToGeof
+    from BasicTools.IO.InpWriter import WriteMeshToINP
+    mesh = CreateCube([3,4,5])
+    tempdir = TestTempDir.GetTempPath()
+    for extension, writeFunction in [(".msh",WriteMeshToGmsh), (".mesh",WriteMesh), (".meshb",WriteMesh), (".xdmf",WriteMeshToXdmf), (".geof",WriteMeshToGeof), (".inp",WriteMeshToINP)]:
+        fileName = tempdir+"IOFactoryMetaData"+extension
+        if writeFunction is WriteMesh:
+            writeFunction(fileName, mesh, binary=(extension == ".meshb"))
+        else:
+            writeFunction(fileName, mesh)
+        metadata = ReadMetaData(fileName)
+        print(extension, metadata)
+        if metadata["nbNodes"] != mesh.GetNumberOfNodes():
+            raise Exception("Error reading the metadata of a " + extension + " file")
+        # in the geof files the skin elements are stored as fasets (tags)
+        if extension != ".geof" and metadata["nbElements"] != mesh.GetNumberOfElements():
+            raise Exception("Error reading the metadata of a " + extension + " file")
+        # in the xdmf files the element types of a Mixed topology are in the heavy data
+        if extension != ".xdmf" and metadata["elementTypes"]["hex8"] != mesh.GetElementsOfType("hex8").GetNumberOfElements():
+            raise Exception("Error reading the metadata of a " + extension + " file")
     InitAllWriters()
     class DummyWriterI:
         pass
@@ -13,7 +13,8 @@ import csv
 from BasicTools.Helpers.Timer import Timer
 import BasicTools.Containers.ElementNames as EN
 from BasicTools.Containers.Filters import ElementFilter
-from BasicTools.IO.ReaderBase import ReaderBase
+from BasicTools.IO.ReaderBase import ReaderBase, LinesToArray, LinesToFlatArray, OriginalIdsToInternalIds, NewMetaData
+from BasicTools.NumpyDefs import PBasicIndexType
 from BasicTools.IO.AbaqusTools import InpNameToBasicTools, permutation
 
 KeywordToIgnore = ["INITIAL CONDITIONS",
@@ -143,6 +144,12 @@ def ReadInp(fileName=None,string=None,out=None,**kwargs):
     reader.Read(fileName=fileName, string=string,out=out,**kwargs)
     return reader.output
 
+def ReadMetaData(fileName=None,string=None):
+    reader = InpReader()
+    reader.SetFileName(fileName)
+    reader.SetStringToRead(string)
+    return reader.ReadMetaData()
+
 class InpReader(ReaderBase):
     def __init__(self):
         super(InpReader,self).__init__()
@@ -164,6 +171,55 @@ class InpReader(ReaderBase):
                 return res + " "+  super(InpReader,self).ReadCleanLine()
         return res
 
+    def ReadMetaData(self):
+        """Read the sizes, the element types and the names of the sets of the
+        file without reading the data lines
+
+        Returns
+        -------
+        dict
+            the metadata (see BasicTools.IO.ReaderBase.NewMetaData)
+        """
+        res = NewMetaData()
+        self.StartReading()
+
+        def AddName(names, name):
+            if name not in names:
+                names.append(name)
+
+        l = self.ReadCleanLine()
+        while(True):
+            if not l: break
+            if l[0] != "*":
+                l = self.ReadCleanLine()
+                continue
+            ldata = LineToDic(l)
+            keyword = ldata.get("KEYWORD","").upper()
+
+            if keyword == "NODE":
+                nbNodes, _, l = self.SkimCleanBlock("*", separator=",")
+                res["nbNodes"] += nbNodes
+                continue
+
+            if keyword == "ELEMENT":
+                nametype = InpNameToBasicTools[ldata["TYPE"]]
+                nbElements, _, l = self.SkimCleanBlock("*", separator=",")
+                res["nbElements"] += nbElements
+                if nbElements:
+                    res["elementTypes"][nametype] = res["elementTypes"].get(nametype,0) + nbElements
+                if "ELSET" in ldata:
+                    AddName(res["elementsTags"], ldata["ELSET"])
+                continue
+
+            if keyword == "NSET":
+                AddName(res["nodesTags"], ldata["NSET"])
+            elif keyword == "ELSET":
+                AddName(res["elementsTags"], ldata["ELSET"])
+            _, _, l = self.SkimCleanBlock("*")
+
+        self.EndReading()
+        return res
+
     def Read(self,fileName=None,string=None, out=None):
         import BasicTools.FE.ProblemData as ProblemData
         from BasicTools.Linalg.Transform  import Transform
@@ -185,7 +241,7 @@ class InpReader(ReaderBase):
         coef = 1.
         meta = ProblemData.ProblemData()
 
-        filetointernalid = {}
+        filetointernalid = OriginalIdsToInternalIds([])
         filetointernalidElement = {}
         l = self.ReadCleanLine()
         FENames = {}
@@ -237,33 +293,15 @@ class InpReader(ReaderBase):
                 continue
 
             if self.find(l,"*NODE")>-1:
-                    nodes= []
-                    originalIds = []
-
-                    cpt = 0
-                    res.originalIDNodes = np.empty((0,1), int)
-                    res.nodes = np.empty((0,3), float)
-                    l = self.ReadCleanLine()
-                    dim = 3
-                    s = None
-
-                    while(True):
-                        if len(l) == 0 or l[0]=="*" or not l:
-                            break
-                        s = LineToListNoQuote(l)
-                        oid = int(s[0])
-                        filetointernalid[oid] = cpt
-                        nodes.append(list(map(float,s[1:])) )
-                        originalIds.append(oid)
-                        cpt += 1
-                        l = self.ReadCleanLine()
-
-                    if s is not None:
-                        # we use the last point to detect the dimensionality of the mesh
-                        dim = len(s)-1
-                    res.nodes = np.array(nodes,dtype=float)
-                    res.nodes.shape = (cpt,dim)
-                    res.originalIDNodes = np.array(originalIds,dtype=int)
+                    lines, l = self.ReadCleanBlock("*")
+                    if len(lines):
+                        data = LinesToArray(lines, separator=",")
+                        res.nodes = np.array(data[:,1:],dtype=float)
+                        res.originalIDNodes = np.array(data[:,0],dtype=int)
+                    else:
+                        res.nodes = np.empty((0,3), float)
+                        res.originalIDNodes = np.empty((0,), int)
+                    filetointernalid = OriginalIdsToInternalIds(res.originalIDNodes)
                     continue
 
             if self.find(l,"*ELEMENT")>-1:
@@ -272,24 +310,16 @@ class InpReader(ReaderBase):
                 nametype = InpNameToBasicTools[etype]
                 per = permutation.get(etype,None)
 
-                l = self.ReadCleanLine()
+                lines, l = self.ReadCleanBlock("*")
                 elements = res.GetElementsOfType(nametype)
                 initialcid = elements.GetNumberOfElements()
 
-                while(True):
-                    if l is None or not l or l[0]== "*" :
-                        break
-                    s = LineToListNoQuote(l)
-                    oid = int(s[0])
-                    conn = [filetointernalid[x] for x in  map(int,s[1:]) ]
-
-                    cid = elements.AddNewElement(conn,oid)-1
-                    if nametype not in FENames:
-                        FENames[nametype] = []
-                    FENames[nametype].append(etype)
-                    filetointernalidElement[oid] = (elements,cid)
-
-                    l = self.ReadCleanLine()
+                if len(lines):
+                    conn = LinesToArray(lines, dtype=PBasicIndexType, separator=",")
+                    oids = conn[:,0]
+                    elements.AddNewElements(filetointernalid[conn[:,1:]],oids)
+                    FENames.setdefault(nametype,[]).extend([etype]*len(oids))
+                    filetointernalidElement.update(zip(oids.tolist(), ((elements,cid) for cid in range(initialcid,elements.GetNumberOfElements()))))
 
                 if per is not None:
                     elements.connectivity = elements.connectivity[:,per]
@@ -316,26 +346,23 @@ class InpReader(ReaderBase):
                     d = (list(map(int,d) ))
                     nset = range(d[0],d[1]+1,d[2])
                     tag = res.nodesTags.CreateTag(nsetName,False)
-                    tagsids = [filetointernalid[x] for x in  nset if x in filetointernalid ]
+                    nset = np.asarray(nset, dtype=PBasicIndexType)
+                    tagsids = filetointernalid[nset[filetointernalid.IsIn(nset)]]
                     if len(tagsids) != len(nset):
                         print("Warning NSET GENERATE : not all the nset generated are present in the mesh ")
                     tag.AddToTag(tagsids)
                     l = self.ReadCleanLine()
                     continue
                 else:
-                    while(True):
-                        if l is None:
-                            break
-                        if l.find("*") > -1 or not l:
-                            break
-                        s = l.replace(',', '').split()
-                        nset.extend(map(int,s))
-
-                        l = self.ReadCleanLine()
-                        continue
+                    lines = []
+                    if l is not None and l.find("*") == -1 :
+                        lines, nextLine = self.ReadCleanBlock("*")
+                        lines.insert(0, l)
+                        l = nextLine
+                    nset = LinesToFlatArray(lines, separator=",")
 
                 tag = res.nodesTags.CreateTag(nsetName,False)
-                tag.AddToTag([filetointernalid[x] for x in  nset ])
+                tag.AddToTag(filetointernalid[nset])
                 continue
 
             if self.find(l,"*DISTRIBUTION")>-1:
@@ -563,10 +590,26 @@ def CheckIntegrity():
          5,      2.9259249999999999,                      0.,      1.4996439999999893
          6,      2.7781790000000002,     0.78753359999999994,      2.3200409999999998
     *ELEMENT, TYPE=C3D4, ELSET=AM1_labo
-         1,         1,         2,         3,         4
-         2,         3,         5,         6,         4"""
+         1,         1,         2,         3,
+                    4
+         2,         3,         5,         6,         4
+    *NSET, NSET=Fixed
+         1, 2,
+         6
+    *NSET, NSET=Gen, GENERATE
+         2, 8, 2"""
 
     res = ReadInp(string=data)
+    mesh = res[0]
+    if not np.array_equal(mesh.nodesTags["Fixed"].GetIds(), [0, 1, 5]): raise(Exception("Error reading nset"))
+    if not np.array_equal(mesh.nodesTags["Gen"].GetIds(), [1, 3, 5]): raise(Exception("Error reading nset"))
+    if not np.array_equal(mesh.GetElementsOfType(EN.Tetrahedron_4).connectivity, [[0, 1, 2, 3], [2, 4, 5, 3]]): raise(Exception("Error reading elements"))
+
+    metadata = ReadMetaData(string=data)
+    print(metadata)
+    if metadata["nbNodes"] != 6 or metadata["nbElements"] != 2: raise(Exception("Error reading metadata"))
+    if metadata["elementTypes"] != {EN.Tetrahedron_4:2}: raise(Exception("Error reading metadata"))
+    if metadata["nodesTags"] != ["Fixed", "Gen"] or metadata["elementsTags"] != ["AM1_labo"]: raise(Exception("Error reading metadata"))
 
     from BasicTools.Helpers.Tests import TestTempDir
     tempdir = TestTempDir.GetTempPath()
@@ -9,7 +9,7 @@ import numpy as np
 
 import BasicTools.Containers.UnstructuredMesh  as UM
 import BasicTools.Containers.ElementNames as EN
-from BasicTools.IO.ReaderBase import ReaderBase
+from BasicTools.IO.ReaderBase import ReaderBase, NewMetaData
 
 from BasicTools.IO.MeshTools import ASCIITypes
 from BasicTools.IO.MeshTools import ASCIITags
@@ -20,17 +20,31 @@ from BasicTools.IO.MeshTools import BinaryFields
 import BasicTools.IO.MeshTools as MT
 from BasicTools.NumpyDefs import PBasicIndexType, PBasicFloatType
 
-def ReadMesh(fileName=None,string=None,ReadRefsAsField=False ):
+def ReadMesh(fileName=None,string=None,ReadRefsAsField=False,mmap=False ):
+    """Read a .mesh/.meshb file, if mmap is True the binary data blocks
+    (refs, fields) are memory mapped (see ReaderBase.SetMemoryMap)"""
     reader = MeshReader()
     reader.SetReadRefsAsField(ReadRefsAsField)
+    reader.SetMemoryMap(mmap)
     reader.SetFileName(fileName)
     reader.SetStringToRead(string)
     reader.Read()
     return reader.output
 
-def ReadSol(fileName, out=None):
+def ReadMetaData(fileName=None,string=None):
+    """Read the sizes, the element types, the tags and the fields names of a
+    .mesh/.meshb file without reading the data blocks"""
+    reader = MeshReader()
+    reader.SetFileName(fileName)
+    reader.SetStringToRead(string)
+    return reader.ReadMetaData()
+
+def ReadSol(fileName, out=None, mmap=False):
+    """Read a .sol/.solb file (and the associated mesh), if mmap is True the
+    binary data blocks (refs, fields) are memory mapped (see ReaderBase.SetMemoryMap)"""
     reader = MeshSolutionReaderWrapper()
     reader.SetFileName(fileName)
+    reader.SetMemoryMap(mmap)
     reader.Read(out=out)
     return reader.output
 
@@ -91,6 +105,23 @@ class MeshReader(ReaderBase):
         else:
             self.SetBinary(False)
 
+    def ReadMetaData(self):
+        """Read the sizes, the element types, the tags and the fields names
+        of the file. The data blocks are skipped (seek for binary files).
+        The tags created from the references ("NTag*", "ETag*") are not
+        reported because the references are part of the data blocks.
+
+        Returns
+        -------
+        dict
+            the metadata (see BasicTools.IO.ReaderBase.NewMetaData) plus the
+            "dimensionality" entry
+        """
+        if self.binary :
+            return self._ReadMetaDataBinary()
+        else:
+            return self._ReadMetaDataAscii()
+
     def ReadExtraFields(self,fileName):
         self.SetFileName(fileName)
 
@@ -270,6 +301,62 @@ class MeshReader(ReaderBase):
         self.EndReading()
         return res
 
+    def _ReadMetaDataAscii(self):
+        self.readFormat = 'r'
+        self.StartReading()
+        res = NewMetaData()
+        res["dimensionality"] = None
+
+        def NextValue(s):
+            # the value is on the same line as the keyword or on the next one
+            if len(s) > 1:
+                return int(s[1])
+            return int(self.filePointer.readline().split()[0])
+
+        while(True):
+            line = self.filePointer.readline()
+            if line == "" :
+                break
+            l = line.strip()
+            # the data lines of the blocks start with a number, only the
+            # keywords are treated
+            if len(l) == 0 or not l[0].isalpha(): continue
+            s = l.split()
+
+            if s[0] == "Dimension":
+                res["dimensionality"] = NextValue(s)
+                continue
+
+            if s[0] == "Vertices":
+                res["nbNodes"] = NextValue(s)
+                continue
+
+            if l in ASCIITypes:
+                nbElements = NextValue(s)
+                if nbElements == 0:
+                    continue
+                nametype = ASCIITypes[l]
+                res["nbElements"] += nbElements
+                res["elementTypes"][nametype] = res["elementTypes"].get(nametype,0) + nbElements
+                continue
+
+            if l in ASCIITags:
+                res["elementsTags"].append(ASCIITags[l][1])
+                continue
+
+            if l in ["SolAtVertices","SolAtTetrahedra"]:
+                self.filePointer.readline()
+                nbfields = int(self.filePointer.readline().split()[0])
+                fields = res["nodeFields"] if l == "SolAtVertices" else res["elementFields"]
+                fields.extend(l+str(i) for i in range(nbfields))
+                continue
+
+            if l.find("End")>-1 :
+                break
+
+        self.EndReading()
+        return res
+
     def _ReadFieldsASCII(self,myFile,dim):
         datares = []
         line = myFile.ReadCleanLine(withError = True)
@@ -332,6 +419,49 @@ class MeshReader(ReaderBase):
 
       return dataType,dataSize,dimension
 
+    def _ReadMetaDataBinary(self):
+      self.readFormat = 'rb'
+      self.StartReading()
+      res = NewMetaData()
+      dataType,dataSize,dimension = self._ReadBinaryHeader()
+      res["dimensionality"] = dimension
+
+      while True:
+          key = self.readInt32()
+          if key == BKeys["GmfEnd"]:
+              break
+
+          if self.version == 3:
+              endOfInformation = self.readInt64()
+          else:
+              endOfInformation = self.readInt32()
+
+          if key == BKeys["GmfVertices"]:
+              res["nbNodes"] = self.readInt32()
+          elif key == BKeys["GmfCorners"]:
+              res["nodesTags"].append("Corners")
+          elif key in BinaryTypes:
+              nbElements = self.readInt32()
+              nametype = BinaryTypes[key]
+              res["nbElements"] += nbElements
+              res["elementTypes"][nametype] = res["elementTypes"].get(nametype,0) + nbElements
+          elif key == BKeys["GmfRequiredVertices"]:
+              res["nodesTags"].append(MT.RequiredVertices)
+          elif key in BinaryTags:
+              res["elementsTags"].append(BinaryTags[key][1])
+          elif key in BinaryFields or key == BKeys["GmfSolAtVertices"]:
+              self._ReadBinaryInt()
+              nbfields = self._ReadBinaryInt()
+              # same destination as in ReadMeshBinary
+              if key in BinaryFields:
+                  res["elementFields"].extend(BinaryFields[key]+str(i) for i in range(nbfields))
+              else:
+                  res["nodeFields"].extend("SolAtVertices"+str(i) for i in range(nbfields))
+          self.filePointer.seek(endOfInformation)
+
+      self.EndReading()
+      return res
+
     def ReadMeshBinary(self,out=None):
       self.readFormat = 'rb'
       self.StartReading()
@@ -374,7 +504,7 @@ class MeshReader(ReaderBase):
               dt =  np.dtype([('pos', dataType,(dimension,) ), ('ref', np.int32, (1,))])
 
 
-              data = np.fromfile(self.filePointer,dtype=dt,count=nbNodes, sep="")
+              data = self.readData(nbNodes,dt)
 
               res.nodes[:,:] = data[:]["pos"]
               res.originalIDNodes[:] = np.arange(nbNodes,dtype=PBasicIndexType)
@@ -393,7 +523,7 @@ class MeshReader(ReaderBase):
 
           if key == BKeys["GmfCorners"]:
               nbCorners = self.readInt32()
-              data = np.fromfile(self.filePointer,dtype=np.int32,count=nbCorners, sep="")
+              data = self.readData(nbCorners,np.int32)
               res.nodesTags.CreateTag("Corners").SetIds(data-1)
               continue
 
@@ -412,7 +542,7 @@ class MeshReader(ReaderBase):
 
               dt =  np.dtype([('conn', np.int32,(nbNodes,) ), ('ref', np.int32, (1,))])
 
-              data = np.fromfile(self.filePointer,dtype=dt,count=nbElements, sep="")
+              data = self.readData(nbElements,dt)
 
               elements.connectivity = (data[:]["conn"]-1).astype(np.int_)
 
@@ -438,7 +568,7 @@ class MeshReader(ReaderBase):
               tagname = MT.RequiredVertices
               self.PrintVerbose("Reading " + str(tagname) )
               nbentries = self.readInt32()
-              ids = np.fromfile(self.filePointer,dtype=np.int32,count=nbentries, sep="")-1
+              ids = self.readData(nbentries,np.int32)-1
               res.nodesTags.CreateTag(tagname).SetIds(ids)
               continue
 
@@ -446,7 +576,7 @@ class MeshReader(ReaderBase):
               elemtype,tagname = BinaryTags[key]
               self.PrintVerbose("Reading " + str(tagname) )
               nbentries = self.readInt32()
-              ids = np.fromfile(self.filePointer,dtype=np.int32,count=nbentries, sep="")-1
+              ids = self.readData(nbentries,np.int32)-1
               elements = res.GetElementsOfType(elemtype)
               elements.tags.CreateTag(tagname).SetIds(ids)
               continue
@@ -648,6 +778,12 @@ class MeshSolutionReaderWrapper():
        import locale
        self.canHandleTemporal = False
        self.encoding = locale.getpreferredencoding(False)
+       self.memoryMap = False
+
+    def SetMemoryMap(self,memoryMap=True):
+        self.memoryMap = memoryMap
+        if hasattr(self,"reader"):
+            self.reader.SetMemoryMap(memoryMap)
 
     def SetFileName(self,fileName):
         import os.path
@@ -674,6 +810,7 @@ class MeshSolutionReaderWrapper():
             raise Exception("unable to find a mesh file")
         self.reader = MeshReader()
         self.reader.encoding = self.encoding
+        self.reader.SetMemoryMap(self.memoryMap)
         self.reader.SetFileName(fileName=f)
 
     def Read(self,out=None):
@@ -687,6 +824,7 @@ class MeshSolutionReaderWrapper():
         if 'SolAtTetrahedra0' in fields:
             if mesh.GetElementsOfType(EN.Tetrahedron_4).GetNumberOfElements() == mesh.GetNumberOfElements():
                 mesh.elemFields = {k:v for k,v in fields.items() if k.find("SolAtTetrahedra") != -1  }
+        self.output = mesh
         return mesh
 
 
@@ -741,6 +879,13 @@ End
     res = ReadMesh(string=__teststring)
     print(res)
 
+    metadata = ReadMetaData(string=__teststring)
+    print(metadata)
+    if metadata["nbNodes"] != 4 or metadata["nbElements"] != 1 or metadata["dimensionality"] != 3: raise Exception("Error reading metadata")
+    if metadata["elementTypes"] != {EN.Tetrahedron_4:1}: raise Exception("Error reading metadata")
+    metadata = ReadMetaData(string=__teststringField)
+    if metadata["nodeFields"] != ["SolAtVertices0"]: raise Exception("Error reading metadata")
+
     from BasicTools.Helpers.Tests import TestTempDir
 
 
@@ -767,6 +912,9 @@ End
 
     res = ReadMesh(newFileName,ReadRefsAsField=True)
     print(res)
+    metadata = ReadMetaData(newFileName)
+    if metadata["nbNodes"] != res.GetNumberOfNodes() or metadata["dimensionality"] != 3: raise Exception("Error reading binary metadata")
+    if metadata["elementTypes"] != {name:data.GetNumberOfElements() for name,data in res.elements.items()}: raise Exception("Error reading binary metadata")
 
 
     sol = MeshReader().ReadExtraFields(TestTempDir().GetTempPath()+"mshFile.sol")
@@ -784,6 +932,17 @@ End
 
     sol = MeshReader().ReadExtraFields(TestTempDir().GetTempPath()+"mshFile.solb")
 
+    # memory mapped reading
+    mmapRes = ReadMesh(TestTempDir().GetTempPath()+"mshFile.meshb",ReadRefsAsField=True,mmap=True)
+    if not isinstance(mmapRes.nodeFields['refs'].base, np.memmap): raise Exception("Error memory mapping the refs")
+    if not np.array_equal(mmapRes.nodes, res.nodes): raise Exception("Error reading nodes")
+    reader = MeshReader()
+    reader.SetMemoryMap(True)
+    mmapSol = reader.ReadExtraFields(TestTempDir().GetTempPath()+"mshFile.solb")
+    if not isinstance(mmapSol['SolAtVertices0'].base, np.memmap): raise Exception("Error memory mapping the fields")
+    if not np.array_equal(mmapSol['SolAtVertices0'], sol['SolAtVertices0']): raise Exception("Error reading fields")
+    mmapSol = ReadSol(TestTempDir().GetTempPath()+"mshFile.solb",mmap=True)
+
     return 'ok'
 
 if __name__ == '__main__':# pragma: no cover
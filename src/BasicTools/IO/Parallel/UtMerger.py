@@ -20,6 +20,7 @@ class UtMerger(WriterBase):
     def __init__(self):
         super(UtMerger,self).__init__()
         self.timeSteps = "all"
+        self.nbCPUs = 1
 
     def __str__(self):
         res  = 'UtMerge : \n'
@@ -61,109 +62,49 @@ class UtMerger(WriterBase):
     def SetTimeSteps(self,iterator):
         self.timeSteps = iterator
 
-    def Merge(self):
-
-        localDataInteg = []
-        localDataNode = []
-        localIdstotreat = []
-        localoriginalIDNodes = []
-
-        from BasicTools.Helpers.ProgressBar import printProgressBar
-        printProgressBar(0, self.nbsd, prefix = 'Reading Local solutions:', suffix = 'Complete', length = 50)
-
-        #Read each subdomain computation
-        for sd in range(1,self.nbsd+1):
-            sdString = "-" + str(sd).zfill(3)
-
-            reader = UR.UtReader()
-            reader.SetFileName(self.dataFolder + self.name + sdString + ".ut")
-            reader.ReadMetaData()
-            nbeTimeSteps = reader.time.shape[0]
-
-            if self.timeSteps != "all":
-                reader.time = reader.time[self.timeSteps,:]
-                if len(reader.time.shape) == 1:
-                    reader.time.shape = (1,nbeTimeSteps)
-
-            localMesh = GR.ReadGeof(fileName = self.dataFolder+reader.meshfile,readElset=False,readFaset=False,printNotRead=False)
-            Tag3D(localMesh)
-            idstotreat, metaDataMesh3D = Return3DElements(localMesh)
+    def SetNumberOfCPUs(self,nbCPUs):
+        """Set the number of processes used to read the subdomains and to
+        merge the time steps (1 to do all the work in the current process)
+        """
+        self.nbCPUs = nbCPUs
 
-            originalIDNodes = np.array(localMesh.originalIDNodes-1, dtype=int)
-
-            reader.atIntegrationPoints = True
-            dataInteg = {}
-            for din in reader.integ:
-                dataInteg[din] = np.empty((reader.meshMetadata['nbIntegrationPoints'],nbeTimeSteps))
-                for timeStep in range(nbeTimeSteps):
-                    dataInteg[din][:,timeStep] = reader.ReadField(fieldname=din, timeIndex=int(reader.time[timeStep,0])-1)
-
-            reader.atIntegrationPoints = False
-            dataNode = {}
-            for din in reader.node:
-                dataNode[din] = np.empty((reader.meshMetadata['nbNodes'],nbeTimeSteps))
-                for timeStep in range(nbeTimeSteps):
-                    dataNode[din][:,timeStep] = reader.ReadField(fieldname=din, timeIndex=int(reader.time[timeStep,0])-1)
-
-            localDataInteg.append(dataInteg)
-            localDataNode.append(dataNode)
-            localIdstotreat.append(idstotreat)
-            localoriginalIDNodes.append(originalIDNodes)
+    def Merge(self):
 
-            printProgressBar(sd, self.nbsd, prefix = 'Reading Local solutions:', suffix = 'Complete', length = 50)
-        print("Local solutions have been read")
+        #Read each subdomain mesh
+        tasks = [ (self.dataFolder, self.name + "-" + str(sd).zfill(3) + ".ut", self.timeSteps) for sd in range(1,self.nbsd+1)]
+        localInfos = RunTasks(_ReadLocalSubdomain, tasks, self.nbCPUs, prefix = 'Reading Local meshes:')
+        print("Local meshes have been read")
 
+        reader = localInfos[0]
+        nbeTimeSteps = len(reader["timeIndices"])
 
         cutGeof = GeofFromCut(self.dataFolder, self.name)
         globalMesh = GR.ReadGeof(fileName = self.dataFolder + cutGeof,readElset=False,readFaset=False,printNotRead=False)
 
         Tag3D(globalMesh)
         globalIdstotreat, metaDataMesh3D = Return3DElements(globalMesh)
-        #globalMesh.originalIDNodes = np.array(globalMesh.originalIDNodes-1, dtype=int)
-
-        globaldataInteg = {}
-        for din in reader.integ:
-            globaldataInteg[din] = np.empty((metaDataMesh3D.NGauss,nbeTimeSteps))
-        globaldataNode = {}
-        for din in reader.node:
-            globaldataNode[din] = np.empty((metaDataMesh3D.Nodes,nbeTimeSteps))
-
-        #write .integ
-        data_integ = np.empty(len(reader.integ)*metaDataMesh3D.NGauss*(nbeTimeSteps))
-        nGpE = metaDataMesh3D.NGaussperEl
-        count0 = 0
-
-        printProgressBar(0, nbeTimeSteps, prefix = 'Writing global .integ:', suffix = 'Complete', length = 50)
-        for timeStep in range(nbeTimeSteps):
-            field = np.empty((len(reader.integ),metaDataMesh3D.NGauss))
-            count = 0
-            for sd in range(self.nbsd):
-                for k in range(len(reader.integ)):
-                    count = 0
-                    for el in localIdstotreat[sd]:
-                        field[k,el*nGpE:(el+1)*nGpE] = localDataInteg[sd][reader.integ[k]][count:count+nGpE,timeStep]
-                        count += nGpE
-            for m in range(len(globalIdstotreat)):
-                for k in range(len(reader.integ)):
-                    data_integ[count0:count0+nGpE] = field[k,nGpE*m:nGpE*(m+1)]
-                    count0 += nGpE
-            printProgressBar(timeStep+1, nbeTimeSteps, prefix = 'Writing global .integ:', suffix = 'Complete', length = 50)
-
-        data_integ.astype(np.float32).byteswap().tofile(self.outputFolder + self.name + ".integ")
-        print("Global .integ has been written")
 
-        #write .node
-        data_node = np.zeros(len(reader.node)*metaDataMesh3D.Nodes*(nbeTimeSteps))
-        printProgressBar(0, nbeTimeSteps, prefix = 'Writing global .node:', suffix = 'Complete', length = 50)
-        for timeStep in range(nbeTimeSteps):
-            count = 0
-            for sd in range(self.nbsd):
-                for k in range(len(reader.node)):
-                    indices = list(map(lambda x: x + len(reader.node)*metaDataMesh3D.Nodes*timeStep+k*metaDataMesh3D.Nodes, localoriginalIDNodes[sd]))
-                    data_node[indices] = localDataNode[sd][reader.node[k]][:,timeStep]
-            printProgressBar(timeStep+1, nbeTimeSteps, prefix = 'Writing global .node:', suffix = 'Complete', length = 50)
-
-        data_node.astype(np.float32).byteswap().tofile(self.outputFolder + self.name + ".node")
+        globalInfo = {"integ": reader["integ"],
+                      "node": reader["node"],
+                      "nbElements": len(globalIdstotreat),
+                      "nGpE": metaDataMesh3D.NGaussperEl,
+                      "NGauss": metaDataMesh3D.NGauss,
+                      "Nodes": metaDataMesh3D.Nodes,
+                      "integFile": self.outputFolder + self.name + ".integ",
+                      "nodeFile": self.outputFolder + self.name + ".node" }
+
+        # the output files are allocated (filled with zeros), then every time
+        # step is written at its own offset
+        for fileName, size in [(globalInfo["integFile"], len(reader["integ"])*globalInfo["nbElements"]*globalInfo["nGpE"]),
+                               (globalInfo["nodeFile"], len(reader["node"])*globalInfo["Nodes"]) ]:
+            with open(fileName,"wb") as outFile:
+                outFile.truncate(4*size*nbeTimeSteps)
+
+        # the infos (and the readers) are sent once to every process, the
+        # tasks are only the time steps
+        RunTasks(_MergeTimeStep, list(range(nbeTimeSteps)), self.nbCPUs, prefix = 'Writing global .integ and .node:',
+                 initializer=_SetSharedData, initargs=({"localInfos":localInfos, "globalInfo":globalInfo},))
+        print("Global .integ has been written")
         print("Global .node has been written")
 
         #write .ut
@@ -173,15 +114,131 @@ class UtMerger(WriterBase):
           for i in range(3):
             __string += inFile.readline()
 
+        times = reader["time"]
         with open(self.outputFolder + self.name + ".ut", "w") as outFile:
           outFile.write(__string)
           for timeStep in range(nbeTimeSteps):
             line = ""
             for i in range(4):
-              line += str(int(reader.time[timeStep,i]))+" "
-            line += str(reader.time[timeStep,4])+"\n"
+              line += str(int(times[timeStep,i]))+" "
+            line += str(times[timeStep,4])+"\n"
             outFile.write(line)
 
+def RunTasks(function, tasks, nbCPUs=1, prefix='Progress:', initializer=None, initargs=()):
+    """Apply function to every task, using a pool of nbCPUs processes if
+    nbCPUs > 1. The function and the tasks must be picklable.
+
+    Parameters
+    ----------
+    function : callable
+        a module level function taking one task as argument
+    tasks : list
+        the arguments for function
+    nbCPUs : int, optional
+        number of processes to use, by default 1
+    prefix : str, optional
+        prefix for the progress bar, by default 'Progress:'
+    initializer : callable, optional
+        a module level function called with initargs once in every process
+        (in the current process if nbCPUs == 1) before the tasks, to share
+        data between all the tasks (see _SetSharedData), by default None
+    initargs : tuple, optional
+        the arguments for initializer, by default ()
+
+    Returns
+    -------
+    list
+        the results of function for every task (in the same order)
+    """
+    from BasicTools.Helpers.ProgressBar import printProgressBar
+    printProgressBar(0, len(tasks), prefix = prefix, suffix = 'Complete', length = 50)
+    res = []
+    if nbCPUs > 1 and len(tasks) > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(nbCPUs,len(tasks)), initializer=initializer, initargs=initargs) as executor:
+            for r in executor.map(function, tasks):
+                res.append(r)
+                printProgressBar(len(res), len(tasks), prefix = prefix, suffix = 'Complete', length = 50)
+    else:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            res.append(function(task))
+            printProgressBar(len(res), len(tasks), prefix = prefix, suffix = 'Complete', length = 50)
+    return res
+
+# data shared by all the tasks of a process (set by the initializer of RunTasks)
+_sharedData = {}
+
+def _SetSharedData(data):
+    """Internal function (initializer for RunTasks) to set the data shared by
+    all the tasks of the process"""
+    _sharedData.clear()
+    _sharedData.update(data)
+
+def _ReadLocalSubdomain(folder_utFile_timeSteps):
+    """Internal function to read the mesh (and meta data) of a subdomain"""
+    dataFolder, utFile, timeSteps = folder_utFile_timeSteps
+    reader = UR.UtReader()
+    reader.SetFileName(dataFolder + utFile)
+    reader.ReadMetaData()
+    times = reader.time
+    if timeSteps != "all":
+        times = times[timeSteps,:]
+        if len(times.shape) == 1:
+            times.shape = (1,times.shape[0])
+
+    localMesh = GR.ReadGeof(fileName = dataFolder+reader.meshfile,readElset=False,readFaset=False,printNotRead=False)
+    Tag3D(localMesh)
+    idstotreat, metaDataMesh3D = Return3DElements(localMesh)
+
+    # the reader (with the meta data already parsed) is reused for all the time steps
+    return {"reader": reader,
+            "integ": reader.integ,
+            "node": reader.node,
+            "time": times,
+            "timeIndices": np.array(times[:,0], dtype=int)-1,
+            "idstotreat": np.asarray(idstotreat, dtype=int),
+            "originalIDNodes": np.array(localMesh.originalIDNodes-1, dtype=int)}
+
+def _MergeTimeStep(timeStep):
+    """Internal function to merge (and write) one time step of all the
+    subdomains (the infos are in _sharedData)"""
+    localInfos = _sharedData["localInfos"]
+    globalInfo = _sharedData["globalInfo"]
+    integ = globalInfo["integ"]
+    node = globalInfo["node"]
+    nGpE = globalInfo["nGpE"]
+    nbElements = globalInfo["nbElements"]
+
+    field = np.empty((len(integ),globalInfo["NGauss"]),dtype=np.float32)
+    data_node = np.zeros((len(node),globalInfo["Nodes"]),dtype=np.float32)
+    for info in localInfos:
+        reader = info["reader"]
+        timeIndex = int(info["timeIndices"][timeStep])
+
+        reader.atIntegrationPoints = True
+        dataInteg = reader.ReadFields(integ, timeIndex=timeIndex)
+        ipIds = (info["idstotreat"][:,None]*nGpE + np.arange(nGpE)[None,:]).ravel()
+        for k, din in enumerate(integ):
+            field[k,ipIds] = dataInteg[din][0:len(ipIds)]
+
+        dataNode = reader.ReadFields(node, timeIndex=timeIndex)
+        for k, din in enumerate(node):
+            data_node[k,info["originalIDNodes"]] = dataNode[din]
+
+    # .integ : element by element, variable by variable
+    data_integ = field[:,0:nbElements*nGpE].reshape((len(integ),nbElements,nGpE)).transpose(1,0,2)
+    _WriteTimeStep(globalInfo["integFile"], timeStep, data_integ)
+    _WriteTimeStep(globalInfo["nodeFile"], timeStep, data_node)
+
+def _WriteTimeStep(fileName, timeStep, data):
+    """Internal function to write the block of one time step in a file
+    already allocated"""
+    data = np.ascontiguousarray(data, dtype=">f4")
+    with open(fileName,"r+b") as outFile:
+        outFile.seek(timeStep*data.nbytes)
+        data.tofile(outFile)
 
 def GeofFromCut(dataFolder, cutName):
   cutFile = open(dataFolder+cutName+".cut", 'r')
@@ -217,19 +274,25 @@ def CheckIntegrity():
     tempdir = TestTempDir.GetTempPath()
     import BasicTools.TestData as BasicToolsTestData
 
-    ##################################
-    # EXEMPLE SYNTAXE DU MERGER
-    import BasicTools.IO.Parallel.UtMerger as UM
-    merger = UM.UtMerger()
-    merger.SetName("cube")
-    merger.SetdataFolder(BasicToolsTestData.GetTestDataPath() + "UtParExample/")
-    merger.SetOutputFolder(tempdir)
-    merger.Merge()
-    ##################################
-
-    import filecmp
-    print(TFormat.InRed("node files equals  ? "+ str(filecmp.cmp(tempdir + "cube.node",  BasicToolsTestData.GetTestDataPath() + "UtParExample/cube.node", shallow=False))))
-    print(TFormat.InRed("integ files equals ? "+ str(filecmp.cmp(tempdir + "cube.integ", BasicToolsTestData.GetTestDataPath() + "UtParExample/cube.integ", shallow=False))))
+    for nbCPUs in [1, 2]:
+        ##################################
+        # EXEMPLE SYNTAXE DU MERGER
+        import BasicTools.IO.Parallel.UtMerger as UM
+        merger = UM.UtMerger()
+        merger.SetName("cube")
+        merger.SetdataFolder(BasicToolsTestData.GetTestDataPath() + "UtParExample/")
+        merger.SetOutputFolder(tempdir)
+        merger.SetNumberOfCPUs(nbCPUs)
+        merger.Merge()
+        ##################################
+
+        import filecmp
+        nodeOk = filecmp.cmp(tempdir + "cube.node",  BasicToolsTestData.GetTestDataPath() + "UtParExample/cube.node", shallow=False)
+        integOk = filecmp.cmp(tempdir + "cube.integ", BasicToolsTestData.GetTestDataPath() + "UtParExample/cube.integ", shallow=False)
+        print(TFormat.InRed("node files equals  ? "+ str(nodeOk)))
+        print(TFormat.InRed("integ files equals ? "+ str(integOk)))
+        if not (nodeOk and integOk):
+            raise(Exception("Error merging the files using " + str(nbCPUs) + " cpus"))
     print(tempdir)
     return "ok"
 
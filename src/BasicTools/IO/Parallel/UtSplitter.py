@@ -14,13 +14,14 @@ import BasicTools.IO.UtReader as UR
 import BasicTools.Containers.ElementNames as EN
 from BasicTools.FE.IntegrationsRules import LagrangeIsoParam
 from BasicTools.Helpers.TextFormatHelper import TFormat
-from BasicTools.IO.Parallel.UtMerger import Tag3D, Return3DElements
+from BasicTools.IO.Parallel.UtMerger import Tag3D, Return3DElements, RunTasks, _SetSharedData, _sharedData, _WriteTimeStep
 
 class UtSplitter(WriterBase):
     "This class can plit .ut, .goef, .ctnod, .node, .integ files frpù a monolithic Zset solution"
     def __init__(self):
         super(UtSplitter,self).__init__()
         self.timeSteps = "all"
+        self.nbCPUs = 1
 
     def __str__(self):
         res  = 'UtSplit : \n'
@@ -62,81 +63,53 @@ class UtSplitter(WriterBase):
     def SetTimeSteps(self,iterator):
         self.timeSteps = iterator
 
-    def Split(self):
-
-      reader = UR.UtReader()
-      reader.SetFileName(self.dataFolder + self.name + ".ut")
-      reader.ReadMetaData()
-
-
-      if self.timeSteps != "all":
-        reader.time = reader.time[self.timeSteps,:]
-        if len(reader.time.shape) == 1:
-          reader.time.shape = (1,reader.time.shape[0])
-
-
-      reader.atIntegrationPoints = True
-      globaldataInteg = {}
-      for din in reader.integ:
-        globaldataInteg[din] = np.empty((reader.meshMetadata['nbIntegrationPoints'],reader.time.shape[0]))
-        for timeStep in range(reader.time.shape[0]):
-          globaldataInteg[din][:,timeStep] = reader.ReadField(fieldname=din, timeIndex=int(reader.time[timeStep,0])-1)
-
-      reader.atIntegrationPoints = False
-      globaldataNode = {}
-      for din in reader.node:
-          globaldataNode[din] = np.empty((reader.meshMetadata['nbNodes'],reader.time.shape[0]))
-          for timeStep in range(reader.time.shape[0]):
-            globaldataNode[din][:,timeStep] = reader.ReadField(fieldname=din, timeIndex=int(reader.time[timeStep,0])-1)
+    def SetNumberOfCPUs(self,nbCPUs):
+        """Set the number of processes used to read the subdomains and to
+        split the time steps (1 to do all the work in the current process)
+        """
+        self.nbCPUs = nbCPUs
 
+    def Split(self):
 
       globalMesh = GR.ReadGeof(fileName = self.dataFolder + self.name + ".geof",readElset=False,readFaset=False,printNotRead=False)
       Tag3D(globalMesh)
       globalIdstotreat, metaDataglobalMesh3D = Return3DElements(globalMesh)
-      globalMesh.originalIDNodes = np.array(globalMesh.originalIDNodes-1, dtype=int)
-
-      nGpE = metaDataglobalMesh3D.NGaussperEl
 
+      reader = UR.UtReader()
+      reader.SetFileName(self.dataFolder + self.name + ".ut")
+      reader.ReadMetaData()
 
-      from BasicTools.Helpers.ProgressBar import printProgressBar
-      printProgressBar(0, self.nbsd, prefix = 'Progress:', suffix = 'Complete', length = 50)
+      times = reader.time
+      if self.timeSteps != "all":
+        times = times[self.timeSteps,:]
+        if len(times.shape) == 1:
+          times.shape = (1,times.shape[0])
+
+      # the reader (with the meta data already parsed) is reused for all the time steps
+      globalInfo = {"reader": reader,
+                    "integ": reader.integ,
+                    "node": reader.node,
+                    "timeIndices": np.array(times[:,0], dtype=int)-1,
+                    "nGpE": metaDataglobalMesh3D.NGaussperEl}
+
+      tasks = [ (self.dataFolder + self.name + "-pmeshes" + os.sep, self.name + "-" + str(sd).zfill(3) + ".geof", self.outputFolder + self.name + "-" + str(sd).zfill(3) ) for sd in range(1,self.nbsd+1)]
+      localInfos = RunTasks(_ReadLocalMesh, tasks, self.nbCPUs, prefix = 'Reading Local meshes:')
+
+      # the output files are allocated (filled with zeros), then every time
+      # step is written at its own offset
+      for info in localInfos:
+        for extension, size in [(".integ", len(reader.integ)*len(info["idstotreat"])*globalInfo["nGpE"]),
+                                (".node", len(reader.node)*info["Nodes"])]:
+          with open(info["outputBaseName"] + extension,"wb") as outFile:
+            outFile.truncate(4*size*times.shape[0])
+
+      # the infos (and the reader) are sent once to every process, the
+      # tasks are only the time steps
+      RunTasks(_SplitTimeStep, list(range(times.shape[0])), self.nbCPUs, prefix = 'Progress:',
+               initializer=_SetSharedData, initargs=({"localInfos":localInfos, "globalInfo":globalInfo},))
 
       for sd in range(1,self.nbsd+1):
         sdString = "-" + str(sd).zfill(3)
-        localMesh = GR.ReadGeof(fileName = self.dataFolder+self.name + "-pmeshes" + os.sep + self.name + sdString + ".geof",readElset=False,readFaset=False,printNotRead=False)
-        Tag3D(localMesh)
-        localIdstotreat, metaDatalocalMesh3D = Return3DElements(localMesh)
-        localOriginalIDNodes = np.array(localMesh.originalIDNodes-1, dtype=int)
-
-
-        #write .integ
-        data_integ = np.empty(len(reader.integ)*metaDatalocalMesh3D.NGauss*(reader.time.shape[0]))
-
-        count0 = 0
-        for timeStep in range(reader.time.shape[0]):
-          field = np.empty((len(reader.integ),metaDatalocalMesh3D.NGauss))
-          count = 0
-          for k in range(len(reader.integ)):
-            count = 0
-            for el in localIdstotreat:
-              field[k,count:count+nGpE] = globaldataInteg[reader.integ[k]][el*nGpE:(el+1)*nGpE,timeStep]
-              count += nGpE
-          for m in range(len(localIdstotreat)):
-            for k in range(len(reader.integ)):
-              data_integ[count0:count0+nGpE] = field[k,nGpE*m:nGpE*(m+1)]
-              count0 += nGpE
-        data_integ.astype(np.float32).byteswap().tofile(self.outputFolder + self.name + sdString + ".integ")
-
-
-        #write .node
-        count0 = 0
-        data_node = np.zeros(len(reader.node)*metaDatalocalMesh3D.Nodes*(reader.time.shape[0]))
-        for timeStep in range(reader.time.shape[0]):
-          for k in range(len(reader.node)):
-            data_node[count0:count0+metaDatalocalMesh3D.Nodes] = globaldataNode[reader.node[k]][localOriginalIDNodes,timeStep]
-            count0 += metaDatalocalMesh3D.Nodes
-        data_node.astype(np.float32).byteswap().tofile(self.outputFolder + self.name + sdString +".node")
-
 
         #write .ut
         __string = "**meshfile " + os.path.relpath(self.dataFolder, self.outputFolder) + os.sep + self.name + "-pmeshes" + os.sep + self.name + sdString + ".geof\n"
@@ -148,22 +121,53 @@ class UtSplitter(WriterBase):
 
         with open(self.outputFolder + self.name + sdString + ".ut", "w") as outFile:
           outFile.write(__string)
-          for timeStep in range(reader.time.shape[0]):
+          for timeStep in range(times.shape[0]):
             line = ""
             for i in range(4):
-              line += str(int(reader.time[timeStep,i]))+" "
-            line += str(reader.time[timeStep,4])+"\n"
+              line += str(int(times[timeStep,i]))+" "
+            line += str(times[timeStep,4])+"\n"
             outFile.write(line)
 
-        printProgressBar(sd, self.nbsd, prefix = 'Progress:', suffix = 'Complete', length = 50)
-
-
-
       #write .cut
       __string = "***decomposition\n" + "  **global_mesh " + os.path.relpath(self.dataFolder, self.outputFolder) + os.sep + self.name + ".geof\n" + "  **domains "+str(self.nbsd)+"\n"
       with open(self.outputFolder + self.name + ".cut", "w") as outFile:
         outFile.write(__string)
 
+def _ReadLocalMesh(folder_geofFile_outputBaseName):
+    """Internal function to read the mesh of a subdomain"""
+    folder, geofFile, outputBaseName = folder_geofFile_outputBaseName
+    localMesh = GR.ReadGeof(fileName = folder + geofFile,readElset=False,readFaset=False,printNotRead=False)
+    Tag3D(localMesh)
+    localIdstotreat, metaDatalocalMesh3D = Return3DElements(localMesh)
+    return {"outputBaseName": outputBaseName,
+            "idstotreat": np.asarray(localIdstotreat, dtype=int),
+            "originalIDNodes": np.array(localMesh.originalIDNodes-1, dtype=int),
+            "Nodes": metaDatalocalMesh3D.Nodes}
+
+def _SplitTimeStep(timeStep):
+    """Internal function to split (and write) one time step for all the
+    subdomains (the infos are in _sharedData)"""
+    localInfos = _sharedData["localInfos"]
+    globalInfo = _sharedData["globalInfo"]
+    integ = globalInfo["integ"]
+    node = globalInfo["node"]
+    nGpE = globalInfo["nGpE"]
+
+    reader = globalInfo["reader"]
+    timeIndex = int(globalInfo["timeIndices"][timeStep])
+    reader.atIntegrationPoints = True
+    dataInteg = reader.ReadFields(integ, timeIndex=timeIndex)
+    dataInteg = np.array([dataInteg[din] for din in integ])
+    dataNode = reader.ReadFields(node, timeIndex=timeIndex)
+    dataNode = np.array([dataNode[din] for din in node])
+
+    for info in localInfos:
+        ids = info["idstotreat"]
+        ipIds = (ids[:,None]*nGpE + np.arange(nGpE)[None,:]).ravel()
+        # .integ : element by element, variable by variable
+        data_integ = dataInteg[:,ipIds].reshape((len(integ),len(ids),nGpE)).transpose(1,0,2)
+        _WriteTimeStep(info["outputBaseName"] + ".integ", timeStep, data_integ)
+        _WriteTimeStep(info["outputBaseName"] + ".node", timeStep, dataNode[:,info["originalIDNodes"]])
 
 def CheckIntegrity():
 
@@ -171,23 +175,29 @@ def CheckIntegrity():
     tempdir = TestTempDir.GetTempPath()
     import BasicTools.TestData as BasicToolsTestData
 
-    ##################################
-    # EXEMPLE SYNTAXE DU SPLITTER
-    import BasicTools.IO.Parallel.UtSplitter as US
-    splitter = US.UtSplitter()
-    splitter.SetName("cube")
-    splitter.SetdataFolder(BasicToolsTestData.GetTestDataPath() + "UtParExample/")
-    splitter.SetOutputFolder(tempdir)
-    splitter.Split()
-    ##################################
-
-    print("tempdir =", tempdir)
-
-    import filecmp
-    for i in range(splitter.nbsd):
-      sdString = "-" + str(i+1).zfill(3)
-      print(TFormat.InRed("node files for subdomain "+str(i+1)+" equals  ? "+ str(filecmp.cmp(tempdir + "cube"+sdString+".node",  BasicToolsTestData.GetTestDataPath() + "UtParExample/cube"+sdString+".node", shallow=False))))
-      print(TFormat.InRed("integ files for subdomain "+str(i+1)+" equals ? "+ str(filecmp.cmp(tempdir + "cube"+sdString+".integ", BasicToolsTestData.GetTestDataPath() + "UtParExample/cube"+sdString+".integ", shallow=False))))
+    for nbCPUs in [1, 2]:
+        ##################################
+        # EXEMPLE SYNTAXE DU SPLITTER
+        import BasicTools.IO.Parallel.UtSplitter as US
+        splitter = US.UtSplitter()
+        splitter.SetName("cube")
+        splitter.SetdataFolder(BasicToolsTestData.GetTestDataPath() + "UtParExample/")
+        splitter.SetOutputFolder(tempdir)
+        splitter.SetNumberOfCPUs(nbCPUs)
+        splitter.Split()
+        ##################################
+
+        print("tempdir =", tempdir)
+
+        import filecmp
+        for i in range(splitter.nbsd):
+          sdString = "-" + str(i+1).zfill(3)
+          nodeOk = filecmp.cmp(tempdir + "cube"+sdString+".node",  BasicToolsTestData.GetTestDataPath() + "UtParExample/cube"+sdString+".node", shallow=False)
+          integOk = filecmp.cmp(tempdir + "cube"+sdString+".integ", BasicToolsTestData.GetTestDataPath() + "UtParExample/cube"+sdString+".integ", shallow=False)
+          print(TFormat.InRed("node files for subdomain "+str(i+1)+" equals  ? "+ str(nodeOk)))
+          print(TFormat.InRed("integ files for subdomain "+str(i+1)+" equals ? "+ str(integOk)))
+          if not (nodeOk and integOk):
+            raise(Exception("Error splitting the files using " + str(nbCPUs) + " cpus"))
 
     print(tempdir)
     return "ok"
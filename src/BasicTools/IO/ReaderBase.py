@@ -12,6 +12,207 @@ import locale
 import numpy as np
 
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject
+from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
+
+def _FromString(text, dtype):
+    """Internal function to convert a text of numbers separated by white spaces
+    into a 1D array. An exception is raised if the text cannot be read to its end.
+    """
+    import warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(text, dtype=dtype, sep=" ")
+        except (DeprecationWarning, ValueError):
+            raise(Exception("Error converting text to numbers of type " + str(np.dtype(dtype)) ))
+
+def LinesToArray(lines, dtype=PBasicFloatType, separator=None):
+    """Convert a block of lines of numbers (with the same number of values per
+    record) into a 2D array using only one tokenization call.
+    A record can span several lines if the lines ends with the separator.
+
+    Parameters
+    ----------
+    lines : list of str
+        the lines to convert
+    dtype : numpy type, optional
+        the type of the output, by default PBasicFloatType
+    separator : str, optional
+        separator to be used in addition to white spaces (for example ","),
+        by default None
+
+    Returns
+    -------
+    np.ndarray
+        array of size (number of records, number of values per record)
+    """
+    if len(lines) == 0:
+        return np.empty((0,0), dtype=dtype)
+
+    text = "\n".join(lines)
+    nbRecords = len(lines)
+    firstRecord = lines[0]
+    if separator is not None:
+        # lines ending with the separator continue on the next line
+        nbRecords -= sum(1 for line in lines if line[-1] == separator)
+        cpt = 1
+        while firstRecord[-1] == separator and cpt < len(lines):
+            firstRecord += " " + lines[cpt]
+            cpt += 1
+        text = text.replace(separator," ")
+        firstRecord = firstRecord.replace(separator," ")
+
+    nbValues = len(firstRecord.split())
+    data = _FromString(text, dtype)
+    if data.size != nbRecords*nbValues:
+        raise(Exception("Error converting block of lines: expected " + str(nbRecords) + " records of " + str(nbValues) + " values, " + str(data.size) + " values read"))
+    data.shape = (nbRecords, nbValues)
+    return data
+
+def LinesToFlatArray(lines, dtype=PBasicIndexType, separator=None):
+    """Convert a block of lines of numbers (with any number of values per
+    line) into a 1D array using only one tokenization call.
+
+    Parameters
+    ----------
+    lines : list of str
+        the lines to convert
+    dtype : numpy type, optional
+        the type of the output, by default PBasicIndexType
+    separator : str, optional
+        separator to be used in addition to white spaces (for example ","),
+        by default None
+
+    Returns
+    -------
+    np.ndarray
+        1D array with all the values
+    """
+    text = "\n".join(lines)
+    if separator is not None:
+        text = text.replace(separator," ")
+    return _FromString(text, dtype)
+
+def LinesToFlatArrayWithSizes(lines, dtype=PBasicIndexType, stringColumn=None):
+    """Convert a block of lines of numbers (with any number of values per
+    line) into a 1D array and the number of values of every line using only
+    one tokenization call. The words of the lines are located on the bytes of
+    the block (no split of the lines).
+
+    Parameters
+    ----------
+    lines : list of str
+        the lines to convert (clean lines, as returned by ReadCleanBlock)
+    dtype : numpy type, optional
+        the type of the output, by default PBasicIndexType
+    stringColumn : int, optional
+        column of a word which is not a number (for example the element
+        type), these words are returned apart, by default None
+
+    Returns
+    -------
+    np.ndarray
+        1D array with all the values (without the words of stringColumn)
+    np.ndarray
+        number of values of every line (without the words of stringColumn)
+    np.ndarray
+        only if stringColumn is not None: the words of the column (bytes)
+    """
+    buffer = np.frombuffer("\n".join(lines).encode(), dtype=np.uint8)
+    # white spaces and control chars
+    blank = buffer <= ord(" ")
+    wordStarts = np.flatnonzero(~blank & np.concatenate(([True], blank[:-1])))
+    lineEnds = np.append(np.flatnonzero(buffer == ord("\n")), len(buffer))
+    sizes = np.diff(np.searchsorted(wordStarts, lineEnds), prepend=0).astype(PBasicIndexType)
+
+    if stringColumn is None:
+        return _FromString(buffer.tobytes(), dtype), sizes
+
+    if np.any(sizes <= stringColumn):
+        raise(Exception("Error converting block of lines: missing column " + str(stringColumn) ))
+    words = np.cumsum(sizes) - sizes + stringColumn
+    wordEnds = np.flatnonzero(~blank & np.concatenate((blank[1:], [True])))+1
+    starts = wordStarts[words]
+    lengths = wordEnds[words] - starts
+    width = np.max(lengths, initial=1)
+    index = starts[:,None] + np.arange(width)
+    inWord = np.arange(width) < lengths[:,None]
+    chars = np.zeros(index.shape, dtype=np.uint8)
+    chars[inWord] = buffer[index[inWord]]
+    strings = chars.view("S"+str(width)).ravel()
+
+    # the words are replaced by spaces before the conversion
+    numbers = buffer.copy()
+    numbers[index[inWord]] = ord(" ")
+    return _FromString(numbers.tobytes(), dtype), sizes-1, strings
+
+def NewMetaData():
+    """Create the dictionary returned by the ReadMetaData functions of the
+    mesh readers, with the default (empty) values
+
+    Returns
+    -------
+    dict
+        "nbNodes" : number of nodes
+        "nbElements" : number of elements
+        "elementTypes" : dict with the number of elements for every element type
+        "nodesTags" : list of the names of the nodal tags
+        "elementsTags" : list of the names of the element tags
+        "nodeFields" : list of the names of the nodal fields
+        "elementFields" : list of the names of the element fields
+        "times" : list of the available times
+    """
+    return {"nbNodes":0,
+            "nbElements":0,
+            "elementTypes":{},
+            "nodesTags":[],
+            "elementsTags":[],
+            "nodeFields":[],
+            "elementFields":[],
+            "times":[] }
+
+class OriginalIdsToInternalIds():
+    """Vectorized mapping from the original ids (ids in the file) to the
+    internal ids (position in the originalIds array)
+
+    Parameters
+    ----------
+    originalIds : np.ndarray
+        the original ids (must be unique)
+    """
+    def __init__(self, originalIds):
+        self.originalIds = np.asarray(originalIds, dtype=PBasicIndexType)
+        self.sorter = np.argsort(self.originalIds, kind="stable")
+        self.sortedIds = self.originalIds[self.sorter]
+
+    def _Positions(self, ids):
+        return np.minimum(np.searchsorted(self.sortedIds, ids), len(self.sortedIds)-1)
+
+    def IsIn(self, ids):
+        """Return a boolean mask with True for the ids present in the mapping"""
+        ids = np.asarray(ids, dtype=PBasicIndexType)
+        if len(self.sortedIds) == 0:
+            return np.zeros(ids.shape, dtype=bool)
+        return self.sortedIds[self._Positions(ids)] == ids
+
+    def __contains__(self, oid):
+        return bool(self.IsIn(oid))
+
+    def __getitem__(self, ids):
+        """Return the internal ids of ids (scalar or array of any shape)"""
+        ids = np.asarray(ids, dtype=PBasicIndexType)
+        if len(self.sortedIds) == 0:
+            if ids.size:
+                raise KeyError(ids.ravel()[0])
+            return ids.copy()
+        pos = self._Positions(ids)
+        mask = self.sortedIds[pos] != ids
+        if np.any(mask):
+            raise KeyError(ids[mask].ravel()[0])
+        res = self.sorter[pos]
+        if res.ndim == 0:
+            return int(res)
+        return res
 
 class ReaderBase(BaseOutputObject):
 
@@ -29,12 +230,19 @@ class ReaderBase(BaseOutputObject):
         self.pipe = False
         self.encoding = locale.getpreferredencoding(False)
         self.canHandleTemporal = False
+        self.memoryMap = False
 
         self.output = None
         self.extraOutput = None
 
         self.SetFileName(fileName)
 
+    def __getstate__(self):
+        # the open file (if any) is not transferred
+        state = self.__dict__.copy()
+        state["filePointer"] = None
+        return state
+
     def SetBinary(self,binary=True):
         self.binary = binary
         if binary:
@@ -46,6 +254,14 @@ class ReaderBase(BaseOutputObject):
                 self.readFormat = self.readFormat.replace("b","")
 
 
+    def SetMemoryMap(self,memoryMap=True):
+        """Activate the memory mapping of the binary data blocks. If active,
+        the blocks read from a file (not from a string or a pipe) are returned
+        as np.memmap (in copy on write mode) at the file offsets, so the data
+        is read from disk only on access and copied only on write.
+        """
+        self.memoryMap = bool(memoryMap)
+
     def StartReading(self):
 
         if not(self.fileName is None):
@@ -175,6 +391,100 @@ class ReaderBase(BaseOutputObject):
                 #    break
         return string
 
+    def ReadCleanBlock(self, stopString):
+        """Read all the clean lines (no empty lines, no comments) until a line
+        starting with stopString. This function does not do any treatment
+        on the lines, so it is much faster than ReadCleanLine for big blocks
+        of data (to be used with LinesToArray).
+
+        Parameters
+        ----------
+        stopString : str
+            string marking the end of the block
+
+        Returns
+        -------
+        list of str, str
+            the lines of the block and the line stopping the block (None if
+            the end of the file is reached)
+        """
+        lines = []
+        append = lines.append
+        commentChar = self.commentChar
+        # only the lines starting with one of these chars need a special treatment
+        specialChars = stopString[0]
+        if commentChar is not None:
+            specialChars += commentChar[0]
+        cpt = 0
+        for string in iter(self.filePointer.readline, ""):
+            cpt += 1
+            string = string.strip(u' \r\n\t\ufeff')
+            if not string:
+                continue
+            if string[0] in specialChars:
+                if commentChar is not None and string.startswith(commentChar):
+                    continue
+                if string.startswith(stopString):
+                    self.lineCounter += cpt
+                    return lines, string
+            append(string)
+        self.lineCounter += cpt
+        return lines, None
+
+    def SkimCleanBlock(self, stopString, column=None, separator=None):
+        """Skip all the clean lines (no empty lines, no comments) until a line
+        starting with stopString, counting the records (and the values of one
+        column) without storing the lines. To be used to extract the metadata
+        of a file without reading the heavy data.
+
+        Parameters
+        ----------
+        stopString : str
+            string marking the end of the block
+        column : int, optional
+            if not None, the occurrences of the values in this column are counted
+        separator : str, optional
+            separator to be used in addition to white spaces (for example ",").
+            A line ending with the separator continues on the next line,
+            by default None
+
+        Returns
+        -------
+        int, dict, str
+            the number of records, the number of occurrences of every value of
+            the column (empty if column is None) and the line stopping the block
+            (None if the end of the file is reached)
+        """
+        nbRecords = 0
+        counts = {}
+        newRecord = True
+        commentChar = self.commentChar
+        specialChars = stopString[0]
+        if commentChar is not None:
+            specialChars += commentChar[0]
+        cpt = 0
+        stopLine = None
+        for string in iter(self.filePointer.readline, ""):
+            cpt += 1
+            string = string.strip(u' \r\n\t\ufeff')
+            if not string:
+                continue
+            if string[0] in specialChars:
+                if commentChar is not None and string.startswith(commentChar):
+                    continue
+                if string.startswith(stopString):
+                    stopLine = string
+                    break
+            if newRecord:
+                nbRecords += 1
+                if column is not None:
+                    text = string if separator is None else string.replace(separator," ")
+                    value = text.split(None,column+1)[column]
+                    counts[value] = counts.get(value,0) + 1
+            newRecord = separator is None or string[-1] != separator
+        self.lineCounter += cpt
+        return nbRecords, counts, stopLine
+
 ##binary interface
     def rawread(self,cpt,withError=False):
 
@@ -194,7 +504,38 @@ class ReaderBase(BaseOutputObject):
        data = struct.unpack("q", rawdata)[0]
        return data
 
+    def readMemoryMap(self,cpt,datatype,fileName=None,offset=0):
+        """Memory map cpt values of type datatype (copy on write mode)
+
+        Parameters
+        ----------
+        cpt : int
+            number of values
+        datatype : numpy type
+            the type of the values
+        fileName : str, optional
+            the file to map, by default None: the current file at the current
+            position (the file pointer is moved after the data)
+        offset : int, optional
+            offset in bytes (only used if fileName is not None), by default 0
+
+        Returns
+        -------
+        np.memmap
+            the mapped data
+        """
+        if fileName is None:
+            fileName = self.fileName
+            offset = self.filePointer.tell()
+            self.filePointer.seek(offset + np.dtype(datatype).itemsize*cpt)
+
+        if cpt == 0:
+            return np.empty(0,dtype=datatype)
+        return np.memmap(fileName, dtype=datatype, mode="c", offset=offset, shape=(cpt,))
+
     def readData(self,cpt,datatype):
+        if self.memoryMap and self.fileName is not None and self.readFormat.find('b') > -1:
+            return self.readMemoryMap(cpt,datatype)
         try:
             return  np.fromfile(self.filePointer,dtype=datatype,count=cpt,sep="")
         except:
@@ -271,6 +612,57 @@ def CheckIntegrity():
     checkBaseReaderAscii(obj)
 
 
+    testString = """1, 0.5, 1.5
+# comment
+
+2, 1.5,
+ 2.5
+3, 4, 5
+*end
+6 7 8"""
+    obj.SetBinary(False)
+    obj.SetStringToRead(testString)
+    obj.StartReading()
+    lines, stopLine = obj.ReadCleanBlock("*")
+    if stopLine != "*end" or len(lines) != 4: raise
+    data = LinesToArray(lines, separator=",")
+    if not np.array_equal(data, [[1, 0.5, 1.5],[2, 1.5, 2.5],[3, 4, 5]]): raise
+    lines, stopLine = obj.ReadCleanBlock("*")
+    if stopLine is not None: raise
+    if not np.array_equal(LinesToArray(lines, dtype=PBasicIndexType), [[6, 7, 8]]): raise
+    obj.EndReading()
+    if not np.array_equal(LinesToFlatArray(["1, 2, 3", "4 5"], separator=","), [1, 2, 3, 4, 5]): raise
+    flat, sizes = LinesToFlatArrayWithSizes(["1 2  3", "4\t5", "6"])
+    if not np.array_equal(flat, [1, 2, 3, 4, 5, 6]) or not np.array_equal(sizes, [3, 2, 1]): raise
+    flat, sizes, words = LinesToFlatArrayWithSizes(["1 c3d4 2 3", "4 s2d3 5", "6 c3d10"], stringColumn=1)
+    if not np.array_equal(flat, [1, 2, 3, 4, 5, 6]) or not np.array_equal(sizes, [3, 2, 1]): raise
+    if list(words.astype(str)) != ["c3d4", "s2d3", "c3d10"]: raise
+    for lines in [["1 2 3", "4 5"], ["1 2 a"]]:
+        try:
+            LinesToArray(lines)
+            raise # pragma: no cover
+        except Exception:
+            pass
+
+    obj.SetStringToRead(testString)
+    obj.StartReading()
+    nbRecords, counts, stopLine = obj.SkimCleanBlock("*", column=1, separator=",")
+    if nbRecords != 3 or counts != {"0.5":1, "1.5":1, "4":1} or stopLine != "*end": raise
+    nbRecords, counts, stopLine = obj.SkimCleanBlock("*")
+    if nbRecords != 1 or len(counts) or stopLine is not None: raise
+    obj.EndReading()
+    if NewMetaData() is NewMetaData() or NewMetaData()["elementTypes"] != {}: raise
+
+    idsMap = OriginalIdsToInternalIds([10, 3, 7])
+    if idsMap[7] != 2 or not np.array_equal(idsMap[[[3,10]]], [[1,0]]): raise
+    if not np.array_equal(idsMap.IsIn([3, 4, 11]), [True, False, False]): raise
+    if 4 in idsMap or 10 not in idsMap: raise
+    try:
+        idsMap[[3,4]]
+        raise # pragma: no cover
+    except KeyError:
+        pass
+
     binarydata = np.array([0], dtype=np.int32).tobytes()
     binarydata += np.array([1], dtype=np.int64).tobytes()
     binarydata += np.array([2], dtype=np.float32).tobytes()
@@ -293,6 +685,21 @@ def CheckIntegrity():
         if obj.readFloats64(1) != 3.: raise
         obj.EndReading()
     checkBaseReaderBinary(obj)
+    obj.SetMemoryMap(True)
+    checkBaseReaderBinary(obj)
+    obj.StartReading()
+    obj.seek(12)
+    data = obj.readFloats32(1)
+    if not isinstance(data, np.memmap) or data[0] != 2. : raise
+    if obj.readFloats64(1) != 3.: raise
+    if len(obj.readData(0,np.int32)) != 0: raise
+    # copy on write
+    data[0] = 5.
+    obj.EndReading()
+    obj.StartReading()
+    obj.seek(12)
+    if obj.readFloats32(1) != 2.: raise
+    obj.EndReading()
     obj.SetStringToRead(binarydata)
     checkBaseReaderBinary(obj)
 
@@ -10,8 +10,11 @@ import BasicTools.Containers.ElementNames as EN
 from BasicTools.IO.ReaderBase import ReaderBase
 from BasicTools.NumpyDefs import PBasicIndexType
 
-def ReadStl(fileName=None,string=None):
+def ReadStl(fileName=None,string=None,mmap=False):
+    """Read a stl file, if mmap is True the normals of a binary file are
+    memory mapped (see ReaderBase.SetMemoryMap)"""
     obj = StlReader()
+    obj.SetMemoryMap(mmap)
     obj.SetFileName(fileName)
     obj.SetStringToRead(string)
     res = obj.Read()
@@ -93,7 +96,12 @@ class StlReader(ReaderBase):
                        ])
 
         data = self.readData(nbTriangles,dt)
-        normals = np.array(data["normal"])
+        if self.memoryMap:
+            # the normals stay in the file, the points must be copied to
+            # get the nodes layout
+            normals = data["normal"]
+        else:
+            normals = np.array(data["normal"])
         resUM.nodes = np.array(data["points"])
         resUM.nodes.shape = (nbTriangles*3,3)
 
@@ -247,6 +255,11 @@ def CheckIntegrity():
 
     if not np.all(np.equal(conn1,conn2)) : raise Exception()
 
+    res3 = ReadStl(fileName=GetTestDataPath()+"coneBinary.stl",mmap=True)
+    if not isinstance(res3.elemFields["normals"].base, np.memmap) : raise Exception()
+    if not np.array_equal(res3.elemFields["normals"], res1.elemFields["normals"]) : raise Exception()
+    if not np.array_equal(res3.nodes, res1.nodes) : raise Exception()
+
     return 'ok'
 
 if __name__ == '__main__':
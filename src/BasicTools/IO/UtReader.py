@@ -10,8 +10,9 @@ import numpy as np
 from BasicTools.IO.ReaderBase import ReaderBase
 from BasicTools.NumpyDefs import PBasicFloatType
 
-def ReadFieldFromUt(fileName=None, fieldname=None, time=None, timeIndex=None, string=None, atIntegrationPoints=False):
+def ReadFieldFromUt(fileName=None, fieldname=None, time=None, timeIndex=None, string=None, atIntegrationPoints=False, mmap=False):
     reader = UtReader()
+    reader.SetMemoryMap(mmap)
     reader.SetFileName(fileName)
     reader.SetStringToRead(string)
     reader.atIntegrationPoints = atIntegrationPoints
@@ -216,7 +217,11 @@ class UtReader(ReaderBase):
             self.PrintVerbose("Opening file : " + str(ffn) )
             res = np.empty(count,dtype=PBasicFloatType)
             try:
-              if len(self.integ)==1 :
+              if self.memoryMap:
+                # only the values of the field are read (from the mapped time step)
+                slab = self.readMemoryMap(count*len(self.integ), ">f4", fileName=ffn+postfix, offset=offset*4)
+                res = slab[self._GetIntegIndices(IPPerElement, idx)].astype(np.float32)
+              elif len(self.integ)==1 :
                 with open(ffn+postfix,"rb") as datafile:
                    datafile.seek(offset*4)
                    res = np.fromfile(datafile ,count=count, dtype=np.float32).byteswap()
@@ -272,7 +277,11 @@ class UtReader(ReaderBase):
             self.PrintVerbose("Opening file : " + str(ffn) )
             res = None
             try:
-                with open(ffn+postfix,"rb") as datafile:
+                if self.memoryMap:
+                    # big endian values mapped directly on the file
+                    res = self.readMemoryMap(count, ">f4", fileName=ffn+postfix, offset=offset*4)
+                else:
+                  with open(ffn+postfix,"rb") as datafile:
                     self.PrintDebug("Offset : " + str(offset*4))
                     self.PrintDebug("count : " + str(count))
                     datafile.seek(offset*4)
@@ -282,6 +291,135 @@ class UtReader(ReaderBase):
 
         return res
 
+    def ReadFields(self, fieldnames=None, time=None, timeIndex=None):
+        """Read several fields for one time step. Every data file (.node,
+        .ctnod or .integ) is read only once, using one call to np.fromfile
+        to read the contiguous block of the time step.
+
+        Parameters
+        ----------
+        fieldnames : list of str, optional
+            the names of the fields to read, by default None (all the node and
+            integ fields)
+        time : float, optional
+            the time to read, by default None
+        timeIndex : int, optional
+            the time index to read, by default None
+
+        Returns
+        -------
+        dict
+            name of the field -> np.ndarray (np.float32) of the values at the
+            nodes or at the integration points (if self.atIntegrationPoints)
+        """
+        if self.time is None:
+            self.ReadUTMetaData()
+        if self.meshMetadata is None:
+            self.ReadMetaData()
+
+        if fieldnames is None:
+            fieldnames = list(self.node) + list(self.integ)
+
+        timeIndex = self.SetTimeToRead(time, timeIndex)
+        self.PrintVerbose("Reading timeIndex : " + str(timeIndex) )
+
+        nbNodes = self.meshMetadata['nbNodes']
+        res = {}
+        for name in fieldnames:
+            if name in self.node:
+                continue
+            if name not in self.integ:
+                raise(Exception("unable to find field " +str(name) + " in file " + self.fileName))
+
+        nodeNames = [name for name in fieldnames if name in self.node]
+        if len(nodeNames):
+            slab = self._ReadTimeSlab("node", timeIndex, len(self.node)*nbNodes)
+            slab.shape = (len(self.node), nbNodes)
+            for name in nodeNames:
+                res[name] = slab[self.node.index(name),:]
+
+        integNames = [name for name in fieldnames if name not in self.node]
+        if len(integNames) == 0:
+            return res
+
+        if self.atIntegrationPoints:
+            IPPerElement = np.asarray(self.meshMetadata['IPPerElement'], dtype=int)
+            nbIntegrationPoints = int(np.sum(IPPerElement))
+            nbIntegs = len(self.integ)
+            slab = self._ReadTimeSlab("integ", timeIndex, nbIntegs*nbIntegrationPoints)
+            base, stride = self._GetIntegIndices(IPPerElement)
+            for name in integNames:
+                res[name] = np.asarray(slab[base + self.integ.index(name)*stride], dtype=np.float32)
+        else:
+            slab = self._ReadTimeSlab("ctnod", timeIndex, len(self.integ)*nbNodes)
+            slab.shape = (len(self.integ), nbNodes)
+            for name in integNames:
+                res[name] = slab[self.integ.index(name),:]
+
+        return res
+
+    def _GetIntegIndices(self, IPPerElement, idx=None):
+        """Compute the position of the values of a field in the block of a
+        time step of the .integ file. The data is stored element by element,
+        variable by variable.
+
+        Parameters
+        ----------
+        IPPerElement : np.ndarray
+            the number of integration points of every element
+        idx : int, optional
+            the index of the field, by default None
+
+        Returns
+        -------
+        np.ndarray or (np.ndarray, np.ndarray)
+            if idx is None: base, stride, the positions of the field number i
+            are base + i*stride. If idx is given: the positions of the field
+        """
+        IPPerElement = np.asarray(IPPerElement, dtype=int)
+        nbIntegs = len(self.integ)
+        elementStart = np.zeros(len(IPPerElement), dtype=int)
+        elementStart[1:] = np.cumsum(IPPerElement*nbIntegs)[:-1]
+        ipStart = np.zeros(len(IPPerElement), dtype=int)
+        ipStart[1:] = np.cumsum(IPPerElement)[:-1]
+        localIp = np.arange(np.sum(IPPerElement)) - np.repeat(ipStart, IPPerElement)
+        base = np.repeat(elementStart, IPPerElement) + localIp
+        stride = np.repeat(IPPerElement, IPPerElement)
+        if idx is None:
+            return base, stride
+        return base + idx*stride
+
+    def _ReadTimeSlab(self, extension, timeIndex, count):
+        """Read the block of data of one time step of a data file
+
+        Parameters
+        ----------
+        extension : str
+            the extension of the data file ("node", "ctnod" or "integ")
+        timeIndex : int
+            the time index to read
+        count : int
+            the number of values per time step
+
+        Returns
+        -------
+        np.ndarray
+            the values in native np.float32
+        """
+        postfix = ""
+        if self.fileName[-1] == "p":
+            postfix = "p"
+        basename = ".".join(self.fileName.split(".")[0:-1])
+        ffn = basename + "." + extension + postfix
+        self.PrintVerbose("Opening file : " + str(ffn) )
+        if self.memoryMap:
+            # big endian values mapped directly on the file
+            return self.readMemoryMap(count, ">f4", fileName=ffn, offset=4*count*timeIndex)
+        res = np.fromfile(ffn, dtype=">f4", count=count, offset=4*count*timeIndex)
+        if len(res) != count:
+            raise(Exception("Error reading time index " + str(timeIndex) + " in file " + ffn))
+        return res.astype(np.float32)
+
     def __str__(self):
         res = ""
         res +=  "class UtReader ("+str(id(self)) + ")\n"
@@ -391,7 +529,40 @@ def CheckIntegrity():
             offset += nbIP
             cpt +=1
 
+    for atIntegrationPoints in [False, True]:
+        reader.atIntegrationPoints = atIntegrationPoints
+        for t in [0., 1.]:
+            fields = reader.ReadFields(time=t)
+            if len(fields) != numberOfnodeVariables + numberOfIntegVariables:
+                raise(Exception("Error Reading fields"))
+            for f, data in fields.items():
+                if atIntegrationPoints and f in reader.node:
+                    continue
+                if np.any(data != reader.ReadField(fieldname=f,time=t)):
+                    raise(Exception("Error Reading field " + f ))
+    if list(reader.ReadFields(["sig22"], timeIndex=0).keys()) != ["sig22"]:
+        raise(Exception("Error Reading fields"))
+
+    # memory mapped reading
+    mmapReader = UtReader()
+    mmapReader.SetFileName(tempfileName)
+    mmapReader.SetMemoryMap(True)
+    for atIntegrationPoints in [False, True]:
+        reader.atIntegrationPoints = atIntegrationPoints
+        mmapReader.atIntegrationPoints = atIntegrationPoints
+        for t in [0., 1.]:
+            fields = mmapReader.ReadFields(time=t)
+            for f in reader.node + reader.integ:
+                if atIntegrationPoints and f in reader.node:
+                    continue
+                data = mmapReader.ReadField(fieldname=f,time=t)
+                if not atIntegrationPoints and not isinstance(data, np.memmap):
+                    raise(Exception("Error memory mapping field " + f ))
+                if np.any(data != reader.ReadField(fieldname=f,time=t)) or np.any(fields[f] != data):
+                    raise(Exception("Error Reading field " + f ))
+
     ReadFieldFromUt(tempfileName,fieldname="U1",time=0.)
+    ReadFieldFromUt(tempfileName,fieldname="U1",time=0.,mmap=True)
     ReadUTMetaData(tempfileName)
 
     return "ok"
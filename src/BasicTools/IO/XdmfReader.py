@@ -19,6 +19,26 @@ def ReadXdmf(fileName):
     obj = XdmfReader(filename=fileName)
     return obj.Read()
 
+def ReadXdmfLazy(fileName):
+    """Open a xdmf file for lazy reading. Only the xml part is parsed, the
+    heavy data is then read on demand (using np.memmap for binary files and
+    h5py datasets for hdf5 files), for example with
+    reader.GetFieldTimeSeries(...)
+
+    Parameters
+    ----------
+    fileName : str
+        name of the file to read
+
+    Returns
+    -------
+    XdmfReader
+        the reader with the meta data already read
+    """
+    obj = XdmfReader(filename=fileName)
+    obj.ReadMetaData()
+    return obj
+
 
 
 class Xdmfbase(object):
@@ -207,6 +227,79 @@ class XdmfGrid(Xdmfbase):
         return res
 
 
+    def GetNumberOfEntities(self, center):
+        """Return the number of entities (nodes, cells) of the support
+
+        Parameters
+        ----------
+        center : str
+            "Node", "Cell" or "Grid"
+
+        Returns
+        -------
+        int
+            the number of entities
+        """
+        if center == "Grid":
+            return 1
+        if self.geometry.Type == "ORIGIN_DXDYDZ":
+            dims = self.topology.GetDimensions()
+            if center == "Node":
+                return int(np.prod(dims))
+            return int(np.prod(np.maximum(np.asarray(dims)-1,1)))
+        if center == "Node":
+            return int(np.prod(self.geometry.dataitems[0].Dimensions))//len(self.geometry.Type)
+        if center == "Cell":
+            if self.topology.NumberOfElements is not None:
+                return self.topology.NumberOfElements
+            return sum(data.GetNumberOfElements() for data in self.topology.GetConnectivity().values())
+        raise Exception("Cant treat this type of field support " + str(center) )
+
+    def GetFieldDataRange(self, name, start=0, stop=None):
+        """Read the values of a field only for the entities in [start, stop).
+        For binary and hdf5 heavy data only the needed part of the file is
+        read (np.memmap or hdf5 hyperslab).
+
+        Parameters
+        ----------
+        name : str
+            name of the field
+        start : int, optional
+            first entity to read, by default 0
+        stop : int, optional
+            last entity (not included) to read, by default None (all)
+
+        Returns
+        -------
+        np.ndarray
+            array of shape (stop-start,) or (stop-start, number of components)
+        """
+        for att in self.attributes:
+            if att.Name != name:
+                continue
+            nbEntities = self.GetNumberOfEntities(att.Center)
+            if stop is None:
+                stop = nbEntities
+            if self.geometry.Type == "ORIGIN_DXDYDZ":
+                # the data is stored in a transposed order
+                data = self.GetFieldsOfType(att.Center,name)[0]
+                data = data.reshape((nbEntities,-1))[start:stop]
+            else:
+                lazyData = att.dataitems[0].GetLazyData()
+                size = int(np.prod(lazyData.shape))
+                nbComponents = size//nbEntities
+                if len(lazyData.shape) > 1 and lazyData.shape[0] == nbEntities:
+                    data = np.asarray(lazyData[start:stop])
+                else:
+                    if len(lazyData.shape) > 1:
+                        lazyData = lazyData.reshape(-1)
+                    data = np.asarray(lazyData[start*nbComponents:stop*nbComponents])
+                data = data.reshape((stop-start,nbComponents))
+            if data.shape[1] == 1:
+                return data.ravel()
+            return data
+        raise FieldNotFound(name)
+
     def GetFieldData(self,name,noTranspose=False):
         for att in self.attributes:
             if att.Name == name :
@@ -322,6 +415,7 @@ class XdmfTopology(Xdmfbase):
         self.dataitems= []
         self.Dimensions = None
         self.Type = None
+        self.NumberOfElements = None
 
     def __str__(self):
         res = TFormat.GetIndent() + 'XdmfTopology\n'
@@ -334,6 +428,9 @@ class XdmfTopology(Xdmfbase):
         if self.Type == -1:
             self.Type = self.ReadAttribute(attrs,'TopologyType')
 
+        if 'NumberOfElements' in attrs:
+            self.NumberOfElements = int(self.ReadAttribute(attrs,'NumberOfElements'))
+
 #        if self.Type != "Mixed":
         try:
             self.Dimensions = np.array(self.ReadAttribute(attrs,'Dimensions').split(), dtype='int')[::-1]
@@ -494,9 +591,12 @@ class XdmfDataItem(Xdmfbase):
         self.CDATA = ''
         self.Seek = 0
         self.Endian = "Native"
+        self.lazyData = None
+        self.hdf5Files = None
 
-    def ReadAttributes(self,attrs, path):
+    def ReadAttributes(self,attrs, path, hdf5Files=None):
         self.path = path
+        self.hdf5Files = hdf5Files
         self.Dimensions = np.array(self.ReadAttribute(attrs,'Dimensions').split(), dtype='int')
         if 'DataType' in attrs:
             self.Type = self.ReadAttribute(attrs,'DataType')
@@ -558,21 +658,7 @@ class XdmfDataItem(Xdmfbase):
             self.CDATA = ''
 
         elif self.Format  == 'Binary':
-            if self.Type.lower() == 'float':
-                if self.Precision == 4 :
-                    numpytype = 'float32'
-                else:
-                    numpytype = 'float_'
-            elif self.Type.lower() =='int':
-                if self.Precision == 4:
-                    numpytype = np.int32
-                elif self.Precision == 8 :
-                    numpytype = np.int64
-                else:
-                    raise Exception(f"Dont know how to treat this type of Precision: {self.Precision}" )
-            elif self.Type.lower() == 'char':
-                numpytype = 'int8'
-
+            numpytype = self._GetBinaryNumpyType()
             binfilename  = str(self.CDATA).lstrip().rstrip()
             binfile = open (os.path.join(self.path, binfilename ), "rb")
             binfile.seek(self.Seek)
@@ -591,10 +677,68 @@ class XdmfDataItem(Xdmfbase):
         else :
             raise Exception("Heavy data in format '" + self.Format + "' not suported yet") # pragma: no cover
 
+    def _GetBinaryNumpyType(self):
+        """Internal function to compute the numpy type of the binary data"""
+        if self.Type.lower() == 'float':
+            if self.Precision == 4 :
+                numpytype = 'float32'
+            else:
+                numpytype = 'float_'
+        elif self.Type.lower() =='int':
+            if self.Precision == 4:
+                numpytype = np.int32
+            elif self.Precision == 8 :
+                numpytype = np.int64
+            else:
+                raise Exception(f"Dont know how to treat this type of Precision: {self.Precision}" )
+        elif self.Type.lower() == 'char':
+            numpytype = 'int8'
+        return numpytype
+
     def GetData(self):
         self.TreatCDATA()
         return self.Data
 
+    def GetLazyData(self):
+        """Return the heavy data without reading it: a read only np.memmap for
+        the binary storage or a h5py dataset for the hdf5 storage. Only the
+        sliced part of these objects is read from disk.
+        For the data stored in the xml file (or already read) a np.ndarray is
+        returned.
+
+        Returns
+        -------
+        np.memmap, h5py.Dataset or np.ndarray
+            the lazy array
+        """
+        if self.lazyData is not None:
+            return self.lazyData
+
+        if len(self.CDATA) == 0 or self.Format == 'XML':
+            return self.GetData()
+
+        if self.Format == 'Binary':
+            numpytype = np.dtype(self._GetBinaryNumpyType())
+            if self.Endian == "Big":
+                numpytype = numpytype.newbyteorder(">")
+            elif self.Endian == "Little":
+                numpytype = numpytype.newbyteorder("<")
+            binfilename  = str(self.CDATA).lstrip().rstrip()
+            self.lazyData = np.memmap(os.path.join(self.path, binfilename ), dtype=numpytype, mode="r", offset=self.Seek, shape=tuple(self.Dimensions))
+        elif self.Format == 'HDF':
+            filename,dataSetPath  = str(self.CDATA).lstrip().rstrip().split(":")
+            fullFilename = os.path.join(self.path, filename)
+            if self.hdf5Files is None:
+                self.hdf5Files = {}
+            if fullFilename not in self.hdf5Files:
+                from h5py import File as __File
+                self.hdf5Files[fullFilename] = __File(fullFilename,'r')
+            self.lazyData = self.hdf5Files[fullFilename][dataSetPath]
+        else:
+            return self.GetData()
+
+        return self.lazyData
+
 
 class XdmfReader(xml.sax.ContentHandler):
 
@@ -611,8 +755,12 @@ class XdmfReader(xml.sax.ContentHandler):
         self.time = np.array([])
         self.timeToRead = -1
         self.encoding = None
+        self.hdf5Files = {}
+        self.dataItems = []
 
     def Reset(self):
+        self.CloseHeavyFiles()
+        self.dataItems = []
         self.xdmf = Xdmf()
         self.pile = []
         self.readed = False
@@ -627,10 +775,32 @@ class XdmfReader(xml.sax.ContentHandler):
         self.filename = filename
         self.path = os.path.dirname(filename)
 
+    def CloseHeavyFiles(self):
+        """Close the hdf5 files opened for the lazy access to the heavy data.
+        The lazy arrays of the data items are released, the files are opened
+        again at the next access to the heavy data"""
+        for f in self.hdf5Files.values():
+            f.close()
+        # the dict is shared with the data items, it must be cleared in place
+        self.hdf5Files.clear()
+        for item in self.dataItems:
+            item.lazyData = None
+
     def ReadMetaData(self):
+        """Parse only the xml part of the file (no heavy data is read) to
+        extract the available times, and the sizes, element types and fields
+        names of the grid read by default (last grid of the last domain)
+
+        Returns
+        -------
+        dict
+            the metadata (see BasicTools.IO.ReaderBase.NewMetaData)
+        """
+        from BasicTools.IO.ReaderBase import NewMetaData
+        from BasicTools.IO.XdmfTools import XdmfNameToEN
         self.lazy = True
         times = []
-        self.Read()
+        self.ParseXml()
         for i, grid in enumerate(self.xdmf.domains[0].grids):
             t  = grid.GetTime()
             if t == None:
@@ -638,6 +808,24 @@ class XdmfReader(xml.sax.ContentHandler):
             times.append(t)
         self.time = np.array(times)
 
+        res = NewMetaData()
+        res["times"] = times
+        domain = self.xdmf.GetDomain(-1)
+        if len(domain.grids) == 0:
+            return res
+        grid = domain.GetGrid(-1)
+        res["nbNodes"] = grid.GetNumberOfEntities("Node")
+        res["nbElements"] = grid.GetNumberOfEntities("Cell")
+        if grid.geometry.Type == "ORIGIN_DXDYDZ":
+            nametype = ElementNames.Hexaedron_8 if len(grid.topology.GetDimensions()) == 3 else ElementNames.Quadrangle_4
+            res["elementTypes"][nametype] = res["nbElements"]
+        elif grid.topology.Type in XdmfNameToEN:
+            res["elementTypes"][XdmfNameToEN[grid.topology.Type]] = res["nbElements"]
+        # for the Mixed topologies the types are only in the heavy data
+        res["nodeFields"] = grid.GetPointFieldsNames()
+        res["elementFields"] = grid.GetCellFieldsNames()
+        return res
+
     def GetAvailableTimes(self):
         return self.time
 
@@ -665,11 +853,18 @@ class XdmfReader(xml.sax.ContentHandler):
             self.SetFileName(fileName)
             self.readed = False
 
+        # read only one time the filel
+        if self.readed: return
+        self.ParseXml()
+        return self.xdmf.GetDomain(-1).GetGrid(timeIndex).GetSupport()
+
+    def ParseXml(self):
+        """Parse the xml part of the file, the heavy data is read only if
+        self.lazy is False
+        """
         if len(self.filename) == 0 :
             raise Exception('Need a filename ')
 
-        # read only one time the filel
-        if self.readed: return
         self.Reset()
 
         thefile = open(self.filename,"r")
@@ -679,7 +874,36 @@ class XdmfReader(xml.sax.ContentHandler):
         parser.setFeature(xml.sax.handler.feature_external_ges, False)
         parser.parse(thefile)
         thefile.close()
-        return self.xdmf.GetDomain(-1).GetGrid(timeIndex).GetSupport()
+
+    def GetFieldTimeSeries(self, name, start=0, stop=None, timeIndices=None):
+        """Read a field over the time steps (grids of the last domain having
+        this field). Only the requested part of the field is read, the other
+        fields are not read.
+
+        Parameters
+        ----------
+        name : str
+            name of the field
+        start : int, optional
+            first entity (node or cell) to read, by default 0
+        stop : int, optional
+            last entity (not included) to read, by default None (all)
+        timeIndices : slice or list of int, optional
+            the time indices to read, by default None (all)
+
+        Returns
+        -------
+        np.ndarray
+            array of shape (number of time steps, stop-start [, number of components])
+        """
+        if len(self.xdmf.domains) == 0:
+            self.ReadMetaData()
+        grids = [g for g in self.xdmf.GetDomain(-1).grids if g.HasField(name)]
+        if len(grids) == 0:
+            raise FieldNotFound(name)
+        if timeIndices is not None:
+            grids = [grids[i] for i in np.arange(len(grids))[timeIndices]]
+        return np.array([g.GetFieldDataRange(name, start, stop) for g in grids])
 
     # this a a overloaded function (must start with lower case)      !!!!!
     def startElement(self, name, attrs):
@@ -716,7 +940,8 @@ class XdmfReader(xml.sax.ContentHandler):
             father.geometry = res
         elif name == 'DataItem':
             res = XdmfDataItem()
-            res.ReadAttributes(attrs, self.path)
+            res.ReadAttributes(attrs, self.path, self.hdf5Files)
+            self.dataItems.append(res)
             father.dataitems.append(res)
         elif name == 'Attribute':
             res = XdmfAttribute()
@@ -917,6 +1142,80 @@ def CheckIntegrity():
     Example1()
     Example2()
 
+    return CheckIntegrityLazy()
+
+def CheckIntegrityLazy():
+    from BasicTools.Helpers.Tests import TestTempDir
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    from BasicTools.IO.XdmfWriter import XdmfWriter
+
+    tempdir = TestTempDir.GetTempPath()
+    mesh = CreateCube([4,5,6])
+    nbNodes = mesh.GetNumberOfNodes()
+    nbElements = mesh.GetNumberOfElements()
+
+    for hdf5 in [False, True]:
+        fileName = tempdir + 'TestLazyReader_hdf5_'+str(hdf5)+'.xdmf'
+        writer = XdmfWriter(fileName)
+        writer.SetTemporal(True)
+        writer.SetBinary(True)
+        writer.SetHdf5(hdf5)
+        writer.Open()
+        temps = []
+        disps = []
+        for step in range(5):
+            temps.append(np.arange(nbNodes, dtype=np.float64) + step)
+            disps.append(np.arange(nbElements*3, dtype=np.float64).reshape((nbElements,3)) - step)
+            writer.Write(mesh, PointFields=[temps[-1]], PointFieldsNames=["Temp"], CellFields=[disps[-1]], CellFieldsNames=["Disp"], Time=float(step))
+        writer.Close()
+
+        reader = ReadXdmfLazy(fileName)
+        if len(reader.time) != 5: raise Exception("Error in the number of time steps")
+        metadata = reader.ReadMetaData()
+        if metadata["times"] != [0., 1., 2., 3., 4.]: raise Exception("Error in the metadata")
+        if metadata["nbNodes"] != nbNodes or metadata["nbElements"] != nbElements: raise Exception("Error in the metadata")
+        if "Temp" not in metadata["nodeFields"] or "Disp" not in metadata["elementFields"]: raise Exception("Error in the metadata")
+
+        data = reader.GetFieldTimeSeries("Temp", start=3, stop=10)
+        if data.shape != (5,7): raise Exception("Error in the shape of the time series")
+        if not np.array_equal(data, np.array(temps)[:,3:10]): raise Exception("Error reading the time series")
+
+        # the heavy data of the fields not used must not be read
+        for grid in reader.xdmf.GetDomain(-1).grids:
+            for att in grid.attributes:
+                item = att.dataitems[0]
+                if att.Name == "Disp" and (len(item.Data) != 0 or item.lazyData is not None):
+                    raise Exception("Heavy data read but not used")
+            if len(grid.geometry.dataitems[0].Data) != 0:
+                raise Exception("Heavy data read but not used")
+
+        data = reader.GetFieldTimeSeries("Disp", start=2, stop=4, timeIndices=[1,3])
+        if data.shape != (2,2,3): raise Exception("Error in the shape of the time series")
+        if not np.array_equal(data, np.array(disps)[[1,3],2:4,:]): raise Exception("Error reading the time series")
+
+        data = reader.xdmf.GetDomain(-1).GetGrid(4).GetFieldDataRange("Disp")
+        if not np.array_equal(data, disps[4]): raise Exception("Error reading the field")
+
+        reader.CloseHeavyFiles()
+        if len(reader.hdf5Files) != 0: raise Exception("Error closing the heavy files")
+
+        # the files must be opened again after a CloseHeavyFiles
+        data = reader.GetFieldTimeSeries("Temp", start=3, stop=10)
+        if not np.array_equal(data, np.array(temps)[:,3:10]): raise Exception("Error reading after CloseHeavyFiles")
+        data = reader.xdmf.GetDomain(-1).GetGrid(4).GetFieldDataRange("Disp")
+        if not np.array_equal(data, disps[4]): raise Exception("Error reading after CloseHeavyFiles")
+        reader.CloseHeavyFiles()
+
+        # the eager reader always returns a mesh
+        readMesh = ReadXdmf(fileName)
+        if readMesh.GetNumberOfNodes() != nbNodes: raise Exception("Error, ReadXdmf must return a mesh")
+
+        try:
+            reader.GetFieldTimeSeries("UnknownField")
+            raise Exception("Error, this field does not exist") # pragma: no cover
+        except FieldNotFound:
+            pass
+
     return 'OK'
 
 
@@ -233,6 +233,9 @@ class XdmfWriter(WriterBase):
         self.globalStorage = {}
         self.maxStorageSize = 50
 
+        self.__streamingMesh = None
+        self.__streamedFields = {}
+
     def IsHdf5(self):
         return self.__isHdf5
 
@@ -814,6 +817,23 @@ class XdmfWriter(WriterBase):
          self.gridfieldsStorage = {}
          self.iptorage = {}
 
+         sufix = self.__OpenGrid(baseMeshObject, Time=Time, TimeStep=TimeStep)
+
+         self.__WriteGeoAndTopo(baseMeshObject,name=sufix)
+         self.__WriteNodesTagsElementsTags(baseMeshObject,PointFieldsNames,CellFieldsNames)
+         self.__WriteNodesFieldsElementsFieldsGridFields(baseMeshObject,
+                                                   PointFieldsNames,PointFields,
+                                                   CellFieldsNames,CellFields,
+                                                   GridFieldsNames,GridFields)
+
+         self.WriteIntegrationsPoints(IntegrationRule)
+         self.WriteIntegrationsPointDatas(IntegrationPointDataNames,IntegrationPointData)
+
+         self.__CloseGrid(baseMeshObject)
+
+    def __OpenGrid(self, baseMeshObject, Time=None, TimeStep=None):
+         """Internal function to start a new grid (time step), return the sufix
+         used for the name of the grid"""
          if not self.isOpen() :
             if self.automaticOpen:
                 self.Open()
@@ -854,17 +874,10 @@ class XdmfWriter(WriterBase):
              self.filePointer.write('    <Grid Name="Grid_'+sufix+'">\n')
              if self.IsTemporalOutput() and self.__printTimeInsideEachGrid and (self.IsMultidomainOutput() == False) :
                  self.filePointer.write('    <Time Value="'+str(self.currentTime)+'" /> \n')
+         return sufix
 
-         self.__WriteGeoAndTopo(baseMeshObject,name=sufix)
-         self.__WriteNodesTagsElementsTags(baseMeshObject,PointFieldsNames,CellFieldsNames)
-         self.__WriteNodesFieldsElementsFieldsGridFields(baseMeshObject,
-                                                   PointFieldsNames,PointFields,
-                                                   CellFieldsNames,CellFields,
-                                                   GridFieldsNames,GridFields)
-
-         self.WriteIntegrationsPoints(IntegrationRule)
-         self.WriteIntegrationsPointDatas(IntegrationPointDataNames,IntegrationPointData)
-
+    def __CloseGrid(self, baseMeshObject):
+         """Internal function to close the current grid (time step)"""
          if baseMeshObject.IsConstantRectilinear() and len(baseMeshObject.elements) > 1:
              self.filePointer.write('    </Grid>\n')
              from BasicTools.Containers.UnstructuredMesh import UnstructuredMesh
@@ -888,6 +901,236 @@ class XdmfWriter(WriterBase):
 
          if self.isBinary() :# pragma: no cover
            self.__binaryFilePointer.flush()
+
+    def BeginStep(self, baseMeshObject, Time=None, TimeStep=None, PointFieldsNames=None, CellFieldsNames=None):
+        """Streaming API: start a new step (grid). The geometry, the topology
+        and the tags are written immediately. The fields are then written by
+        chunks using BeginField, WriteFieldChunk and EndField, and the step is
+        finished by EndStep. Only binary and hdf5 outputs are supported.
+
+        Parameters
+        ----------
+        baseMeshObject : UnstructuredMesh
+            the mesh (ConstantRectilinearMesh are not supported)
+        Time : float, optional
+            time of the step, by default None
+        TimeStep : float, optional
+            time step (if Time is None), by default None
+        PointFieldsNames : List[str], optional
+            names of the point fields of this step (to avoid name clashes with the nodal tags), by default None
+        CellFieldsNames : List[str], optional
+            names of the cell fields of this step (to avoid name clashes with the element tags), by default None
+        """
+        if self.__streamingMesh is not None:
+            raise Exception("Previous step not finished (please call EndStep)")
+
+        if not (self.isBinary() or self.IsHdf5()):
+            raise Exception("The streaming API needs a binary or hdf5 output")
+
+        if baseMeshObject.IsConstantRectilinear():
+            raise Exception("The streaming API does not support ConstantRectilinearMesh")
+
+        if (Time is not None or TimeStep is not None) and self.IsMultidomainOutput():
+            raise(Exception("set time using MakeStep, not the BeginStep option") )
+
+        if PointFieldsNames is None:
+            PointFieldsNames = []
+
+        if CellFieldsNames is None:
+            CellFieldsNames = []
+
+        self.pointfieldsStorage = {}
+        self.cellfieldsStorage = {}
+        self.gridfieldsStorage = {}
+        self.iptorage = {}
+
+        sufix = self.__OpenGrid(baseMeshObject, Time=Time, TimeStep=TimeStep)
+        self.__WriteGeoAndTopo(baseMeshObject,name=sufix)
+        self.__WriteNodesTagsElementsTags(baseMeshObject,PointFieldsNames,CellFieldsNames)
+        self.__streamingMesh = baseMeshObject
+
+    def BeginField(self, name, center="Node", numberOfComponents=1, dtype=np.float64):
+        """Streaming API: reserve the storage for a field of the current step.
+        The xml part is written immediately, the heavy data must be written
+        using WriteFieldChunk.
+
+        Parameters
+        ----------
+        name : str
+            name of the field
+        center : str, optional
+            "Node" or "Cell", by default "Node"
+        numberOfComponents : int, optional
+            number of components (1, 2, 3, 6 or 9), by default 1
+        dtype : np.dtype, optional
+            the type of the data, by default np.float64
+        """
+        mesh = self.__streamingMesh
+        if mesh is None:
+            raise Exception("Please call BeginStep first")
+
+        if name in self.__streamedFields:
+            raise Exception(f"Field '{name}' already in the streaming process")
+
+        if center == "Node":
+            nbEntries = mesh.GetNumberOfNodes()
+        elif center == "Cell":
+            nbEntries = mesh.GetNumberOfElements()
+        else:
+            raise Exception('Cant treat this type of field support ' + str(center) )
+
+        if numberOfComponents not in [1, 2, 3, 6, 9]:
+            raise Exception(f"I dont kow how to treat fields with {numberOfComponents} components")
+
+        dtype = np.dtype(dtype)
+        if dtype == np.float64 or dtype == np.float32:
+            typename = 'Float'
+        elif dtype == np.int32 or dtype == np.int64:
+            typename = 'Int'
+        elif dtype == np.int8:
+            typename = 'Char'
+        else:
+            raise Exception(f"Field '{name}' of type '{dtype}' not supported")
+
+        # 2D vectors are written as 3D vectors (like in Write)
+        storedComponents = 3 if numberOfComponents == 2 else numberOfComponents
+        size = nbEntries*storedComponents
+        attype = "Scalar" if numberOfComponents == 1 else "Vector"
+
+        field = {"nbEntries": nbEntries,
+                 "numberOfComponents": numberOfComponents,
+                 "storedComponents": storedComponents,
+                 "dtype": dtype,
+                 "chunks": []}
+
+        self.filePointer.write('    <Attribute Center="'+center+'" Name="'+name+'" Type="'+attype+'">\n')
+        if self.isBinary():
+            if self.__binarycpt > self.__chunkSize :
+                self.__binaryFilePointer.close()
+                self.NewBinaryFilename()
+                self.__binaryFilePointer = open (self.__binFileName, "wb")
+                self.__binarycpt = 0
+
+            # the data before the reserved space must be on disk
+            self.__binaryFilePointer.flush()
+            field["offset"] = self.__binarycpt
+            field["filePointer"] = open(self.__binFileName, "r+b")
+            self.filePointer.write(' <DataItem Format="Binary"'+
+            ' NumberType="'+typename+'"'+
+            ' Dimensions="'+str(size)+'" '+
+            ' Seek="'+str(self.__binarycpt)+'" '+
+            ' Endian="Native" '+
+            ' Precision="'+str(dtype.itemsize)+'" '+
+            ' Compression="Raw" >')
+            self.filePointer.write(self.__binFileNameOnly)
+            self.filePointer.write('</DataItem>\n')
+            self.__binarycpt += dtype.itemsize*size
+            self.__binaryFilePointer.seek(self.__binarycpt)
+        else:
+            if self.__hdf5cpt > self.__chunkSize and len(self.__streamedFields) == 0:
+                import h5py
+                self.__hdf5FilePointer.close()
+                self.NewHdf5Filename()
+                self.__hdf5FilePointer = h5py.File(self.__hdf5FileName, 'w')
+                self.__hdf5cpt = 0
+
+            datasetName = name + "_"+ str(self.__hdf5NameCpt)
+            self.__hdf5NameCpt += 1
+            field["dataset"] = self.__hdf5FilePointer.create_dataset(datasetName, shape=(size,), dtype=dtype)
+            self.__hdf5cpt += dtype.itemsize*size
+            self.filePointer.write(' <DataItem Format="HDF"'+
+            ' NumberType="'+typename+'"'+
+            ' Dimensions="'+str(size)+'" '+
+            ' Precision="'+str(dtype.itemsize)+'" >')
+            self.filePointer.write(self.__hdf5FileNameOnly)
+            self.filePointer.write(":")
+            self.filePointer.write(datasetName)
+            self.filePointer.write('</DataItem>\n')
+
+        self.filePointer.write('    </Attribute>\n')
+        self.__streamedFields[name] = field
+
+    def WriteFieldChunk(self, name, data, start=0):
+        """Streaming API: write a chunk (a contiguous range of entities) of
+        a field. Only the chunk is kept in memory. The chunks can be written
+        in any order (for example element-range slabs computed one after the
+        other). Overlapping chunks are allowed, the last one written wins.
+
+        Parameters
+        ----------
+        name : str
+            name of the field (must be initialized with BeginField)
+        data : ArrayLike
+            the values for the entities start to start+n, of shape (n,) or
+            (n, numberOfComponents)
+        start : int, optional
+            the index of the first entity of this chunk, by default 0
+        """
+        field = self.__streamedFields.get(name, None)
+        if field is None:
+            raise Exception(f"Field '{name}' not initialized (please call BeginField)")
+
+        numberOfComponents = field["numberOfComponents"]
+        storedComponents = field["storedComponents"]
+        data = np.asarray(data, dtype=field["dtype"]).reshape(-1, numberOfComponents)
+        nbEntries = data.shape[0]
+        if start < 0 or start+nbEntries > field["nbEntries"]:
+            raise Exception(f"Chunk [{start}, {start+nbEntries}) out of range for field '{name}' ({field['nbEntries']} entities)")
+
+        if storedComponents != numberOfComponents:
+            paddedData = np.zeros((nbEntries,storedComponents), dtype=field["dtype"])
+            paddedData[:,0:numberOfComponents] = data
+            data = paddedData
+
+        if self.isBinary():
+            fp = field["filePointer"]
+            fp.seek(field["offset"] + start*storedComponents*field["dtype"].itemsize)
+            data.ravel().tofile(fp)
+        else:
+            field["dataset"][start*storedComponents:(start+nbEntries)*storedComponents] = data.ravel()
+
+        field["chunks"].append((start, start+nbEntries))
+
+    def EndField(self, name):
+        """Streaming API: finish the writing of a field
+
+        Parameters
+        ----------
+        name : str
+            name of the field
+        """
+        field = self.__streamedFields.pop(name, None)
+        if field is None:
+            raise Exception(f"Field '{name}' not initialized (please call BeginField)")
+
+        if self.isBinary():
+            field["filePointer"].close()
+
+        # number of entities written (each entity counted once)
+        written = 0
+        end = 0
+        for start, stop in sorted(field["chunks"]):
+            if stop > end:
+                written += stop - max(start, end)
+                end = stop
+        if written != field["nbEntries"]:
+            raise Exception(f"Field '{name}' incomplete ({written} of {field['nbEntries']} entities written)")
+
+    def EndStep(self):
+        """Streaming API: finish the current step. The xml file is flushed
+        and left in a sane state"""
+        if self.__streamingMesh is None:
+            raise Exception("Please call BeginStep first")
+
+        if len(self.__streamedFields):
+            raise Exception("Fields not finished : " + str(list(self.__streamedFields.keys())) )
+
+        mesh = self.__streamingMesh
+        self.__streamingMesh = None
+        self.__CloseGrid(mesh)
+        if self.IsHdf5():
+            self.__hdf5FilePointer.flush()
+
     def __WriteNodesFieldsElementsFieldsGridFields(self,baseMeshObject,
                                                    PointFieldsNames,PointFields,
                                                    CellFieldsNames,CellFields,
@@ -1045,7 +1288,7 @@ class XdmfWriter(WriterBase):
 
                 return res
             elif self.IsHdf5():
-                if self.__hdf5cpt > self.__chunkSize :
+                if self.__hdf5cpt > self.__chunkSize and len(self.__streamedFields) == 0:
                     import h5py
                     self.__hdf5FilePointer.close()
                     self.NewHdf5Filename()
@@ -1374,7 +1617,7 @@ def CheckIntegrity(GUI=False):
 
     CheckIntegrityHdf5(tempdir)
 
-    return 'ok'
+    return CheckIntegrityStreaming(tempdir)
 
 def CheckIntegrityHdf5(tempdir):
 
@@ -1404,6 +1647,74 @@ def CheckIntegrityHdf5(tempdir):
         writer.Write(myMesh,PointFields=[dataT, dataDep], PointFieldsNames=["Temp","Dep"],CellFields=[np.arange(19*29*39)],CellFieldsNames=['S']);
     writer.Close()
 
+def CheckIntegrityStreaming(tempdir):
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+    from BasicTools.IO.XdmfReader import XdmfReader
+
+    mesh = CreateCube([5,6,7])
+    nbNodes = mesh.GetNumberOfNodes()
+    nbElements = mesh.GetNumberOfElements()
+
+    for hdf5 in [False, True]:
+        fileName = tempdir + 'TestStreaming_hdf5_'+str(hdf5)+'.xdmf'
+        writer = XdmfWriter(fileName)
+        writer.SetTemporal(True)
+        writer.SetBinary(not hdf5)
+        writer.SetHdf5(hdf5)
+        writer.Open()
+        references = []
+        for step in range(2):
+            temp = np.arange(nbNodes, dtype=np.float64) + step
+            disp = np.arange(nbNodes*3, dtype=np.float64).reshape((nbNodes,3)) - step
+            vel = np.arange(nbElements*2, dtype=np.float32).reshape((nbElements,2)) + step
+            references.append((temp, disp, vel))
+
+            writer.BeginStep(mesh, Time=float(step))
+            writer.BeginField("Temp", "Node")
+            writer.BeginField("Disp", "Node", numberOfComponents=3)
+            writer.BeginField("Vel", "Cell", numberOfComponents=2, dtype=np.float32)
+            # chunks written in reverse order
+            for start in range(nbNodes - nbNodes%7, -1, -7):
+                writer.WriteFieldChunk("Temp", temp[start:start+7], start)
+            for start in range(0, nbNodes, 11):
+                writer.WriteFieldChunk("Disp", disp[start:start+11,:], start)
+            writer.WriteFieldChunk("Vel", vel[0:nbElements//2,:], 0)
+            writer.WriteFieldChunk("Vel", vel[nbElements//2:,:], nbElements//2)
+            writer.EndField("Temp")
+            writer.EndField("Disp")
+            writer.EndField("Vel")
+            writer.EndStep()
+        writer.Close()
+
+        reader = XdmfReader(fileName)
+        reader.Read()
+        for step in range(2):
+            grid = reader.xdmf.GetDomain(0).GetGrid(step)
+            temp, disp, vel = references[step]
+            if not np.array_equal(grid.GetPointField("Temp")[0].ravel(), temp): # pragma: no cover
+                raise Exception("Error in the streaming of a scalar field")
+            if not np.array_equal(grid.GetPointField("Disp")[0].ravel(), disp.ravel()): # pragma: no cover
+                raise Exception("Error in the streaming of a vector field")
+            if not np.array_equal(grid.GetCellField("Vel")[0].reshape((-1,3))[:,0:2], vel): # pragma: no cover
+                raise Exception("Error in the streaming of a 2D vector field")
+
+    writer = XdmfWriter(tempdir + 'TestStreamingErrors.xdmf')
+    writer.SetBinary(True)
+    writer.Open()
+    writer.BeginStep(mesh)
+    writer.BeginField("Temp", "Node")
+    writer.WriteFieldChunk("Temp", np.zeros(nbNodes-1), 0)
+    # overlapping chunk : the entities are counted once (the last entity is missing)
+    writer.WriteFieldChunk("Temp", np.zeros(1), nbNodes-2)
+    try:
+        writer.EndField("Temp")
+        raise Exception("This must fail (incomplete field)") # pragma: no cover
+    except Exception as e:
+        if str(e).find("incomplete") == -1: raise # pragma: no cover
+    writer.EndStep()
+    writer.Close()
+    return "ok"
+
 def CheckIntegrityDDM(GUI=False):
     """ this test function can be lauched using the mpirun -n 2 ...
     to test the writer in mpi mode
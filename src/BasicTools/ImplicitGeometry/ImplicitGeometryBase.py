@@ -3,7 +3,11 @@
 # This file is subject to the terms and conditions defined in
 # file 'LICENSE.txt', which is part of this source code package.
 #
-from typing import Optional, Union
+from typing import Optional, Union, Tuple
+from collections import OrderedDict
+import hashlib
+import weakref
+
 import numpy as np
 
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject
@@ -93,43 +97,190 @@ class ImplicitGeometryBase(BaseOutputObject):
     #    return "+-+-"
 
 ####################### cache object ################################
+def GetArrayFingerprint(array:np.ndarray) -> Tuple:
+    """Compute a fingerprint of the content of a numpy array (shape, dtype and
+    a hash of the data)
+
+    Parameters
+    ----------
+    array : np.ndarray
+        the array
+
+    Returns
+    -------
+    Tuple
+        the fingerprint
+    """
+    array = np.ascontiguousarray(array)
+    return (array.shape, array.dtype.str, hashlib.blake2b(array.data.cast("B"), digest_size=16).digest())
+
+def _GetParametersFingerprint(obj, visited:set) -> Tuple:
+    """Internal function to compute a fingerprint of the parameters of an
+    implicit geometry (recursively for the sub geometries)
+    """
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes, np.generic)):
+        return (type(obj).__name__, obj)
+    if isinstance(obj, np.ndarray):
+        return ("array",) + GetArrayFingerprint(obj)
+    if id(obj) in visited:
+        return ("visited", id(obj))
+    visited.add(id(obj))
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__,) + tuple(_GetParametersFingerprint(v, visited) for v in obj)
+    if isinstance(obj, dict):
+        return ("dict",) + tuple((repr(k), _GetParametersFingerprint(v, visited)) for k, v in obj.items())
+    if isinstance(obj, ImplicitGeometryBase):
+        ignored = ("cache", "cacheMemory") if isinstance(obj, ImplicitGeometryCachedData) else ()
+        return (type(obj).__name__,) + tuple((k, _GetParametersFingerprint(v, visited)) for k, v in obj.__dict__.items() if k not in ignored and not k.startswith("_BaseOutputObject") )
+    counter = getattr(obj, "GetMutationCounter", lambda : None)()
+    if counter is not None:
+        return ("mesh", id(obj), counter)
+    # other objects (functions, meshes, ...) are compared by identity
+    return ("object", id(obj))
+
 class ImplicitGeometryCachedData(ImplicitGeometryBase):
-    def __init__(self,internalImplicitGeometry):
+    """Cache (LRU) for the evaluations of an implicit geometry
+
+    The results are stored using a fingerprint of the input:
+
+    * numpy arrays : the content of the array (see GetArrayFingerprint)
+    * ConstantRectilinearMesh : dimensions, origin and spacing
+    * meshes with a mutation counter (UnstructuredMesh) : the id and the
+      mutation counter of the mesh (see UnstructuredMesh.GetMutationCounter)
+    * other meshes : the content of the position of the nodes
+
+    together with the cellCenter and dim options and a fingerprint of the
+    parameters of the wrapped geometry (the scalars, strings and arrays of
+    the geometry and of its sub geometries, e.g. radius, center, insideOut,
+    ...). So changing a parameter of the wrapped geometry does not return
+    stale results. The other objects held by the geometries (meshes without
+    mutation counter, functions, surface distance objects, ...) are compared
+    by identity: if they are modified in place the user must call ClearCache.
+    The same applies to a mesh modified in place without calling Modified.
+
+    GetDistanceToPoint and ApplyVector use different entries (a geometry can
+    implement them differently).
+
+    The least recently used entries are discarded when the memory used by
+    the results is bigger than maxMemory (in bytes). The stored results are
+    never returned directly, a copy is returned at each call.
+
+    Parameters
+    ----------
+    internalImplicitGeometry : ImplicitGeometryBase
+        the implicit geometry to cache
+    maxMemory : int, optional
+        memory budget for the cached results in bytes, by default 2**28
+    """
+    def __init__(self,internalImplicitGeometry, maxMemory:int=2**28):
         super(ImplicitGeometryCachedData,self).__init__()
         self.internalImplicitGeometry = internalImplicitGeometry
-        self.cacheData = None
-        self.cachedInputGetDistanceToPoint = None
-        self.cachedInputApplyVector = None
-        self.cachedInputcellCenter = False
-        self.cachedInputcelldim = 0
+        self.maxMemory = maxMemory
+        self.cache = OrderedDict()
+        self.cacheMemory = 0
+
+    def __getstate__(self):
+        # the cache (with weak references) is not transferred
+        state = self.__dict__.copy()
+        state["cache"] = OrderedDict()
+        state["cacheMemory"] = 0
+        return state
+
+    def ClearCache(self):
+        """Discard all the cached results
+        """
+        self.cache = OrderedDict()
+        self.cacheMemory = 0
 
-    def GetDistanceToPoint(self,pos):
-        if self.cacheData is None:
-            self.PrintDebug("building Cache")
-            self.cacheData = self.internalImplicitGeometry.GetDistanceToPoint(pos)
-        elif pos is not self.cachedInputGetDistanceToPoint:
-            self.PrintDebug("rebuilding Cache")
-            self.cacheData = self.internalImplicitGeometry.GetDistanceToPoint(pos)
-        else :
-            self.PrintDebug("Using Cache")
+    def _GetSupportFingerprint_(self, support) -> Tuple[Tuple,object]:
+        """Internal function to compute the fingerprint of a support
 
-        self.cachedInputGetDistanceToPoint = pos
-        self.cachedInputApplyVector = None
+        Returns
+        -------
+        Tuple[Tuple,object]
+            the fingerprint and the object to compare by identity (None if
+            the fingerprint depends only on the content)
+        """
+        if type(support).__module__ == np.__name__:
+            return ("array",) + GetArrayFingerprint(support), None
+        if getattr(support, "IsConstantRectilinear", lambda : False)():
+            return ("crm", tuple(support.GetDimensions()), tuple(support.GetOrigin()), tuple(support.GetSpacing())), None
+        counter = getattr(support, "GetMutationCounter", lambda : None)()
+        if counter is not None:
+            return ("mesh", id(support), counter), support
+        return ("nodes",) + GetArrayFingerprint(support.GetPosOfNodes()), None
+
+    def _GetGeometryFingerprint_(self) -> Tuple:
+        """Internal function to compute the fingerprint of the parameters of
+        the wrapped geometry
+        """
+        return _GetParametersFingerprint(self.internalImplicitGeometry, set())
+
+    def _GetFromCache_(self, key):
+        entry = self.cache.get(key, None)
+        if entry is None:
+            return None
+        ref, res = entry
+        if ref is not None and ref() is None:
+            # the object is dead (the id can be reused)
+            self._RemoveFromCache_(key)
+            return None
+        self.cache.move_to_end(key)
+        self.PrintDebug("Using Cache")
+        return res
 
-        return self.cacheData
+    def _RemoveFromCache_(self, key):
+        _, res = self.cache.pop(key)
+        self.cacheMemory -= res.nbytes
+
+    def _AddToCache_(self, key, obj, res):
+        res = np.asarray(res)
+        if res.nbytes > self.maxMemory:
+            return res
+        try:
+            ref = None if obj is None else weakref.ref(obj)
+        except TypeError:
+            return res
+        res.flags.writeable = False
+        if key in self.cache:
+            self._RemoveFromCache_(key)
+        self.cache[key] = (ref, res)
+        self.cacheMemory += res.nbytes
+        while self.cacheMemory > self.maxMemory:
+            self._RemoveFromCache_(next(iter(self.cache)))
+        return res
 
+    def GetDistanceToPoint(self,pos):
+        key, obj = self._GetSupportFingerprint_(pos)
+        key = ("GetDistanceToPoint", self._GetGeometryFingerprint_()) + key
+        res = self._GetFromCache_(key)
+        if res is None:
+            self.PrintDebug("building Cache")
+            res = self._AddToCache_(key, obj, self.internalImplicitGeometry.GetDistanceToPoint(pos))
+        return res.copy()
 
     def ApplyVector(self, support,cellCenter=False,dim=None):
-       if self.cacheData is not None:
-           if support is self.cachedInputApplyVector and cellCenter == self.cachedInputcellCenter and dim == self.cachedInputcelldim:
-               return self.cacheData
+        key, obj = self._GetSupportFingerprint_(support)
+        key = ("ApplyVector", bool(cellCenter), dim, self._GetGeometryFingerprint_()) + key
+        res = self._GetFromCache_(key)
+        if res is None:
+            self.PrintDebug("building Cache")
+            if dim is None:
+                res = self.internalImplicitGeometry.ApplyVector(support,cellCenter=cellCenter)
+            else:
+                res = self.internalImplicitGeometry.ApplyVector(support,cellCenter=cellCenter,dim=dim)
+            res = self._AddToCache_(key, obj, res)
+        return res.copy()
 
-       res = super(ImplicitGeometryCachedData,self).ApplyVector(support,cellCenter=cellCenter,dim=dim)
-       self.cachedInputApplyVector = support
-       self.cachedInputcellCenter  = cellCenter
-       self.cachedInputcelldim = dim
+    def GetGradientDistanceToPoint(self, pos:np.ndarray, dx:Optional[Union[PBasicFloatType,ArrayLike] ] = None) -> np.ndarray:
+        # the perturbed positions are not stored in the cache
+        return self.internalImplicitGeometry.GetGradientDistanceToPoint(pos, dx)
+
+    def __str__(self):
+        res = "ImplicitGeometryCachedData ({} entries, {} bytes) :\n".format(len(self.cache), self.cacheMemory)
+        res += str(self.internalImplicitGeometry)
+        return res
 
-       return  res
 ####################### cache object ################################
 class ImplicitGeometryDelayedInit (ImplicitGeometryBase):
     def __init__(self,name,ops={}):
@@ -174,6 +325,88 @@ def TryToCreate(name,ops=None):
     return res
 #-----------------------------.
 
+def CheckIntegrityCachedData(GUI=False):
+    from BasicTools.Containers.ConstantRectilinearMesh import ConstantRectilinearMesh
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+
+    # the counter is not stored in the geometry (it is not a parameter)
+    calls = {"cpt":0}
+    class CountingImplicitGeometry(ImplicitGeometryBase):
+        def __init__(self):
+            super(CountingImplicitGeometry,self).__init__()
+            self.radius = 0.5
+
+        def GetDistanceToPoint(self, pos):
+            calls["cpt"] += 1
+            return self.ApplyInsideOut(np.linalg.norm(pos,axis=1)-self.radius)
+
+    internal = CountingImplicitGeometry()
+    obj = ImplicitGeometryCachedData(internal)
+
+    # numpy arrays : the content is used
+    pos = np.random.rand(10,3)
+    res = obj.GetDistanceToPoint(pos)
+    obj.GetDistanceToPoint(pos.copy())
+    if calls["cpt"] != 1: raise Exception("the cache must be used for a copy")
+    res *= -1
+    if not np.array_equal(obj.GetDistanceToPoint(pos), -res) or calls["cpt"] != 1: raise Exception("the cached data must not be modified by the user")
+    pos[0,0] += 1
+    if obj.GetDistanceToPoint(pos)[0] == res[0] or calls["cpt"] != 2: raise Exception("the cache must be rebuilt")
+
+    # ConstantRectilinearMesh : dimensions, origin and spacing
+    crm = ConstantRectilinearMesh()
+    crm.SetDimensions([3,4,5])
+    obj(crm)
+    obj(crm)
+    obj(crm, cellCenter=True)
+    if calls["cpt"] != 4: raise Exception("error in the cache for ConstantRectilinearMesh")
+    crm.SetSpacing([0.5,0.5,0.5])
+    obj(crm)
+    if calls["cpt"] != 5: raise Exception("error in the cache for ConstantRectilinearMesh")
+
+    # UnstructuredMesh : mutation counter
+    mesh = CreateCube([3,4,5])
+    obj(mesh)
+    obj(mesh)
+    if calls["cpt"] != 6: raise Exception("error in the cache for UnstructuredMesh")
+    mesh.nodes[:,0] += 1
+    mesh.Modified()
+    obj(mesh)
+    if calls["cpt"] != 7: raise Exception("error in the cache for UnstructuredMesh")
+
+    # parameters of the wrapped geometry
+    calls["cpt"] = 0
+    pos = np.random.rand(10,3)
+    obj.GetDistanceToPoint(pos)
+    obj.GetDistanceToPoint(pos)
+    internal.radius = 2.
+    if abs(obj.GetDistanceToPoint(pos)[0] - (np.linalg.norm(pos[0])-2.)) > 1e-14 or calls["cpt"] != 2: raise Exception("the cache must depend on the parameters of the geometry")
+    internal.insideOut = True
+    if abs(obj.GetDistanceToPoint(pos)[0] + (np.linalg.norm(pos[0])-2.)) > 1e-14 or calls["cpt"] != 3: raise Exception("the cache must depend on insideOut")
+    internal.insideOut = False
+    obj.GetDistanceToPoint(pos)
+    if calls["cpt"] != 3: raise Exception("error in the cache")
+
+    # memory budget (LRU)
+    calls["cpt"] = 0
+    obj = ImplicitGeometryCachedData(internal, maxMemory=2*10*8)
+    pos1, pos2, pos3 = np.random.rand(10,3), np.random.rand(10,3), np.random.rand(10,3)
+    obj.GetDistanceToPoint(pos1)
+    obj.GetDistanceToPoint(pos2)
+    obj.GetDistanceToPoint(pos1)
+    obj.GetDistanceToPoint(pos3)
+    if calls["cpt"] != 3 or len(obj.cache) != 2 or obj.cacheMemory > obj.maxMemory: raise Exception("error in the LRU cache")
+    obj.GetDistanceToPoint(pos1)
+    if calls["cpt"] != 3: raise Exception("error in the LRU cache")
+    obj.GetDistanceToPoint(pos2)
+    if calls["cpt"] != 4: raise Exception("error in the LRU cache")
+    obj.GetDistanceToPoint(np.random.rand(100,3))
+    if len(obj.cache) != 2: raise Exception("results bigger than the budget must not be stored")
+    obj.ClearCache()
+    if len(obj.cache) != 0 or obj.cacheMemory != 0: raise Exception("error in ClearCache")
+
+    return "ok"
+
 def CheckIntegrity(GUI=False):
 
     from BasicTools.Containers.ConstantRectilinearMesh import ConstantRectilinearMesh
@@ -228,6 +461,9 @@ def CheckIntegrity(GUI=False):
 
     myObj6.GetGradientDistanceToPoint(TwoPoints3D)
     myObj6.GetGradientDistanceToPoint(TwoPoints3D,1)
+    print(myObj6)
+
+    CheckIntegrityCachedData(GUI)
     #######################################################################
 
     res = ImplicitGeometryDelayedInit("Dummy")
@@ -659,11 +659,18 @@ os.environ["LANG"] = "en_UK"
 class ImplicitGeometryStl(ImplicitGeometryBase):
     """ImplicitGeometry based on a external stlfile
         filename : stl filename to be loaded
+
+        engine : "vtk" (default) or "numpy". vtk (vtkImplicitPolyDataDistance)
+        is used if available. The numpy engine (see TriangleSurfaceDistance)
+        treats the surfaces made of triangles and quadrangles (and stl files),
+        it is used if engine is "numpy" or if vtk is not available
     """
 
     def __init__(self):
         super(ImplicitGeometryStl,self).__init__()
         self.implicitFunction = None
+        self.triangleSurfaceDistance = None
+        self.engine = "vtk"
 
         self.filename = ''
         self.boundingMin = [0,0,0]
@@ -683,11 +690,29 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
     def SetFileName(self,filenameSTL):
         self.LoadFromFile(filenameSTL)
 
+    def _UseNumpyEngine(self):
+        if self.engine == "numpy":
+            return True
+        try:
+            import vtkmodules.vtkFiltersCore
+            return False
+        except ImportError:
+            self.PrintVerbose("vtk not available, using the numpy engine")
+            return True
+
     def LoadFromFile(self,filenameSTL):
 
+        if filenameSTL.split(".")[-1] == "stl" and self._UseNumpyEngine():
+            from BasicTools.IO.StlReader import ReadStl
+            mesh = ReadStl(fileName=filenameSTL)
+            if mesh.GetNumberOfNodes() == 0:# pragma: no cover
+                raise ValueError( "No point data could be loaded from '" + filenameSTL)
+            self.filename = filenameSTL
+            self.SetSurface(mesh)
+            return self
+
         from vtkmodules.vtkIOGeometry import vtkSTLReader
         from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
-        from vtkmodules.vtkCommonDataModel import vtkPolyData, vtkUnstructuredGrid
 
         if filenameSTL.split(".")[-1] == "stl":
             readerSTL = vtkSTLReader()
@@ -717,15 +742,8 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
         else:
              return self.SetSurface(mesh)
 
-
-        from vtkmodules.vtkFiltersGeometry import vtkDataSetSurfaceFilter
-        from BasicTools.Containers.vtkBridge import MeshToVtk
-        vtkmesh = MeshToVtk(mesh)
-
-        filt = vtkDataSetSurfaceFilter()
-        filt.SetInputData(vtkmesh)
-        filt.Update()
-        self.SetSurfaceUsingVtkPolyData(filt.GetOutput())
+        from BasicTools.Containers.UnstructuredMeshModificationTools import ComputeSkin
+        self.SetSurface(ComputeSkin(mesh, md=3))
 
 
     def SetSurface(self,mesh):
@@ -736,10 +754,41 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
             if dimension[name] >2:
                 return self.SetMesh(mesh)
 
+        if self._UseNumpyEngine() and self.SetSurfaceUsingTriangles(mesh):
+            return
+
         from BasicTools.Containers.vtkBridge import MeshToVtk
         vtkmesh = MeshToVtk(mesh)
         self.SetSurfaceUsingVtkPolyData(vtkmesh)
 
+    def SetSurfaceUsingTriangles(self,mesh):
+        """Use the numpy engine (TriangleSurfaceDistance) on the triangles and
+        quadrangles of the mesh (only the vertices of quadratic elements are
+        used). Return False if the mesh does not have any surface element.
+        """
+        import BasicTools.Containers.ElementNames as EN
+        from BasicTools.ImplicitGeometry.TriangleSurfaceDistance import TriangleSurfaceDistance
+
+        triangles = []
+        for name,data in mesh.elements.items():
+            if data.GetNumberOfElements() == 0: continue
+            if EN.geoSupport[name] == EN.GeoTri:
+                triangles.append(data.connectivity[:,0:3])
+            elif EN.geoSupport[name] == EN.GeoQuad:
+                triangles.append(data.connectivity[:,[0,1,2]])
+                triangles.append(data.connectivity[:,[0,2,3]])
+        if len(triangles) == 0:
+            return False
+
+        self.triangleSurfaceDistance = TriangleSurfaceDistance(mesh.nodes, np.vstack(triangles))
+        self.implicitFunction = None
+        self.onLines = False
+        self.ismanifold = self.triangleSurfaceDistance.IsClosed()
+        mesh.ComputeBoundingBox()
+        self.boundingMin = np.array(mesh.boundingMin, dtype=float)
+        self.boundingMax = np.array(mesh.boundingMax, dtype=float)
+        return True
+
     def SetSurfaceUsingVtkPolyData(self,polydata):
         from vtkmodules.vtkFiltersCore import vtkFeatureEdges, vtkImplicitPolyDataDistance
         from vtkmodules.vtkCommonDataModel import vtkSpheres
@@ -747,6 +796,7 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
         if polydata.GetNumberOfPoints() == 0:# pragma: no cover
             raise ValueError( "No points " )
 
+        self.triangleSurfaceDistance = None
         bounds = [0 for i in range(6)]
         polydata.GetBounds(bounds)
         self.boundingMin = np.array([bounds[0],  bounds[2], bounds[4]])
@@ -784,7 +834,9 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
 
     def GetDistanceToPoint(self,pos):
 
-        if len(pos.shape) == 1:
+        if self.triangleSurfaceDistance is not None:
+            res = self.triangleSurfaceDistance.GetSignedDistance(pos)
+        elif len(pos.shape) == 1:
             res = np.zeros(1,dtype=float)
             res[0]  =  self.implicitFunction.EvaluateFunction(pos)
         else:
@@ -811,6 +863,8 @@ class ImplicitGeometryStl(ImplicitGeometryBase):
 
 def CreateImplicitGeometryStl(ops):
        res =  ImplicitGeometryStl()
+       if "engine" in ops:
+           res.engine = ops["engine"]
        if "filename" in ops:
            res.LoadFromFile(ops["filename"])
        return res
@@ -961,6 +1015,39 @@ RegisterClass("Holes",ImplicitGeometryHoles)
 
 
 
+def CheckIntegrityStl(GUI=False):
+    import BasicTools.TestData as TestData
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateCube
+
+    # stl file (sphere of radius 0.5) with the numpy engine
+    IGStl = CreateImplicitGeometryStl({"engine":"numpy", "filename":TestData.GetTestDataPath()+"stlsphere.stl"})
+    if not IGStl.ismanifold: raise Exception("the stl sphere must be closed")
+    res = IGStl.GetDistanceToPoint(np.array([[0.,0.,0.],[1.,0.,0.],[0.,0.,-2.]]))
+    if np.max(np.abs(res-[-0.5,0.5,1.5])) > 0.05: raise Exception("Error in the distance to the stl sphere")
+    IGStl.insideOut = True
+    if IGStl.GetDistanceToPoint(np.array([0.,0.,0.]))[0] < 0: raise Exception("Error in the insideOut")
+
+    # volume mesh (the skin is used) and open surface
+    for ofTetras in [False, True]:
+        mesh = CreateCube(dimensions=[3,4,5], origin=[0.,0.,0.], spacing=[0.5,1./3,0.25], ofTetras=ofTetras)
+        IGStl = ImplicitGeometryStl()
+        IGStl.engine = "numpy"
+        IGStl.SetMesh(mesh)
+        if not IGStl.ismanifold: raise Exception("the skin must be closed")
+        res = IGStl(np.array([[0.5,0.5,0.5],[0.5,0.5,2.]]))
+        if not np.allclose(res,[-0.5,1.]): raise Exception("Error in the distance to the skin")
+        if not np.allclose(IGStl.GetBoundingMax(),[1,1,1]): raise Exception("Error in the bounding box")
+
+    from BasicTools.Containers.UnstructuredMeshCreationTools import CreateSquare
+    IGStl = ImplicitGeometryStl()
+    IGStl.engine = "numpy"
+    IGStl.SetSurface(CreateSquare(dimensions=[3,3], origin=[0.,0.], spacing=[0.5,0.5]))
+    if IGStl.ismanifold: raise Exception("the square must be open")
+    res = IGStl(np.array([[0.5,0.5,-1.],[0.5,0.5,1.]]))
+    if not np.allclose(res,[1.,1.]): raise Exception("Error in the distance to a open surface")
+
+    return "ok"
+
 def CheckIntegrity(GUI=False):
 
     def MustFail(func):
@@ -987,6 +1074,8 @@ def CheckIntegrity(GUI=False):
 
     testDataPath = TestData.GetTestDataPath()
 
+    CheckIntegrityStl(GUI)
+
     ##################### ImplicitGeometrySphere ################################
     IGSphere = ImplicitGeometrySphere(center=[0,0,0],radius=0.1)
     IGSphere = ImplicitGeometrySphere()
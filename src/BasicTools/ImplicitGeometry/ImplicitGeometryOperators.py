@@ -7,6 +7,7 @@
 import numpy as np
 
 import BasicTools.Helpers.ParserHelper as PH
+from BasicTools.NumpyDefs import PBasicFloatType
 
 from BasicTools.ImplicitGeometry.ImplicitGeometryFactory import RegisterClass
 from BasicTools.ImplicitGeometry.ImplicitGeometryBase import ImplicitGeometryBase, smoothmin, smoothmax
@@ -232,6 +233,153 @@ class ImplicitGeometryShell(ImplicitGeometryBase):
 
 RegisterClass("Shell",ImplicitGeometryShell,CreateImplicitGeometryShell)
 
+def CreateImplicitGeometryCompiled(ops):
+    if "Zones" not in ops or len(ops["Zones"]) != 1:
+        raise Exception("Need one zone")
+    res = ImplicitGeometryCompiled(ops["Zones"][0])
+    PH.ReadProperties(ops, ["blockSize"], res)
+    return res
+
+class ImplicitGeometryCompiled(ImplicitGeometryBase):
+    """ImplicitGeometry evaluation of a tree of operators by blocks of points
+        z : zone (the root of the tree)
+        blockSize : number of points treated at the same time
+
+    The tree of operators (Union, Intersection, Difference, Offset,
+    InsideOut, Symmetric and Shell) is compiled in a list of instructions
+    working on a small set of preallocated buffers of size blockSize. The
+    other objects (the leaves of the tree) are evaluated one block at a time.
+    The memory used is the output plus a few buffers of size blockSize (the
+    original tree allocates temporaries of the size of the input for every
+    level of the tree). The tree is compiled at every call, so the zones can
+    be modified between two evaluations.
+    """
+    def __init__(self,a=None,blockSize=2**14):
+        super(ImplicitGeometryCompiled,self).__init__()
+        self.Zone1 = a
+        self.blockSize = blockSize
+
+    def Compile(self):
+        """Compile the tree
+
+        Returns
+        -------
+        Tuple[List[Tuple], int, int]
+            the list of instructions, the number of buffers for the values and
+            the number of buffers for the positions
+        """
+        plan = []
+        sizes = [0,0]
+
+        def AddInstruction(*args):
+            plan.append(args)
+
+        def CompileNode(node, reg, posReg):
+            sizes[0] = max(sizes[0], reg+1)
+            sizes[1] = max(sizes[1], posReg)
+            nodeType = type(node)
+            if nodeType is ImplicitGeometryUnion or nodeType is ImplicitGeometryIntersection:
+                CompileNode(node.Zones[0], reg, posReg)
+                opName = "min" if nodeType is ImplicitGeometryUnion else "max"
+                for zone in node.Zones[1:]:
+                    CompileNode(zone, reg+1, posReg)
+                    sizes[0] = max(sizes[0], reg+3)
+                    AddInstruction(opName, reg, reg+1, reg+2, node.smoothControl)
+            elif nodeType is ImplicitGeometryDifference:
+                CompileNode(node.Zone1, reg, posReg)
+                CompileNode(node.Zone2, reg+1, posReg)
+                sizes[0] = max(sizes[0], reg+3)
+                AddInstruction("neg", reg+1)
+                AddInstruction("max", reg, reg+1, reg+2, node.smoothControl)
+            elif nodeType is ImplicitGeometryOffset:
+                CompileNode(node.Zone1, reg, posReg)
+                AddInstruction("add", reg, node.offset)
+            elif nodeType is ImplicitGeometryInsideOut:
+                CompileNode(node.Zone1, reg, posReg)
+                AddInstruction("neg", reg)
+            elif nodeType is ImplicitGeometryShell:
+                CompileNode(node.Zone1, reg, posReg)
+                AddInstruction("shell", reg, node.thickness/2.)
+            elif nodeType is ImplicitGeometrySymmetric:
+                AddInstruction("symmetric", posReg, posReg+1, np.asarray(node.center, dtype=float))
+                CompileNode(node.Zone1, reg, posReg+1)
+            else:
+                AddInstruction("leaf", reg, posReg, node)
+                return
+            if node.insideOut:
+                AddInstruction("neg", reg)
+
+        CompileNode(self.Zone1, 0, 0)
+        return plan, sizes[0], sizes[1]
+
+    @classmethod
+    def _ApplyBlend_(self, a, b, h, opName, smoothControl):
+        # in place version of smoothmin and smoothmax (the result is in a)
+        if smoothControl == 0:
+            if opName == "min":
+                np.minimum(a, b, out=a)
+            else:
+                np.maximum(a, b, out=a)
+            return
+        np.subtract(a, b, out=h)
+        np.abs(h, out=h)
+        np.subtract(smoothControl, h, out=h)
+        np.maximum(h, 0, out=h)
+        np.multiply(h, h, out=h)
+        h *= 1./(4*smoothControl)
+        if opName == "min":
+            np.minimum(a, b, out=a)
+            a -= h
+        else:
+            np.maximum(a, b, out=a)
+            a += h
+
+    def GetDistanceToPoint(self, pos):
+        if len(pos.shape) == 1:
+            return self.ApplyInsideOut(self.Zone1.GetDistanceToPoint(pos))
+
+        plan, nbValues, nbPos = self.Compile()
+        blockSize = min(self.blockSize, pos.shape[0])
+        values = np.empty((nbValues, blockSize), dtype=PBasicFloatType)
+        positions = np.empty((nbPos, blockSize, pos.shape[1]), dtype=PBasicFloatType)
+        res = np.empty(pos.shape[0], dtype=PBasicFloatType)
+
+        for start in range(0, pos.shape[0], blockSize):
+            stop = min(start+blockSize, pos.shape[0])
+            n = stop-start
+            blockPos = [pos[start:stop]] + [p[:n] for p in positions]
+            v = values[:,:n]
+            for instruction in plan:
+                opName = instruction[0]
+                if opName == "leaf":
+                    v[instruction[1]] = instruction[3].GetDistanceToPoint(blockPos[instruction[2]])
+                elif opName == "min" or opName == "max":
+                    self._ApplyBlend_(v[instruction[1]], v[instruction[2]], v[instruction[3]], opName, instruction[4])
+                elif opName == "neg":
+                    np.negative(v[instruction[1]], out=v[instruction[1]])
+                elif opName == "add":
+                    v[instruction[1]] += instruction[2]
+                elif opName == "shell":
+                    a = v[instruction[1]]
+                    a -= instruction[2]
+                    np.abs(a, out=a)
+                    a -= instruction[2]
+                elif opName == "symmetric":
+                    p = blockPos[instruction[2]]
+                    np.subtract(blockPos[instruction[1]], instruction[3], out=p)
+                    np.abs(p, out=p)
+                    p += instruction[3]
+            res[start:stop] = v[0]
+
+        return self.ApplyInsideOut(res)
+
+    def __str__(self):
+        res = "ImplicitGeometryCompiled:\n"
+        res += "    "+ str(self.Zone1) + "\n"
+        return res
+
+RegisterClass("Compiled",ImplicitGeometryCompiled,CreateImplicitGeometryCompiled)
+
 def CheckIntegrity(GUI=False):
     def MustFail(func):
         try:
@@ -314,6 +462,35 @@ def CheckIntegrity(GUI=False):
 
     MustFail(partial(CreateImplicitGeometryInsideOut, {"Zones":[IGUnion,IGUnion]}))
 
+    ########################### ImplicitGeometryCompiled #######################
+    from BasicTools.ImplicitGeometry.ImplicitGeometryObjects import ImplicitGeometryGyroid
+    IGGyroid = ImplicitGeometryGyroid(scale=0.5)
+    IGUnion = ImplicitGeometryUnion([SP1,SPX,IGGyroid])
+    IGUnion.smoothControl = 0.1
+    IGIntersection = ImplicitGeometryIntersection([IGUnion,SPY,ImplicitGeometryInsideOut(SPX)])
+    IGIntersection.smoothControl = 0.2
+    IGIntersection.insideOut = True
+    IGDifference = ImplicitGeometryDifference(Zone1=ImplicitGeometryOffset(IGIntersection,0.1),Zone2=ImplicitGeometryShell(SP1,0.2))
+    IGSymmetric = ImplicitGeometrySymmetric(ImplicitGeometryUnion([IGDifference,ImplicitGeometrySymmetric(SPX)]))
+    IGSymmetric.center = np.array([0.1,0.2,0.3])
+    IGTree = ImplicitGeometryIntersection([IGSymmetric,ImplicitGeometryDifference(Zone1=SPX,Zone2=SPY)])
+
+    points = np.random.rand(1001,3)*4-2
+    for tree in [IGTree, IGSymmetric, IGIntersection, SP1]:
+        ref = tree.GetDistanceToPoint(points)
+        IGCompiled = CreateImplicitGeometryCompiled({"Zones":[tree],"blockSize":100})
+        if np.max(np.abs(IGCompiled.GetDistanceToPoint(points)-ref)) > 1e-14:
+            raise Exception("Error in the compiled geometry")
+        IGCompiled.insideOut = True
+        if np.max(np.abs(IGCompiled.GetDistanceToPoint(points)+ref)) > 1e-14:
+            raise Exception("Error in the compiled geometry")
+    if np.max(np.abs(IGCompiled(myMesh)+tree(myMesh))) > 1e-14:
+        raise Exception("Error in the compiled geometry")
+    IGCompiled.GetDistanceToPoint(TwoPoints3D[0,:])
+    print(IGCompiled)
+
+    MustFail(partial(CreateImplicitGeometryCompiled, {"Zones":[IGUnion,IGUnion]}))
+
     return "ok"
 
 if __name__ == '__main__':# pragma: no cover
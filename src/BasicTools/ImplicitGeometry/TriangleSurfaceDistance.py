@@ -0,0 +1,476 @@
+# -*- coding: utf-8 -*-
+#
+# This file is subject to the terms and conditions defined in
+# file 'LICENSE.txt', which is part of this source code package.
+#
+
+""" Signed distance to triangle surfaces (pure numpy)
+
+The triangles are sorted using the Morton code of their centers and grouped
+in leaves of a fixed size. A complete binary tree of axis aligned bounding
+boxes (BVH) is built over the leaves. The queries are treated in chunks (to
+bound the memory). For every query an upper bound of the distance is seeded
+with the exact distance to the triangles with the closest centers (cKDTree).
+Then every chunk traverses the tree level by level: all the (query point,
+tree node) pairs of a level are treated in one vectorized call, and the
+nodes with a bounding box further than the bound are pruned. The leaves are
+evaluated by rounds in order of increasing distance to their bounding box,
+and only the triangles with a bounding sphere closer than the current bound
+are evaluated exactly.
+The sign is computed using the angle weighted pseudo-normals of the closest
+feature (face, edge or vertex) of the surface.
+"""
+import numpy as np
+
+from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
+from BasicTools.Helpers.BaseOutputObject import BaseOutputObject, froze_it
+from BasicTools.Containers.Octree import MortonEncode
+
+def _Dot(a, b):
+    return np.einsum("ij,ij->i", a, b)
+
+def _SafeDivide(num, den):
+    res = np.zeros_like(num)
+    np.divide(num, den, out=res, where=den != 0)
+    return res
+
+def ClosestPointOnTriangles(points, a, b, c):
+    """Compute the closest point on the triangles (a, b, c) for every point
+    (vectorized version of the algorithm of C. Ericson, Real-Time Collision
+    Detection)
+
+    Parameters
+    ----------
+    points : np.ndarray
+        (n,3) the query points
+    a : np.ndarray
+        (n,3) the first vertex of the triangles
+    b : np.ndarray
+        (n,3) the second vertex of the triangles
+    c : np.ndarray
+        (n,3) the third vertex of the triangles
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        closestPoints (n,3), barycentricCoordinates (n,3) and features (n,)
+        the feature of the triangle holding the closest point :
+        0, 1, 2 for the vertices a, b, c ; 3, 4, 5 for the edges ab, bc, ca ;
+        6 for the interior of the triangle
+    """
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    bp = points - b
+    cp = points - c
+    d1 = _Dot(ab, ap)
+    d2 = _Dot(ac, ap)
+    d3 = _Dot(ab, bp)
+    d4 = _Dot(ac, bp)
+    d5 = _Dot(ab, cp)
+    d6 = _Dot(ac, cp)
+    va = d3*d6 - d5*d4
+    vb = d5*d2 - d1*d6
+    vc = d1*d4 - d3*d2
+
+    bary = np.empty((len(points),3), dtype=PBasicFloatType)
+    features = np.full(len(points), 6, dtype=PBasicIndexType)
+
+    denom = va + vb + vc
+    v = _SafeDivide(vb, denom)
+    w = _SafeDivide(vc, denom)
+    bary[:,0] = 1 - v - w
+    bary[:,1] = v
+    bary[:,2] = w
+
+    # the regions are treated in the reverse order of the original
+    # algorithm, so the first region (in the original order) wins
+    mask = (va <= 0) & (d4-d3 >= 0) & (d5-d6 >= 0)
+    t = _SafeDivide(d4[mask]-d3[mask], (d4[mask]-d3[mask]) + (d5[mask]-d6[mask]))
+    bary[mask] = np.column_stack((np.zeros_like(t), 1-t, t))
+    features[mask] = 4
+
+    mask = (vb <= 0) & (d2 >= 0) & (d6 <= 0)
+    t = _SafeDivide(d2[mask], d2[mask]-d6[mask])
+    bary[mask] = np.column_stack((1-t, np.zeros_like(t), t))
+    features[mask] = 5
+
+    mask = (d6 >= 0) & (d5 <= d6)
+    bary[mask] = [0., 0., 1.]
+    features[mask] = 2
+
+    mask = (vc <= 0) & (d1 >= 0) & (d3 <= 0)
+    t = _SafeDivide(d1[mask], d1[mask]-d3[mask])
+    bary[mask] = np.column_stack((1-t, t, np.zeros_like(t)))
+    features[mask] = 3
+
+    mask = (d3 >= 0) & (d4 <= d3)
+    bary[mask] = [0., 1., 0.]
+    features[mask] = 1
+
+    mask = (d1 <= 0) & (d2 <= 0)
+    bary[mask] = [1., 0., 0.]
+    features[mask] = 0
+
+    closestPoints = bary[:,0,None]*a + bary[:,1,None]*b + bary[:,2,None]*c
+    return closestPoints, bary, features
+
+@froze_it
+class TriangleSurfaceDistance(BaseOutputObject):
+    """Distance (and signed distance) from points to a triangle surface
+
+    Parameters
+    ----------
+    points : ArrayLike, optional
+        (n,3) or (n,2) array with the position of the vertices, by default None
+    triangles : ArrayLike, optional
+        (m,3) array with the connectivity of the triangles, by default None
+    leafSize : int, optional
+        number of triangles in the leaves of the tree, by default 8
+    chunkSize : int, optional
+        number of query points treated at the same time, by default 2**12
+
+    The sign of the distance is negative inside the surface (using the
+    orientation of the triangles) and is meaningful only for closed surfaces
+    (see IsClosed).
+    """
+    def __init__(self, points=None, triangles=None, leafSize=8, chunkSize=2**12):
+        super(TriangleSurfaceDistance,self).__init__()
+        self.leafSize = leafSize
+        self.chunkSize = chunkSize
+        self.nbTriangles = 0
+        self.nbLeaves = 1
+        self.triangleOrder = np.empty(0, dtype=PBasicIndexType)
+        self.triangles = np.empty((0,3), dtype=PBasicIndexType)
+        self.vertices = np.empty((0,3,3), dtype=PBasicFloatType)
+        self.nodesMin = None
+        self.nodesMax = None
+        self.facesNormals = None
+        self.edgesNormals = None
+        self.verticesNormals = None
+        self.trianglesEdges = None
+        self.closed = False
+        self.maxPairs = 2**18
+        self.seedSize = 4
+        self.centersTree = None
+        self.trianglesCenters = np.empty((0,3), dtype=PBasicFloatType)
+        self.trianglesRadii = np.empty(0, dtype=PBasicFloatType)
+        if points is not None and triangles is not None:
+            self.SetSurface(points, triangles)
+
+    def SetSurface(self, points, triangles):
+        """Set the surface and build the acceleration structure
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array with the position of the vertices
+        triangles : ArrayLike
+            (m,3) array with the connectivity of the triangles
+        """
+        points = self._To3D(points)
+        triangles = np.asarray(triangles, dtype=PBasicIndexType).reshape((-1,3))
+        if len(triangles) == 0:
+            raise ValueError("Need at least one triangle")
+
+        # the duplicated vertices (stl files) are merged to recover the
+        # connectivity between the triangles
+        points, inverse = np.unique(points, axis=0, return_inverse=True)
+        triangles = inverse.ravel()[triangles]
+
+        # sort the triangles using the Morton code of the centers
+        centers = np.mean(points[triangles], axis=1)
+        bMin = np.min(centers, axis=0)
+        size = np.max(np.max(centers, axis=0) - bMin)
+        if not size > 0:
+            size = 1.
+        ijk = np.minimum(((centers - bMin)/size*2**16).astype(np.int64), 2**16-1)
+        self.triangleOrder = np.argsort(MortonEncode(ijk), kind="stable").astype(PBasicIndexType)
+        self.triangles = triangles[self.triangleOrder,:]
+        self.vertices = points[self.triangles]
+        self.nbTriangles = len(self.triangles)
+        # bounding spheres of the triangles (cheap lower bound of the distance)
+        self.trianglesCenters = centers[self.triangleOrder]
+        self.trianglesRadii = np.sqrt(np.max(np.sum((self.vertices - self.trianglesCenters[:,None,:])**2, axis=2), axis=1))
+        # tree of the centers, used to seed the upper bound of the distances
+        from scipy.spatial import cKDTree
+        self.centersTree = cKDTree(self.trianglesCenters)
+
+        # complete binary tree over the leaves (heap numbering, the root is 1)
+        nbLeaves = -(-self.nbTriangles//self.leafSize)
+        self.nbLeaves = 1 << int(np.ceil(np.log2(nbLeaves))) if nbLeaves > 1 else 1
+        paddedSize = self.nbLeaves*self.leafSize
+        trianglesMin = np.full((paddedSize,3), np.inf, dtype=PBasicFloatType)
+        trianglesMax = np.full((paddedSize,3), -np.inf, dtype=PBasicFloatType)
+        trianglesMin[:self.nbTriangles] = np.min(self.vertices, axis=1)
+        trianglesMax[:self.nbTriangles] = np.max(self.vertices, axis=1)
+        self.nodesMin = np.empty((2*self.nbLeaves,3), dtype=PBasicFloatType)
+        self.nodesMax = np.empty((2*self.nbLeaves,3), dtype=PBasicFloatType)
+        self.nodesMin[self.nbLeaves:] = np.min(trianglesMin.reshape((self.nbLeaves,self.leafSize,3)), axis=1)
+        self.nodesMax[self.nbLeaves:] = np.max(trianglesMax.reshape((self.nbLeaves,self.leafSize,3)), axis=1)
+        level = self.nbLeaves//2
+        while level >= 1:
+            self.nodesMin[level:2*level] = np.minimum(self.nodesMin[2*level:4*level:2], self.nodesMin[2*level+1:4*level:2])
+            self.nodesMax[level:2*level] = np.maximum(self.nodesMax[2*level:4*level:2], self.nodesMax[2*level+1:4*level:2])
+            level //= 2
+
+        self._ComputePseudoNormals(len(points))
+
+    def _ComputePseudoNormals(self, nbPoints):
+        a, b, c = self.vertices[:,0,:], self.vertices[:,1,:], self.vertices[:,2,:]
+        normals = np.cross(b-a, c-a)
+        norms = np.linalg.norm(normals, axis=1)
+        self.facesNormals = normals/np.where(norms > 0, norms, 1)[:,None]
+
+        # angle weighted normals at the vertices
+        self.verticesNormals = np.zeros((nbPoints,3), dtype=PBasicFloatType)
+        for i in range(3):
+            e1 = self.vertices[:,(i+1)%3,:] - self.vertices[:,i,:]
+            e2 = self.vertices[:,(i+2)%3,:] - self.vertices[:,i,:]
+            n1 = np.linalg.norm(e1, axis=1)
+            n2 = np.linalg.norm(e2, axis=1)
+            cosAngle = _SafeDivide(_Dot(e1, e2), n1*n2)
+            angles = np.arccos(np.clip(cosAngle, -1., 1.))
+            np.add.at(self.verticesNormals, self.triangles[:,i], angles[:,None]*self.facesNormals)
+
+        # the edge i goes from the vertex i to the vertex (i+1)%3
+        edges = np.sort(np.stack((self.triangles, np.roll(self.triangles, -1, axis=1)), axis=2).reshape((-1,2)), axis=1)
+        uniqueEdges, inverse = np.unique(edges, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        self.trianglesEdges = inverse.reshape((-1,3))
+        self.edgesNormals = np.zeros((len(uniqueEdges),3), dtype=PBasicFloatType)
+        np.add.at(self.edgesNormals, inverse, np.repeat(self.facesNormals, 3, axis=0))
+        self.closed = bool(np.all(np.bincount(inverse) == 2))
+
+    def IsClosed(self):
+        """Return True if every edge of the surface is shared by exactly two triangles"""
+        return self.closed
+
+    def _To3D(self, points):
+        points = np.asarray(points, dtype=PBasicFloatType)
+        if points.ndim == 1:
+            points = points[None,:]
+        if points.shape[1] == 2:
+            points = np.hstack((points, np.zeros((points.shape[0],1), dtype=PBasicFloatType)))
+        return points
+
+    def _BoxDistances2(self, points, nodes):
+        delta = np.maximum(self.nodesMin[nodes] - points, 0) + np.maximum(points - self.nodesMax[nodes], 0)
+        return np.sum(delta**2, axis=1)
+
+    def _UpdateWithTriangles(self, points, queryIds, triangles, best2, bestTriangles):
+        vertices = self.vertices[triangles]
+        closestPoints, _, _ = ClosestPointOnTriangles(points[queryIds], vertices[:,0,:], vertices[:,1,:], vertices[:,2,:])
+        dist2 = np.sum((points[queryIds] - closestPoints)**2, axis=1)
+        newBest2 = best2.copy()
+        np.minimum.at(newBest2, queryIds, dist2)
+        improved = (dist2 < best2[queryIds]) & (dist2 == newBest2[queryIds])
+        bestTriangles[queryIds[improved]] = triangles[improved]
+        best2[:] = newBest2
+
+    def _UpdateWithLeaves(self, points, queryIds, leaves, boxDistances2, best2, bestTriangles):
+        # the leaves are treated by rounds in order of increasing box distance
+        # (1, 1, 2, 4, ... leaves per query), the pairs are pruned after every round
+        order = np.lexsort((boxDistances2, queryIds))
+        queryIds = queryIds[order]
+        leaves = leaves[order]
+        boxDistances2 = boxDistances2[order]
+        firsts = np.flatnonzero(np.r_[True, queryIds[1:] != queryIds[:-1]])
+        ranks = np.arange(len(queryIds)) - np.repeat(firsts, np.diff(np.r_[firsts, len(queryIds)]))
+        lower, upper = 0, 1
+        while len(queryIds):
+            mask = ranks < upper
+            ids = queryIds[mask]
+            roundLeaves = leaves[mask]
+            for start in range(0, len(roundLeaves), self.maxPairs):
+                triangles = (roundLeaves[start:start+self.maxPairs,None]*self.leafSize + np.arange(self.leafSize)[None,:]).ravel()
+                triangleQueryIds = np.repeat(ids[start:start+self.maxPairs], self.leafSize)
+                valid = triangles < self.nbTriangles
+                triangles, triangleQueryIds = triangles[valid], triangleQueryIds[valid]
+                # only the triangles with a bounding sphere closer than the current bound are evaluated
+                lowerBounds = np.maximum(np.linalg.norm(points[triangleQueryIds] - self.trianglesCenters[triangles], axis=1) - self.trianglesRadii[triangles], 0)
+                valid = lowerBounds**2 <= best2[triangleQueryIds]
+                self._UpdateWithTriangles(points, triangleQueryIds[valid], triangles[valid], best2, bestTriangles)
+            mask = ~mask
+            mask[mask] = boxDistances2[mask] <= best2[queryIds[mask]]
+            queryIds, leaves, boxDistances2, ranks = queryIds[mask], leaves[mask], boxDistances2[mask], ranks[mask]
+            lower, upper = upper, upper + max(upper-lower, 1)*(2 if lower else 1)
+
+    def _Traverse(self, points, queryIds, best2, bestTriangles):
+        # level by level traversal of the tree, the nodes with a bounding box
+        # further than the current best distance (seeded in
+        # _FindClosestTriangles) are pruned. The children are visited in
+        # order of increasing box distance at the leaf level (see
+        # _UpdateWithLeaves), so the bound is tightened by the closest leaves first
+        nodes = np.ones(len(queryIds), dtype=PBasicIndexType)
+        level = 1
+        while len(queryIds):
+            boxDistances2 = self._BoxDistances2(points[queryIds], nodes)
+            mask = boxDistances2 <= best2[queryIds]
+            queryIds = queryIds[mask]
+            nodes = nodes[mask]
+            boxDistances2 = boxDistances2[mask]
+            if len(nodes) > self.maxPairs:
+                # too many candidates, the queries are treated in two groups
+                # to bound the memory
+                aliveQueries = np.unique(queryIds)
+                if len(aliveQueries) > 1:
+                    half = len(aliveQueries)//2
+                    self._Traverse(points, aliveQueries[:half], best2, bestTriangles)
+                    self._Traverse(points, aliveQueries[half:], best2, bestTriangles)
+                    return
+            if level == self.nbLeaves:
+                self._UpdateWithLeaves(points, queryIds, nodes-self.nbLeaves, boxDistances2, best2, bestTriangles)
+                return
+            queryIds = np.repeat(queryIds, 2)
+            nodes = (2*nodes[:,None] + np.arange(2)[None,:]).ravel()
+            level *= 2
+
+    def _FindClosestTriangles(self, points):
+        best2 = np.full(len(points), np.inf, dtype=PBasicFloatType)
+        bestTriangles = np.zeros(len(points), dtype=PBasicIndexType)
+        # tight upper bound: exact distance to the triangles with the closest centers
+        k = min(self.seedSize, self.nbTriangles)
+        _, seeds = self.centersTree.query(points, k=k)
+        seeds = np.asarray(seeds, dtype=PBasicIndexType).reshape((len(points),k))
+        queryIds = np.arange(len(points), dtype=PBasicIndexType)
+        self._UpdateWithTriangles(points, np.repeat(queryIds, k), seeds.ravel(), best2, bestTriangles)
+        self._Traverse(points, queryIds, best2, bestTriangles)
+        return bestTriangles
+
+    def GetClosestPoints(self, points):
+        """Compute the closest point of the surface for every query point
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array of the query points
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            triangles (n,) the id of the closest triangle (in the input
+            numbering), closestPoints (n,3), signedDistances (n,)
+        """
+        if self.nbTriangles == 0:
+            raise RuntimeError("Need a surface (call SetSurface first)")
+        points = self._To3D(points)
+        nbQueries = len(points)
+        triangles = np.empty(nbQueries, dtype=PBasicIndexType)
+        closestPoints = np.empty((nbQueries,3), dtype=PBasicFloatType)
+        distances = np.empty(nbQueries, dtype=PBasicFloatType)
+
+        for start in range(0, nbQueries, self.chunkSize):
+            stop = min(start+self.chunkSize, nbQueries)
+            chunk = points[start:stop]
+            bestTriangles = self._FindClosestTriangles(chunk)
+            vertices = self.vertices[bestTriangles]
+            cp, _, features = ClosestPointOnTriangles(chunk, vertices[:,0,:], vertices[:,1,:], vertices[:,2,:])
+
+            # pseudo normal of the closest feature
+            normals = self.facesNormals[bestTriangles]
+            mask = features < 3
+            normals[mask] = self.verticesNormals[self.triangles[bestTriangles[mask],features[mask]]]
+            mask = (features >= 3) & (features < 6)
+            normals[mask] = self.edgesNormals[self.trianglesEdges[bestTriangles[mask],features[mask]-3]]
+
+            vectors = chunk - cp
+            dist = np.linalg.norm(vectors, axis=1)
+            dist[_Dot(vectors, normals) < 0] *= -1
+            triangles[start:stop] = self.triangleOrder[bestTriangles]
+            closestPoints[start:stop] = cp
+            distances[start:stop] = dist
+
+        return triangles, closestPoints, distances
+
+    def GetSignedDistance(self, points):
+        """Compute the signed distance to the surface (negative inside)
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array of the query points
+
+        Returns
+        -------
+        np.ndarray
+            (n,) the signed distances
+        """
+        return self.GetClosestPoints(points)[2]
+
+    def GetDistance(self, points):
+        """Compute the (unsigned) distance to the surface
+
+        Parameters
+        ----------
+        points : ArrayLike
+            (n,3) or (n,2) array of the query points
+
+        Returns
+        -------
+        np.ndarray
+            (n,) the distances
+        """
+        return np.abs(self.GetClosestPoints(points)[2])
+
+def CheckIntegrity(GUI=False):
+    np.random.seed(0)
+
+    # closed surface: the unit cube (outward normals)
+    points = np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0,0,1],[1,0,1],[1,1,1],[0,1,1]], dtype=PBasicFloatType)
+    quads = np.array([[0,3,2,1],[4,5,6,7],[0,1,5,4],[1,2,6,5],[2,3,7,6],[3,0,4,7]])
+    triangles = np.vstack((quads[:,[0,1,2]], quads[:,[0,2,3]]))
+    engine = TriangleSurfaceDistance(points, triangles, leafSize=2, chunkSize=100)
+    if not engine.IsClosed(): raise Exception("The cube must be closed")
+    # same surface with duplicated vertices (like in a stl file)
+    if not TriangleSurfaceDistance(points[triangles].reshape((-1,3)), np.arange(36).reshape((12,3))).IsClosed():
+        raise Exception("The cube must be closed")
+
+    queries = np.random.rand(1000,3)*3-1
+    # add points on the faces, edges and vertices regions
+    queries = np.vstack((queries, points*1.5-0.25, [[0.5,0.5,0.5],[0.5,0.5,1.5],[1.5,1.5,0.5]]))
+    q = np.abs(queries-0.5)-0.5
+    exact = np.linalg.norm(np.maximum(q,0), axis=1) + np.minimum(np.max(q,axis=1),0)
+    signed = engine.GetSignedDistance(queries)
+    error = np.max(np.abs(signed-exact))
+    print("Error on the signed distance to a cube : ", error)
+    if error > 1e-12: raise Exception("Error in the signed distance")
+
+    ids, closestPoints, signed = engine.GetClosestPoints(queries)
+    if not np.allclose(np.linalg.norm(queries-closestPoints, axis=1), np.abs(exact)): raise Exception("Error in the closest points")
+    cp, _, _ = ClosestPointOnTriangles(queries, *[points[triangles[ids,i]] for i in range(3)])
+    if not np.allclose(cp, closestPoints): raise Exception("Error in the closest triangles")
+
+    # open surfaces (random triangles) against brute force: big triangles
+    # (the seed of the bound is often not the closest triangle) and many
+    # small triangles (deep tree)
+    for nbPoints, nbTriangles, scale in [(60, 40, 1.), (3000, 1000, 0.05)]:
+        centers = np.random.rand(nbTriangles,3)
+        points = np.repeat(centers, 3, axis=0) + (np.random.rand(3*nbTriangles,3)-0.5)*scale
+        triangles = np.random.randint(0, nbPoints, size=(nbTriangles,3)) if scale == 1. else np.arange(3*nbTriangles).reshape((-1,3))
+        engine = TriangleSurfaceDistance(points, triangles, chunkSize=64)
+        engine.maxPairs = 256
+        if engine.IsClosed(): raise Exception("The surface must be open")
+        queries = np.random.rand(300,3)*2-0.5
+        bruteForce = np.full(len(queries), np.inf)
+        for tri in triangles:
+            cp, _, _ = ClosestPointOnTriangles(queries, *[np.tile(points[t], (len(queries),1)) for t in tri])
+            bruteForce = np.minimum(bruteForce, np.linalg.norm(queries-cp, axis=1))
+        error = np.max(np.abs(engine.GetDistance(queries)-bruteForce))
+        print("Error on the distance to random triangles : ", error)
+        if error > 1e-12: raise Exception("Error in the distance")
+
+    # 2D query points, one triangle
+    engine = TriangleSurfaceDistance([[0,0,0],[1,0,0],[0,1,0]], [[0,1,2]])
+    if not np.allclose(engine.GetDistance([[2,0],[-1,-1],[0.2,0.2]]), [1, np.sqrt(2), 0]): raise Exception("Error in 2D")
+
+    try:
+        TriangleSurfaceDistance().GetDistance(queries)
+        raise # pragma: no cover
+    except RuntimeError:
+        pass
+
+    return "ok"
+
+if __name__ == '__main__':
+    print(CheckIntegrity(GUI=True))# pragma: no cover
@@ -8,5 +8,6 @@ _test = ['ImplicitGeometryFactory',
            'ImplicitGeometryBase',
            'ImplicitGeometryObjects',
            'ImplicitGeometryOperators',
-           'ImplicitGeometryTools'
+           'ImplicitGeometryTools',
+           'TriangleSurfaceDistance'
            ]
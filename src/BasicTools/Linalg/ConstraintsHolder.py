@@ -11,7 +11,7 @@ from scipy.sparse import linalg as splinalg
 from scipy import sparse
 import scipy.linalg as sp_linalg
 from scipy.sparse import coo_matrix
-from scipy.sparse.csgraph import connected_components
+from scipy.sparse.csgraph import connected_components, breadth_first_order
 
 from BasicTools.NumpyDefs import PBasicFloatType, PBasicIndexType
 from BasicTools.Helpers.BaseOutputObject import BaseOutputObject as BOO
@@ -51,6 +51,7 @@ class ConstraintsHolder(BOO):
 
         self.SetConstraintsMethod("Projection")
         self.tol = 1e-8 # tolerance for the detection of redundant constraints
+        self.hubDegree = 64 # dofs present in more equations are treated apart (sparse algorithm)
 
 #----------------------- for population of the class --------------------------
 
@@ -107,11 +108,15 @@ class ConstraintsHolder(BOO):
         ei = np.require(ei, dtype=PBasicIndexType)
         ej = np.require(ej, dtype=PBasicIndexType)
         ev = np.require(ev, dtype=PBasicFloatType)
-        s = np.unique(ei)
+        s, equations = np.unique(ei, return_inverse=True)
 
-        for i in s:
-            mask = np.equal(ei,i)
-            self.AddEquationSparse(ej[mask],ev[mask],0)
+        # entries grouped by equation, in the order of the sorted unique ei
+        order = np.argsort(equations, kind="stable")
+        order = order[ev[order] != 0]
+        self.rows.extend((equations[order] + self.numberOfEquations).tolist())
+        self.cols.extend(ej[order].tolist())
+        self.vals.extend(ev[order].tolist())
+        self.numberOfEquations += len(s)
 
     def NextEquation(self):
         self.numberOfEquations += 1
@@ -213,9 +218,11 @@ class ConstraintsHolder(BOO):
             Q' containt only the non zero columns of [A|b] and always the last
             column (the b)
             usedDofs : the indices of the columns present in Q
+            slaves : the indices (in Q) of one independent dof per constraint
 
         option:
-            purePython: to force scipy for computing the QR decomposition
+            purePython: to force the scipy sparse algorithm
+            (see GetCleanConstraintBaseSparse)
         """
         self.PrintDebug("GetCleanConstraintBase ")
 
@@ -225,32 +232,11 @@ class ConstraintsHolder(BOO):
                 LS = NativeEigenSolver.CEigenSolvers()
             except: # pragma: no cover
                 purePython = True
-                print("Warning!!! Eigen SPQR decomposition not available using slower algorithm (scipy.linalg.qr)")
+                print("Warning!!! Eigen SPQR decomposition not available using scipy sparse algorithm")
 
         if purePython == True:
-            from scipy.linalg  import qr
-            class WrapedScipyQr():
-                def __init__(self):
-                    self.tol = 1.e-6
-                def SetTolerance(self,tol):
-                    self.tol = tol
-                def SetSolverType(self,st):
-                    if st != "SPQR": # pragma: no cover
-                        raise(Exception("SolverType '"+str(st)+"' not allowed "))
-                def SetOp(self,op):
-                    Q,r,P= qr(op.toarray(),mode="full", pivoting=True,check_finite=False)
-                    diag = r.diagonal()
-                    diag = diag/diag[0]
-                    mask = (abs(diag)<self.tol)
-                    self.rank = mask.argmax()
-                    if self.rank == 0:
-                        self.rank = op.shape[1]
-                    self.Q = sparse.csr_matrix(Q)
-                def GetSPQRRank(self):
-                    return self.rank
-                def GetSPQR_Q(self):
-                    return self.Q
-            LS = WrapedScipyQr()
+            return self.GetCleanConstraintBaseSparse()
+
         LS.SetTolerance(self.tol)
         LS.SetSolverType("SPQR")
 
@@ -288,16 +274,19 @@ class ConstraintsHolder(BOO):
         else:
             atonce = np.zeros( M.shape[0],dtype=bool)
             slaves = []
+            # equations sorted by connected component
+            ccOrder = np.argsort(cc, kind="stable")
+            ccBounds = np.concatenate(([0], np.cumsum(np.bincount(cc, minlength=ncc))))
             for incc in range(ncc):
-                mask = (cc == incc)
-                nl = np.count_nonzero(mask)
+                ccEquations = ccOrder[ccBounds[incc]:ccBounds[incc+1]]
+                nl = len(ccEquations)
                 if nl == 1:
                     # we have one independet equation
-                    np.logical_or(atonce,mask,out=atonce)
+                    atonce[ccEquations] = True
                     continue
                 # extraction sof the equation to treat (rows) and filter the matrix
                 # to have only the used dofs (cols)
-                subsubM, subusedDofs =  self.CleanEmptyColumns(Mcsr[mask,:])
+                subsubM, subusedDofs =  self.CleanEmptyColumns(Mcsr[ccEquations,:])
                 LS.SetOp(subsubM.T)
                 rank = LS.GetSPQRRank()
                 slaves.extend(subusedDofs[0:rank])
@@ -332,6 +321,69 @@ class ConstraintsHolder(BOO):
 
         return res, usedDofs, slaves
 
+    def GetCleanConstraintBaseSparse(self):
+        """
+        Sparse (scipy only) version of GetCleanConstraintBase. The full system
+        is never densified:
+
+            1) the tie relations (a*u_i + c*u_j = d, with |a| == |c|) are
+               eliminated using a spanning forest of the tie graph
+               (see EliminateTieRelations)
+            2) the remaining equations (expressed with the masters of the tie
+               relations) are split into independent blocks and a small dense
+               QR is computed for each block (see CleanConstraintBlocks)
+
+        The rows of res are not orthonormal but are normalized (unitary norm of
+        the A part). Every row has a slave dof and res[:,slaves] is invertible.
+
+        this functions returns:
+            res, usedDofs, slaves (same as GetCleanConstraintBase)
+        """
+        self.PrintDebug("GetCleanConstraintBaseSparse ")
+        M, usedDofs = self.ToSparse()
+        if M.shape[0] == 0:
+            return coo_matrix((0,len(usedDofs)), dtype=PBasicFloatType), usedDofs, np.empty(0, dtype=PBasicIndexType)
+
+        Mcsr = M.tocsr()
+        nbDofs = M.shape[1]-1
+        A = Mcsr[:,:-1].tocsr()
+        A.sum_duplicates()
+        A.eliminate_zeros()
+        A.sort_indices()
+        b = Mcsr[:,-1].toarray().ravel()
+
+        self.PrintDebug("tie relations elimination")
+        treeEquations, treeSlaves, otherEquations, root, factor, shift = EliminateTieRelations(A, b, self.tol)
+        self.PrintVerbose(f"{len(treeEquations)} tie relations eliminated")
+
+        # the others equations are expressed using only the masters of the tie relations
+        other = A[otherEquations,:].tocoo()
+        nbOthers = len(otherEquations)
+        G = coo_matrix((other.data*factor[other.col], (other.row, root[other.col])), shape=(nbOthers, nbDofs)).tocsr()
+        g = b[otherEquations] - np.bincount(other.row, weights=other.data*shift[other.col], minlength=nbOthers)
+        # clean of the terms canceled by the substitution
+        scale = np.zeros(nbOthers, dtype=PBasicFloatType)
+        np.maximum.at(scale, other.row, np.abs(other.data))
+        G.data[np.abs(G.data) <= self.tol*np.repeat(scale, np.diff(G.indptr))] = 0
+        G.eliminate_zeros()
+
+        self.PrintDebug("treating blocks")
+        C, Cg, blockSlaves, nbInconsistent = CleanConstraintBlocks(G, g, self.tol, self.hubDegree)
+        if nbInconsistent:
+            print(f"Warning!!! {nbInconsistent} inconsistent constraint(s) ignored")
+
+        T = A[treeEquations,:]
+        res = sparse.vstack( ( sparse.hstack((T, b[treeEquations][:,None])),
+                               sparse.hstack((C, Cg[:,None])) ) ).tocoo()
+        slaves = np.concatenate((treeSlaves, blockSlaves)).astype(PBasicIndexType)
+
+        # normalisation
+        norm = 1/splinalg.norm(res.tocsr()[:,:-1],axis=1)
+        res.data *= norm[res.row]
+
+        self.PrintDebug("GetCleanConstraintBaseSparse Done ")
+        return res, usedDofs, slaves
+
 #-----------------------  External API ------------------
 
     def SetConstraintsMethod(self,method):
@@ -374,6 +426,262 @@ class ConstraintsHolder(BOO):
         res += str(self.method)
         return res
 
+def EliminateTieRelations(A, b, tol=1e-8):
+    """
+    Detect the tie relations (a*u_i + c*u_j = d, with |a| == |c|) in the
+    system A.u = b. This is the master/slave pattern generated by periodic
+    conditions and conformal ties. A spanning forest of the graph of the tie
+    relations gives a set of independent equations, and every dof is expressed
+    using the root (master) of its tree:
+
+        u_i = factor[i]*u_root[i] + shift[i]
+
+    Parameters
+    ----------
+    A : scipy.sparse.csr_matrix
+        the constraint operator with sorted indices and without explicit zeros
+    b : np.ndarray
+        the right hand side of the constraints
+    tol : float, optional
+        relative tolerance to compare the coefficients, by default 1e-8
+
+    Returns
+    -------
+    treeEquations : np.ndarray
+        the independent tie equations (the edges of the spanning forest)
+    treeSlaves : np.ndarray
+        the slave dof of each equation in treeEquations
+    otherEquations : np.ndarray
+        all the other equations (including the redundant tie relations)
+    root : np.ndarray
+        the master dof of every dof
+    factor : np.ndarray
+        the factor to the master dof of every dof
+    shift : np.ndarray
+        the shift to the master dof of every dof
+    """
+    nbEquations, nbDofs = A.shape
+
+    root = np.arange(nbDofs, dtype=PBasicIndexType)
+    factor = np.ones(nbDofs, dtype=PBasicFloatType)
+    shift = np.zeros(nbDofs, dtype=PBasicFloatType)
+
+    twoTerms = np.where(np.diff(A.indptr) == 2)[0]
+    first = A.indptr[twoTerms]
+    v0 = A.data[first]
+    v1 = A.data[first+1]
+    isTie = np.abs(np.abs(v0)-np.abs(v1)) <= tol*np.maximum(np.abs(v0), np.abs(v1))
+    tieEquations = twoTerms[isTie]
+    if len(tieEquations) == 0:
+        return np.empty(0, dtype=PBasicIndexType), np.empty(0, dtype=PBasicIndexType), np.arange(nbEquations, dtype=PBasicIndexType), root, factor, shift
+
+    c0 = A.indices[first[isTie]].astype(np.int64)
+    c1 = A.indices[first[isTie]+1].astype(np.int64)
+    v0 = v0[isTie]
+    v1 = v1[isTie]
+
+    # only one equation per pair of dofs is used to build the forest
+    pairKeys, firstPair = np.unique(c0*nbDofs+c1, return_index=True)
+    p0 = c0[firstPair]
+    p1 = c1[firstPair]
+
+    # the graph of the ties plus a virtual node (nbDofs) linked to the root of every tree
+    ncc, labels = connected_components(coo_matrix((np.ones(len(p0)), (p0, p1)), shape=(nbDofs, nbDofs)), directed=False)
+    treeRoots = np.unique(labels, return_index=True)[1]
+    graphRows = np.concatenate((p0, np.full(ncc, nbDofs)))
+    graphCols = np.concatenate((p1, treeRoots))
+    graph = coo_matrix((np.ones(len(graphRows)), (graphRows, graphCols)), shape=(nbDofs+1, nbDofs+1)).tocsr()
+    _, predecessors = breadth_first_order(graph, nbDofs, directed=False, return_predecessors=True)
+
+    parent = predecessors[:nbDofs]
+    children = np.where(parent != nbDofs)[0]
+    parent = parent[children]
+
+    # equation defining every child
+    pairIds = np.searchsorted(pairKeys, np.minimum(children, parent).astype(np.int64)*nbDofs+np.maximum(children, parent))
+    edgeIds = firstPair[pairIds]
+    treeEquations = tieEquations[edgeIds]
+    childIsFirst = c0[edgeIds] == children
+    childCoeff = np.where(childIsFirst, v0[edgeIds], v1[edgeIds])
+    parentCoeff = np.where(childIsFirst, v1[edgeIds], v0[edgeIds])
+
+    # u_child = factor*u_parent + shift, then pointer jumping to the root
+    root[children] = parent
+    factor[children] = -parentCoeff/childCoeff
+    shift[children] = b[treeEquations]/childCoeff
+    toUpdate = children
+    while True:
+        toUpdate = toUpdate[root[root[toUpdate]] != root[toUpdate]]
+        if len(toUpdate) == 0:
+            break
+        up = root[toUpdate]
+        shift[toUpdate] += factor[toUpdate]*shift[up]
+        factor[toUpdate] *= factor[up]
+        root[toUpdate] = root[up]
+
+    otherMask = np.ones(nbEquations, dtype=bool)
+    otherMask[treeEquations] = False
+
+    return treeEquations.astype(PBasicIndexType), children.astype(PBasicIndexType), np.where(otherMask)[0].astype(PBasicIndexType), root, factor, shift
+
+def _DenseRows(mat, rows):
+    """
+    Extract the rows of a csr matrix (without duplicated entries) as a dense
+    array restricted to the used columns. (mat[rows,:][:,cols] cost is
+    proportional to the number of columns of mat)
+
+    Returns
+    -------
+    cols : np.ndarray
+        the used columns
+    dense : np.ndarray
+        the dense sub matrix of size (len(rows), len(cols))
+    """
+    starts = mat.indptr[rows]
+    counts = mat.indptr[rows+1] - starts
+    ptr = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+    cols, localCols = np.unique(mat.indices[ptr], return_inverse=True)
+    dense = np.zeros((len(rows), len(cols)), dtype=PBasicFloatType)
+    dense[np.repeat(np.arange(len(rows)), counts), localCols] = mat.data[ptr]
+    return cols, dense
+
+def CleanConstraintBlocks(A, b, tol=1e-8, hubDegree=64):
+    """
+    Compute a full row rank system equivalent to A.u = b without densifying
+    the full operator.
+    The dofs present in more than hubDegree equations (hubs, for example the
+    macroscopic strain in homogenization problems) are removed from the graph
+    of the constraints. The equations are then split into independent blocks
+    (connected components). The equations alone in a block are kept as is;
+    for the others a small dense QR (rank revealing) is computed. The
+    combinations of equations acting only on the hubs are treated at the end.
+
+    Parameters
+    ----------
+    A : scipy.sparse matrix
+        the constraint operator
+    b : np.ndarray
+        the right hand side of the constraints
+    tol : float, optional
+        relative tolerance to detect the redundant equations, by default 1e-8
+    hubDegree : int, optional
+        threshold to detect the hubs dofs, by default 64
+
+    Returns
+    -------
+    C : scipy.sparse.coo_matrix
+        the independent equations
+    g : np.ndarray
+        the right hand side of C
+    slaves : np.ndarray
+        one dof per equation, C[:,slaves] is invertible
+    nbInconsistent : int
+        number of redundant equations with a non compatible right hand side
+    """
+    A = sparse.csr_matrix(A, dtype=PBasicFloatType)
+    A.sum_duplicates()
+    A.eliminate_zeros()
+    nbEquations, nbDofs = A.shape
+    b = np.asarray(b, dtype=PBasicFloatType).ravel()
+
+    # split of the operator into the local part and the hubs part
+    isHub = np.bincount(A.indices, minlength=nbDofs) > hubDegree
+    AH = A.copy()
+    AH.data[~isHub[AH.indices]] = 0
+    AH.eliminate_zeros()
+    AL = A.copy()
+    AL.data[isHub[AL.indices]] = 0
+    AL.eliminate_zeros()
+    AL.sort_indices()
+    nnzLocal = np.diff(AL.indptr)
+
+    # connected components of the bipartite graph equations/dofs
+    pattern = AL.tocoo()
+    bipartite = coo_matrix((np.ones(pattern.nnz), (pattern.row, pattern.col+nbEquations)), shape=(nbEquations+nbDofs, nbEquations+nbDofs))
+    _, labels = connected_components(bipartite, directed=False)
+    labels = labels[:nbEquations]
+    sizes = np.bincount(labels)
+    single = sizes[labels] == 1
+
+    resRows, resCols, resVals, resRhs, slaves = [], [], [], [], []
+    rankcpt = 0
+
+    # equations alone in a block, the slave is the biggest local term
+    singles = np.where(single & (nnzLocal > 0))[0]
+    if len(singles):
+        rowOfData = np.repeat(np.arange(nbEquations), nnzLocal)
+        byMagnitude = np.lexsort((-np.abs(AL.data), rowOfData))
+        slaves.append(AL.indices[byMagnitude[AL.indptr[singles]]])
+        subA = A[singles,:].tocoo()
+        resRows.append(subA.row+rankcpt)
+        resCols.append(subA.col)
+        resVals.append(subA.data)
+        resRhs.append(b[singles])
+        rankcpt += len(singles)
+
+    # equations without local terms are treated at the end
+    leftRows, leftCols, leftVals, leftRhs = [np.empty(0, dtype=PBasicIndexType)], [np.empty(0, dtype=PBasicIndexType)], [np.empty(0)], [b[nnzLocal == 0]]
+    leftSubA = AH[nnzLocal == 0,:].tocoo()
+    leftRows.append(leftSubA.row)
+    leftCols.append(leftSubA.col)
+    leftVals.append(leftSubA.data)
+    leftcpt = leftSubA.shape[0]
+
+    # blocks of several equations: rank revealing QR
+    blockEquations = np.where(~single)[0]
+    blockEquations = blockEquations[np.argsort(labels[blockEquations], kind="stable")]
+    blockBounds = np.concatenate(([0], np.cumsum(sizes[sizes > 1])))
+    for bs, be in zip(blockBounds[:-1], blockBounds[1:]):
+        equations = blockEquations[bs:be]
+        localCols, denseAL = _DenseRows(AL, equations)
+        hubCols, denseAH = _DenseRows(AH, equations)
+
+        Q, R, P = sp_linalg.qr(denseAL, mode="full", pivoting=True, check_finite=False)
+        diag = np.abs(R.diagonal())
+        rank = np.count_nonzero(diag > tol*diag[0])
+
+        localPart = R[:rank,:]
+        localPart[np.abs(localPart) <= tol*diag[0]] = 0
+        lr, lc = np.nonzero(localPart)
+        resRows.append(lr+rankcpt)
+        resCols.append(localCols[P[lc]])
+        resVals.append(localPart[lr, lc])
+        slaves.append(localCols[P[:rank]])
+
+        hubPart = Q.T.dot(denseAH)
+        rhs = Q.T.dot(b[equations])
+        hr, hc = np.nonzero(hubPart[:rank,:])
+        resRows.append(hr+rankcpt)
+        resCols.append(hubCols[hc])
+        resVals.append(hubPart[hr, hc])
+        resRhs.append(rhs[:rank])
+        rankcpt += rank
+
+        hr, hc = np.nonzero(hubPart[rank:,:])
+        leftRows.append(hr+leftcpt)
+        leftCols.append(hubCols[hc])
+        leftVals.append(hubPart[rank:,:][hr, hc])
+        leftRhs.append(rhs[rank:])
+        leftcpt += len(equations)-rank
+
+    C = coo_matrix((np.concatenate(resVals) if resVals else [], (np.concatenate(resRows) if resRows else [], np.concatenate(resCols) if resCols else [])), shape=(rankcpt, nbDofs))
+    g = np.concatenate(resRhs) if resRhs else np.empty(0)
+    slaves = np.concatenate(slaves).astype(PBasicIndexType) if slaves else np.empty(0, dtype=PBasicIndexType)
+
+    leftRhs = np.concatenate(leftRhs)
+    if AH.nnz == 0 :
+        # the remaining equations are 0 = rhs
+        rhsScale = max(np.max(np.abs(b), initial=0.), 1.)
+        return C, g, slaves, int(np.count_nonzero(np.abs(leftRhs) > tol*rhsScale))
+
+    # the remaining equations act only on the hubs
+    left = coo_matrix((np.concatenate(leftVals), (np.concatenate(leftRows), np.concatenate(leftCols))), shape=(leftcpt, nbDofs)).tocsr()
+    rowScale = np.max(np.abs(A), axis=1).toarray().ravel() if nbEquations else np.empty(0)
+    left.data[np.abs(left.data) <= tol*np.max(rowScale, initial=0.)] = 0
+    hubC, hubG, hubSlaves, nbInconsistent = CleanConstraintBlocks(left, leftRhs, tol, hubDegree=np.inf)
+
+    return sparse.vstack((C, hubC)).tocoo(), np.concatenate((g, hubG)), np.concatenate((slaves, hubSlaves)), nbInconsistent
+
 def ExpandMatrix(op,mattoglobal,nbdofs,  treatrows=True, treatcols=True):
     op = op.tocoo()
     data = op.data
@@ -642,7 +950,59 @@ def TestQR():
 #TestQR()
 #exit()
 
+def CheckIntegritySparse(GUI=False):
+    """
+    Check of the sparse algorithm (GetCleanConstraintBaseSparse) on a system
+    with tie relations (chains, cycles, duplicates), hubs and redundant
+    equations
+    """
+    nbdof = 60
+    sol = np.linspace(1,2,nbdof)
+    CH = ConstraintsHolder()
+    CH.SetNumberOfDofs(nbdof)
+    # tie relations with cycles
+    for i in range(30):
+        j, k = (i*7)%20, (i*3+1)%20
+        if j == k:
+            continue
+        s = (-1)**i
+        CH.AddEquationSparse([j,k],[2.,2.*s],2*(sol[j]+s*sol[k]))
+    # equations with a hub (dof 59) and redundant blocks
+    for i in range(20,40):
+        idx = [i,59,i%5]
+        vals = np.array([1.,0.5,-1.])
+        CH.AddEquationSparse(idx,vals,vals.dot(sol[idx]))
+    for i in range(40,58,3):
+        idx = [i,i+1,i+2]
+        vals = np.array([1.,2.,3.])
+        CH.AddEquationSparse(idx,vals,vals.dot(sol[idx]))
+        CH.AddEquationSparse(idx,-2*vals,-2*vals.dot(sol[idx]))
+    CH.AddEquationSparse([59],[1.],sol[59])
+    CH.Compact()
+
+    A = CH.ToSparseFull().toarray()[:,:-1]
+    refRank = np.linalg.matrix_rank(A)
+
+    for hubDegree in [64, 5]:
+        CH.hubDegree = hubDegree
+        res, usedDofs, slaves = CH.GetCleanConstraintBase(purePython=True)
+        Cg = res.toarray()
+        C = Cg[:,:-1]
+        g = Cg[:,-1]
+        if C.shape[0] != refRank or len(np.unique(slaves)) != refRank:
+            raise Exception("Error in the rank detection")
+        if np.linalg.matrix_rank(np.vstack((A[:,usedDofs[:-1]],C))) != refRank:
+            raise Exception("Error: clean constraints not equivalent")
+        if np.linalg.matrix_rank(C[:,slaves]) != refRank:
+            raise Exception("Error: singular slave operator")
+        if np.linalg.norm(C.dot(sol[usedDofs[:-1]])-g) > 1e-10:
+            raise Exception("Error in the right hand side")
+    return "ok"
+
 def CheckIntegrity(GUI=False):
+    res = CheckIntegritySparse(GUI=GUI)
+    if res.lower() != 'ok':
+        return res
     typeToCheck = list(methodFactory.keys())
     for ttc in typeToCheck:
         res = CheckIntegrityTTC(ttc,GUI=GUI)
@@ -3,6 +3,10 @@
 # This file is subject to the terms and conditions defined in
 # file 'LICENSE.txt', which is part of this source code package.
 #
+import copy
+import hashlib
+import inspect
+from collections import OrderedDict
 
 import numpy as np
 import scipy.sparse as sps
@@ -29,6 +33,53 @@ def RegisterSolverClass(name, classtype, constructor=None, withError = True):
 def RegisterSolverClassUsingName(cls):
     RegisterSolverClass(cls().name, cls)
 
+# scipy >= 1.12 renamed the "tol" argument of the iterative solvers to "rtol"
+_rtolName = "rtol" if "rtol" in inspect.signature(spslin.cg).parameters else "tol"
+
+def GetOperatorFingerprint(op, constraints=None):
+    """
+    Compute a hash of the structure and the values of an operator (dense or
+    sparse), and of the constraints if present. Used as key for the
+    factorization cache
+
+    Parameters
+    ----------
+    op : np.ndarray or scipy.sparse matrix
+        the operator
+    constraints : ConstraintsHolder, optional
+        the constraints applied to the operator, by default None
+
+    Returns
+    -------
+    bytes
+        the fingerprint
+    """
+    fingerprint = hashlib.blake2b(digest_size=20)
+    if sps.issparse(op):
+        if op.format not in ("csr","csc"):
+            op = op.tocsr()
+        fingerprint.update(f"{op.format} {op.shape} {op.dtype.str}".encode())
+        for data in (op.indptr, op.indices, op.data):
+            fingerprint.update(np.ascontiguousarray(data).data.cast("B"))
+    else:
+        op = np.ascontiguousarray(op)
+        fingerprint.update(f"dense {op.shape} {op.dtype.str}".encode())
+        fingerprint.update(op.data.cast("B"))
+
+    if constraints is not None and constraints.numberOfEquations > 0:
+        fingerprint.update(f"{type(constraints.method).__name__} {constraints.tol} {constraints.numberOfEquations} {constraints.nbdof}".encode())
+        for data, dtype in ((constraints.rows, PBasicIndexType), (constraints.cols, PBasicIndexType), (constraints.vals, PBasicFloatType)):
+            fingerprint.update(np.ascontiguousarray(data, dtype=dtype).data.cast("B"))
+    return fingerprint.digest()
+
+def JacobiPreconditioner(op):
+    """
+    Inverse of the diagonal of op (ones for the zero diagonal terms)
+    """
+    diag = op.diagonal()
+    diag[diag == 0] = 1.0
+    return sps.dia_matrix((1./diag,0), shape=op.shape)
+
 class LinearSolverBase(BOO):
     def __init__(self):
         super().__init__()
@@ -40,6 +91,31 @@ class LinearSolverBase(BOO):
         self.constraints = ConstraintsHolder()
 
         self._can_use_u0 = False
+        self.__print_warning_u0_ignored = True
+
+        # factorization cache: key -> state of the solver after SetOp
+        self.factorizationCacheSize = 1
+        self._factorizationCache = OrderedDict()
+        self._currentFactorizationKey = None
+        # attributes computed in _setop_imp that can be restored from the cache
+        # None means that the state of the solver can not be stored
+        self._factorizationAttributes = []
+
+    def SetFactorizationCacheSize(self, size):
+        """
+        Set the number of factorizations kept in memory. A call to SetOp with
+        an operator (and constraints) already factorized will reuse the
+        stored factorization. 0 to deactivate the cache (always refactorize)
+        """
+        self.factorizationCacheSize = size
+        while len(self._factorizationCache) > max(size,0):
+            self._factorizationCache.popitem(last=False)
+        if size <= 0:
+            self._currentFactorizationKey = None
+
+    def ClearFactorizationCache(self):
+        self._factorizationCache.clear()
+        self._currentFactorizationKey = None
 
     def GetConstraints(self):
         return self.constraints
@@ -68,6 +144,20 @@ class LinearSolverBase(BOO):
 
     def SetOp(self, op):
         self.PrintVerbose('In SetOp (type:' +str(self.name) + ')')
+
+        key = None
+        # only explicit (dense or sparse) operators can be fingerprinted
+        if self.factorizationCacheSize > 0 and (sps.issparse(op) or isinstance(op, np.ndarray)):
+            key = self._GetFactorizationKey(op)
+            if key == self._currentFactorizationKey:
+                self.PrintVerbose('Operator already factorized')
+                self.originalOp = op
+                return
+            if key in self._factorizationCache:
+                self.PrintVerbose('Using cached factorization')
+                self._RestoreFactorization(key, op)
+                return
+
         self.originalOp = op
 
         if self.HasConstraints():
@@ -79,6 +169,42 @@ class LinearSolverBase(BOO):
         self._setop_imp(op)
         self.PrintDebug('In LinearSolver.SetOp(...) Done')
 
+        self._StoreFactorization(key)
+
+    def _GetFactorizationKey(self, op):
+        """
+        Key of the factorization cache. The solvers with parameters used in
+        _setop_imp must overload this function to add them to the key
+        """
+        return GetOperatorFingerprint(op, self.constraints)
+
+    def _StoreFactorization(self, key):
+        self._currentFactorizationKey = key
+        if key is None or self._factorizationAttributes is None:
+            # the state of the solver can not be copied, only the current factorization is reused
+            return
+        state = {name:getattr(self,name) for name in self._factorizationAttributes}
+        state["op"] = self.op
+        if self.HasConstraints():
+            state["constraintsMethod"] = copy.copy(self.constraints.method)
+        self._factorizationCache[key] = state
+        self._factorizationCache.move_to_end(key)
+        while len(self._factorizationCache) > self.factorizationCacheSize:
+            self._factorizationCache.popitem(last=False)
+
+    def _RestoreFactorization(self, key, originalOp):
+        state = self._factorizationCache[key]
+        self._factorizationCache.move_to_end(key)
+        self.originalOp = originalOp
+        self.op = state["op"]
+        for name in self._factorizationAttributes:
+            setattr(self, name, state[name])
+        if "constraintsMethod" in state:
+            self.constraints.SetNumberOfDofs(originalOp.shape[1])
+            self.constraints.SetOp(originalOp)
+            self.constraints.method = state["constraintsMethod"]
+        self._currentFactorizationKey = key
+
     def Solve(self, rhs, u0=None):
         if self.HasConstraints():
             rhs = self.constraints.GetCRhs(rhs.squeeze())
@@ -114,9 +240,65 @@ class LinearSolverBase(BOO):
 
         return self.u
 
+    def SolveMany(self, rhs, u0=None):
+        """
+        Solve the system for several right hand sides with the current
+        factorization (or preconditioner)
+
+        Parameters
+        ----------
+        rhs : np.ndarray
+            the right hand sides, size (number of dofs, number of rhs)
+        u0 : np.ndarray, optional
+            initial guesses for the iterative solvers, same size as rhs
+
+        Returns
+        -------
+        np.ndarray
+            the solutions, size (number of dofs, number of rhs)
+        """
+        rhs = np.asarray(rhs)
+        if rhs.ndim == 1:
+            rhs = rhs[:,np.newaxis]
+        nbRhs = rhs.shape[1]
+
+        if self.HasConstraints():
+            crhs = np.empty((self.op.shape[0],nbRhs), dtype=PBasicFloatType)
+            for i in range(nbRhs):
+                crhs[:,i] = self.constraints.GetCRhs(rhs[:,i])
+            rhs = crhs
+
+        self.PrintDebug(f'In LinearProblem SolveMany {self.name} ({nbRhs} rhs)')
+        if self._can_use_u0 :
+            if u0 is None:
+                u0 = np.zeros_like(rhs)
+            else:
+                u0 = np.asarray(u0).reshape(-1, nbRhs)
+                if self.HasConstraints():
+                    u0 = np.column_stack([self.constraints.RestrictSolution(u0[:,i]) for i in range(nbRhs)])
+        else:
+            if u0 is not None and self.__print_warning_u0_ignored:
+                print("u0 ignored for direct solvers")
+                self.__print_warning_u0_ignored = False
+            u0 = None
+
+        u = self._solve_many_imp(rhs, u0=u0)
+        self.PrintDebug("Done Linear solver "+str(u.shape))
+
+        if self.HasConstraints():
+            u = np.column_stack([self.constraints.RestoreSolution(u[:,i]) for i in range(nbRhs)]) if nbRhs else np.empty((self.originalOp.shape[1],0))
+
+        return u
+
     def _setop_imp(self,op):
         pass
 
+    def _solve_many_imp(self, rhs, u0=None):
+        res = np.empty_like(rhs, dtype=PBasicFloatType)
+        for i in range(rhs.shape[1]):
+            res[:,i] = self._solve_imp(rhs[:,i], u0=None if u0 is None else u0[:,i])
+        return res
+
 
 class LinearSolverIterativeBase(LinearSolverBase):
     def __init__(self):
@@ -131,17 +313,22 @@ class LinearSolverCG(LinearSolverIterativeBase):
     def __init__(self):
         super().__init__()
         self.name = "CG"
+        self._preconditioner = None
+        self._factorizationAttributes = ["_preconditioner"]
+
+    def _setop_imp(self,op):
+        self._preconditioner = JacobiPreconditioner(op)
 
     def _solve_imp(self, rhs, u0):
-        diag = self.op.diagonal()
-        diag[diag == 0] = 1.0
-        M = sps.dia_matrix((1./diag,0), shape=self.op.shape)
+        M = self._preconditioner
 
         norm = np.linalg.norm(rhs)
+        if norm == 0:
+            return np.zeros_like(rhs, dtype=PBasicFloatType)
         if u0 is None:
-            res = spslin.cg(self.op, rhs/norm, M = M,tol = self.tol, atol = self.tol)
+            res = spslin.cg(self.op, rhs/norm, M = M, atol = self.tol, **{_rtolName:self.tol})
         else:
-            res = spslin.cg(self.op, rhs/norm, M = M, x0 = u0/norm,tol = self.tol, atol = self.tol)
+            res = spslin.cg(self.op, rhs/norm, M = M, x0 = u0/norm, atol = self.tol, **{_rtolName:self.tol})
         u = res[0][np.newaxis].T*norm
         u = u[:,0]
 
@@ -158,12 +345,14 @@ class LinearSolvergmres(LinearSolverIterativeBase):
     def __init__(self):
         super().__init__()
         self.name = "gmres"
+        self._preconditioner = None
+        self._factorizationAttributes = ["_preconditioner"]
+
+    def _setop_imp(self,op):
+        self._preconditioner = JacobiPreconditioner(op)
 
     def _solve_imp(self, rhs, u0):
-        diag = self.op.diagonal()
-        diag[diag == 0] = 1.0
-        M = sps.dia_matrix((1./diag,0), shape=self.op.shape)
-        return  spslin.gmres(self.op, rhs, x0 = u0,M = M,tol = self.tol, atol= self.tol)[0]
+        return  spslin.gmres(self.op, rhs, x0 = u0,M = self._preconditioner, atol= self.tol, **{_rtolName:self.tol})[0]
 
 RegisterSolverClassUsingName(LinearSolvergmres)
 
@@ -181,12 +370,14 @@ class LinearSolverlgmres(LinearSolverIterativeBase):
     def __init__(self):
         super().__init__()
         self.name = "lgmres"
+        self._preconditioner = None
+        self._factorizationAttributes = ["_preconditioner"]
+
+    def _setop_imp(self,op):
+        self._preconditioner = JacobiPreconditioner(op)
 
     def _solve_imp(self, rhs, u0):
-        diag = self.op.diagonal()
-        diag[diag == 0] = 1.0
-        M = sps.dia_matrix((1./diag,0), shape=self.op.shape)
-        return spslin.lgmres(self.op, rhs, x0 = u0,M = M,tol = self.tol, atol= self.tol)[0]
+        return spslin.lgmres(self.op, rhs, x0 = u0,M = self._preconditioner, atol= self.tol, **{_rtolName:self.tol})[0]
 
 RegisterSolverClassUsingName(LinearSolverlgmres)
 
@@ -194,6 +385,9 @@ class LinearSolverlAMG(LinearSolverIterativeBase):
     def __init__(self):
         super().__init__()
         self.name = "AMG"
+        self._internal_solver = None
+        # the AMG hierarchy is reused for all the rhs and stored in the cache
+        self._factorizationAttributes = ["_internal_solver"]
 
     def _setop_imp(self,op):
         import pyamg
@@ -208,17 +402,214 @@ try:
 except:
     pass
 
+def GetRectilinearProlongation1D(nbFineNodes):
+    """Linear interpolation between a 1D grid and the grid obtained by
+    keeping every other node (the last node is always kept)
+
+    Parameters
+    ----------
+    nbFineNodes : int
+        number of nodes of the fine grid
+
+    Returns
+    -------
+    Tuple[sps.csr_matrix, np.ndarray]
+        P (nbFineNodes, nbCoarseNodes) the interpolation matrix, and the
+        indices in the fine grid of the coarse nodes
+    """
+    coarseNodes = np.arange(0, nbFineNodes, 2, dtype=PBasicIndexType)
+    if coarseNodes[-1] != nbFineNodes-1:
+        coarseNodes = np.append(coarseNodes, nbFineNodes-1)
+
+    fineNodes = np.arange(nbFineNodes, dtype=PBasicIndexType)
+    right = np.clip(np.searchsorted(coarseNodes, fineNodes, side="right"), 1, len(coarseNodes)-1)
+    left = right-1
+    if len(coarseNodes) == 1:
+        return sps.csr_matrix(np.ones((nbFineNodes,1), dtype=PBasicFloatType)), coarseNodes
+    alpha = (fineNodes-coarseNodes[left])/(coarseNodes[right]-coarseNodes[left])
+    P = sps.coo_matrix((np.hstack((1-alpha,alpha)), (np.hstack((fineNodes,fineNodes)),np.hstack((left,right)))), shape=(nbFineNodes,len(coarseNodes)))
+    P = P.tocsr()
+    P.eliminate_zeros()
+    return P, coarseNodes
+
+class LinearSolverGMG(LinearSolverIterativeBase):
+    """Conjugate gradient preconditioned by a geometric multigrid V-cycle for
+    problems discretized on a ConstantRectilinearMesh (nodal unknowns)
+
+    The grid is coarsened by a factor 2 in every direction (linear
+    interpolation, Galerkin coarse operators P^T.A.P), damped Jacobi smoothers
+    are used on every level and the coarsest level is solved with a direct
+    solver.
+
+    The grid is defined by (ops of SolverFactory.Create or setters):
+        dimensions : number of nodes in every direction
+        dofPerNode : number of unknowns per node (numbering node*dofPerNode+i)
+        freeDofs : mask of the unknowns present in the operator (the
+            operator is restricted to the free dofs, as in
+            ConstantRectilinearFea)
+    """
+    def __init__(self):
+        super().__init__()
+        self.name = "GMG"
+        self.dimensions = None
+        self.dofPerNode = 1
+        self.freeDofs = None
+        self.coarsestSize = 2000
+        self.smoothingSteps = 2
+        # damping of the Jacobi smoother, None for 4/(3*rho(D^-1.A))
+        self.omega = None
+        self.numberOfIterations = 0
+        self._levels = None
+        self._coarseSolver = None
+        self._factorizationAttributes = ["_levels", "_coarseSolver"]
+
+    def SetDimensions(self, dimensions):
+        self.dimensions = None if dimensions is None else [int(x) for x in dimensions]
+
+    def SetDofPerNode(self, dofPerNode):
+        self.dofPerNode = int(dofPerNode)
+
+    def SetFreeDofs(self, freeDofs):
+        self.freeDofs = None if freeDofs is None else np.asarray(freeDofs, dtype=bool)
+
+    def _GetFactorizationKey(self, op):
+        # the hierarchy depends on the description of the grid
+        fingerprint = hashlib.blake2b(super()._GetFactorizationKey(op), digest_size=20)
+        fingerprint.update(f"{self.dimensions} {self.dofPerNode} {self.coarsestSize} {self.omega}".encode())
+        if self.freeDofs is not None:
+            fingerprint.update(np.ascontiguousarray(self.freeDofs, dtype=bool).data.cast("B"))
+        return fingerprint.digest()
+
+    def _setop_imp(self, op):
+        A = sps.csr_matrix(op, dtype=PBasicFloatType)
+
+        free = self.freeDofs
+        if self.dimensions is None:
+            if A.shape[0] > self.coarsestSize:
+                raise Exception("Please set the dimensions of the grid for the GMG solver")
+            dimensions = [A.shape[0]]
+            dofPerNode = 1
+        else:
+            dimensions = list(self.dimensions)
+            dofPerNode = self.dofPerNode
+        nbDofs = np.prod(dimensions)*dofPerNode
+        if free is None:
+            free = np.ones(nbDofs, dtype=bool)
+        if len(free) != nbDofs or np.count_nonzero(free) != A.shape[0]:
+            raise Exception(f"The size of the operator ({A.shape[0]}) is not compatible with the grid (dimensions:{dimensions}, dofPerNode:{dofPerNode}, free dofs:{np.count_nonzero(free)})")
+
+        self._levels = []
+        while True:
+            diag = A.diagonal().copy()
+            diag[diag == 0] = 1.
+            level = {"A":A, "Dinv":1./diag}
+            self._levels.append(level)
+            if A.shape[0] <= self.coarsestSize or max(dimensions) <= 2:
+                break
+
+            # prolongation on the full grid (nodes numbered with the last index running fastest)
+            P = None
+            coarseNodes = np.zeros(1, dtype=PBasicIndexType)
+            coarseDimensions = []
+            for n in dimensions:
+                P1D, coarseNodes1D = GetRectilinearProlongation1D(n)
+                P = P1D if P is None else sps.kron(P, P1D, format="csr")
+                coarseNodes = (coarseNodes[:,np.newaxis]*n + coarseNodes1D).ravel()
+                coarseDimensions.append(len(coarseNodes1D))
+            P = sps.kron(P, sps.identity(dofPerNode, format="csr"), format="csr")
+
+            # a coarse dof is free if the fine dof at the same position is free
+            coarseFree = free[(coarseNodes[:,np.newaxis]*dofPerNode + np.arange(dofPerNode)).ravel()]
+            P = P[free,:][:,coarseFree].tocsr()
+
+            level["P"] = P
+            A = (P.T.dot(A.dot(P))).tocsr()
+            dimensions = coarseDimensions
+            free = coarseFree
+
+        for level in self._levels[:-1]:
+            level["omega"] = self.omega if self.omega is not None else 4./(3*self._EstimateSpectralRadius(level))
+
+        self._coarseSolver = spslin.factorized(self._levels[-1]["A"].tocsc())
+        self.PrintVerbose("GMG levels : " + str([l["A"].shape[0] for l in self._levels]))
+
+    def _EstimateSpectralRadius(self, level, nbIterations=15):
+        """Power iterations to estimate the spectral radius of D^-1.A"""
+        A = level["A"]
+        Dinv = level["Dinv"]
+        x = np.random.RandomState(0).rand(A.shape[0])
+        rho = 1.
+        for i in range(nbIterations):
+            y = Dinv*A.dot(x)
+            rho = np.linalg.norm(y)/np.linalg.norm(x)
+            x = y/np.linalg.norm(y)
+        return rho
+
+    def _VCycle(self, b, cpt=0):
+        if cpt == len(self._levels)-1:
+            return self._coarseSolver(b)
+
+        level = self._levels[cpt]
+        A = level["A"]
+        omegaDinv = level["omega"]*level["Dinv"]
+
+        x = omegaDinv*b
+        for i in range(self.smoothingSteps-1):
+            x += omegaDinv*(b-A.dot(x))
+
+        P = level["P"]
+        x += P.dot(self._VCycle(P.T.dot(b-A.dot(x)), cpt+1))
+
+        for i in range(self.smoothingSteps):
+            x += omegaDinv*(b-A.dot(x))
+        return x
+
+    def _solve_imp(self, rhs, u0):
+        norm = np.linalg.norm(rhs)
+        if norm == 0:
+            return np.zeros_like(rhs, dtype=PBasicFloatType)
+
+        n = self.op.shape[0]
+        M = spslin.LinearOperator((n,n), matvec=lambda x: self._VCycle(np.ravel(x)), dtype=PBasicFloatType)
+
+        self.numberOfIterations = 0
+        def Count(xk):
+            self.numberOfIterations += 1
+
+        x0 = None if u0 is None else u0/norm
+        res = spslin.cg(self.op, rhs/norm, M = M, x0 = x0, atol = self.tol, callback = Count, **{_rtolName:self.tol})
+        u = res[0]*norm
+
+        if res[1] > 0 :
+            self.Print(TF.InYellowBackGround(TF.InRed("Convergence to tolerance not achieved"))) #pragma: no cover
+        if res[1] < 0 :
+            self.Print(TF.InYellowBackGround(TF.InRed("Illegal input or breakdown"))) #pragma: no cover
+
+        return u
+
+RegisterSolverClassUsingName(LinearSolverGMG)
+
 class LinearSolverDirect(LinearSolverIterativeBase):
     def __init__(self):
         super().__init__()
         self.name = "Direct"
+        self._internal_solver = None
+        self._multiRhs = False
+        self._factorizationAttributes = ["_internal_solver", "_multiRhs"]
 
     def _setop_imp(self,op):
         self._internal_solver = sps.linalg.factorized(op)
+        # splu (the default backend) solves stacked right hand sides at once, umfpack does not
+        self._multiRhs = isinstance(getattr(self._internal_solver, "__self__", None), spslin.SuperLU)
 
     def _solve_imp(self, rhs, u0=None):
         return self._internal_solver(rhs)
 
+    def _solve_many_imp(self, rhs, u0=None):
+        if self._multiRhs:
+            return self._internal_solver(np.asfortranarray(rhs, dtype=PBasicFloatType))
+        return super()._solve_many_imp(rhs, u0)
+
 RegisterSolverClassUsingName(LinearSolverDirect)
 
 class LinearSolverCholesky(LinearSolverDirect):
@@ -229,6 +620,7 @@ class LinearSolverCholesky(LinearSolverDirect):
     def _setop_imp(self,op):
         from sksparse.cholmod import cholesky
         self._internal_solver = cholesky(op)
+        self._multiRhs = True
 
     def _solve_imp(self, rhs, u0= None):
         return self._internal_solver(rhs)
@@ -243,15 +635,24 @@ class LinearSolverEigen(LinearSolverIterativeBase):
     def __init__(self,subtype):
         super().__init__()
         self.SetSolver(subtype)
+        # the factorization lives in the native object, only the current one is reused
+        self._factorizationAttributes = None
         import BasicTools.Linalg.NativeEigenSolver as NativeEigenSolver
         self.solver = NativeEigenSolver.CEigenSolvers()
         from BasicTools.Helpers.CPU import GetNumberOfAvailableCpus
         self.solver.ForceNumberOfThreads(GetNumberOfAvailableCpus())
 
+    def SetTolerance(self,tol):
+        super().SetTolerance(tol)
+        # the tolerance is given to the native solver in SetOp
+        self._currentFactorizationKey = None
+
     def SetSolver(self, subtype):
         self.name = "Eigen"+subtype
         self.subtype = subtype
-        self.solver = None
+        # the solver type is given to the native solver in SetOp, the
+        # current factorization was done with the previous type
+        self.ClearFactorizationCache()
 
     def _setop_imp(self,op):
         self.solver.SetSolverType(self.subtype)
@@ -344,6 +745,16 @@ class LinearProblem(BOO):
             raise(Exception("Please set the solver type first"))
         return self.realsolver.Solve(rhs)
 
+    def SolveMany(self, rhs, u0=None):
+        if self.realsolver == None: #pragma: no cover
+            raise(Exception("Please set the solver type first"))
+        return self.realsolver.SolveMany(rhs, u0=u0)
+
+    def SetFactorizationCacheSize(self, size):
+        if self.realsolver == None: #pragma: no cover
+            raise(Exception("Please set the solver type first"))
+        self.realsolver.SetFactorizationCacheSize(size)
+
     @property
     def constraints(self):
         if self.realsolver == None: #pragma: no cover
@@ -378,6 +789,140 @@ def CheckSolver(GUI,solver):
     if abs(sol[1] - 2.) > 1e-15 : raise Exception()
 
 
+def CheckSolverMany(GUI,solver):
+    print("Solver (SolveMany) "+ str(solver))
+    op = sps.csc_matrix(np.array([[ 4.,-1, 0, 0],
+                                  [-1, 4,-1, 0],
+                                  [ 0,-1, 4,-1],
+                                  [ 0, 0,-1, 4]]),dtype=PBasicFloatType)
+    rhs = np.array([[1., 0, 2, 0],
+                    [2., 0, 1, 1],
+                    [0., 0, 1, 2],
+                    [1., 0,-1, 3]],dtype=PBasicFloatType)
+    refSol = np.linalg.solve(op.toarray(),rhs)
+
+    LS = LinearProblem()
+    LS.SetAlgo(solver)
+    LS.SetOp(op)
+    LS.SetTolerance(1e-12)
+    sol = LS.SolveMany(rhs)
+    if sol.shape != rhs.shape or np.linalg.norm(sol-refSol) > 1e-8:
+        print(sol) #pragma: no cover
+        raise Exception("Error in SolveMany") #pragma: no cover
+
+    # with constraints (u[0] = 1)
+    LS.constraints.SetNumberOfDofs(4)
+    LS.constraints.AddEquation([1.,0,0,0],1.)
+    LS.SetOp(op)
+    sol = LS.SolveMany(rhs)
+    for i in range(rhs.shape[1]):
+        sol_i = LS.Solve(rhs[:,i])
+        if np.linalg.norm(sol[:,i]-sol_i) > 1e-8 or abs(sol[0,i] - 1.) > 1e-8:
+            print(sol[:,i], sol_i) #pragma: no cover
+            raise Exception("Error in SolveMany with constraints") #pragma: no cover
+
+def CheckFactorizationCache(GUI):
+    op = sps.csc_matrix(np.array([[2.,-1],[-1,2]]),dtype=PBasicFloatType)
+    op2 = op*2
+
+    LS = LinearSolverDirect()
+    LS.SetOp(op)
+    factorization = LS._internal_solver
+    # same operator (not the same object): no refactorization
+    LS.SetOp(op.copy())
+    if LS._internal_solver is not factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+    LS.SetOp(op2)
+    if LS._internal_solver is factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+    # only the last factorization is kept by default
+    LS.SetOp(op)
+    if LS._internal_solver is factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+
+    LS.SetFactorizationCacheSize(2)
+    LS.SetOp(op2)
+    factorization = LS._internal_solver
+    LS.SetOp(op)
+    LS.SetOp(op2)
+    if LS._internal_solver is not factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+    if np.linalg.norm(LS.Solve(np.array([1.,1]))- [0.5,0.5]) > 1e-14:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+
+    # a change in the constraints must be detected
+    LS.constraints.SetNumberOfDofs(2)
+    LS.constraints.AddEquation([1.,0],1.)
+    LS.SetOp(op2)
+    if LS._internal_solver is factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+    if abs(LS.Solve(np.array([0.,0]))[0] - 1.) > 1e-14:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+
+    LS.SetFactorizationCacheSize(0)
+    LS.SetOp(op2)
+    if LS._internal_solver is factorization:
+        raise Exception("Error in the factorization cache") #pragma: no cover
+
+    # a change of the solver type must force a new factorization
+    if "EigenCG" in GetAvailableSolvers():
+        LS = LinearSolverEigen("CG")
+        LS.SetOp(op)
+        LS.SetSolver("LU")
+        if LS._currentFactorizationKey is not None:
+            raise Exception("Error in the factorization cache") #pragma: no cover
+        LS.SetOp(op)
+        if np.linalg.norm(LS.Solve(np.array([1.,1]))- [1.,1.]) > 1e-14:
+            raise Exception("Error in the factorization cache") #pragma: no cover
+
+def CheckGMG(GUI):
+    # 3D Poisson problem (first layer of nodes fixed), 2 dofs per node
+    iterations = []
+    for n in [9, 17, 33]:
+        T = sps.diags([-np.ones(n-1), 2*np.ones(n), -np.ones(n-1)], [-1,0,1])
+        I = sps.identity(n)
+        A = sps.kron(sps.kron(T,I),I) + sps.kron(sps.kron(I,T),I) + sps.kron(sps.kron(I,I),T)
+        A = sps.kron(A, sps.identity(2)).tocsr()
+        free = np.ones(A.shape[0], dtype=bool)
+        free[0:2*n*n] = False
+        A = A[free,:][:,free]
+
+        LS = LinearProblem()
+        LS.SetAlgo("GMG", ops={"dimensions":[n,n,n], "dofPerNode":2, "freeDofs":free})
+        LS.SetTolerance(1e-8)
+        LS.realsolver.coarsestSize = 100
+        LS.SetOp(A)
+        rhs = np.random.RandomState(0).rand(A.shape[0])
+        sol = LS.Solve(rhs)
+        if np.linalg.norm(A.dot(sol)-rhs) > 1e-7*np.linalg.norm(rhs):
+            raise Exception("Error in the GMG solver") #pragma: no cover
+        iterations.append(LS.realsolver.numberOfIterations)
+
+    # the same operator on a different grid must not reuse the hierarchy
+    n = 9
+    A = sps.diags([-np.ones(n*n*2-1), 2*np.ones(n*n*2), -np.ones(n*n*2-1)], [-1,0,1]).tocsr()
+    LS = LinearProblem()
+    LS.SetAlgo("GMG", ops={"dimensions":[n,n*2], "dofPerNode":1})
+    LS.realsolver.coarsestSize = 10
+    LS.SetOp(A)
+    nbLevels = len(LS.realsolver._levels)
+    LS.realsolver.SetDimensions([n*n*2])
+    LS.SetOp(A)
+    if len(LS.realsolver._levels) == nbLevels:
+        raise Exception("Error in the GMG factorization cache") #pragma: no cover
+    LS.realsolver.SetDimensions([n,n*2])
+    LS.SetOp(A)
+    if len(LS.realsolver._levels) != nbLevels:
+        raise Exception("Error in the GMG factorization cache") #pragma: no cover
+
+    print("GMG iterations : ", iterations)
+    if max(iterations) > 15:
+        raise Exception("Too many GMG iterations") #pragma: no cover
+
+    P, coarseNodes = GetRectilinearProlongation1D(6)
+    if not np.array_equal(coarseNodes, [0,2,4,5]) or np.max(np.abs(P.dot([1,3,5,6]) - np.arange(1,7))) > 1e-15:
+        raise Exception("Error in GetRectilinearProlongation1D") #pragma: no cover
+
 def CheckSPQR(GUI):
     realsolver = LinearSolverEigen("SPQR")
 
@@ -433,6 +978,11 @@ def CheckIntegrity(GUI=False):
 
     for s in solvers:
         CheckSolver(GUI,s)
+        CheckSolverMany(GUI,s)
+
+    CheckFactorizationCache(GUI)
+
+    CheckGMG(GUI)
 
     CheckSPQR(GUI)
 